@@ -0,0 +1,69 @@
+"""Compares write and read throughput of the storage backends on a demo run.
+
+Usage: python -m benchmarks.bench_backends [ticks]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence.backend import BACKENDS, create_backend
+from scenarios import create_demo_scenario
+
+
+def collect(ticks: int):
+    """Deltas and snapshots of a demo run, as (tick, delta, snapshot) in recording order."""
+    engine = SimulationEngine(persistence=create_backend("", PersistenceConfig(backend="memory")))
+    engine.create_session("bench")
+    engine.initialize_world(create_demo_scenario())
+
+    steps = []
+    submit = engine.writer.submit
+
+    def capture(session_id, tick, delta, world_snapshot=None, **kwargs):
+        steps.append((tick, delta, world_snapshot.clone() if world_snapshot is not None else None))
+        return submit(session_id, tick, delta, world_snapshot=world_snapshot, **kwargs)
+
+    engine.writer.submit = capture
+    engine.step(ticks)
+    engine.close()
+    return steps
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    steps = collect(ticks)
+
+    for name in BACKENDS:
+        with tempfile.TemporaryDirectory() as directory:
+            persistence = create_backend(os.path.join(directory, "bench"), PersistenceConfig(backend=name))
+            session_id = persistence.create_session("bench")
+            pending = [persistence.prepare_step(session_id, tick, delta, snapshot) for tick, delta, snapshot in steps]
+
+            start = time.perf_counter()
+            for step in pending:
+                persistence.save_steps([step])
+            write = time.perf_counter() - start
+
+            start = time.perf_counter()
+            count = sum(1 for _ in persistence.iter_deltas(session_id, 1, ticks))
+            scan = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for tick in range(1, ticks + 1, max(1, ticks // 100)):
+                list(persistence.iter_deltas(session_id, tick, tick + 9))
+            seek = time.perf_counter() - start
+            persistence.close()
+
+        print(
+            f"{name:7s} write {len(pending) / write:9.0f} ticks/s   "
+            f"scan {count / scan:9.0f} deltas/s   10-tick range {seek * 1e6 / 100:8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Compares the binary codec with the JSON serializer on a demo run.
+
+Usage: python -m benchmarks.bench_codec [ticks]
+"""
+import logging
+import sys
+import time
+
+from core.engine import SimulationEngine
+from scenarios import create_demo_scenario
+from persistence import codec
+from persistence.serializer import to_json, from_json
+from deltas.types import WorldDelta
+from domains.world import World
+
+
+def collect(ticks: int):
+    engine = SimulationEngine(":memory:")
+    engine.create_session("bench")
+    engine.initialize_world(create_demo_scenario())
+
+    deltas = []
+    submit = engine.writer.submit
+
+    def capture(session_id, tick, delta, **kwargs):
+        if delta is not None:
+            deltas.append(delta)
+        return submit(session_id, tick, delta, **kwargs)
+
+    engine.writer.submit = capture
+    engine.step(ticks)
+    world = engine.world
+    engine.close()
+    return deltas, world
+
+
+def timed(fn, items, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def report(label: str, items, encode_json, decode_json, encode_bin, decode_bin):
+    json_payloads = [encode_json(i) for i in items]
+    bin_payloads = [encode_bin(i) for i in items]
+    json_size = sum(len(p.encode("utf-8")) for p in json_payloads)
+    bin_size = sum(len(p) for p in bin_payloads)
+
+    enc_json = timed(encode_json, items)
+    enc_bin = timed(encode_bin, items)
+    dec_json = timed(decode_json, json_payloads)
+    dec_bin = timed(decode_bin, bin_payloads)
+
+    print(f"{label} ({len(items)} items)")
+    print(f"  size    json {json_size / len(items):10.0f} B   binary {bin_size / len(items):10.0f} B   x{json_size / bin_size:.1f}")
+    print(f"  encode  json {enc_json * 1e6 / len(items):10.1f} us  binary {enc_bin * 1e6 / len(items):10.1f} us  x{enc_json / enc_bin:.1f}")
+    print(f"  decode  json {dec_json * 1e6 / len(items):10.1f} us  binary {dec_bin * 1e6 / len(items):10.1f} us  x{dec_json / dec_bin:.1f}")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    deltas, world = collect(ticks)
+
+    report(
+        "WorldDelta", deltas,
+        to_json, lambda s: from_json(s, WorldDelta),
+        codec.encode_delta, codec.decode_delta
+    )
+    report(
+        "World", [world] * 50,
+        to_json, lambda s: from_json(s, World),
+        codec.encode_world, codec.decode_world
+    )
+
+
+if __name__ == "__main__":
+    main()
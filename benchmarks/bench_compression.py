@@ -0,0 +1,67 @@
+"""Measures preset-dictionary compression of delta payloads on a demo run.
+
+Usage: python -m benchmarks.bench_compression [ticks] [--save PATH]
+
+With --save, the dictionary trained on the run is written to PATH so it can be
+used as PersistenceConfig.dictionary_path.
+"""
+import argparse
+import logging
+import time
+
+from benchmarks.bench_codec import collect
+from core.defaults import PersistenceConfig
+from persistence import codec
+from persistence.compression import compress, decompress, train_dictionary
+from persistence.serializer import to_json
+
+
+def report(label: str, payloads, config: PersistenceConfig):
+    train, test = payloads[:config.dictionary_samples], payloads[config.dictionary_samples:]
+    if not test:
+        raise SystemExit("Run more ticks than PersistenceConfig.dictionary_samples.")
+
+    start = time.perf_counter()
+    zdict = train_dictionary(train, config.dictionary_size)
+    training = time.perf_counter() - start
+
+    raw = sum(len(p.encode("utf-8") if isinstance(p, str) else p) for p in test)
+    plain = [compress(p, None, config.compression_level) for p in test]
+
+    start = time.perf_counter()
+    packed = [compress(p, zdict, config.compression_level) for p in test]
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for p in packed:
+        decompress(p, zdict)
+    decode = time.perf_counter() - start
+
+    print(f"{label} deltas ({len(test)} after {len(train)} training samples, dictionary trained in {training:.2f}s)")
+    print(f"  raw        {raw / len(test):8.0f} B")
+    print(f"  zlib       {sum(map(len, plain)) / len(test):8.0f} B   x{raw / sum(map(len, plain)):.1f}")
+    print(f"  zlib+dict  {sum(map(len, packed)) / len(test):8.0f} B   x{raw / sum(map(len, packed)):.1f}"
+          f"   {encode * 1e6 / len(test):.0f} us / {decode * 1e6 / len(test):.0f} us per payload")
+    return zdict
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ticks", type=int, nargs="?", default=600)
+    parser.add_argument("--save", help="write the dictionary trained on binary deltas to this file")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    config = PersistenceConfig()
+    deltas, _ = collect(args.ticks)
+
+    zdict = report("binary", [codec.encode_delta(d) for d in deltas], config)
+    report("json", [to_json(d) for d in deltas], config)
+
+    if args.save:
+        with open(args.save, "wb") as f:
+            f.write(zdict)
+        print(f"Dictionary written to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from bot import engine, bot
+import asyncio
+from discord.ext import commands
+from persistence.backfill import backfill_session
+from utils.embeds import Embeds
+
+class backfillCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="backfill")
+    async def backfill(self, ctx, session_id: str = None):
+        session_id = session_id or engine.session_id
+        if not session_id:
+            await ctx.send(embed=Embeds.create_error_embed("No session given and no active simulation."))
+            return
+        if not engine.persistence.load_session_metadata(session_id):
+            await ctx.send(embed=Embeds.create_error_embed(f"Session `{session_id}` not found."))
+            return
+
+        await ctx.send(embed=Embeds.create_info_embed("Building historical metrics... This may take a while for long sessions."))
+
+        try:
+            engine.flush()
+            report = await asyncio.to_thread(backfill_session, engine.persistence, session_id, engine.config)
+            await ctx.send(embed=Embeds.create_success_embed(
+                "Backfill complete",
+                f"Session `{session_id}`: **{report.ticks}** ticks and **{report.rows}** rows written "
+                f"in {report.seconds:.1f}s ({report.rows_per_second:.0f} rows/s)."
+            ))
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Backfill failed: {str(e)}"))
+
+async def setup(bot):
+    await bot.add_cog(backfillCog(bot))
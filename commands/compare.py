@@ -1,4 +1,5 @@
 from bot import engine, bot
+import asyncio
 from discord import Embed, Color
 from core.metrics import GeopoliticalMetrics
 from discord.ext import commands
@@ -9,12 +10,21 @@ class compareCog(commands.Cog):
         self.bot = bot
         
     @commands.command(name="compare")
-    async def compare_factions(self, ctx, fid1: str, fid2: str):
+    async def compare_factions(self, ctx, fid1: str, fid2: str, tick: int = None):
         if not engine.world:
             await ctx.send(embed=Embeds.create_error_embed("No active simulation to capture."))
             return
     
-        comparison = GeopoliticalMetrics.compare_factions(engine.world, fid1, fid2)
+        world = engine.world
+        if tick is not None:
+            try:
+                engine.flush()
+                world = await asyncio.to_thread(engine.time_travel.view, engine.session_id, tick)
+            except ValueError as e:
+                await ctx.send(embed=Embeds.create_error_embed(str(e)))
+                return
+    
+        comparison = GeopoliticalMetrics.compare_factions(world, fid1, fid2)
     
         if "error" in comparison:
             await ctx.send(embed=Embeds.create_error_embed(comparison['error']))
@@ -25,7 +35,7 @@ class compareCog(commands.Cog):
     
         embed = Embeds.create_info_embed(
             title=f"⚔️ {f1['name']} vs {f2['name']}",
-            description=f"Alliance Status: {'Allied' if comparison['are_allied'] else 'Not Allied'}",
+            description=(f"Tick **{tick}** — " if tick is not None else "") + f"Alliance Status: {'Allied' if comparison['are_allied'] else 'Not Allied'}",
         )
     
         embed.add_field(
@@ -0,0 +1,65 @@
+from bot import engine, bot
+import asyncio
+import time
+from discord.ext import commands
+from utils.embeds import Embeds
+
+MAX_EVENTS = 15
+
+class eventsCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="events")
+    async def show_events(self, ctx, *terms: str):
+        if not engine.session_id:
+            await ctx.send(embed=Embeds.create_error_embed("No active simulation to search."))
+            return
+
+        kinds, entity_id, tick_range, words = [], None, None, []
+        try:
+            for term in terms:
+                key, _, value = term.partition(":")
+                if key == "type" and value:
+                    kinds.extend(value.lower().split(","))
+                elif key == "entity" and value:
+                    entity_id = value
+                elif key == "ticks" and value:
+                    low, _, high = value.partition("-")
+                    tick_range = (int(low) if low else None, int(high) if high else None)
+                else:
+                    words.append(term)
+        except ValueError:
+            await ctx.send(embed=Embeds.create_error_embed("Invalid tick range. Use `ticks:100-200`, `ticks:100-` or `ticks:-200`."))
+            return
+
+        try:
+            engine.flush()
+            started = time.perf_counter()
+            rows = await asyncio.to_thread(
+                engine.persistence.query_events, engine.session_id, kinds, entity_id, " ".join(words), tick_range, MAX_EVENTS
+            )
+            elapsed = (time.perf_counter() - started) * 1000
+        except NotImplementedError:
+            await ctx.send(embed=Embeds.create_error_embed("The configured storage backend does not index events."))
+            return
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Error searching events: {str(e)}"))
+            return
+
+        if not rows:
+            await ctx.send(embed=Embeds.create_warning_embed("No events found", "Nothing recorded matches these filters."))
+            return
+
+        lines = [f"`{tick:>5}` {message}" for tick, _, _, _, message in rows]
+        description = "\n".join(lines)
+        # Embed descriptions are capped at 4096 characters.
+        while len(description) > 4000:
+            lines.pop()
+            description = "\n".join(lines)
+        embed = Embeds.create_info_embed(f"Events ({len(lines)} most recent)", description)
+        embed.set_footer(text=f"Found in {elapsed:.1f} ms")
+        await ctx.send(embed=embed)
+
+async def setup(bot):
+    await bot.add_cog(eventsCog(bot))
@@ -0,0 +1,27 @@
+from bot import engine, bot
+from discord.ext import commands
+from utils.embeds import Embeds
+
+class forkCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="fork")
+    async def fork_sim(self, ctx, tick: int = None, *, name: str = None):
+        if not engine.session_id:
+            await ctx.send(embed=Embeds.create_error_embed("No active simulation to fork."))
+            return
+
+        parent_id = engine.session_id
+        try:
+            fork_id = engine.fork_session(parent_id, tick, name)
+            await ctx.send(embed=Embeds.create_success_embed(
+                "Session forked",
+                f"Branched `{parent_id}` at tick **{engine.current_tick}** into `{fork_id}`.\n"
+                f"The new branch is now active; `!load {parent_id}` returns to the original."
+            ))
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Failed to fork session: {str(e)}"))
+
+async def setup(bot):
+    await bot.add_cog(forkCog(bot))
@@ -30,7 +30,7 @@ class HelpCog(commands.Cog):
         
         embed_simulation.add_field(
             name="▸ Current Status",
-            value="```!status```\nView the current state of all factions and regions.",
+            value="```!status [tick]```\nView the current state of all factions and regions, or their state at a past tick.",
             inline=False
         )
         
@@ -46,9 +46,21 @@ class HelpCog(commands.Cog):
             inline=False
         )
         
+        embed_simulation.add_field(
+            name="▸ Search Events",
+            value="```!events [type:<kinds>] [entity:<id>] [ticks:<from>-<to>] [words...]```\nFind the latest events of the active session by kind, faction or region id, tick range and message text.\n*Example: `!events type:war,coup entity:f_hegemony` or `!events drought ticks:100-500`*",
+            inline=False
+        )
+        
+        embed_simulation.add_field(
+            name="▸ Backfill History",
+            value="```!backfill [session_id]```\nBuild the historical metrics and event rows of a session recorded before they existed, so `!history` and `!events` can read them.\n*Defaults to the active session*",
+            inline=False
+        )
+        
         embed_simulation.add_field(
             name="▸ Compare Factions",
-            value="```!compare <faction1_id> <faction2_id>```\nGenerate a detailed comparison between two factions.\n*Example: `!compare 1 3`*",
+            value="```!compare <faction1_id> <faction2_id> [tick]```\nGenerate a detailed comparison between two factions, now or at a past tick.\n*Example: `!compare 1 3` or `!compare 1 3 250`*",
             inline=False
         )
         
@@ -66,7 +78,25 @@ class HelpCog(commands.Cog):
         
         embed_simulation.add_field(
             name="▸ Load Session",
-            value="```!load <session_id>```\nRestore a previously saved simulation session.\n*Example: `!load my_session_001`*",
+            value="```!load <session_id> [tick] [truncate]```\nRestore a previously saved simulation session, at its latest or a given tick. An earlier tick is read-only until you `!fork` or `!undo`; add `truncate` to discard the later ticks and continue from there instead.\n*Example: `!load my_session_001` or `!load my_session_001 500 truncate`*",
+            inline=False
+        )
+        
+        embed_simulation.add_field(
+            name="▸ Fork Session",
+            value="```!fork [tick] [name]```\nBranch the active session at a past or the current tick and continue on the branch. History before the fork is shared, not copied.\n*Example: `!fork 500 no-war branch`*",
+            inline=False
+        )
+        
+        embed_simulation.add_field(
+            name="▸ Undo Ticks",
+            value="```!undo [ticks]```\nRewind the active session by N ticks (default: 1) and discard what happened after that point.\n*Example: `!undo 10`*",
+            inline=False
+        )
+        
+        embed_simulation.add_field(
+            name="▸ Apply Retention",
+            value="```!retention```\nCompact, thin and archive the history of inactive sessions as configured, then reclaim disk space. Archived sessions come back when loaded.",
             inline=False
         )
         
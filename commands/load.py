@@ -7,10 +7,23 @@ class loadCog(commands.Cog):
         self.bot = bot
     
     @commands.command(name="load")
-    async def load_sim(self, ctx, session_id: str):
+    async def load_sim(self, ctx, session_id: str, tick: int = None, mode: str = None):
+        if mode not in (None, "truncate"):
+            await ctx.send(embed=Embeds.create_error_embed(f"Unknown option `{mode}`. Use `!load <session_id> [tick] [truncate]`."))
+            return
+
         try:
-            engine.load_session(session_id)
-            await ctx.send(embed=Embeds.create_success_embed("Session loaded", f"Loaded session `{session_id}` at tick **{engine.current_tick}**."))
+            engine.load_session(session_id, tick, truncate=mode == "truncate")
+            latest_tick = engine.persistence.get_latest_tick(session_id)
+            description = f"Loaded session `{session_id}` at tick **{engine.current_tick}**."
+            if mode == "truncate":
+                description += " Any later ticks were discarded."
+            elif engine.current_tick < latest_tick:
+                description = (
+                    f"Loaded session `{session_id}` at tick **{engine.current_tick}** of **{latest_tick}**, read-only.\n"
+                    f"`!fork` branches from here; `!load {session_id} {engine.current_tick} truncate` discards the later ticks and continues this session."
+                )
+            await ctx.send(embed=Embeds.create_success_embed("Session loaded", description))
         except Exception as e:
             await ctx.send(embed=Embeds.create_error_embed(f"Failed to load session: {str(e)}"))
 
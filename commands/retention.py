@@ -0,0 +1,29 @@
+from bot import engine, bot
+import asyncio
+from discord.ext import commands
+from persistence.retention import apply_retention
+from utils.embeds import Embeds
+
+class retentionCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="retention")
+    async def retention(self, ctx):
+        await ctx.send(embed=Embeds.create_info_embed("Applying the retention policy... This may take a while on large databases."))
+
+        try:
+            engine.flush()
+            # The running session keeps its full history.
+            exclude = [engine.session_id] if engine.session_id else []
+            report = await asyncio.to_thread(apply_retention, engine.persistence, engine.config, None, exclude)
+            await ctx.send(embed=Embeds.create_success_embed(
+                "Retention applied",
+                f"**{report.sessions}** sessions: **{report.deltas_dropped}** deltas and **{report.snapshots_dropped}** snapshots dropped, "
+                f"**{len(report.archived)}** archived, {report.bytes_reclaimed / 1024 / 1024:.1f} MiB reclaimed in {report.seconds:.1f}s."
+            ))
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Retention failed: {str(e)}"))
+
+async def setup(bot):
+    await bot.add_cog(retentionCog(bot))
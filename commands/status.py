@@ -1,3 +1,4 @@
+import asyncio
 import discord
 from bot import engine
 from bot import bot
@@ -9,18 +10,27 @@ class statusCog(commands.Cog):
         self.bot = bot
     
     @commands.command(name="status")
-    async def status_sim(self, ctx):
+    async def status_sim(self, ctx, tick: int = None):
         if not engine.world:
             await ctx.send(embed=Embeds.create_error_embed("No active simulation to capture."))
             return
         
-        active_factions = [f for f in engine.world.factions.values() if f.is_active]
-        collapsed_count = len(engine.world.factions) - len(active_factions)
+        world = engine.world
+        if tick is not None:
+            try:
+                engine.flush()
+                world = await asyncio.to_thread(engine.time_travel.view, engine.session_id, tick)
+            except ValueError as e:
+                await ctx.send(embed=Embeds.create_error_embed(str(e)))
+                return
+        
+        active_factions = [f for f in world.factions.values() if f.is_active]
+        collapsed_count = len(world.factions) - len(active_factions)
         
         embeds = []
         
         main_embed = Embeds.create_info_embed(title="Simulation Status")
-        main_embed.add_field(name="Current Tick", value=str(engine.current_tick), inline=False)
+        main_embed.add_field(name="Tick" if tick is not None else "Current Tick", value=str(tick if tick is not None else engine.current_tick), inline=False)
         main_embed.add_field(name="Summary", value=f"Active Factions: {len(active_factions)}\nCollapsed: {collapsed_count}", inline=False)
         embeds.append(main_embed)
         
@@ -43,7 +53,7 @@ class statusCog(commands.Cog):
                     EnvironmentType.WILDERNESS: "wil"
                 }
                 for rid in f.regions:
-                    r = engine.world.get_region(rid)
+                    r = world.get_region(rid)
                     if r:
                         env_icons += icons.get(r.environment)
                         total_infra += r.socio_economic.infrastructure
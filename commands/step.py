@@ -15,7 +15,11 @@ class stepCog(commands.Cog):
     
         await ctx.send(embed=Embeds.create_info_embed(title="Simulation running", description=f"Running **{ticks}** ticks..."))
     
-        events = engine.step(ticks)
+        try:
+            events = engine.step(ticks)
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Failed to step the simulation: {str(e)}"))
+            return
     
         if events:
             display_events = events[-10:]
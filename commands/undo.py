@@ -0,0 +1,26 @@
+from bot import engine, bot
+from discord.ext import commands
+from utils.embeds import Embeds
+
+class undoCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="undo")
+    async def undo(self, ctx, ticks: int = 1):
+        if not engine.session_id:
+            await ctx.send(embed=Embeds.create_error_embed("No active simulation to undo."))
+            return
+
+        try:
+            previous_tick = engine.current_tick
+            tick = engine.rewind(ticks)
+            await ctx.send(embed=Embeds.create_success_embed(
+                "Ticks undone",
+                f"Rewound from tick **{previous_tick}** to tick **{tick}**. Later history was discarded."
+            ))
+        except Exception as e:
+            await ctx.send(embed=Embeds.create_error_embed(f"Failed to undo: {str(e)}"))
+
+async def setup(bot):
+    await bot.add_cog(undoCog(bot))
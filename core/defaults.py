@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 # =========================
 # SIMULATION DEFAULTS
@@ -7,7 +8,58 @@ from dataclasses import dataclass
 class SimulationConfig:
     max_ticks: int = 1_000_000
     snapshot_interval: int = 100
+    adaptive_snapshots: bool = True
+    min_snapshot_interval: int = 25
+    max_snapshot_interval: int = 1_000
+    snapshot_replay_budget: int = 2_000
     base_tick_duration: float = 1.0
+    persist_batch_size: int = 500
+    write_behind: bool = False
+    write_queue_size: int = 1024
+    metrics_interval: int = 1
+    undo_depth: int = 100
+    persist_undo: bool = False
+    seed: Optional[int] = None
+    storage_mode: str = "deltas"
+    replay_snapshot_interval: int = 1_000
+
+# =========================
+# PERSISTENCE DEFAULTS
+# =========================
+@dataclass(frozen=True)
+class PersistenceConfig:
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size_kib: int = 65_536
+    mmap_size: int = 268_435_456
+    busy_timeout_ms: int = 5_000
+    read_pool_size: int = 4
+    codec: str = "binary"
+    keyframe_interval: int = 10
+    compression: bool = False
+    compression_level: int = 6
+    dictionary_size: int = 16_384
+    dictionary_samples: int = 100
+    dictionary_path: str = ""
+    backfill_workers: int = 0
+    rollup_levels: tuple = (10, 100, 1_000, 10_000)
+    world_cache_mib: int = 64
+    columnar_snapshots: bool = False
+    columnar_path: str = ""
+    backend: str = "sqlite"
+    log_segment_mib: int = 64
+    log_index_interval: int = 100
+    auto_vacuum: str = "INCREMENTAL"
+    retention_delta_ticks: int = 0
+    retention_snapshot_window: int = 0
+    archive_after_days: float = 0.0
+    archive_path: str = ""
+    vacuum_pages: int = 0
+    coalesce_ticks: int = 1
+    snapshot_blobs: bool = False
+    blob_cache_size: int = 4_096
+    open_session_files: int = 16
+    analytics_workers: int = 0
 
 # =========================
 # FACTION DEFAULTS
@@ -229,6 +281,7 @@ class TraitConfig:
 @dataclass(frozen=True)
 class Defaults:
     simulation: SimulationConfig = SimulationConfig()
+    persistence: PersistenceConfig = PersistenceConfig()
     faction: FactionConfig = FactionConfig()
     region: RegionConfig = RegionConfig()
     power: PowerConfig = PowerConfig()
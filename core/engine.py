@@ -1,142 +1,412 @@
 import logging
-from typing import List, Optional, Dict, Any
+from collections import deque
+from dataclasses import replace
+from typing import Deque, List, Optional, Dict, Any, Tuple
 
 from core.defaults import Defaults
+from core.simulator import Simulator, STORAGE_MODES, new_seed
+from core.scheduler import SnapshotScheduler
 from domains.world import World
 from domains.faction import Faction
-from deltas.builder import DeltaBuilder
+from deltas.types import WorldDelta, FactionDelta, RegionDelta, InverseDelta, FactionInverse, RegionInverse
 from deltas.applier import DeltaApplier
 from deltas.validator import DeltaValidator
-from persistence.manager import PersistenceManager
-
-from systems.base import BaseSystem
-from systems.power import PowerSystem
-from systems.economy import EconomySystem
-from systems.legitimacy import LegitimacySystem
-from systems.conflict import ConflictSystem
-from systems.alliance import AllianceSystem
-from systems.region import RegionSystem
-from systems.war import WarSystem
-from systems.investment import InvestmentSystem
+from persistence.backend import StorageBackend, create_backend
+from persistence.writer import BatchWriter, CoalescingWriter, WriteBehindWriter
+from persistence.timetravel import TimeTravelService
+from persistence.events import event_rows
+from persistence.timeseries import capture_metrics
+from persistence.replay import seed_schedule, session_config
 from core.metrics import GeopoliticalMetrics
-from systems.research import ResearchSystem
-from systems.trade import TradeSystem
-from systems.weather import WeatherSystem
-from systems.demographics import DemographicsSystem
-from systems.market import MarketSystem
-from systems.events import EventSystem
 
 logger = logging.getLogger("SimulationEngine")
 
+
+def _seeded(config: Defaults, fresh: bool = False) -> Defaults:
+    # Without a configured seed each session draws its own, recorded with its config.
+    if config.simulation.seed is not None and not fresh:
+        return config
+    return replace(config, simulation=replace(config.simulation, seed=new_seed()))
+
+
 class SimulationEngine:
-    def __init__(self, db_path: str = "simulation.db"):
+    def __init__(self, db_path: str = "simulation.db", persistence: Optional[StorageBackend] = None):
         self.config = Defaults()
-        self.persistence = PersistenceManager(db_path)
+        # The backend named by the persistence config, opened at db_path, unless one is handed in.
+        self.persistence = persistence or create_backend(db_path, self.config.persistence)
+        self.writer = self._create_writer()
+        self.time_travel = TimeTravelService(self.persistence, self.config)
         
         self.world: Optional[World] = None
         self.session_id: Optional[str] = None
         self.current_tick: int = 0
+        # Inverse deltas of the most recent ticks of the active session, oldest first.
+        self.undo_log: Deque[Tuple[int, InverseDelta]] = deque(maxlen=self.config.simulation.undo_depth)
+        # The config and seed the active session is recorded with, and the systems built from them.
+        self.session_config: Optional[Defaults] = None
+        self.simulator: Optional[Simulator] = None
+        # External edits waiting for the next tick.
+        self.pending_inputs: List[WorldDelta] = []
+        # Replay cost accumulated since the last snapshot of the active session.
+        self.snapshots = SnapshotScheduler()
         
-        self.systems: List[BaseSystem] = [
-            WeatherSystem(self.config),
-            RegionSystem(self.config),
-            PowerSystem(self.config),
-            EconomySystem(self.config),
-            MarketSystem(self.config),
-            DemographicsSystem(self.config),
-            LegitimacySystem(self.config),
-            AllianceSystem(self.config),
-            WarSystem(self.config),
-            ResearchSystem(self.config),
-            TradeSystem(self.config),
-            InvestmentSystem(self.config),
-            ConflictSystem(self.config),
-            EventSystem(self.config),
-        ]
+    def _create_writer(self):
+        sim = self.config.simulation
+        if sim.write_behind:
+            writer = WriteBehindWriter(self.persistence, sim.persist_batch_size, sim.write_queue_size)
+        else:
+            writer = BatchWriter(self.persistence, sim.persist_batch_size)
+        coalesce_ticks = self.config.persistence.coalesce_ticks
+        return CoalescingWriter(writer, coalesce_ticks) if coalesce_ticks > 1 else writer
         
     def create_session(self, session_name: str):
-        self.session_id = self.persistence.create_session(session_name, self.config)
+        self.flush()
+        sim = self.config.simulation
+        if sim.storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode '{sim.storage_mode}'. Expected one of: {', '.join(STORAGE_MODES)}")
+        config = _seeded(self.config)
+        self.session_id = self.persistence.create_session(session_name, config)
+        self._use_session_config(config)
         self.world = World(factions={}, regions={})
         self.current_tick = 0
+        self.undo_log.clear()
+        self.snapshots.reset(0)
         logger.info(f"Created session {self.session_id} - '{session_name}'")
+
+    def _use_session_config(self, config: Defaults):
+        # Sessions recorded before seeds existed continue with a fresh one.
+        config = _seeded(config)
+        self.session_config = config
+        self.simulator = Simulator(config, config.simulation.seed, seed_schedule(self.persistence, self.session_id))
+        self.pending_inputs.clear()
         
-    def load_session(self, session_id: str, tick: Optional[int] = None):
+    def _session_metadata(self, session_id: str) -> tuple:
         metadata = self.persistence.load_session_metadata(session_id)
+        # Archived sessions come back on first use.
+        if not metadata and self.persistence.restore_session(session_id):
+            metadata = self.persistence.load_session_metadata(session_id)
         if not metadata:
             raise ValueError(f"Session {session_id} not found.")
+        return metadata
+
+    def load_session(self, session_id: str, tick: Optional[int] = None, truncate: bool = False):
+        """Moves the engine to session_id at tick, by default its latest.
+
+        At an earlier tick the session can be viewed but not stepped, since its
+        later ticks are stored; fork or rewind it to continue. With truncate the
+        ticks after tick are discarded instead, as rewind() does.
+        """
+        self.flush()
+        self._session_metadata(session_id)
             
-        target_tick = tick if tick is not None else self.persistence.get_latest_tick(session_id)
+        latest_tick = self.persistence.get_latest_tick(session_id)
+        target_tick = tick if tick is not None else latest_tick
+        if target_tick < 0 or target_tick > latest_tick:
+            raise ValueError(f"Tick {target_tick} is outside the recorded range (0-{latest_tick}).")
+        truncate = truncate and target_tick < latest_tick
+        if truncate:
+            self._check_truncate(session_id, target_tick, latest_tick)
         
-        snapshot_json = self.persistence.get_snapshot(session_id, target_tick)
+        # Replays forward from the closest cached or stored state; the engine gets its own copy.
+        world = self.time_travel.checkout(session_id, target_tick)
+        if truncate:
+            self._discard_after(session_id, target_tick)
         
-        if snapshot_json:
-            self.world = self._reconstruct_world(snapshot_json)
-            self.current_tick = target_tick
-        else:
-            init_snap = self.persistence.get_snapshot(session_id, 0)
-            if not init_snap:
-                raise ValueError("No snapshot found to start replay.")
-            
-            self.world = self._reconstruct_world(init_snap)
-            self.current_tick = 0
-            
-            deltas_json = self.persistence.get_deltas(session_id, 1, target_tick)
-            applier = DeltaApplier(DeltaValidator(self.config))
-            from persistence.serializer import from_json
-            from deltas.types import WorldDelta
-            
-            for d_json in deltas_json:
-                self.current_tick += 1
-                d_dict = from_json(d_json)
-                pass 
-                
+        self.world = world
+        self.current_tick = target_tick
         self.session_id = session_id
+        self._use_session_config(session_config(self.persistence, session_id))
+        self.undo_log.clear()
+        self.snapshots.reset(self.persistence.get_nearest_snapshot_tick(session_id, target_tick) or 0)
         logger.info(f"Loaded session {session_id} at tick {self.current_tick}")
 
-    def _reconstruct_world(self, json_str: str) -> World:
-        from scenarios import load_scenario_json
-        return load_scenario_json(json_str)
+    def fork_session(self, session_id: str, tick: Optional[int] = None, name: Optional[str] = None) -> str:
+        """Branches session_id at tick into a new session and continues the engine on it.
+
+        tick defaults to the engine's tick for the active session and to the
+        latest tick for any other.
+
+        The fork reads the parent's history up to tick instead of copying it,
+        and keeps the parent's config. It draws its own seed, so it branches
+        off the parent's run instead of repeating it.
+        """
+        self.flush()
+        metadata = self._session_metadata(session_id)
+
+        if tick is not None:
+            target_tick = tick
+        elif session_id == self.session_id:
+            target_tick = self.current_tick
+        else:
+            target_tick = self.persistence.get_latest_tick(session_id)
+        if session_id == self.session_id and target_tick == self.current_tick and self.world:
+            world = self.world.clone()
+        else:
+            world = self.time_travel.checkout(session_id, target_tick)
+
+        config = _seeded(session_config(self.persistence, session_id), fresh=True)
+        fork_id = self.persistence.fork_session(session_id, target_tick, name or f"{metadata[2]} @ {target_tick}", world, config)
+        self.world = world
+        self.current_tick = target_tick
+        self.session_id = fork_id
+        self._use_session_config(config)
+        self.undo_log.clear()
+        self.snapshots.reset(target_tick)
+        logger.info(f"Forked session {session_id} at tick {target_tick} into {fork_id}")
+        return fork_id
+
     def initialize_world(self, world: World):
         self.world = world
-        self.persistence.save_step(self.session_id, 0, None, world_snapshot=self.world)
+        try:
+            self.writer.submit(self.session_id, 0, None, world_snapshot=self.world, metrics=capture_metrics(self.world))
+            self.writer.flush()
+        except Exception:
+            # Nothing is stored for the session yet; it can be initialized again.
+            self.writer.discard()
+            raise
+
+    def submit_input(self, delta: WorldDelta):
+        """Queues an external edit of the world, applied at the start of the next tick before the systems run.
+
+        Edits are recorded with that tick, so replays apply them at the same
+        point. An edit that fails validation then is logged and dropped.
+        """
+        if not self.world or not self.session_id:
+            raise ValueError("Session not initialized. Call create_session() and initialize_world() first.")
+        self.pending_inputs.append(delta)
+
+    def _apply_inputs(self, validator: DeltaValidator, inverse: Optional[InverseDelta]) -> List[WorldDelta]:
+        applied = []
+        applier = DeltaApplier(validator)
+        for delta in self.pending_inputs:
+            result = applier.apply(delta, self.world, validate=True, inverse=inverse)
+            if result.success:
+                applied.append(delta)
+            else:
+                for error in result.errors:
+                    logger.error(f"[Tick {self.current_tick}] Rejected input: {error.message} (Entity: {error.entity_id})")
+        self.pending_inputs.clear()
+        return applied
         
     def step(self, ticks: int = 1) -> List[str]:
         if not self.world or not self.session_id:
             raise ValueError("Session not initialized. Call create_session() and initialize_world() first.")
+        self._check_at_latest_tick()
             
+        sim = self.config.simulation
+        # Replay logs keep edits and sparse snapshots only; the rest is rebuilt by running the systems again.
+        replay_log = self.session_config.simulation.storage_mode == "replay"
+        replay_snapshot_interval = self.session_config.simulation.replay_snapshot_interval
+        persist_undo = sim.persist_undo and not replay_log
+        record_undo = sim.undo_depth > 0 or persist_undo
         all_events = []
-        for _ in range(ticks):
-            self.current_tick += 1
-            
-            builder = DeltaBuilder()
-            
-            for system in self.systems:
-                system.compute_delta(self.world, builder)
+        try:
+            for _ in range(ticks):
+                self.current_tick += 1
                 
-            delta = builder.build()
-            
-            validator = DeltaValidator(self.config)
-            applier = DeltaApplier(validator)
-            result = applier.apply(delta, self.world, validate=True)
-            
-            if not result.success:
-                for error in result.errors:
-                    logger.error(f"[Tick {self.current_tick}] Validation Error: {error.message} (Entity: {error.entity_id})")
-            
-            snapshot = None
-            if self.current_tick % self.config.simulation.snapshot_interval == 0:
-                snapshot = self.world
+                inverse = InverseDelta() if record_undo else None
+                direct_writes = self._capture_direct_writes() if record_undo else None
+                validator = DeltaValidator(self.config)
+                inputs = self._apply_inputs(validator, inverse) if self.pending_inputs else None
                 
-            self.persistence.save_step(self.session_id, self.current_tick, delta, world_snapshot=snapshot)
-            
-            if delta.events:
-                for event in delta.events:
-                    formatted_event = f"[Tick {self.current_tick}] {event}"
-                    logger.info(formatted_event)
-                    all_events.append(formatted_event)
+                delta = self.simulator.compute_delta(self.world, self.current_tick)
+                
+                applier = DeltaApplier(validator)
+                result = applier.apply(delta, self.world, validate=True, inverse=inverse)
+                if inverse is not None:
+                    self._record_direct_writes(inverse, direct_writes)
+                    self.undo_log.append((self.current_tick, inverse))
+                
+                if not result.success:
+                    for error in result.errors:
+                        logger.error(f"[Tick {self.current_tick}] Validation Error: {error.message} (Entity: {error.entity_id})")
+                    delta = self._rejected_delta(delta)
+                
+                snapshot = None
+                if replay_log:
+                    due = self.current_tick % replay_snapshot_interval == 0
+                else:
+                    due = self.snapshots.observe(sim, self.current_tick, delta, inputs or ())
+                if due:
+                    snapshot = self.world
+
+                metrics = None
+                if self.persistence.records_metrics and self.current_tick % sim.metrics_interval == 0 and (snapshot is not None or not replay_log):
+                    metrics = capture_metrics(self.world)
+                    
+                # A replay log stores no delta to read the events from, so they are passed on their own.
+                self.writer.submit(
+                    self.session_id, self.current_tick, None if replay_log else delta, world_snapshot=snapshot, metrics=metrics,
+                    inverse=inverse if persist_undo else None, inputs=inputs, events=event_rows(delta) if replay_log else None
+                )
+                
+                if delta.events:
+                    for event in delta.events:
+                        formatted_event = f"[Tick {self.current_tick}] {event}"
+                        logger.info(formatted_event)
+                        all_events.append(formatted_event)
+            self.flush()
+        except Exception:
+            self._recover()
+            raise
         
         return all_events
 
+    def _check_at_latest_tick(self):
+        # Each tick is written after the last stored one, so the engine must stand on it.
+        latest_tick = self.persistence.get_latest_tick(self.session_id)
+        if latest_tick > self.current_tick:
+            raise ValueError(
+                f"Session {self.session_id} is recorded up to tick {latest_tick} and the engine is at tick {self.current_tick}. "
+                f"Fork the session, rewind it, or load it with truncate=True to continue from here."
+            )
+        if latest_tick < self.current_tick:
+            raise ValueError(
+                f"Session {self.session_id} is only stored up to tick {latest_tick} and the engine is at tick {self.current_tick}. "
+                f"Load the session again to continue from what is stored."
+            )
+
+    def _recover(self):
+        """Moves the engine back to the latest stored tick of the active session after a failed step.
+
+        The ticks completed before the failure are written if they still can
+        be; the rest are dropped with the world they led to, so the stored
+        history never has a gap and the next step continues from it.
+        """
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Dropping the unwritten ticks of session {self.session_id}: {e}")
+        self.writer.discard()
+        latest_tick = self.persistence.get_latest_tick(self.session_id)
+        self.world = self.time_travel.checkout(self.session_id, latest_tick)
+        while self.undo_log and self.undo_log[-1][0] > latest_tick:
+            self.undo_log.pop()
+        self.pending_inputs.clear()
+        self.snapshots.reset(self.persistence.get_nearest_snapshot_tick(self.session_id, latest_tick) or 0)
+        logger.error(f"Step failed at tick {self.current_tick}; session {self.session_id} continues from stored tick {latest_tick}")
+        self.current_tick = latest_tick
+
+    def _rejected_delta(self, delta: WorldDelta) -> WorldDelta:
+        # Weather, market prices and some resource updates are written straight
+        # into the world while systems run, so they stick even when the delta is
+        # rejected. Persist their current values so replay ends in the same state.
+        residual = WorldDelta(market=dict(delta.market), events=list(delta.events), event_tags=list(delta.event_tags))
+        for faction_id, faction_delta in delta.faction_deltas.items():
+            faction = self.world.get_faction(faction_id)
+            if faction and faction_delta.resources is not None:
+                residual.faction_deltas[faction_id] = FactionDelta(resources=faction.resources)
+        for region_id, region_delta in delta.region_deltas.items():
+            if region_delta.weather is not None:
+                residual.region_deltas[region_id] = RegionDelta(weather=region_delta.weather)
+        return residual
+
+    def _capture_direct_writes(self) -> tuple:
+        # The values systems may assign straight into the world (see
+        # _rejected_delta), taken before any system runs: by the time the delta
+        # is applied they are already overwritten.
+        return (
+            {fid: f.resources for fid, f in self.world.factions.items()},
+            {rid: r.weather for rid, r in self.world.regions.items()},
+            dict(self.world.market)
+        )
+
+    def _record_direct_writes(self, inverse: InverseDelta, before: tuple):
+        resources, weather, market = before
+        for faction_id, prior in resources.items():
+            faction = self.world.get_faction(faction_id) or inverse.deleted_factions.get(faction_id)
+            if faction is not None and faction.resources is not prior:
+                entry = inverse.factions.setdefault(faction_id, FactionInverse())
+                entry.fields.add("resources")
+                entry.resources = prior
+        for region_id, prior in weather.items():
+            region = self.world.get_region(region_id) or inverse.deleted_regions.get(region_id)
+            if region is not None and region.weather is not prior:
+                entry = inverse.regions.setdefault(region_id, RegionInverse())
+                entry.fields.add("weather")
+                entry.weather = prior
+        for resource, price in self.world.market.items():
+            prior = market.get(resource)
+            if price != prior:
+                inverse.market[resource] = prior
+
+    def rewind(self, ticks: int = 1) -> int:
+        """Moves the active session back by ticks and discards the history recorded after that point.
+
+        Ticks still in the undo log are reverted in place, in time proportional
+        to what they changed. Older ticks are read back from persisted inverse
+        deltas when persist_undo is on, and otherwise rebuilt by time travel.
+        A target inside a coalesced range moves back to the tick before the
+        range. Returns the new current tick.
+        """
+        if not self.world or not self.session_id:
+            raise ValueError("Session not initialized. Call create_session() and initialize_world() first.")
+        if ticks < 1:
+            raise ValueError("Rewind needs at least one tick.")
+        self.flush()
+
+        target_tick = self.current_tick - ticks
+        # Ticks inside a coalesced range have no state of their own; go back to its start.
+        coalesced = self.persistence.get_coalesced_range(self.session_id, target_tick)
+        if coalesced:
+            target_tick = coalesced[0] - 1
+            ticks = self.current_tick - target_tick
+        self._check_truncate(self.session_id, target_tick, self.current_tick)
+
+        in_memory = len(self.undo_log) >= ticks
+        inverses = [inverse for _, inverse in list(self.undo_log)[-ticks:]] if in_memory else None
+        if inverses is None and self.config.simulation.persist_undo:
+            stored = self.persistence.get_inverse_deltas(self.session_id, target_tick + 1, self.current_tick)
+            if len(stored) == ticks:
+                inverses = [inverse for _, inverse in stored]
+
+        world = self.time_travel.checkout(self.session_id, target_tick) if inverses is None else None
+
+        # Discard the history first, so a backend that cannot leaves the engine where it was.
+        self.simulator.reseed(target_tick + 1, self._discard_after(self.session_id, target_tick))
+        if inverses is not None:
+            applier = DeltaApplier(DeltaValidator(self.config))
+            for inverse in reversed(inverses):
+                applier.revert(inverse, self.world)
+        else:
+            self.world = world
+        if in_memory:
+            for _ in range(ticks):
+                self.undo_log.pop()
+        else:
+            self.undo_log.clear()
+        self.snapshots.reset(self.persistence.get_nearest_snapshot_tick(self.session_id, target_tick) or 0)
+        logger.info(f"Rewound session {self.session_id} from tick {self.current_tick} to {target_tick}")
+        self.current_tick = target_tick
+        return target_tick
+
+    def _check_truncate(self, session_id: str, tick: int, from_tick: int):
+        fork = self.persistence.get_fork_point(session_id)
+        first_tick = max(fork[1] if fork else 0, self.persistence.get_compacted_tick(session_id) or 0)
+        if tick < first_tick:
+            raise ValueError(f"Cannot go back before tick {first_tick} ({from_tick - first_tick} tick(s) available).")
+        # Forks read the history up to their fork tick, so it has to stay.
+        blocking = [(fork_tick, fork_id) for fork_id, fork_tick in self.persistence.list_forks(session_id) if fork_tick > tick]
+        if blocking:
+            fork_tick, fork_id = min(blocking)
+            raise ValueError(f"Cannot go back before tick {fork_tick}: session {fork_id} was forked there.")
+
+    def _discard_after(self, session_id: str, tick: int) -> int:
+        """Deletes the history of session_id after tick and returns the seed recorded for the ticks that run again."""
+        self.persistence.truncate_session(session_id, tick)
+        self.time_travel.invalidate(session_id, tick + 1)
+        # They get a new seed, so they do not repeat what was discarded.
+        seed = new_seed()
+        self.persistence.record_seed(session_id, tick + 1, seed)
+        return seed
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.close()
+        self.persistence.close()
+
     def get_metrics(self) -> Dict[str, Any]:
         if not self.world:
             return {}
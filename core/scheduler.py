@@ -0,0 +1,76 @@
+"""Decides at which ticks the engine stores a snapshot.
+
+Reading a tick replays every delta recorded since the closest snapshot before
+it, so the work a snapshot saves is the replay work accumulated since the
+previous one. With adaptive_snapshots on, the scheduler estimates that work
+from each tick's delta and inputs, and snapshots once it reaches
+snapshot_replay_budget, or on a tick that creates, deletes or deactivates a
+faction or region, after which the world no longer has the shape the previous
+snapshot recorded. min_snapshot_interval and max_snapshot_interval bound the
+spacing either way.
+
+The schedule is not a function of the tick number, so readers seek through the
+snapshots a session actually stored (get_nearest_snapshot_tick), never through
+tick % snapshot_interval.
+"""
+from typing import Iterable, Optional
+
+from core.defaults import SimulationConfig
+from deltas.types import WorldDelta
+
+# Estimated cost of replaying a tick that changes nothing, in entity updates.
+TICK_COST = 1
+
+
+def replay_cost(delta: Optional[WorldDelta]) -> int:
+    """Estimated cost of replaying delta, in entity updates."""
+    if delta is None:
+        return 0
+    return (
+        len(delta.faction_deltas) + len(delta.region_deltas)
+        + len(delta.create_factions) + len(delta.create_regions)
+        + len(delta.delete_factions) + len(delta.delete_regions)
+        + len(delta.market)
+    )
+
+
+def is_structural(delta: Optional[WorldDelta]) -> bool:
+    """Whether delta adds, removes or deactivates an entity."""
+    if delta is None:
+        return False
+    return bool(
+        delta.create_factions or delta.create_regions or delta.delete_factions or delta.delete_regions
+        or any(faction_delta.deactivate for faction_delta in delta.faction_deltas.values())
+    )
+
+
+class SnapshotScheduler:
+    def __init__(self, snapshot_tick: int = 0):
+        self.snapshot_tick = snapshot_tick
+        # Estimated replay cost of the ticks since snapshot_tick.
+        self.cost = 0
+
+    def reset(self, snapshot_tick: int):
+        """Starts counting from a snapshot stored at snapshot_tick."""
+        self.snapshot_tick = snapshot_tick
+        self.cost = 0
+
+    def observe(
+        self, config: SimulationConfig, tick: int, delta: Optional[WorldDelta], inputs: Iterable[WorldDelta] = ()
+    ) -> bool:
+        """Accounts for the delta and inputs recorded at tick; True when a snapshot should be stored there."""
+        inputs = list(inputs)
+        self.cost += TICK_COST + replay_cost(delta) + sum(replay_cost(edit) for edit in inputs)
+        spacing = tick - self.snapshot_tick
+        if not config.adaptive_snapshots:
+            due = tick % config.snapshot_interval == 0
+        elif spacing < config.min_snapshot_interval:
+            due = False
+        else:
+            due = (
+                spacing >= config.max_snapshot_interval or self.cost >= config.snapshot_replay_budget
+                or is_structural(delta) or any(is_structural(edit) for edit in inputs)
+            )
+        if due:
+            self.reset(tick)
+        return due
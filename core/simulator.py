@@ -0,0 +1,103 @@
+"""Deterministic computation of ticks, shared by the engine and by replays.
+
+Systems draw every random number from one generator, which is reseeded from
+the seed and the tick number before each tick. What a tick does then only
+depends on the world it starts from, the external edits applied to it and the
+seed, so a session recorded as a replay log can be rebuilt by running the
+systems again from any of its snapshots.
+
+A session runs with its own seed. A rewind starts a new seed epoch from the
+tick it continues from, so the ticks it runs again do not repeat what was
+undone; the epochs are recorded with the session (see replay.seed_schedule).
+"""
+import random
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+from core.defaults import Defaults
+from deltas.applier import DeltaApplier
+from deltas.builder import DeltaBuilder
+from deltas.types import WorldDelta
+from deltas.validator import DeltaValidator
+from domains.world import World
+
+from systems.base import BaseSystem
+from systems.power import PowerSystem
+from systems.economy import EconomySystem
+from systems.legitimacy import LegitimacySystem
+from systems.conflict import ConflictSystem
+from systems.alliance import AllianceSystem
+from systems.region import RegionSystem
+from systems.war import WarSystem
+from systems.investment import InvestmentSystem
+from systems.research import ResearchSystem
+from systems.trade import TradeSystem
+from systems.weather import WeatherSystem
+from systems.demographics import DemographicsSystem
+from systems.market import MarketSystem
+from systems.events import EventSystem
+
+STORAGE_MODES = ("deltas", "replay")
+
+
+def new_seed() -> int:
+    return random.SystemRandom().getrandbits(63)
+
+
+class Simulator:
+    def __init__(
+        self, config: Optional[Defaults] = None, seed: Optional[int] = None, seeds: Optional[List[Tuple[int, int]]] = None
+    ):
+        self.config = config or Defaults()
+        self.seed = seed if seed is not None else new_seed()
+        # (first tick, seed) of each seed epoch; ticks before the first one use seed.
+        self.seeds: List[Tuple[int, int]] = sorted(seeds or [])
+        self.rng = random.Random()
+        self.systems: List[BaseSystem] = [
+            WeatherSystem(self.config, self.rng),
+            RegionSystem(self.config, self.rng),
+            PowerSystem(self.config, self.rng),
+            EconomySystem(self.config, self.rng),
+            MarketSystem(self.config, self.rng),
+            DemographicsSystem(self.config, self.rng),
+            LegitimacySystem(self.config, self.rng),
+            AllianceSystem(self.config, self.rng),
+            WarSystem(self.config, self.rng),
+            ResearchSystem(self.config, self.rng),
+            TradeSystem(self.config, self.rng),
+            InvestmentSystem(self.config, self.rng),
+            ConflictSystem(self.config, self.rng),
+            EventSystem(self.config, self.rng),
+        ]
+
+    def seed_at(self, tick: int) -> int:
+        i = bisect_right(self.seeds, tick, key=lambda epoch: epoch[0])
+        return self.seeds[i - 1][1] if i else self.seed
+
+    def reseed(self, tick: int, seed: int):
+        """Runs tick and every later tick with seed, replacing the epochs that started from tick on."""
+        self.seeds = [epoch for epoch in self.seeds if epoch[0] < tick] + [(tick, seed)]
+
+    def compute_delta(self, world: World, tick: int) -> WorldDelta:
+        """Runs every system on world for tick. Some write straight into world (see SimulationEngine._rejected_delta)."""
+        # A string seed is hashed with SHA-512, so it does not depend on PYTHONHASHSEED.
+        self.rng.seed(f"{self.seed_at(tick)}:{tick}")
+        builder = DeltaBuilder()
+        for system in self.systems:
+            system.compute_delta(world, builder)
+        return builder.build()
+
+    def resimulate(
+        self, world: World, start_tick: int, end_tick: int, inputs: Optional[Dict[int, List[WorldDelta]]] = None
+    ) -> World:
+        """Advances world in place through start_tick..end_tick, applying the recorded edits of each tick first.
+
+        Edits were validated when they were submitted and are applied as they
+        are; the deltas of the systems go through validation as they did live.
+        """
+        inputs = inputs or {}
+        applier = DeltaApplier(DeltaValidator(self.config))
+        for tick in range(start_tick, end_tick + 1):
+            applier.replay(inputs.get(tick, ()), world)
+            applier.apply(self.compute_delta(world, tick), world, validate=True)
+        return world
@@ -216,6 +216,34 @@ class MetricsVisualizer:
             plt.close('all')
             raise Exception(f"Error creating world indicators chart: {str(e)}")
     
+    HISTORY_FIELDS = ("army", "navy", "air", "legitimacy", "credits", "materials", "food", "energy", "influence")
+
+    @staticmethod
+    def history_from_series(series: Dict[str, Any], names: Dict[str, tuple]) -> List[Dict[str, Any]]:
+        """Groups the per-faction TimeSeries of PersistenceManager.query_timeseries (queried with
+        HISTORY_FIELDS) by tick into the structure the evolution charts expect."""
+        by_tick = {}
+        for fid, data in series.items():
+            name, color = names.get(fid, (None, None))
+            c = data.columns
+            for i, tick in enumerate(data.ticks):
+                snapshot = by_tick.setdefault(tick, {'tick': tick, 'factions': {}})
+                snapshot['factions'][fid] = {
+                    'name': name or fid,
+                    'color': color or '#808080',
+                    'power': c['army'][i] + c['navy'][i] + c['air'][i],
+                    'legitimacy': c['legitimacy'][i],
+                    'legitimacy_range': (c['legitimacy_min'][i], c['legitimacy_max'][i]),
+                    'resources': {
+                        'credits': c['credits'][i],
+                        'materials': c['materials'][i],
+                        'food': c['food'][i],
+                        'energy': c['energy'][i],
+                        'influence': c['influence'][i]
+                    }
+                }
+        return [by_tick[tick] for tick in sorted(by_tick)]
+
     @staticmethod
     def create_power_evolution_chart(historical_data: List[Dict[str, Any]]) -> io.BytesIO:
         try:
@@ -300,16 +328,23 @@ class MetricsVisualizer:
                                 'name': faction.get('name', fid),
                                 'color': faction.get('color', '#808080'),
                                 'ticks': [],
-                                'legitimacy': []
+                                'legitimacy': [],
+                                'ranges': []
                             }
                         faction_data[fid]['ticks'].append(tick)
                         faction_data[fid]['legitimacy'].append(faction.get('legitimacy', 0))
+                        if 'legitimacy_range' in faction:
+                            faction_data[fid]['ranges'].append(faction['legitimacy_range'])
                 
                 for fid, data in faction_data.items():
                     if data['ticks']:
                         ax.plot(data['ticks'], data['legitimacy'], 
                                label=data['name'], color=data['color'], 
                                linewidth=2.5, marker='s', markersize=4)
+                        # Downsampled points average their bucket; the band keeps short collapses visible.
+                        if len(data['ranges']) == len(data['ticks']):
+                            ax.fill_between(data['ticks'], [r[0] for r in data['ranges']], [r[1] for r in data['ranges']],
+                                           color=data['color'], alpha=0.15, linewidth=0)
                 
                 ax.set_xlabel('Tick', fontsize=12, weight='bold', color='white')
                 ax.set_ylabel('Legitimacy', fontsize=12, weight='bold', color='white')
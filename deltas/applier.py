@@ -1,18 +1,24 @@
 from __future__ import annotations
-from typing import List
+from typing import Iterable, List, Optional, Set
 from dataclasses import dataclass, field
-from .types import WorldDelta
+from .types import WorldDelta, FactionDelta, InverseDelta, FactionInverse, RegionInverse
 from .validator import DeltaValidator, ValidationError
 from domains.world import World
 
+_FACTION_FIELDS = ("power", "legitimacy", "resources", "detailed_resources", "knowledge")
+_SOCIO_ECONOMIC_FIELDS = ("infrastructure", "cohesion")
+
 class DeltaApplier:
     
     def __init__(self, validator: DeltaValidator):
         self.validator = validator
     
     def apply(
-        self, delta: WorldDelta, world: World, validate: bool = True
+        self, delta: WorldDelta, world: World, validate: bool = True,
+        inverse: Optional[InverseDelta] = None
     ) -> ApplyResult:
+        # When inverse is given, every value the delta overwrites is recorded in
+        # it first, so revert() can undo the tick.
         errors = []
         
         if validate:
@@ -21,10 +27,7 @@ class DeltaApplier:
                 return ApplyResult(success=False, errors=errors)
         
         try:
-            self._apply_faction_deltas(delta, world)
-            self._apply_region_deltas(delta, world)
-            self._apply_creations(delta, world)
-            self._apply_deletions(delta, world)
+            self._apply_all(delta, world, inverse)
             
             return ApplyResult(success=True, errors=errors)
         
@@ -38,37 +41,111 @@ class DeltaApplier:
             ))
             return ApplyResult(success=False, errors=errors)
     
-    def _apply_faction_deltas(self, delta: WorldDelta, world: World):
+    def replay(self, deltas: Iterable[WorldDelta], world: World) -> int:
+        # Stored deltas were already validated when they were produced, so
+        # replay applies them directly and lets any error propagate.
+        count = 0
+        for delta in deltas:
+            self._apply_all(delta, world)
+            count += 1
+        return count
+
+    def revert(self, inverse: InverseDelta, world: World):
+        """Restores the world to its state before the tick that inverse was recorded for.
+
+        Undoes _apply_all step by step in reverse order, so the cost is
+        proportional to the size of the inverse, not of the world.
+        """
+        for resource, price in inverse.market.items():
+            if price is None:
+                world.market.pop(resource, None)
+            else:
+                world.market[resource] = price
+
+        world.factions.update(inverse.deleted_factions)
+        world.regions.update(inverse.deleted_regions)
+        for faction_id in inverse.created_factions:
+            world.factions.pop(faction_id, None)
+        for region_id in inverse.created_regions:
+            world.regions.pop(region_id, None)
+
+        for region_id, entry in inverse.regions.items():
+            region = world.get_region(region_id)
+            if not region:
+                continue
+            for name in entry.fields:
+                target = region.socio_economic if name in _SOCIO_ECONOMIC_FIELDS else region
+                setattr(target, name, getattr(entry, name))
+
+        for faction_id, entry in inverse.factions.items():
+            faction = world.get_faction(faction_id)
+            if not faction:
+                continue
+            for name in entry.fields:
+                setattr(faction, name, getattr(entry, name))
+            faction.regions.difference_update(entry.added_regions)
+            faction.regions.update(entry.removed_regions)
+            faction.alliances.difference_update(entry.added_alliances)
+            faction.alliances.update(entry.removed_alliances)
+
+    def _apply_all(self, delta: WorldDelta, world: World, inverse: Optional[InverseDelta] = None):
+        self._apply_faction_deltas(delta, world, inverse)
+        self._apply_region_deltas(delta, world, inverse)
+        self._apply_creations(delta, world, inverse)
+        self._apply_deletions(delta, world, inverse)
+        if delta.market:
+            if inverse is not None:
+                for resource in delta.market:
+                    inverse.market.setdefault(resource, world.market.get(resource))
+            world.market.update(delta.market)
+    
+    def _apply_faction_deltas(self, delta: WorldDelta, world: World, inverse: Optional[InverseDelta] = None):
         for faction_id, faction_delta in delta.faction_deltas.items():
             faction = world.get_faction(faction_id)
             if not faction:
                 continue
             
+            if inverse is not None:
+                self._record_faction(inverse, faction_id, faction, faction_delta)
             faction.apply_delta(faction_delta)
             
             for region_id in faction_delta.add_regions:
                 region = world.get_region(region_id)
                 if region:
+                    if inverse is not None:
+                        self._record_region(inverse, region_id, region, ("owner",))
                     region.owner = faction_id
             
             for region_id in faction_delta.remove_regions:
                 region = world.get_region(region_id)
                 if region and region.owner == faction_id:
+                    if inverse is not None:
+                        self._record_region(inverse, region_id, region, ("owner",))
                     region.owner = None
             
 
-    def _apply_region_deltas(self, delta: WorldDelta, world: World):
+    def _apply_region_deltas(self, delta: WorldDelta, world: World, inverse: Optional[InverseDelta] = None):
         for region_id, region_delta in delta.region_deltas.items():
             region = world.get_region(region_id)
             if region:
+                if inverse is not None:
+                    names = []
+                    if region_delta.socio_economic is not None:
+                        names += ["infrastructure", "cohesion"]
+                    if region_delta.stability is not None:
+                        names.append("cohesion")
+                    names += [name for name in ("population", "owner", "weather") if getattr(region_delta, name) is not None]
+                    self._record_region(inverse, region_id, region, names)
                 region.apply_delta(region_delta)
 
-    def _apply_creations(self, delta: WorldDelta, world: World):
+    def _apply_creations(self, delta: WorldDelta, world: World, inverse: Optional[InverseDelta] = None):
         from domains.faction import Faction
         from domains.region import Region
         
         for fid, data in delta.create_factions.items():
             if fid not in world.factions:
+                if inverse is not None:
+                    inverse.created_factions.add(fid)
                 faction = Faction(
                     id=data.id,
                     name=data.name,
@@ -85,10 +162,14 @@ class DeltaApplier:
                 for rid in data.regions:
                     region = world.get_region(rid)
                     if region:
+                        if inverse is not None:
+                            self._record_region(inverse, rid, region, ("owner",))
                         region.owner = fid
         
         for rid, data in delta.create_regions.items():
             if rid not in world.regions:
+                if inverse is not None:
+                    inverse.created_regions.add(rid)
                 region = Region(
                     id=data.id,
                     name=data.name,
@@ -98,15 +179,54 @@ class DeltaApplier:
                 )
                 world.regions[rid] = region
 
-    def _apply_deletions(self, delta: WorldDelta, world: World):
+    def _apply_deletions(self, delta: WorldDelta, world: World, inverse: Optional[InverseDelta] = None):
         for faction_id in delta.delete_factions:
             if faction_id in world.factions:
+                if inverse is not None:
+                    inverse.deleted_factions.setdefault(faction_id, world.factions[faction_id])
                 del world.factions[faction_id]
         
         for region_id in delta.delete_regions:
             if region_id in world.regions:
+                if inverse is not None:
+                    inverse.deleted_regions.setdefault(region_id, world.regions[region_id])
                 del world.regions[region_id]
 
+    # Recording keeps the first prior value seen for each field, which is the
+    # one the world had before the tick.
+    def _record_faction(self, inverse: InverseDelta, faction_id: str, faction, faction_delta: FactionDelta):
+        entry = inverse.factions.setdefault(faction_id, FactionInverse())
+        for name in _FACTION_FIELDS:
+            if getattr(faction_delta, name) is not None and name not in entry.fields:
+                entry.fields.add(name)
+                setattr(entry, name, getattr(faction, name))
+        if faction_delta.deactivate and "is_active" not in entry.fields:
+            entry.fields.add("is_active")
+            entry.is_active = faction.is_active
+        _record_set_change(entry.added_regions, entry.removed_regions, faction.regions,
+                           faction_delta.add_regions, faction_delta.remove_regions)
+        _record_set_change(entry.added_alliances, entry.removed_alliances, faction.alliances,
+                           faction_delta.add_alliances, faction_delta.remove_alliances)
+
+    def _record_region(self, inverse: InverseDelta, region_id: str, region, names: Iterable[str]):
+        entry = inverse.regions.setdefault(region_id, RegionInverse())
+        for name in names:
+            if name not in entry.fields:
+                entry.fields.add(name)
+                source = region.socio_economic if name in _SOCIO_ECONOMIC_FIELDS else region
+                setattr(entry, name, getattr(source, name))
+
+
+def _record_set_change(added: Set[str], removed: Set[str], current: Set[str], add: Set[str], remove: Set[str]):
+    # Mirrors Faction.apply_delta, which adds first and then removes. A change
+    # that cancels one recorded earlier in the same tick drops it instead.
+    gained = (add - current) - remove
+    lost = remove & current
+    added |= gained - removed
+    removed -= gained
+    removed |= lost - added
+    added -= lost
+
 
 @dataclass
 class ApplyResult:
@@ -1,8 +1,8 @@
-from typing import Optional
+from typing import Dict, Optional
 from domains.economy import Resources
 from domains.power import Power
-from domains.region_meta import EnvironmentType, RegionSocioEconomic
-from .types import WorldDelta, FactionDelta, RegionDelta, FactionCreationData, RegionCreationData
+from domains.region_meta import EnvironmentType, RegionSocioEconomic, WeatherState
+from .types import WorldDelta, FactionDelta, RegionDelta, FactionCreationData, RegionCreationData, EventTag
 
 
 class DeltaBuilder:
@@ -20,8 +20,13 @@ class DeltaBuilder:
             self._world_delta.region_deltas[region_id] = RegionDelta()
         return RegionDeltaBuilder(self, region_id, self._world_delta.region_deltas[region_id])
     
-    def add_event(self, message: str) -> 'DeltaBuilder':
+    def add_event(self, message: str, kind: str = "event", primary: Optional[str] = None, secondary: Optional[str] = None) -> 'DeltaBuilder':
         self._world_delta.events.append(message)
+        self._world_delta.event_tags.append(EventTag(kind, primary, secondary))
+        return self
+
+    def set_market_prices(self, prices: Dict[str, float]) -> 'DeltaBuilder':
+        self._world_delta.market.update(prices)
         return self
     
     def has_pending_owner_change(self, region_id: str) -> bool:
@@ -122,6 +127,10 @@ class RegionDeltaBuilder:
     def set_owner(self, owner_id: str) -> 'RegionDeltaBuilder':
         self.delta.owner = owner_id
         return self
+
+    def set_weather(self, weather: WeatherState) -> 'RegionDeltaBuilder':
+        self.delta.weather = weather
+        return self
     
     def done(self) -> DeltaBuilder:
         return self.parent
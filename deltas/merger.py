@@ -1,5 +1,11 @@
+from dataclasses import replace
 from enum import Enum
-from .types import WorldDelta, FactionDelta
+from typing import Callable, Iterable, Optional, Set
+from .types import WorldDelta, FactionDelta, RegionDelta
+
+_FACTION_FIELDS = ("power", "legitimacy", "resources", "detailed_resources", "knowledge")
+_REGION_FIELDS = ("socio_economic", "stability", "population", "owner", "weather")
+
 
 class MergeStrategy(Enum):
     LAST_WINS = "last_wins"
@@ -12,42 +18,139 @@ class MergeStrategy(Enum):
 
 
 class DeltaMerger:
-    
-    def __init__(self, strategy: MergeStrategy = MergeStrategy.LAST_WINS):
+    """Folds consecutive deltas into one.
+
+    With LAST_WINS, applying the merged delta leaves a world in the same state
+    as applying the deltas one after the other, as long as each delta passed
+    can_merge() against the ones merged before it. The other strategies
+    combine numeric fields for analysis and do not reproduce the world.
+    """
+
+    def __init__(self, strategy: MergeStrategy = MergeStrategy.LAST_WINS, resolver: Optional[Callable] = None):
+        if strategy == MergeStrategy.CUSTOM and resolver is None:
+            raise ValueError("MergeStrategy.CUSTOM needs a resolver(previous, value).")
         self.strategy = strategy
-    
-    def merge(self, deltas: list[WorldDelta]) -> WorldDelta:
-        if not deltas:
-            return WorldDelta()
-        
+        self.resolver = resolver
+
+    def merge(self, deltas: Iterable[WorldDelta]) -> WorldDelta:
         result = WorldDelta()
-        
         for delta in deltas:
-            self._merge_into(result, delta)
-        
+            self.merge_into(result, delta)
         return result
-    
-    def _merge_into(self, target: WorldDelta, source: WorldDelta):
+
+    def merge_into(self, target: WorldDelta, source: WorldDelta) -> WorldDelta:
+        """Folds source, the later delta, into target. source is left untouched."""
         for faction_id, faction_delta in source.faction_deltas.items():
-            if faction_id not in target.faction_deltas:
-                target.faction_deltas[faction_id] = faction_delta
+            merged = target.faction_deltas.get(faction_id)
+            if merged is None:
+                target.faction_deltas[faction_id] = _copy_faction_delta(faction_delta)
             else:
-                self._merge_faction_delta(
-                    target.faction_deltas[faction_id],
-                    faction_delta
-                )
-    
+                self._merge_faction_delta(merged, faction_delta)
+
+        for region_id, region_delta in source.region_deltas.items():
+            merged = target.region_deltas.get(region_id)
+            if merged is None:
+                target.region_deltas[region_id] = replace(region_delta)
+            else:
+                self._merge_region_delta(merged, region_delta)
+
+        target.create_factions.update(source.create_factions)
+        target.create_regions.update(source.create_regions)
+        target.delete_factions |= source.delete_factions
+        target.delete_regions |= source.delete_regions
+        for resource, price in source.market.items():
+            target.market[resource] = self._merge_value(target.market.get(resource), price)
+        # Tags stay aligned with their messages only if both sides carry them.
+        tagged = len(target.event_tags) == len(target.events) and len(source.event_tags) == len(source.events)
+        target.events.extend(source.events)
+        target.event_tags = target.event_tags + source.event_tags if tagged else []
+        return target
+
+    def can_merge(self, target: WorldDelta, source: WorldDelta) -> bool:
+        """False when source cannot be folded into target without changing the result.
+
+        A merged delta applies all faction changes, then region changes, then
+        creations and deletions. That order only matches the original one when
+        source leaves alone the entities target created or deleted, and the
+        regions whose owner target changed.
+        """
+        if target.create_factions or target.delete_factions:
+            factions = target.create_factions.keys() | target.delete_factions
+            if not factions.isdisjoint(source.faction_deltas) or not factions.isdisjoint(source.create_factions):
+                return False
+        if target.create_regions or target.delete_regions:
+            regions = target.create_regions.keys() | target.delete_regions
+            if not regions.isdisjoint(source.region_deltas) or not regions.isdisjoint(_owner_changes(source)):
+                return False
+        return _owner_changes(target).isdisjoint(_owner_changes(source))
+
     def _merge_faction_delta(self, target: FactionDelta, source: FactionDelta):
-        if self.strategy == MergeStrategy.LAST_WINS:
-            if source.power is not None:
-                target.power = source.power
-            if source.legitimacy is not None:
-                target.legitimacy = source.legitimacy
-        
-        elif self.strategy == MergeStrategy.AVERAGE:
-            if source.power is not None and target.power is not None:
-                target.power = (target.power + source.power) / 2
-        
-        
-        target.add_regions.update(source.add_regions)
-        target.remove_regions.update(source.remove_regions)
\ No newline at end of file
+        for name in _FACTION_FIELDS:
+            value = getattr(source, name)
+            if value is not None:
+                setattr(target, name, self._merge_value(getattr(target, name), value))
+
+        # Faction.apply_delta adds, then removes; a later change cancels an earlier opposite one.
+        _merge_set_change(target.add_regions, target.remove_regions, source.add_regions, source.remove_regions)
+        _merge_set_change(target.add_alliances, target.remove_alliances, source.add_alliances, source.remove_alliances)
+        target.deactivate = target.deactivate or source.deactivate
+
+    def _merge_region_delta(self, target: RegionDelta, source: RegionDelta):
+        # Region.apply_delta writes cohesion from socio_economic, then from stability.
+        if source.socio_economic is not None:
+            target.stability = None
+        for name in _REGION_FIELDS:
+            value = getattr(source, name)
+            if value is not None:
+                setattr(target, name, self._merge_value(getattr(target, name), value))
+        target.is_conquered = target.is_conquered or source.is_conquered
+        target.is_liberated = target.is_liberated or source.is_liberated
+
+    def _merge_value(self, previous, value):
+        if previous is None or self.strategy == MergeStrategy.LAST_WINS:
+            return value
+        if self.strategy == MergeStrategy.FIRST_WINS:
+            return previous
+        if self.strategy == MergeStrategy.CUSTOM:
+            return self.resolver(previous, value)
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return value
+        if self.strategy == MergeStrategy.MAX:
+            return max(previous, value)
+        if self.strategy == MergeStrategy.MIN:
+            return min(previous, value)
+        if self.strategy == MergeStrategy.AVERAGE:
+            return (previous + value) / 2
+        return previous + value
+
+
+def _copy_faction_delta(delta: FactionDelta) -> FactionDelta:
+    return replace(
+        delta,
+        add_regions=set(delta.add_regions), remove_regions=set(delta.remove_regions),
+        add_alliances=set(delta.add_alliances), remove_alliances=set(delta.remove_alliances)
+    )
+
+
+def _merge_set_change(added: Set[str], removed: Set[str], add: Set[str], remove: Set[str]):
+    added |= add
+    removed -= add
+    removed |= remove
+    added -= remove
+
+
+def _owner_changes(delta: WorldDelta) -> Set[str]:
+    """Regions whose owner applying delta may change."""
+    regions = set()
+    for faction_delta in delta.faction_deltas.values():
+        regions |= faction_delta.add_regions
+        regions |= faction_delta.remove_regions
+    for region_id, region_delta in delta.region_deltas.items():
+        if region_delta.owner is not None:
+            regions.add(region_id)
+    for data in delta.create_factions.values():
+        regions |= data.regions
+    for region_id, data in delta.create_regions.items():
+        if data.owner is not None:
+            regions.add(region_id)
+    return regions
@@ -2,7 +2,7 @@ from dataclasses import dataclass, field
 from typing import Optional, Dict, Set, List
 from domains.economy import Resources
 from domains.power import Power
-from domains.region_meta import EnvironmentType, RegionSocioEconomic
+from domains.region_meta import EnvironmentType, RegionSocioEconomic, WeatherState
 
 @dataclass
 class FactionDelta:
@@ -26,6 +26,7 @@ class RegionDelta:
     stability: Optional[float] = None
     population: Optional[int] = None
     owner: Optional[str] = None
+    weather: Optional[WeatherState] = None
     
     is_conquered: bool = False
     is_liberated: bool = False
@@ -53,6 +54,13 @@ class RegionCreationData:
     socio_economic: RegionSocioEconomic
     owner: Optional[str]
 
+@dataclass
+class EventTag:
+    # What an event message is about: its type and the ids of the entities involved.
+    kind: str
+    primary: Optional[str] = None
+    secondary: Optional[str] = None
+
 @dataclass
 class WorldDelta:
     faction_deltas: Dict[str, FactionDelta] = field(default_factory=dict)
@@ -63,10 +71,10 @@ class WorldDelta:
     delete_factions: Set[str] = field(default_factory=set)
     delete_regions: Set[str] = field(default_factory=set)
     
+    market: Dict[str, float] = field(default_factory=dict)
     events: List[str] = field(default_factory=list)
-    delete_regions: Set[str] = field(default_factory=set)
-    
-    events: List[str] = field(default_factory=list)
+    # One per entry of events, in the same order. Deltas recorded before tags existed have none.
+    event_tags: List[EventTag] = field(default_factory=list)
 
 
 @dataclass
@@ -74,4 +82,45 @@ class DeltaBatch:
     source_system: str
     deltas: WorldDelta
     timestamp: float
-    priority: int = 0
\ No newline at end of file
+    priority: int = 0
+
+@dataclass
+class FactionInverse:
+    # Prior values of the attributes listed in `fields`; None is a valid prior there.
+    fields: Set[str] = field(default_factory=set)
+    power: Optional[Power] = None
+    legitimacy: Optional[float] = None
+    resources: Optional[Resources] = None
+    detailed_resources: Optional['Ressources'] = None
+    knowledge: Optional[float] = None
+    is_active: Optional[bool] = None
+
+    added_regions: Set[str] = field(default_factory=set)
+    removed_regions: Set[str] = field(default_factory=set)
+    added_alliances: Set[str] = field(default_factory=set)
+    removed_alliances: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class RegionInverse:
+    fields: Set[str] = field(default_factory=set)
+    infrastructure: Optional[float] = None
+    cohesion: Optional[float] = None
+    population: Optional[int] = None
+    owner: Optional[str] = None
+    weather: Optional[WeatherState] = None
+
+
+@dataclass
+class InverseDelta:
+    """What applying one tick overwrote, so DeltaApplier.revert can restore the previous world."""
+    factions: Dict[str, FactionInverse] = field(default_factory=dict)
+    regions: Dict[str, RegionInverse] = field(default_factory=dict)
+
+    created_factions: Set[str] = field(default_factory=set)
+    created_regions: Set[str] = field(default_factory=set)
+    deleted_factions: Dict[str, 'Faction'] = field(default_factory=dict)
+    deleted_regions: Dict[str, 'Region'] = field(default_factory=dict)
+
+    # Prior market prices; None marks a price that did not exist before.
+    market: Dict[str, Optional[float]] = field(default_factory=dict)
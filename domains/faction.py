@@ -1,3 +1,4 @@
+import copy
 from typing import Set, Optional
 from dataclasses import dataclass, field
 from .economy import Resources
@@ -33,6 +34,16 @@ class Faction:
         if self.id in self.alliances:
             raise ValueError(f"Faction {self.id} cannot be allied with itself")
     
+    def clone(self) -> 'Faction':
+        # copy.copy skips __post_init__; only the mutable containers need fresh instances.
+        clone = copy.copy(self)
+        clone.power = copy.copy(self.power)
+        clone.resources = copy.copy(self.resources)
+        clone.regions = set(self.regions)
+        clone.alliances = set(self.alliances)
+        clone.traits = set(self.traits)
+        return clone
+    
     def apply_delta(self, delta: 'FactionDelta') -> None:
         if delta.power is not None:
             self.power = delta.power
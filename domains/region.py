@@ -1,3 +1,4 @@
+import copy
 from dataclasses import dataclass, field
 from .region_meta import EnvironmentType, RegionSocioEconomic, WeatherState
 
@@ -25,6 +26,12 @@ class Region:
         if self.population < 0:
             raise ValueError(f"Population cannot be negative: {self.population}")
     
+    def clone(self) -> 'Region':
+        clone = copy.copy(self)
+        clone.socio_economic = copy.copy(self.socio_economic)
+        clone.weather = copy.copy(self.weather)
+        return clone
+    
     def apply_delta(self, delta: 'RegionDelta') -> None:
         if delta.socio_economic is not None:
             self.socio_economic.infrastructure = delta.socio_economic.infrastructure
@@ -36,4 +43,6 @@ class Region:
         if delta.population is not None:
             self.population = delta.population
         if delta.owner is not None:
-            self.owner = delta.owner
\ No newline at end of file
+            self.owner = delta.owner
+        if delta.weather is not None:
+            self.weather = delta.weather
\ No newline at end of file
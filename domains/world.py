@@ -21,4 +21,11 @@ class World:
         return self.factions.get(faction_id)
     
     def get_region(self, region_id: str) -> Optional[Region]:
-        return self.regions.get(region_id)
\ No newline at end of file
+        return self.regions.get(region_id)
+
+    def clone(self) -> 'World':
+        return World(
+            factions={fid: f.clone() for fid, f in self.factions.items()},
+            regions={rid: r.clone() for rid, r in self.regions.items()},
+            market=dict(self.market)
+        )
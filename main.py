@@ -38,6 +38,8 @@ def main():
                 
     except KeyboardInterrupt:
         print("\nSimulation stopped by user.")
+    finally:
+        engine.close()
 
 if __name__ == "__main__":
     main()
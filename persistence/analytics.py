@@ -0,0 +1,400 @@
+"""Aggregate questions over every session of a database.
+
+Questions the events and time-series tables answer run as SQL on each database
+file, reading the session-leading indexes one session at a time. Sessions those
+tables cannot answer for, such as sessions on the log backend or recorded
+before events had their own table, are scanned instead. Each worker process of
+a pool opens the backend once and reduces one session at a time to a small
+partial result. The parent folds the partials into an aggregator as they
+arrive, so memory does not grow with the number of sessions.
+
+Results are Tables of column arrays. Each event counts in the session that
+recorded it, so a fork only contributes what happened after its fork tick.
+
+Usage: python -m persistence.analytics <db_path> [session_id ...]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from core.defaults import Defaults, PersistenceConfig
+from .backend import StorageBackend, create_backend
+from .catalog import SessionFilesBackend
+from .events import event_rows
+from .manager import PersistenceManager
+
+logger = logging.getLogger("Analytics")
+
+# Event kinds of the factions ConflictSystem spawns: insurrections in ownerless regions and civil-war splits.
+REBEL_KINDS = ("insurrection", "new_faction")
+# SQLite allows 999 host parameters per statement in older builds.
+_CHUNK = 500
+
+LIFESPAN_COLUMNS = ("session_id", "faction_id", "born", "died", "lifespan")
+COLLAPSE_COLUMNS = ("session_id", "start_tick", "collapse_tick", "ticks")
+
+
+@dataclass
+class Table:
+    """Column arrays of equal length, by column name, in column order."""
+    columns: Dict[str, list] = field(default_factory=dict)
+
+    @classmethod
+    def from_rows(cls, names: Sequence[str], rows: Iterable[Sequence]) -> "Table":
+        table = cls({name: [] for name in names})
+        table.extend(rows)
+        return table
+
+    def __len__(self) -> int:
+        return len(next(iter(self.columns.values()), ()))
+
+    def extend(self, rows: Iterable[Sequence]):
+        columns = list(self.columns.values())
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(value)
+
+    def rows(self) -> Iterator[tuple]:
+        return zip(*self.columns.values())
+
+
+# =========================
+# STREAMING AGGREGATORS
+# =========================
+class Rows:
+    """Collects the rows of every partial."""
+
+    def __init__(self, names: Sequence[str]):
+        self.table = Table.from_rows(names, ())
+
+    def add(self, rows: Iterable[Sequence]):
+        self.table.extend(rows)
+
+    def result(self) -> Table:
+        return self.table
+
+
+class Summary:
+    """Count, mean, min, max and standard deviation of the values of every partial. None values are skipped."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.low: Optional[float] = None
+        self.high: Optional[float] = None
+
+    def add(self, values: Iterable[Optional[float]]):
+        for value in values:
+            if value is None:
+                continue
+            self.count += 1
+            self.total += value
+            self.squares += value * value
+            self.low = value if self.low is None else min(self.low, value)
+            self.high = value if self.high is None else max(self.high, value)
+
+    def result(self) -> Table:
+        mean = self.total / self.count if self.count else None
+        std = max(0.0, self.squares / self.count - mean * mean) ** 0.5 if self.count else None
+        return Table.from_rows(("count", "mean", "min", "max", "std"), [(self.count, mean, self.low, self.high, std)])
+
+
+class Histogram:
+    """Counts of the values of every partial in buckets of width, plus the count of None values."""
+
+    def __init__(self, width: int):
+        self.width = max(1, width)
+        self.counts: Dict[int, int] = {}
+        self.missing = 0
+
+    def add(self, values: Iterable[Optional[float]]):
+        for value in values:
+            if value is None:
+                self.missing += 1
+                continue
+            bucket = int(value // self.width) * self.width
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+
+    def result(self) -> Table:
+        """(bucket, count) rows in bucket order; bucket is the first value it covers."""
+        return Table.from_rows(("bucket", "count"), sorted(self.counts.items()))
+
+
+def summary(values: Iterable[Optional[float]]) -> Table:
+    aggregator = Summary()
+    aggregator.add(values)
+    return aggregator.result()
+
+
+def histogram(values: Iterable[Optional[float]], width: int) -> Table:
+    aggregator = Histogram(width)
+    aggregator.add(values)
+    return aggregator.result()
+
+
+# =========================
+# SESSION SCANS
+# =========================
+_worker_backend: Optional[StorageBackend] = None
+
+
+def _open_worker(path: str, config: PersistenceConfig):
+    global _worker_backend
+    _worker_backend = create_backend(path, config)
+
+
+def _scan_one(scanner: Callable[[StorageBackend, str], Any], session_id: str):
+    return scanner(_worker_backend, session_id)
+
+
+def scan_sessions(
+    path: str,
+    config: Optional[PersistenceConfig],
+    scanner: Callable[[StorageBackend, str], Any],
+    aggregator,
+    session_ids: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None
+):
+    """Runs scanner(backend, session_id) on every session in a process pool and folds the results into aggregator.
+
+    scanner must be a module-level function, so worker processes can import
+    it. Each worker opens the backend at path once. Partials are folded with
+    aggregator.add() in session order while later sessions are still being
+    scanned; aggregator.result() is returned. The memory backend cannot be
+    opened from another process.
+    """
+    config = config or PersistenceConfig()
+    if config.backend == "memory":
+        raise ValueError("Sessions of the memory backend cannot be scanned from worker processes.")
+    if session_ids is None:
+        backend = create_backend(path, config)
+        try:
+            session_ids = backend.list_session_ids()
+        finally:
+            backend.close()
+    workers = workers or config.analytics_workers or os.cpu_count() or 1
+    # Spawned workers do not inherit the caller's threads or open connections.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_open_worker, initargs=(path, config)) as pool:
+        in_flight = deque()
+        for session_id in session_ids:
+            in_flight.append(pool.submit(_scan_one, scanner, session_id))
+            # Keep every worker busy without holding a partial per session.
+            while len(in_flight) > workers * 2:
+                aggregator.add(in_flight.popleft().result())
+        while in_flight:
+            aggregator.add(in_flight.popleft().result())
+    return aggregator.result()
+
+
+def _own_ticks(backend: StorageBackend, session_id: str) -> Tuple[int, int]:
+    # The ticks a session recorded itself: a fork starts at its fork tick.
+    fork = backend.get_fork_point(session_id)
+    first, last = backend.get_tick_range(session_id)
+    return (fork[1] if fork else first), last
+
+
+def scan_rebel_lifespans(backend: StorageBackend, session_id: str) -> List[tuple]:
+    """LIFESPAN_COLUMNS rows of the rebels recorded in the deltas of a session."""
+    start, last = _own_ticks(backend, session_id)
+    born: Dict[str, int] = {}
+    died: Dict[str, int] = {}
+    for tick, delta in backend.iter_deltas(session_id, start + 1, last, decode=True):
+        for kind, primary, _, _ in event_rows(delta):
+            if primary is None:
+                continue
+            if kind in REBEL_KINDS:
+                born.setdefault(primary, tick)
+            elif kind == "collapse" and primary in born:
+                died.setdefault(primary, tick)
+    return [
+        (session_id, faction_id, tick, died.get(faction_id), died.get(faction_id, last) - tick)
+        for faction_id, tick in born.items()
+    ]
+
+
+def scan_first_collapse(backend: StorageBackend, session_id: str) -> List[tuple]:
+    """The COLLAPSE_COLUMNS row of a session, read from its deltas up to the first collapse."""
+    start, last = _own_ticks(backend, session_id)
+    for tick, delta in backend.iter_deltas(session_id, start + 1, last, decode=True):
+        if any(kind == "collapse" for kind, _, _, _ in event_rows(delta)):
+            return [(session_id, start, tick, tick - start)]
+    return [(session_id, start, None, None)]
+
+
+# =========================
+# INDEXED QUERIES
+# =========================
+def _databases(backend: StorageBackend) -> Iterator[PersistenceManager]:
+    if isinstance(backend, SessionFilesBackend):
+        yield from backend.iter_files()
+    elif isinstance(backend, PersistenceManager):
+        yield backend
+
+
+def _chunks(values: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(values), _CHUNK):
+        yield values[i:i + _CHUNK]
+
+
+def _indexed_sessions(conn: sqlite3.Connection, wanted: Optional[set]) -> List[str]:
+    # Sessions with event rows that name the factions of every rebellion and
+    # collapse. Rows rebuilt by !backfill before ids were read from the
+    # messages have none, so those sessions are scanned like the others.
+    kinds = ", ".join(f"'{kind}'" for kind in (*REBEL_KINDS, "collapse"))
+    sessions = [
+        row[0] for row in conn.execute(f"""
+            SELECT id FROM sessions s
+            WHERE EXISTS (SELECT 1 FROM events e WHERE e.session_id = s.id)
+              AND NOT EXISTS (
+                  SELECT 1 FROM events e INDEXED BY idx_events_kind
+                  WHERE e.session_id = s.id AND e.kind IN ({kinds}) AND e.primary_id IS NULL
+              )
+        """)
+    ]
+    return sessions if wanted is None else [session_id for session_id in sessions if session_id in wanted]
+
+
+def query(backend: StorageBackend, sql: str, params: Sequence = ()) -> Table:
+    """Runs a read-only SQL query on every database file of a SQLite backend and concatenates the rows.
+
+    With the files backend, each file answers on its own, so aggregates should
+    be grouped by session.
+    """
+    table = None
+    for manager in _databases(backend):
+        with manager.connections.reader() as conn:
+            cursor = conn.execute(sql, params)
+            if table is None:
+                table = Table.from_rows([column[0] for column in cursor.description], ())
+            table.extend(cursor)
+    return table or Table()
+
+
+def _run(
+    path: str,
+    config: Optional[PersistenceConfig],
+    session_ids: Optional[Iterable[str]],
+    workers: Optional[int],
+    names: Sequence[str],
+    sql: str,
+    scanner: Callable[[StorageBackend, str], Any]
+) -> Table:
+    """Rows of sql on the sessions with tagged event rows, and of scanner on the others.
+
+    sql reads the ids of a chunk of sessions from the chosen(id) table.
+    """
+    config = config or PersistenceConfig()
+    wanted = set(session_ids) if session_ids is not None else None
+    table = Table.from_rows(names, ())
+    backend = create_backend(path, config)
+    try:
+        indexed = set()
+        for manager in _databases(backend):
+            with manager.connections.reader() as conn:
+                sessions = _indexed_sessions(conn, wanted)
+                for chunk in _chunks(sessions):
+                    chosen = ", ".join(["(?)"] * len(chunk))
+                    table.extend(conn.execute(f"WITH chosen(id) AS (VALUES {chosen}) {sql}", chunk))
+            indexed.update(sessions)
+        remaining = [session_id for session_id in (wanted or backend.list_session_ids()) if session_id not in indexed]
+    finally:
+        backend.close()
+    if remaining:
+        logger.info(f"Scanning the deltas of {len(remaining)} sessions without tagged event rows")
+        table.extend(scan_sessions(path, config, scanner, Rows(names), remaining, workers).rows())
+    return table
+
+
+def rebel_lifespans(
+    path: str,
+    config: Optional[PersistenceConfig] = None,
+    session_ids: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None
+) -> Table:
+    """Every faction ConflictSystem spawned, with the ticks it was born and collapsed at.
+
+    Columns are LIFESPAN_COLUMNS. died is None for a rebel still standing at
+    the last tick of its session, whose lifespan then runs to that tick.
+    """
+    kinds = ", ".join(f"'{kind}'" for kind in REBEL_KINDS)
+    return _run(path, config, session_ids, workers, LIFESPAN_COLUMNS, f"""
+        SELECT b.session_id, b.faction_id, b.born, d.died,
+               COALESCE(d.died, (SELECT MAX(tick_number) FROM ticks t WHERE t.session_id = b.session_id)) - b.born
+        FROM (
+            SELECT e.session_id, e.primary_id AS faction_id, MIN(e.tick_number) AS born
+            FROM sessions s JOIN events e INDEXED BY idx_events_kind ON e.session_id = s.id AND e.kind IN ({kinds})
+            WHERE s.id IN (SELECT id FROM chosen) AND e.primary_id IS NOT NULL
+            GROUP BY e.session_id, e.primary_id
+        ) b
+        LEFT JOIN (
+            SELECT e.session_id, e.primary_id AS faction_id, MIN(e.tick_number) AS died
+            FROM sessions s JOIN events e INDEXED BY idx_events_kind ON e.session_id = s.id AND e.kind = 'collapse'
+            WHERE s.id IN (SELECT id FROM chosen) AND e.primary_id IS NOT NULL
+            GROUP BY e.session_id, e.primary_id
+        ) d ON d.session_id = b.session_id AND d.faction_id = b.faction_id
+        ORDER BY b.session_id, b.born
+    """, scan_rebel_lifespans)
+
+
+def first_collapse_ticks(
+    path: str,
+    config: Optional[PersistenceConfig] = None,
+    session_ids: Optional[Iterable[str]] = None,
+    workers: Optional[int] = None
+) -> Table:
+    """The first collapse of every session, counted in ticks from its start.
+
+    Columns are COLLAPSE_COLUMNS. A fork starts at its fork tick. Sessions
+    without a collapse have None as collapse_tick and ticks; histogram()
+    counts them apart.
+    """
+    return _run(path, config, session_ids, workers, COLLAPSE_COLUMNS, """
+        SELECT id, start_tick, collapse_tick, collapse_tick - start_tick
+        FROM (
+            SELECT s.id,
+                   COALESCE(s.fork_tick, (SELECT MIN(tick_number) FROM ticks t WHERE t.session_id = s.id)) AS start_tick,
+                   (SELECT MIN(tick_number) FROM events e WHERE e.session_id = s.id AND e.kind = 'collapse') AS collapse_tick
+            FROM sessions s
+            WHERE s.id IN (SELECT id FROM chosen)
+        )
+        ORDER BY id
+    """, scan_first_collapse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate rebel lifespans and first collapses over recorded sessions.")
+    parser.add_argument("db_path")
+    parser.add_argument("session_ids", nargs="*", help="defaults to every session in the database")
+    parser.add_argument("--width", type=int, default=100, help="bucket width, in ticks, of the first-collapse histogram")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = Defaults().persistence
+    session_ids = args.session_ids or None
+
+    lifespans = rebel_lifespans(args.db_path, config, session_ids, args.workers)
+    collapsed = [lifespan for lifespan, died in zip(lifespans.columns["lifespan"], lifespans.columns["died"]) if died is not None]
+    stats = dict(zip(("count", "mean", "min", "max", "std"), next(summary(collapsed).rows())))
+    print(f"Rebel factions: {len(lifespans)}, collapsed: {stats['count']}")
+    if stats["count"]:
+        print(f"Lifespan until collapse: mean {stats['mean']:.1f}, min {stats['min']}, max {stats['max']}, std {stats['std']:.1f} ticks")
+
+    collapses = first_collapse_ticks(args.db_path, config, session_ids, args.workers)
+    aggregator = Histogram(args.width)
+    aggregator.add(collapses.columns["ticks"])
+    print(f"Ticks until the first collapse ({len(collapses)} sessions, {aggregator.missing} without one):")
+    for bucket, count in aggregator.result().rows():
+        print(f"  {bucket:>7}-{bucket + aggregator.width - 1:<7} {count}")
+
+
+if __name__ == "__main__":
+    main()
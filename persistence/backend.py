@@ -0,0 +1,345 @@
+"""Storage backend interface of the simulation engine.
+
+StorageBackend is what the engine, the writers and the time-travel service
+need from storage: sessions, encoded ticks, snapshots and delta ranges.
+PersistenceManager (SQLite) implements all of it plus the optional features:
+forks, time series, rollups and columnar files; SessionFilesBackend runs one
+PersistenceManager per session file. RecordBackend is the shared base
+of the backends that keep each session as an ordered sequence of encoded
+records: InMemoryBackend and the append-only LogBackend.
+"""
+import time
+import uuid
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from core.defaults import Defaults, PersistenceConfig
+from deltas.types import WorldDelta, InverseDelta
+from domains.world import World
+from .codec import get_encoders, is_binary, load_delta, load_world
+from .events import EventRow
+from .lazy import LazyWorld
+from .serializer import to_json, from_json, inputs_from_data
+from .timeseries import TickMetrics
+
+SNAPSHOT_KEYFRAME = 0
+SNAPSHOT_DIFF = 1
+
+BACKENDS = ("sqlite", "files", "log", "memory")
+
+
+@dataclass
+class PendingStep:
+    session_id: str
+    tick: int
+    timestamp: float
+    delta_json: Optional[Union[bytes, str]] = None
+    world_json: Optional[Union[bytes, str]] = None
+    snapshot_kind: int = SNAPSHOT_KEYFRAME
+    snapshot_base: Optional[int] = None
+    dictionary: Optional[bytes] = None
+    metrics: Optional[TickMetrics] = None
+    inverse_json: Optional[Union[bytes, str]] = None
+    inputs_json: Optional[Union[bytes, str]] = None
+    columnar: Optional[bytes] = None
+    # First tick covered by delta_json when it is a coalesced delta of several ticks ending at tick.
+    first_tick: Optional[int] = None
+    # (hash, record) of the entity records a snapshot manifest refers to that may not be stored yet.
+    blobs: Optional[List[Tuple[bytes, bytes]]] = None
+    # (kind, primary, secondary, message) of the events of the tick.
+    events: Optional[List[EventRow]] = None
+
+
+class StorageBackend(ABC):
+    """Sessions and their recorded ticks, deltas and snapshots.
+
+    Session metadata rows are (id, created_at, name, config_json, parent_id,
+    fork_tick). Optional features raise NotImplementedError, or report that
+    nothing is stored, on backends that do not have them.
+    """
+    # Whether the metrics passed to prepare_step are kept; callers skip computing them otherwise.
+    records_metrics = False
+
+    @abstractmethod
+    def create_session(self, name: str, config: Defaults = None) -> str: ...
+
+    @abstractmethod
+    def load_session_metadata(self, session_id: str) -> Optional[tuple]: ...
+
+    @abstractmethod
+    def list_session_ids(self) -> List[str]: ...
+
+    @abstractmethod
+    def prepare_step(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ) -> PendingStep:
+        """Encodes one tick. Called while the world is still at that tick.
+
+        inputs are the external edits applied at the start of the tick, before
+        the systems ran. With first_tick, delta is the coalesced delta of ticks
+        first_tick..tick, whose own steps were saved without one. events are
+        the rows of the events of the tick; by default they are read from delta
+        unless it is coalesced.
+        """
+
+    @abstractmethod
+    def save_steps(self, steps: List[PendingStep]):
+        """Stores prepared ticks, all or nothing."""
+
+    @abstractmethod
+    def get_latest_tick(self, session_id: str) -> int: ...
+
+    @abstractmethod
+    def get_tick_range(self, session_id: str) -> tuple: ...
+
+    @abstractmethod
+    def get_snapshot(self, session_id: str, tick: int, lazy: bool = False) -> Optional[Union[World, LazyWorld]]: ...
+
+    @abstractmethod
+    def get_nearest_snapshot_tick(self, session_id: str, tick: int) -> Optional[int]: ...
+
+    @abstractmethod
+    def iter_deltas(
+        self, session_id: str, start_tick: int, end_tick: int, batch_size: int = 1000, decode: bool = False
+    ) -> Iterator[Tuple[int, Union[bytes, str, WorldDelta]]]: ...
+
+    @abstractmethod
+    def close(self): ...
+
+    def save_step(self, session_id: str, tick: int, delta: WorldDelta, world_snapshot: Optional[World] = None):
+        self.save_steps([self.prepare_step(session_id, tick, delta, world_snapshot)])
+
+    def get_deltas(self, session_id: str, start_tick: int, end_tick: int) -> List[Union[bytes, str]]:
+        return [payload for _, payload in self.iter_deltas(session_id, start_tick, end_tick)]
+
+    def get_nearest_snapshot(self, session_id: str, tick: int) -> Optional[Tuple[int, World]]:
+        snapshot_tick = self.get_nearest_snapshot_tick(session_id, tick)
+        if snapshot_tick is None:
+            return None
+        world = self.get_snapshot(session_id, snapshot_tick)
+        return (snapshot_tick, world) if world is not None else None
+
+    # Optional features.
+    def truncate_session(self, session_id: str, tick: int):
+        raise NotImplementedError(f"{type(self).__name__} cannot discard recorded ticks.")
+
+    def get_inverse_deltas(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, InverseDelta]]:
+        return []
+
+    def get_inputs(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, List[WorldDelta]]]:
+        """(tick, edits) for the ticks in start_tick..end_tick that had external edits."""
+        return []
+
+    def record_seed(self, session_id: str, tick: int, seed: int):
+        """Starts a seed epoch: ticks from tick on ran with seed. Replaces the epochs recorded from tick on."""
+        raise NotImplementedError(f"{type(self).__name__} cannot discard recorded ticks.")
+
+    def get_seeds(self, session_id: str) -> List[Tuple[int, int]]:
+        """(first tick, seed) of the seed epochs a session recorded itself, in tick order."""
+        return []
+
+    def get_compacted_tick(self, session_id: str) -> Optional[int]:
+        return None
+
+    def is_replayable(self, session_id: str, tick: int) -> bool:
+        """False for ticks whose deltas were dropped by retention and that have no snapshot."""
+        return True
+
+    def get_coalesced_range(self, session_id: str, tick: int) -> Optional[Tuple[int, int]]:
+        """(first_tick, last_tick) of the coalesced delta that covers tick without ending at it, if any.
+
+        Such ticks have no state of their own: the delta is stored at
+        last_tick, and inputs recorded at first_tick apply before it.
+        """
+        return None
+
+    def restore_session(self, session_id: str) -> bool:
+        """Brings back an archived session; False when there is nothing to restore."""
+        return False
+
+    def fork_session(self, parent_id: str, tick: int, name: str, world: World, config: Defaults = None) -> str:
+        raise NotImplementedError(f"{type(self).__name__} does not support forks.")
+
+    def get_fork_point(self, session_id: str) -> Optional[Tuple[str, int]]:
+        return None
+
+    def list_forks(self, session_id: str) -> List[Tuple[str, int]]:
+        return []
+
+    def get_session_factions(self, session_id: str) -> Dict[str, Tuple[str, str]]:
+        raise NotImplementedError(f"{type(self).__name__} does not record time series.")
+
+    def query_timeseries(self, session_id: str, entity_ids, fields, tick_range=None, max_points: int = 300):
+        raise NotImplementedError(f"{type(self).__name__} does not record time series.")
+
+    def query_events(self, session_id: str, kinds=None, entity_id=None, text=None, tick_range=None, limit: int = 50):
+        raise NotImplementedError(f"{type(self).__name__} does not index events.")
+
+    def get_columnar_snapshot(self, session_id: str, tick: int):
+        return None
+
+    def iter_columnar_snapshots(self, session_id: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None):
+        return iter(())
+
+
+# Kinds of the records a RecordBackend keeps per session.
+RECORD_TICK = 0
+RECORD_DELTA = 1
+RECORD_SNAPSHOT = 2
+RECORD_INVERSE = 3
+RECORD_INPUT = 4
+RECORD_RANGE = 5
+
+
+class RecordBackend(StorageBackend):
+    """Base of backends that store each session as tick-ordered encoded records.
+
+    Subclasses only append records and read them back by kind and tick range;
+    encoding and the read API are shared. Snapshots are always full keyframes,
+    payloads are not compressed, and metrics and event rows are not recorded.
+    Ticks of a session must be saved in increasing order.
+    """
+
+    def __init__(self, config: Optional[PersistenceConfig] = None):
+        self.config = config or PersistenceConfig()
+        self.encode_delta, self.encode_world = get_encoders(self.config.codec)
+        self.sessions: Dict[str, tuple] = {}
+
+    @abstractmethod
+    def _store_session(self, row: tuple): ...
+
+    @abstractmethod
+    def _append(self, records: Dict[str, List[Tuple[int, int, bytes]]]):
+        """Appends (kind, tick, payload) records per session, all or nothing."""
+
+    @abstractmethod
+    def _read(self, session_id: str, kind: int, start_tick: int, end_tick: int) -> Iterator[Tuple[int, bytes]]:
+        """Yields (tick, payload) of the records of a kind in start_tick..end_tick, in tick order."""
+
+    @abstractmethod
+    def _bounds(self, session_id: str) -> Tuple[Optional[int], Optional[int]]:
+        """First and last stored tick of a session."""
+
+    @abstractmethod
+    def _snapshot_ticks(self, session_id: str) -> List[int]:
+        """Sorted ticks that have a snapshot."""
+
+    def create_session(self, name: str, config: Defaults = None) -> str:
+        row = (str(uuid.uuid4()), time.time(), name, to_json(config) if config else "{}", None, None)
+        self._store_session(row)
+        self.sessions[row[0]] = row
+        return row[0]
+
+    def load_session_metadata(self, session_id: str) -> Optional[tuple]:
+        return self.sessions.get(session_id)
+
+    def list_session_ids(self) -> List[str]:
+        return [row[0] for row in sorted(self.sessions.values(), key=lambda row: row[1])]
+
+    def prepare_step(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ) -> PendingStep:
+        return PendingStep(
+            session_id=session_id,
+            tick=tick,
+            timestamp=time.time(),
+            delta_json=_as_bytes(self.encode_delta(delta)) if delta else None,
+            world_json=_as_bytes(self.encode_world(world_snapshot)) if world_snapshot else None,
+            inverse_json=_as_bytes(to_json(inverse)) if inverse else None,
+            inputs_json=_as_bytes(to_json(inputs)) if inputs else None,
+            first_tick=first_tick
+        )
+
+    def save_steps(self, steps: List[PendingStep]):
+        records: Dict[str, List[Tuple[int, int, bytes]]] = {}
+        last: Dict[str, Optional[int]] = {}
+        for step in steps:
+            if step.session_id not in self.sessions:
+                raise ValueError(f"Session {step.session_id} not found.")
+            previous = last[step.session_id] if step.session_id in last else self._bounds(step.session_id)[1]
+            if previous is not None and step.tick <= previous:
+                raise ValueError(f"Tick {step.tick} of session {step.session_id} is not after the last stored tick {previous}.")
+            last[step.session_id] = step.tick
+            session = records.setdefault(step.session_id, [])
+            session.append((RECORD_TICK, step.tick, b""))
+            for kind, payload in (
+                (RECORD_INPUT, step.inputs_json), (RECORD_DELTA, step.delta_json),
+                (RECORD_RANGE, str(step.first_tick).encode() if step.first_tick is not None else None),
+                (RECORD_SNAPSHOT, step.world_json), (RECORD_INVERSE, step.inverse_json)
+            ):
+                if payload is not None:
+                    session.append((kind, step.tick, payload))
+        if records:
+            self._append(records)
+
+    def get_latest_tick(self, session_id: str) -> int:
+        last = self._bounds(session_id)[1]
+        return last if last is not None else 0
+
+    def get_tick_range(self, session_id: str) -> tuple:
+        first, last = self._bounds(session_id)
+        return (first or 0, last if last is not None else 0)
+
+    def get_snapshot(self, session_id: str, tick: int, lazy: bool = False) -> Optional[Union[World, LazyWorld]]:
+        for _, payload in self._read(session_id, RECORD_SNAPSHOT, tick, tick):
+            return LazyWorld.from_payload(payload) if lazy and is_binary(payload) else load_world(payload)
+        return None
+
+    def get_nearest_snapshot_tick(self, session_id: str, tick: int) -> Optional[int]:
+        ticks = self._snapshot_ticks(session_id)
+        i = bisect_right(ticks, tick)
+        return ticks[i - 1] if i else None
+
+    def iter_deltas(
+        self, session_id: str, start_tick: int, end_tick: int, batch_size: int = 1000, decode: bool = False
+    ) -> Iterator[Tuple[int, Union[bytes, str, WorldDelta]]]:
+        # Records are streamed one at a time, so batch_size has nothing to bound here.
+        for tick, payload in self._read(session_id, RECORD_DELTA, start_tick, end_tick):
+            yield tick, load_delta(payload) if decode else payload
+
+    def get_inverse_deltas(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, InverseDelta]]:
+        return [(tick, from_json(payload, InverseDelta)) for tick, payload in self._read(session_id, RECORD_INVERSE, start_tick, end_tick)]
+
+    def get_inputs(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, List[WorldDelta]]]:
+        return [(tick, inputs_from_data(from_json(payload))) for tick, payload in self._read(session_id, RECORD_INPUT, start_tick, end_tick)]
+
+    def get_coalesced_range(self, session_id: str, tick: int) -> Optional[Tuple[int, int]]:
+        for last_tick, payload in self._read(session_id, RECORD_RANGE, tick + 1, self.get_latest_tick(session_id)):
+            first_tick = int(payload)
+            return (first_tick, last_tick) if first_tick <= tick else None
+        return None
+
+
+def _as_bytes(payload: Union[bytes, str]) -> bytes:
+    return payload.encode("utf-8") if isinstance(payload, str) else payload
+
+
+def create_backend(path: str, config: Optional[PersistenceConfig] = None) -> StorageBackend:
+    """Opens the backend named by config.backend at path.
+
+    path is the SQLite database file for "sqlite", the directory of the session
+    files and their catalog for "files" and the log directory for "log";
+    "memory" ignores it.
+    """
+    config = config or PersistenceConfig()
+    if config.backend == "sqlite":
+        from .manager import PersistenceManager
+        return PersistenceManager(path, config)
+    if config.backend == "files":
+        from .catalog import SessionFilesBackend
+        return SessionFilesBackend(path, config)
+    if config.backend == "log":
+        from .log import LogBackend
+        return LogBackend(path, config)
+    if config.backend == "memory":
+        from .memory import InMemoryBackend
+        return InMemoryBackend(config)
+    raise ValueError(f"Unknown persistence backend '{config.backend}'. Expected one of: {', '.join(BACKENDS)}")
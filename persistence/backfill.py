@@ -0,0 +1,214 @@
+"""Builds the faction and world time-series tables for sessions recorded without them.
+
+Each stretch of ticks between two keyframe snapshots is rebuilt independently:
+a worker process decodes the keyframe, replays the deltas that follow it (or
+runs the systems again, for replay logs) and captures the metrics of every
+tick. Results are written back in tick order
+together with a resume point, so an interrupted backfill picks up after the
+last finished stretch. The rollup levels of the session are rebuilt at the end,
+which also covers sessions whose metrics were recorded before rollups existed.
+Sessions recorded before events had their own table get its rows first, read
+from their deltas.
+
+Usage: python -m persistence.backfill <db_path> [session_id ...]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from core.defaults import Defaults
+from core.simulator import Simulator
+from deltas.applier import DeltaApplier
+from deltas.types import WorldDelta
+from deltas.validator import DeltaValidator
+from .codec import load_delta, load_world
+from .compression import decompress, is_compressed
+from .backend import create_backend
+from .manager import PersistenceManager
+from .replay import is_replay_log, seed_schedule, session_config
+from .timeseries import TickMetrics, capture_metrics
+
+logger = logging.getLogger("Backfill")
+
+
+@dataclass
+class BackfillReport:
+    session_id: str
+    start_tick: int
+    end_tick: int
+    ticks: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class _Segment:
+    base_tick: int
+    end_tick: int
+    first_tick: int
+    snapshot: Union[bytes, str]
+    deltas: List[Tuple[int, Union[bytes, str]]]
+    zdict: Optional[bytes]
+    interval: int
+    inputs: Dict[int, List[WorldDelta]]
+    # Session config and seed epochs of a replay log, whose ticks are simulated again instead of replayed.
+    replay: Optional[Defaults] = None
+    seeds: Optional[List[Tuple[int, int]]] = None
+
+
+def _unpack(payload, zdict: Optional[bytes]):
+    return decompress(payload, zdict) if is_compressed(payload) else payload
+
+
+def _replay_segment(segment: _Segment) -> Tuple[int, List[Tuple[int, TickMetrics]]]:
+    world = load_world(_unpack(segment.snapshot, segment.zdict))
+    applier = DeltaApplier(DeltaValidator(Defaults()))
+    collected = []
+
+    def capture(tick: int):
+        if tick >= segment.first_tick and tick % segment.interval == 0:
+            collected.append((tick, capture_metrics(world)))
+
+    capture(segment.base_tick)
+    if segment.replay is not None:
+        simulator = Simulator(segment.replay, segment.replay.simulation.seed, segment.seeds)
+        for tick in range(segment.base_tick + 1, segment.end_tick + 1):
+            simulator.resimulate(world, tick, tick, segment.inputs)
+            capture(tick)
+        return segment.end_tick, collected
+    # Edits go before the delta stored at or after their tick: a coalesced delta
+    # is stored at the end of its range, and edits only start a range.
+    inputs = sorted(segment.inputs.items())
+    for tick, payload in segment.deltas:
+        edits = []
+        while inputs and inputs[0][0] <= tick:
+            edits += inputs.pop(0)[1]
+        applier.replay(edits + [load_delta(_unpack(payload, segment.zdict))], world)
+        capture(tick)
+    return segment.end_tick, collected
+
+
+def _segments(persistence: PersistenceManager, session_id: str, first_tick: int, last_tick: int, interval: int):
+    keyframes = persistence.get_keyframe_ticks(session_id)
+    zdict = persistence.get_dictionary(session_id)
+    config = session_config(persistence, session_id)
+    replay = config if is_replay_log(config) else None
+    seeds = seed_schedule(persistence, session_id) if replay else None
+    for i, base in enumerate(keyframes):
+        end = keyframes[i + 1] - 1 if i + 1 < len(keyframes) else last_tick
+        if end < first_tick or base > last_tick:
+            continue
+        start = max(base, first_tick)
+        expected = end // interval - (start - 1) // interval
+        if persistence.count_world_metrics(session_id, start, end) >= expected:
+            # Already recorded live (or by an earlier run); only the resume point moves.
+            yield None, end
+            continue
+        snapshot, deltas = persistence.get_raw_segment(session_id, base, end)
+        inputs = dict(persistence.get_inputs(session_id, base + 1, end))
+        yield _Segment(base, end, first_tick, snapshot, deltas, zdict, interval, inputs, replay, seeds), end
+
+
+def backfill_session(
+    persistence: PersistenceManager,
+    session_id: str,
+    config: Optional[Defaults] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[BackfillReport], None]] = None
+) -> BackfillReport:
+    """Fills faction_timeseries, world_timeseries and events for a session from its snapshots and deltas."""
+    if not persistence.records_metrics:
+        raise NotImplementedError(f"{type(persistence).__name__} does not record time series.")
+    events = persistence.rebuild_events(session_id)
+    if events:
+        logger.info(f"Indexed {events} events of session {session_id}")
+    config = config or Defaults()
+    interval = max(1, config.simulation.metrics_interval)
+    workers = workers or config.persistence.backfill_workers or os.cpu_count() or 1
+
+    resume = persistence.get_backfill_progress(session_id)
+    fork = persistence.get_fork_point(session_id)
+    # A fork only owns the ticks after its fork point; earlier ones belong to its parent.
+    first_tick = resume + 1 if resume is not None else fork[1] + 1 if fork else 0
+    # Ticks up to a compaction have no deltas left to replay.
+    compacted = persistence.get_compacted_tick(session_id)
+    if compacted is not None:
+        first_tick = max(first_tick, compacted + 1)
+    last_tick = persistence.get_latest_tick(session_id)
+    report = BackfillReport(session_id, first_tick, last_tick)
+    if first_tick > last_tick:
+        persistence.rebuild_rollups(session_id)
+        return report
+
+    started = time.perf_counter()
+    reported = started
+    # Spawned workers do not inherit the caller's threads or open connections.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        in_flight = deque()
+
+        def commit_oldest():
+            nonlocal reported
+            future, end = in_flight.popleft()
+            items = future.result()[1] if future is not None else []
+            persistence.save_backfill(session_id, items, end)
+            report.ticks += len(items)
+            report.rows += sum(len(metrics.factions) + 1 for _, metrics in items)
+            now = time.perf_counter()
+            report.seconds = now - started
+            if progress and now - reported >= 1.0:
+                reported = now
+                progress(report)
+
+        for segment, end in _segments(persistence, session_id, first_tick, last_tick, interval):
+            in_flight.append((pool.submit(_replay_segment, segment) if segment else None, end))
+            # Keep every worker busy without reading the whole session into memory.
+            while len(in_flight) > workers * 2:
+                commit_oldest()
+        while in_flight:
+            commit_oldest()
+
+    # Rollups are rebuilt once rather than merged per stretch: backfilled rows
+    # never replace live ones, so per-stretch merging could count them twice.
+    persistence.rebuild_rollups(session_id)
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        f"Backfilled {report.ticks} ticks ({report.rows} rows) for session {session_id} "
+        f"in {report.seconds:.1f}s, {report.rows_per_second:.0f} rows/s"
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build time-series tables for recorded sessions.")
+    parser.add_argument("db_path")
+    parser.add_argument("session_ids", nargs="*", help="defaults to every session in the database")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = Defaults()
+    persistence = create_backend(args.db_path, config.persistence)
+    try:
+        session_ids = args.session_ids or persistence.list_session_ids()
+        for session_id in session_ids:
+            backfill_session(
+                persistence, session_id, config, args.workers,
+                progress=lambda r: logger.info(f"{r.session_id}: {r.ticks} ticks, {r.rows_per_second:.0f} rows/s")
+            )
+    finally:
+        persistence.close()
+
+
+if __name__ == "__main__":
+    main()
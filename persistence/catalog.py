@@ -0,0 +1,421 @@
+"""Storage backend with one SQLite file per session tree.
+
+Each session started from scratch gets its own database file, named after it,
+under a root directory; its forks are stored in the same file, since they read
+its history. A small catalog database next to the files maps every session to
+its file and keeps its metadata row, so listing sessions opens no session file.
+
+Session files are opened on first use through a bounded LRU of
+PersistenceManagers. A file in use by a call or an open iterator is never
+closed; the least recently used idle ones are once more than
+open_session_files are open. A bulk run therefore only takes the write lock of
+its own file, and deleting a session removes its file instead of leaving free
+pages behind.
+
+attach() opens the files of several sessions in one read-only connection for
+queries across sessions.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.defaults import Defaults, PersistenceConfig
+from deltas.types import WorldDelta, InverseDelta
+from domains.world import World
+from .backend import PendingStep, StorageBackend
+from .connection import ConnectionPool
+from .events import EventRow
+from .manager import ARCHIVE_EXTENSION, SESSION_TABLES, PersistenceManager
+from .timeseries import TickMetrics
+
+CATALOG_FILE = "catalog.db"
+SESSION_EXTENSION = ".db"
+SESSION_COLUMNS = ("id", "created_at", "name", "config_json", "parent_id", "fork_tick")
+
+
+def _forwarded(name: str):
+    # A method that runs the PersistenceManager method of the same name on the session's file.
+    def method(self, session_id: str, *args, **kwargs):
+        with self._session(session_id) as manager:
+            return getattr(manager, name)(session_id, *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = getattr(PersistenceManager, name).__doc__
+    return method
+
+
+class SessionFilesBackend(StorageBackend):
+    """Sessions stored in one SQLite file per session tree under a root directory."""
+    records_metrics = True
+
+    def __init__(self, root: str, config: Optional[PersistenceConfig] = None):
+        self.root = root
+        self.config = config or PersistenceConfig()
+        os.makedirs(root, exist_ok=True)
+        self.archive_path = self.config.archive_path or os.path.join(root, "archive")
+        # Session files archive into the shared directory, so restores find them whichever file they came from.
+        self._file_config = replace(self.config, archive_path=self.archive_path)
+        self.catalog = ConnectionPool(os.path.join(root, CATALOG_FILE), self.config)
+        self._open: "OrderedDict[str, PersistenceManager]" = OrderedDict()
+        self._users: Dict[str, int] = {}
+        self._files: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        with self.catalog.writer() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    created_at REAL,
+                    name TEXT,
+                    config_json TEXT,
+                    parent_id TEXT,
+                    fork_tick INTEGER,
+                    file TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_parent ON sessions(parent_id)")
+            empty = conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+        if empty:
+            self._rebuild_catalog()
+
+    def _rebuild_catalog(self):
+        """Lists the sessions of every file in the root directory, for a catalog that went missing."""
+        for path in sorted(glob.glob(os.path.join(self.root, f"*{SESSION_EXTENSION}"))):
+            file = os.path.basename(path)
+            if file == CATALOG_FILE:
+                continue
+            source = sqlite3.connect(path)
+            try:
+                rows = source.execute(f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions").fetchall()
+            except sqlite3.DatabaseError:
+                continue
+            finally:
+                source.close()
+            self._add_to_catalog(rows, file)
+
+    def _add_to_catalog(self, rows: Iterable[tuple], file: str):
+        with self.catalog.writer() as conn:
+            conn.executemany(
+                f"INSERT INTO sessions ({', '.join(SESSION_COLUMNS)}, file) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [tuple(row) + (file,) for row in rows]
+            )
+
+    def _file(self, session_id: str) -> str:
+        file = self._files.get(session_id)
+        if file is None:
+            with self.catalog.reader() as conn:
+                row = conn.execute("SELECT file FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise ValueError(f"Session {session_id} not found.")
+            file = self._files[session_id] = row[0]
+        return file
+
+    def _remove_from_catalog(self, session_id: str):
+        with self.catalog.writer() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+        self._files.pop(session_id, None)
+
+    # =========================
+    # OPEN FILES
+    # =========================
+    @contextmanager
+    def _open_file(self, file: str) -> Iterator[PersistenceManager]:
+        with self._lock:
+            manager = self._open.get(file)
+            if manager is None:
+                manager = self._open[file] = PersistenceManager(os.path.join(self.root, file), self._file_config)
+            self._open.move_to_end(file)
+            self._users[file] = self._users.get(file, 0) + 1
+            self._evict()
+        try:
+            yield manager
+        finally:
+            with self._lock:
+                self._users[file] -= 1
+                if not self._users[file]:
+                    del self._users[file]
+                self._evict()
+
+    @contextmanager
+    def _session(self, session_id: str) -> Iterator[PersistenceManager]:
+        with self._open_file(self._file(session_id)) as manager:
+            yield manager
+
+    def _evict(self):
+        # Called with _lock held. Files in use stay open, even past the limit.
+        limit = max(1, self.config.open_session_files)
+        for file in list(self._open):
+            if len(self._open) <= limit:
+                break
+            if file not in self._users:
+                self._open.pop(file).close()
+
+    def _close_file(self, file: str):
+        """Closes a file so it can be moved or removed. Refuses while it is in use."""
+        with self._lock:
+            if file in self._users:
+                raise ValueError(f"Session file {file} is in use.")
+            manager = self._open.pop(file, None)
+        if manager is not None:
+            with manager.connections.writer() as conn:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            manager.close()
+
+    def _remove_file(self, file: str):
+        path = os.path.join(self.root, file)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        shutil.rmtree(f"{path}.columns", ignore_errors=True)
+
+    # =========================
+    # SESSIONS
+    # =========================
+    def create_session(self, name: str, config: Defaults = None) -> str:
+        session_id = str(uuid.uuid4())
+        file = f"{session_id}{SESSION_EXTENSION}"
+        with self._open_file(file) as manager:
+            manager.create_session(name, config, session_id=session_id)
+            row = manager.load_session_metadata(session_id)
+        self._add_to_catalog([row], file)
+        return session_id
+
+    def fork_session(self, parent_id: str, tick: int, name: str, world: World, config: Defaults = None) -> str:
+        """Creates a fork in the file of parent_id, whose history it reads."""
+        file = self._file(parent_id)
+        with self._open_file(file) as manager:
+            session_id = manager.fork_session(parent_id, tick, name, world, config)
+            row = manager.load_session_metadata(session_id)
+        self._add_to_catalog([row], file)
+        return session_id
+
+    def load_session_metadata(self, session_id: str) -> Optional[tuple]:
+        with self.catalog.reader() as conn:
+            return conn.execute(f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions WHERE id = ?", (session_id,)).fetchone()
+
+    def list_session_ids(self) -> List[str]:
+        with self.catalog.reader() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM sessions ORDER BY created_at").fetchall()]
+
+    def get_fork_point(self, session_id: str) -> Optional[Tuple[str, int]]:
+        metadata = self.load_session_metadata(session_id)
+        return (metadata[4], metadata[5]) if metadata and metadata[4] is not None else None
+
+    def list_forks(self, session_id: str) -> List[Tuple[str, int]]:
+        with self.catalog.reader() as conn:
+            return conn.execute(
+                "SELECT id, fork_tick FROM sessions WHERE parent_id = ? ORDER BY fork_tick", (session_id,)
+            ).fetchall()
+
+    def delete_session(self, session_id: str):
+        """Deletes a session. A session started from scratch takes its file with it."""
+        forks = [fork_id for fork_id, _ in self.list_forks(session_id)]
+        if forks:
+            raise ValueError(f"Session {session_id} has forks: {', '.join(forks)}")
+        file = self._file(session_id)
+        if self.get_fork_point(session_id) is None:
+            with self._open_file(file) as manager:
+                if manager.columns is not None:
+                    manager.columns.delete_after(session_id, -1)
+            self._close_file(file)
+            self._remove_file(file)
+        else:
+            with self._open_file(file) as manager:
+                manager.delete_session(session_id)
+        self._remove_from_catalog(session_id)
+
+    # =========================
+    # TICKS
+    # =========================
+    def prepare_step(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ) -> PendingStep:
+        with self._session(session_id) as manager:
+            return manager.prepare_step(session_id, tick, delta, world_snapshot, metrics, inverse, inputs, first_tick, events)
+
+    def save_steps(self, steps: List[PendingStep]):
+        """Stores prepared ticks, all or nothing within each session file."""
+        batches: Dict[str, List[PendingStep]] = {}
+        for step in steps:
+            batches.setdefault(self._file(step.session_id), []).append(step)
+        for file, batch in batches.items():
+            with self._open_file(file) as manager:
+                manager.save_steps(batch)
+
+    def iter_deltas(
+        self, session_id: str, start_tick: int, end_tick: int, batch_size: int = 1000, decode: bool = False
+    ) -> Iterator[Tuple[int, Union[bytes, str, WorldDelta]]]:
+        with self._session(session_id) as manager:
+            yield from manager.iter_deltas(session_id, start_tick, end_tick, batch_size, decode)
+
+    def iter_columnar_snapshots(self, session_id: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None):
+        with self._session(session_id) as manager:
+            yield from manager.iter_columnar_snapshots(session_id, start_tick, end_tick)
+
+    get_latest_tick = _forwarded("get_latest_tick")
+    get_tick_range = _forwarded("get_tick_range")
+    get_snapshot = _forwarded("get_snapshot")
+    get_nearest_snapshot_tick = _forwarded("get_nearest_snapshot_tick")
+    get_nearest_snapshot = _forwarded("get_nearest_snapshot")
+    get_snapshot_ticks = _forwarded("get_snapshot_ticks")
+    get_keyframe_ticks = _forwarded("get_keyframe_ticks")
+    get_all_snapshots = _forwarded("get_all_snapshots")
+    get_sampled_snapshots = _forwarded("get_sampled_snapshots")
+    get_columnar_snapshot = _forwarded("get_columnar_snapshot")
+    get_raw_segment = _forwarded("get_raw_segment")
+    get_dictionary = _forwarded("get_dictionary")
+    truncate_session = _forwarded("truncate_session")
+    get_inverse_deltas = _forwarded("get_inverse_deltas")
+    get_inputs = _forwarded("get_inputs")
+    record_seed = _forwarded("record_seed")
+    get_seeds = _forwarded("get_seeds")
+    get_compacted_tick = _forwarded("get_compacted_tick")
+    is_replayable = _forwarded("is_replayable")
+    get_coalesced_range = _forwarded("get_coalesced_range")
+    get_last_activity = _forwarded("get_last_activity")
+    compact_deltas = _forwarded("compact_deltas")
+    drop_snapshots = _forwarded("drop_snapshots")
+
+    # =========================
+    # TIME SERIES
+    # =========================
+    get_session_factions = _forwarded("get_session_factions")
+    get_faction_timeseries = _forwarded("get_faction_timeseries")
+    get_world_timeseries = _forwarded("get_world_timeseries")
+    query_timeseries = _forwarded("query_timeseries")
+    rebuild_rollups = _forwarded("rebuild_rollups")
+    count_world_metrics = _forwarded("count_world_metrics")
+    get_backfill_progress = _forwarded("get_backfill_progress")
+    save_backfill = _forwarded("save_backfill")
+
+    # =========================
+    # EVENTS
+    # =========================
+    query_events = _forwarded("query_events")
+    rebuild_events = _forwarded("rebuild_events")
+
+    # =========================
+    # MAINTENANCE
+    # =========================
+    def _archive_file(self, session_id: str) -> str:
+        return os.path.join(self.archive_path, f"{session_id}{ARCHIVE_EXTENSION}")
+
+    def archive_session(self, session_id: str) -> str:
+        """Moves a session into a gzip-compressed SQLite file under archive_path and returns its path.
+
+        A session started from scratch is archived as its whole file. Refuses
+        while forks of the session exist, since they read its history.
+        """
+        forks = [fork_id for fork_id, _ in self.list_forks(session_id)]
+        if forks:
+            raise ValueError(f"Session {session_id} has forks: {', '.join(forks)}")
+        file = self._file(session_id)
+        if self.get_fork_point(session_id) is not None:
+            with self._open_file(file) as manager:
+                path = manager.archive_session(session_id)
+        else:
+            self._close_file(file)
+            path = self._archive_file(session_id)
+            os.makedirs(self.archive_path, exist_ok=True)
+            temporary = f"{path}.tmp"
+            with open(os.path.join(self.root, file), "rb") as source, gzip.open(temporary, "wb", compresslevel=self.config.compression_level) as target:
+                shutil.copyfileobj(source, target)
+            os.replace(temporary, path)
+            self._remove_file(file)
+        self._remove_from_catalog(session_id)
+        return path
+
+    def restore_session(self, session_id: str) -> bool:
+        """Brings back an archived session; False when there is no archive of it.
+
+        An archived fork goes back into the file of its parent, which is restored
+        first if it was archived too.
+        """
+        path = self._archive_file(session_id)
+        if not os.path.exists(path):
+            return False
+        file = f"{session_id}{SESSION_EXTENSION}"
+        temporary = os.path.join(self.root, f"{file}.tmp")
+        with gzip.open(path, "rb") as source, open(temporary, "wb") as target:
+            shutil.copyfileobj(source, target)
+        archive = sqlite3.connect(temporary)
+        try:
+            rows = archive.execute(f"SELECT {', '.join(SESSION_COLUMNS)} FROM sessions").fetchall()
+        finally:
+            archive.close()
+        if not rows or rows[0][0] != session_id:
+            os.remove(temporary)
+            raise ValueError(f"{path} does not hold session {session_id}.")
+
+        parent_id = rows[0][4]
+        if parent_id is None:
+            os.replace(temporary, os.path.join(self.root, file))
+        else:
+            os.remove(temporary)
+            if not self.load_session_metadata(parent_id) and not self.restore_session(parent_id):
+                raise ValueError(f"Session {session_id} was forked from {parent_id}, which is missing.")
+            file = self._file(parent_id)
+            with self._open_file(file) as manager:
+                manager.import_session(path)
+        self._add_to_catalog(rows, file)
+        os.remove(path)
+        return True
+
+    def iter_files(self) -> Iterator[PersistenceManager]:
+        """Yields the PersistenceManager of every session file, each kept open until the next one is requested."""
+        with self.catalog.reader() as conn:
+            files = [row[0] for row in conn.execute("SELECT DISTINCT file FROM sessions").fetchall()]
+        for file in files:
+            with self._open_file(file) as manager:
+                yield manager
+
+    def vacuum(self, pages: int = 0) -> int:
+        """Vacuums every session file and returns the number of bytes given back."""
+        return sum(manager.vacuum(pages) for manager in self.iter_files())
+
+    @contextmanager
+    def attach(self, session_ids: Iterable[str]) -> Iterator[sqlite3.Connection]:
+        """A read-only connection over the files of session_ids for queries across sessions.
+
+        Every session table is a temporary view over the union of that table
+        in each file, so queries read as they would on a single database. A
+        file holds a whole session tree, so filter on session_id. Raises
+        ValueError when no session is given or their files exceed the number
+        SQLite attaches per connection (10 by default).
+        """
+        files = list(dict.fromkeys(self._file(session_id) for session_id in session_ids))
+        if not files:
+            raise ValueError("attach() needs at least one session")
+        conn = sqlite3.connect("file::memory:", uri=True)
+        try:
+            limit = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(conn, "getlimit") else 10
+            if len(files) > limit:
+                raise ValueError(
+                    f"Cannot attach {len(files)} session files: SQLite attaches at most {limit} per connection"
+                )
+            for i, file in enumerate(files):
+                # Writes in flight stay invisible until committed, as with any other reader.
+                uri = f"{Path(os.path.join(self.root, file)).resolve().as_uri()}?mode=ro"
+                conn.execute("ATTACH DATABASE ? AS ?", (uri, f"s{i}"))
+            for table, _ in SESSION_TABLES:
+                union = " UNION ALL ".join(f"SELECT * FROM s{i}.{table}" for i in range(len(files)))
+                conn.execute(f"CREATE TEMP VIEW {table} AS {union}")
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            while self._open:
+                self._open.popitem()[1].close()
+        self.catalog.close()
@@ -0,0 +1,845 @@
+"""Versioned binary encoding for deltas and worlds.
+
+Every blob starts with a 4-byte header: the magic ``DB``, a format version and
+a payload kind. Numeric fields of a record are packed together in one fixed
+``struct`` block, optional fields are announced by a flag byte, and strings and
+collections are length-prefixed with unsigned LEB128 varints.
+
+World blobs store each faction and region as a self-contained record that is
+prefixed by its byte length, so a reader can skip or index entities without
+decoding them. A manifest stores the market and the content hash of each
+record instead, for records kept once in a shared table.
+"""
+import dataclasses
+import hashlib
+import struct
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from deltas.types import WorldDelta, FactionDelta, RegionDelta, FactionCreationData, RegionCreationData, EventTag
+from domains.economy import Resources
+from domains.faction import Faction
+from domains.power import Power
+from domains.region import Region
+from domains.region_meta import EnvironmentType, RegionSocioEconomic, WeatherState, WeatherType
+from domains.ressources import Ressources, Energetic, Human, Material, Production, Intangible, Vital
+from domains.world import World
+
+MAGIC = b"DB"
+VERSION = 1
+
+KIND_DELTA = 1
+KIND_WORLD = 2
+KIND_WORLD_DIFF = 3
+KIND_WORLD_MANIFEST = 4
+
+RECORD_HASH_SIZE = 16
+
+# Enum members are stored by their position in these tuples. Append only.
+ENVIRONMENTS = (
+    EnvironmentType.URBAN, EnvironmentType.RURAL, EnvironmentType.INDUSTRIAL,
+    EnvironmentType.COASTAL, EnvironmentType.WILDERNESS,
+)
+WEATHERS = (
+    WeatherType.SUNNY, WeatherType.CLOUDY, WeatherType.RAIN, WeatherType.STORM,
+    WeatherType.DROUGHT, WeatherType.SNOW, WeatherType.HEATWAVE,
+)
+_ENVIRONMENT_INDEX = {e: i for i, e in enumerate(ENVIRONMENTS)}
+_WEATHER_INDEX = {w: i for i, w in enumerate(WEATHERS)}
+
+HEADER = struct.Struct("<2sBB")
+DOUBLE = struct.Struct("<d")
+POWER = struct.Struct("<3d")
+RESOURCES = struct.Struct("<5d")
+SOCIO = struct.Struct("<3d")
+RESSOURCES = struct.Struct("<4d3q4d4d4d2d")
+# power(3) legitimacy resources(5) knowledge
+FACTION_FIXED = struct.Struct("<3dd5dd")
+# population socio(3) weather(type, intensity, duration)
+REGION_FIXED = struct.Struct("<q3dBdq")
+
+# Byte offsets of single numeric fields inside the fixed blocks, used by readers
+# that scan one field across many records without building objects.
+FACTION_FIELD_OFFSETS: Dict[str, Tuple[int, str]] = {
+    "army": (0, "d"), "navy": (8, "d"), "air": (16, "d"),
+    "legitimacy": (24, "d"),
+    "credits": (32, "d"), "materials": (40, "d"), "food": (48, "d"),
+    "energy": (56, "d"), "influence": (64, "d"),
+    "knowledge": (72, "d"),
+}
+REGION_FIELD_OFFSETS: Dict[str, Tuple[int, str]] = {
+    "population": (0, "q"),
+    "infrastructure": (8, "d"), "cohesion": (16, "d"), "happiness": (24, "d"),
+    "weather_intensity": (33, "d"), "weather_duration": (41, "q"),
+}
+
+_F_ACTIVE = 0x01
+_F_DETAILED = 0x02
+
+_FD_POWER = 0x001
+_FD_LEGITIMACY = 0x002
+_FD_RESOURCES = 0x004
+_FD_DETAILED = 0x008
+_FD_KNOWLEDGE = 0x010
+_FD_DEACTIVATE = 0x020
+_FD_SETS = 0x040
+
+_RD_SOCIO = 0x01
+_RD_STABILITY = 0x02
+_RD_POPULATION = 0x04
+_RD_OWNER = 0x08
+_RD_WEATHER = 0x10
+_RD_CONQUERED = 0x20
+_RD_LIBERATED = 0x40
+
+
+def _layouts(parts: Tuple[Tuple[int, str], ...]) -> List[struct.Struct]:
+    # Every optional numeric field present in a delta record is packed into one
+    # block whose layout is derived from the record's flag byte.
+    size = 1 << len(parts)
+    return [struct.Struct("<" + "".join(fmt for bit, fmt in parts if flags & bit)) for flags in range(size)]
+
+_FACTION_DELTA_LAYOUTS = _layouts((
+    (_FD_POWER, "3d"),
+    (_FD_LEGITIMACY, "d"),
+    (_FD_RESOURCES, "5d"),
+    (_FD_DETAILED, RESSOURCES.format[1:]),
+    (_FD_KNOWLEDGE, "d"),
+))
+_FD_NUMERIC = _FD_POWER | _FD_LEGITIMACY | _FD_RESOURCES | _FD_DETAILED | _FD_KNOWLEDGE
+
+_REGION_DELTA_LAYOUTS = _layouts((
+    (_RD_SOCIO, "3d"),
+    (_RD_STABILITY, "d"),
+    (_RD_POPULATION, "q"),
+    (_RD_OWNER, ""),
+    (_RD_WEATHER, "Bdq"),
+))
+_RD_NUMERIC = _RD_SOCIO | _RD_STABILITY | _RD_POPULATION | _RD_OWNER | _RD_WEATHER
+
+
+class CodecError(ValueError):
+    pass
+
+
+def is_binary(payload: Union[bytes, str, None]) -> bool:
+    return isinstance(payload, (bytes, bytearray, memoryview)) and bytes(payload[:2]) == MAGIC
+
+def is_manifest(payload: Union[bytes, str, None]) -> bool:
+    return is_binary(payload) and len(payload) >= HEADER.size and payload[3] == KIND_WORLD_MANIFEST
+
+
+# =========================
+# PRIMITIVES
+# =========================
+def _put_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _get_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = buf[pos]
+    if result < 0x80:
+        return result, pos + 1
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def _put_svarint(out: bytearray, value: int):
+    _put_varint(out, (value << 1) ^ (value >> 63))
+
+def _get_svarint(buf: bytes, pos: int) -> Tuple[int, int]:
+    value, pos = _get_varint(buf, pos)
+    return (value >> 1) ^ -(value & 1), pos
+
+def _put_str(out: bytearray, value: str):
+    data = value.encode("utf-8")
+    _put_varint(out, len(data))
+    out += data
+
+def _get_str(buf: bytes, pos: int) -> Tuple[str, int]:
+    length = buf[pos]
+    if length < 0x80:
+        pos += 1
+    else:
+        length, pos = _get_varint(buf, pos)
+    end = pos + length
+    return str(buf[pos:end], "utf-8"), end
+
+def _put_opt_str(out: bytearray, value: Optional[str]):
+    # 0 marks None, otherwise the UTF-8 length is stored plus one.
+    if value is None:
+        out.append(0)
+        return
+    data = value.encode("utf-8")
+    _put_varint(out, len(data) + 1)
+    out += data
+
+def _get_opt_str(buf: bytes, pos: int) -> Tuple[Optional[str], int]:
+    length, pos = _get_varint(buf, pos)
+    if length == 0:
+        return None, pos
+    end = pos + length - 1
+    return str(buf[pos:end], "utf-8"), end
+
+def _put_strs(out: bytearray, values):
+    _put_varint(out, len(values))
+    for value in values:
+        _put_str(out, value)
+
+def _get_strs(buf: bytes, pos: int) -> Tuple[List[str], int]:
+    # Most lists are short lists of short strings, so one-byte lengths are read inline.
+    count = buf[pos]
+    if count < 0x80:
+        pos += 1
+    else:
+        count, pos = _get_varint(buf, pos)
+    values = []
+    for _ in range(count):
+        length = buf[pos]
+        if length < 0x80:
+            pos += 1
+        else:
+            length, pos = _get_varint(buf, pos)
+        end = pos + length
+        values.append(str(buf[pos:end], "utf-8"))
+        pos = end
+    return values, pos
+
+def _check_header(buf: bytes, kind: int) -> int:
+    if len(buf) < HEADER.size:
+        raise CodecError("Truncated payload")
+    magic, version, found_kind = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise CodecError("Not a binary payload")
+    if version > VERSION:
+        raise CodecError(f"Unsupported codec version {version}")
+    if found_kind != kind:
+        raise CodecError(f"Expected payload kind {kind}, found {found_kind}")
+    return HEADER.size
+
+
+# =========================
+# VALUE OBJECTS
+# =========================
+def _pack_ressources(r: Ressources) -> bytes:
+    return RESSOURCES.pack(*_ressources_values(r))
+
+def _ressources(x: tuple, i: int) -> Ressources:
+    # The categories are frozen, so their __init__ pays an object.__setattr__ per field.
+    return _restore_ressources(
+        _restore_energetic(x[i], x[i + 1], x[i + 2], x[i + 3]),
+        _restore_human(x[i + 4], x[i + 5], x[i + 6]),
+        _restore_material(x[i + 7], x[i + 8], x[i + 9], x[i + 10]),
+        _restore_production(x[i + 11], x[i + 12], x[i + 13], x[i + 14]),
+        _restore_intangible(x[i + 15], x[i + 16], x[i + 17], x[i + 18]),
+        _restore_vital(x[i + 19], x[i + 20])
+    )
+
+def _unpack_ressources(buf: bytes, pos: int) -> Tuple[Ressources, int]:
+    return _ressources(RESSOURCES.unpack_from(buf, pos), 0), pos + RESSOURCES.size
+
+def _ressources_values(r: Ressources) -> tuple:
+    e, h, m, p, i, v = r.energetic, r.human, r.material, r.production, r.intangible, r.vital
+    return (
+        e.fossils, e.renewables, e.nuclear, e.biomass,
+        int(h.population), int(h.population_active), int(h.population_qualified),
+        m.metals_common, m.metals_rare, m.materials_construction, m.products_chemicals,
+        p.machinery, p.infrastructure, p.logistics, p.capital,
+        i.technology, i.know_how, i.data, i.trust,
+        v.food, v.water
+    )
+
+
+def _restorer(cls):
+    """Builds cls from positional field values without running __init__ or __post_init__.
+
+    Same contract as serializer._restore (stored state skips entity validation).
+    Like dataclasses does for __init__, the function is generated with one
+    parameter per field, which store straight into the slots, or into the
+    instance dict of a class without slots (frozen or not). That is about
+    twice as fast as the generated __init__ of a frozen class, or a loop over
+    the fields. Every field must be given, defaults are not applied.
+    """
+    names = [f.name for f in dataclasses.fields(cls)]
+    if "__slots__" in cls.__dict__:
+        if cls.__dataclass_params__.frozen:
+            stores = [f"_setattr(_obj, {name!r}, {name})" for name in names]
+        else:
+            stores = [f"_obj.{name} = {name}" for name in names]
+    else:
+        stores = ["_d = _obj.__dict__"] + [f"_d[{name!r}] = {name}" for name in names]
+    source = "\n".join([f"def restore({', '.join(names)}):", "    _obj = _new(_cls)"] + [f"    {line}" for line in stores] + ["    return _obj"])
+    namespace = {"_new": object.__new__, "_cls": cls, "_setattr": object.__setattr__}
+    exec(source, namespace)
+    return namespace["restore"]
+
+_restore_faction = _restorer(Faction)
+_restore_region = _restorer(Region)
+_restore_faction_delta = _restorer(FactionDelta)
+_restore_region_delta = _restorer(RegionDelta)
+_restore_ressources = _restorer(Ressources)
+_restore_energetic = _restorer(Energetic)
+_restore_human = _restorer(Human)
+_restore_material = _restorer(Material)
+_restore_production = _restorer(Production)
+_restore_intangible = _restorer(Intangible)
+_restore_vital = _restorer(Vital)
+
+
+# =========================
+# ENTITY RECORDS
+# =========================
+def encode_faction(f: Faction) -> bytes:
+    out = bytearray()
+    _put_str(out, f.id)
+    _put_str(out, f.name)
+    _put_str(out, f.color)
+    flags = (_F_ACTIVE if f.is_active else 0) | (_F_DETAILED if f.detailed_resources is not None else 0)
+    out.append(flags)
+    p, r = f.power, f.resources
+    out += FACTION_FIXED.pack(
+        p.army, p.navy, p.air,
+        f.legitimacy,
+        r.credits, r.materials, r.food, r.energy, r.influence,
+        f.knowledge
+    )
+    if f.detailed_resources is not None:
+        out += _pack_ressources(f.detailed_resources)
+    _put_strs(out, sorted(f.regions))
+    _put_strs(out, sorted(f.alliances))
+    _put_strs(out, sorted(f.traits))
+    return bytes(out)
+
+def decode_faction(buf: bytes, pos: int = 0) -> Faction:
+    fid, pos = _get_str(buf, pos)
+    name, pos = _get_str(buf, pos)
+    color, pos = _get_str(buf, pos)
+    flags = buf[pos]
+    pos += 1
+    x = FACTION_FIXED.unpack_from(buf, pos)
+    pos += FACTION_FIXED.size
+    detailed = None
+    if flags & _F_DETAILED:
+        detailed, pos = _unpack_ressources(buf, pos)
+    regions, pos = _get_strs(buf, pos)
+    alliances, pos = _get_strs(buf, pos)
+    traits, pos = _get_strs(buf, pos)
+    # Field order of Faction: id, name, power, legitimacy, resources, detailed_resources,
+    # knowledge, regions, alliances, traits, color, is_active.
+    return _restore_faction(
+        fid, name,
+        Power(x[0], x[1], x[2]),
+        x[3],
+        Resources(x[4], x[5], x[6], x[7], x[8]),
+        detailed,
+        x[9],
+        set(regions), set(alliances), set(traits),
+        color,
+        flags & _F_ACTIVE != 0
+    )
+
+def record_id(buf: bytes, pos: int = 0) -> str:
+    """Id of a faction or region record, which both records store first."""
+    return _get_str(buf, pos)[0]
+
+def faction_fixed_offset(buf: bytes, pos: int = 0) -> int:
+    """Offset of the FACTION_FIXED block inside a faction record."""
+    for _ in range(3):
+        length, pos = _get_varint(buf, pos)
+        pos += length
+    return pos + 1
+
+def encode_region(r: Region) -> bytes:
+    out = bytearray()
+    _put_str(out, r.id)
+    _put_str(out, r.name)
+    _put_opt_str(out, r.owner)
+    out.append(_ENVIRONMENT_INDEX[r.environment])
+    se, w = r.socio_economic, r.weather
+    out += REGION_FIXED.pack(
+        int(r.population),
+        se.infrastructure, se.cohesion, se.happiness,
+        _WEATHER_INDEX[w.type], w.intensity, w.duration
+    )
+    return bytes(out)
+
+def decode_region(buf: bytes, pos: int = 0) -> Region:
+    rid, pos = _get_str(buf, pos)
+    name, pos = _get_str(buf, pos)
+    owner, pos = _get_opt_str(buf, pos)
+    environment = ENVIRONMENTS[buf[pos]]
+    x = REGION_FIXED.unpack_from(buf, pos + 1)
+    # Field order of Region: id, name, population, owner, environment, socio_economic, weather.
+    return _restore_region(
+        rid, name, x[0], owner, environment,
+        RegionSocioEconomic(x[1], x[2], x[3]),
+        WeatherState(WEATHERS[x[4]], x[5], x[6])
+    )
+
+def region_fixed_offset(buf: bytes, pos: int = 0) -> int:
+    """Offset of the REGION_FIXED block inside a region record."""
+    length, pos = _get_varint(buf, pos)
+    pos += length
+    length, pos = _get_varint(buf, pos)
+    pos += length
+    length, pos = _get_varint(buf, pos)
+    pos += max(0, length - 1)
+    return pos + 1
+
+
+# =========================
+# WORLD
+# =========================
+def _put_market(out: bytearray, market: Dict[str, float]):
+    _put_varint(out, len(market))
+    for key, price in market.items():
+        _put_str(out, key)
+        out += DOUBLE.pack(price)
+
+def _get_market(buf: bytes, pos: int) -> Tuple[Dict[str, float], int]:
+    count, pos = _get_varint(buf, pos)
+    market = {}
+    for _ in range(count):
+        key, pos = _get_str(buf, pos)
+        market[key] = DOUBLE.unpack_from(buf, pos)[0]
+        pos += DOUBLE.size
+    return market, pos
+
+def _put_records(out: bytearray, records: Iterable[bytes]):
+    records = list(records)
+    _put_varint(out, len(records))
+    for record in records:
+        _put_varint(out, len(record))
+        out += record
+
+def iter_records(buf: bytes, pos: int):
+    """Yields (offset, length) of each length-prefixed record, then the end offset."""
+    count, pos = _get_varint(buf, pos)
+    for _ in range(count):
+        length, pos = _get_varint(buf, pos)
+        yield pos, length
+        pos += length
+    yield pos, -1
+
+def _get_records(buf: bytes, pos: int) -> Tuple[List[Tuple[int, int]], int]:
+    records = list(iter_records(buf, pos))
+    return records, records.pop()[0]
+
+def world_sections(buf: bytes) -> Tuple[Dict[str, float], List[Tuple[int, int]], List[Tuple[int, int]]]:
+    """Decodes the market and returns the (offset, length) of every faction and region record."""
+    pos = _check_header(buf, KIND_WORLD)
+    market, pos = _get_market(buf, pos)
+    factions, pos = _get_records(buf, pos)
+    regions, pos = _get_records(buf, pos)
+    return market, factions, regions
+
+def encode_world_records(market: Dict[str, float], factions: Iterable[bytes], regions: Iterable[bytes]) -> bytes:
+    """Builds a world blob from already encoded faction and region records."""
+    out = bytearray(HEADER.pack(MAGIC, VERSION, KIND_WORLD))
+    _put_market(out, market)
+    _put_records(out, factions)
+    _put_records(out, regions)
+    return bytes(out)
+
+def encode_world(world: World) -> bytes:
+    return encode_world_records(
+        world.market,
+        [encode_faction(f) for f in world.factions.values()],
+        [encode_region(r) for r in world.regions.values()]
+    )
+
+def decode_world(buf: bytes) -> World:
+    market, factions, regions = world_sections(buf)
+    world = World(
+        factions={},
+        regions={},
+        market=market
+    )
+    for offset, _ in factions:
+        faction = decode_faction(buf, offset)
+        world.factions[faction.id] = faction
+    for offset, _ in regions:
+        region = decode_region(buf, offset)
+        world.regions[region.id] = region
+    return world
+
+def encode_world_diff(
+    market: Dict[str, float],
+    factions: Iterable[bytes], removed_factions: Iterable[str],
+    regions: Iterable[bytes], removed_regions: Iterable[str]
+) -> bytes:
+    """Builds a diff blob: the market, the changed or new entity records and the removed ids."""
+    out = bytearray(HEADER.pack(MAGIC, VERSION, KIND_WORLD_DIFF))
+    _put_market(out, market)
+    _put_records(out, factions)
+    _put_strs(out, list(removed_factions))
+    _put_records(out, regions)
+    _put_strs(out, list(removed_regions))
+    return bytes(out)
+
+def world_diff_sections(buf: bytes) -> Tuple[Dict[str, float], List[Tuple[int, int]], List[str], List[Tuple[int, int]], List[str]]:
+    """Decodes the market and removed ids of a diff blob and returns the (offset, length) of every record."""
+    pos = _check_header(buf, KIND_WORLD_DIFF)
+    market, pos = _get_market(buf, pos)
+    factions, pos = _get_records(buf, pos)
+    removed_factions, pos = _get_strs(buf, pos)
+    regions, pos = _get_records(buf, pos)
+    removed_regions, pos = _get_strs(buf, pos)
+    return market, factions, removed_factions, regions, removed_regions
+
+def record_hash(record: bytes) -> bytes:
+    """Content hash a manifest refers to an entity record by."""
+    return hashlib.blake2b(record, digest_size=RECORD_HASH_SIZE).digest()
+
+def _put_hashes(out: bytearray, hashes: Iterable[bytes]):
+    hashes = list(hashes)
+    _put_varint(out, len(hashes))
+    for digest in hashes:
+        out += digest
+
+def _get_hashes(buf: bytes, pos: int) -> Tuple[List[bytes], int]:
+    count, pos = _get_varint(buf, pos)
+    end = pos + count * RECORD_HASH_SIZE
+    if end > len(buf):
+        raise CodecError("Truncated payload")
+    return [bytes(buf[i:i + RECORD_HASH_SIZE]) for i in range(pos, end, RECORD_HASH_SIZE)], end
+
+def encode_world_manifest(market: Dict[str, float], factions: Iterable[bytes], regions: Iterable[bytes]) -> bytes:
+    """Builds a manifest blob from the record hashes of every faction and region."""
+    out = bytearray(HEADER.pack(MAGIC, VERSION, KIND_WORLD_MANIFEST))
+    _put_market(out, market)
+    _put_hashes(out, factions)
+    _put_hashes(out, regions)
+    return bytes(out)
+
+def world_manifest_sections(buf: bytes) -> Tuple[Dict[str, float], List[bytes], List[bytes]]:
+    """Decodes the market and the faction and region record hashes of a manifest blob."""
+    pos = _check_header(buf, KIND_WORLD_MANIFEST)
+    market, pos = _get_market(buf, pos)
+    factions, pos = _get_hashes(buf, pos)
+    regions, pos = _get_hashes(buf, pos)
+    return market, factions, regions
+
+def apply_world_diff(world: World, buf: bytes) -> World:
+    """Patches world in place with a diff blob and returns it."""
+    world.market, factions, removed_factions, regions, removed_regions = world_diff_sections(buf)
+    for offset, _ in factions:
+        faction = decode_faction(buf, offset)
+        world.factions[faction.id] = faction
+    for fid in removed_factions:
+        world.factions.pop(fid, None)
+    for offset, _ in regions:
+        region = decode_region(buf, offset)
+        world.regions[region.id] = region
+    for rid in removed_regions:
+        world.regions.pop(rid, None)
+    return world
+
+
+# =========================
+# DELTAS
+# =========================
+def _encode_faction_delta(out: bytearray, fid: str, d: FactionDelta):
+    has_sets = bool(d.add_regions or d.remove_regions or d.add_alliances or d.remove_alliances)
+    flags = (
+        (_FD_POWER if d.power is not None else 0)
+        | (_FD_LEGITIMACY if d.legitimacy is not None else 0)
+        | (_FD_RESOURCES if d.resources is not None else 0)
+        | (_FD_DETAILED if d.detailed_resources is not None else 0)
+        | (_FD_KNOWLEDGE if d.knowledge is not None else 0)
+        | (_FD_DEACTIVATE if d.deactivate else 0)
+        | (_FD_SETS if has_sets else 0)
+    )
+    values = []
+    if d.power is not None:
+        values += (d.power.army, d.power.navy, d.power.air)
+    if d.legitimacy is not None:
+        values.append(d.legitimacy)
+    if d.resources is not None:
+        r = d.resources
+        values += (r.credits, r.materials, r.food, r.energy, r.influence)
+    if d.detailed_resources is not None:
+        values += _ressources_values(d.detailed_resources)
+    if d.knowledge is not None:
+        values.append(d.knowledge)
+
+    _put_str(out, fid)
+    out.append(flags)
+    out += _FACTION_DELTA_LAYOUTS[flags & _FD_NUMERIC].pack(*values)
+    if has_sets:
+        _put_strs(out, d.add_regions)
+        _put_strs(out, d.remove_regions)
+        _put_strs(out, d.add_alliances)
+        _put_strs(out, d.remove_alliances)
+
+def _decode_faction_delta(buf: bytes, pos: int) -> Tuple[str, FactionDelta, int]:
+    fid, pos = _get_str(buf, pos)
+    flags = buf[pos]
+    layout = _FACTION_DELTA_LAYOUTS[flags & _FD_NUMERIC]
+    x = layout.unpack_from(buf, pos + 1)
+    pos += 1 + layout.size
+
+    power = legitimacy = resources = detailed = knowledge = None
+    i = 0
+    if flags & _FD_POWER:
+        power = Power(x[0], x[1], x[2])
+        i = 3
+    if flags & _FD_LEGITIMACY:
+        legitimacy = x[i]
+        i += 1
+    if flags & _FD_RESOURCES:
+        resources = Resources(x[i], x[i + 1], x[i + 2], x[i + 3], x[i + 4])
+        i += 5
+    if flags & _FD_DETAILED:
+        detailed = _ressources(x, i)
+        i += 21
+    if flags & _FD_KNOWLEDGE:
+        knowledge = x[i]
+    if flags & _FD_SETS:
+        values, pos = _get_strs(buf, pos)
+        add_regions = set(values)
+        values, pos = _get_strs(buf, pos)
+        remove_regions = set(values)
+        values, pos = _get_strs(buf, pos)
+        add_alliances = set(values)
+        values, pos = _get_strs(buf, pos)
+        remove_alliances = set(values)
+    else:
+        add_regions, remove_regions, add_alliances, remove_alliances = set(), set(), set(), set()
+    # Field order of FactionDelta: power, legitimacy, resources, detailed_resources, knowledge,
+    # add_regions, remove_regions, add_alliances, remove_alliances, deactivate.
+    return fid, _restore_faction_delta(
+        power, legitimacy, resources, detailed, knowledge,
+        add_regions, remove_regions, add_alliances, remove_alliances,
+        flags & _FD_DEACTIVATE != 0
+    ), pos
+
+def _encode_region_delta(out: bytearray, rid: str, d: RegionDelta):
+    flags = (
+        (_RD_SOCIO if d.socio_economic is not None else 0)
+        | (_RD_STABILITY if d.stability is not None else 0)
+        | (_RD_POPULATION if d.population is not None else 0)
+        | (_RD_OWNER if d.owner is not None else 0)
+        | (_RD_WEATHER if d.weather is not None else 0)
+        | (_RD_CONQUERED if d.is_conquered else 0)
+        | (_RD_LIBERATED if d.is_liberated else 0)
+    )
+    values = []
+    if d.socio_economic is not None:
+        se = d.socio_economic
+        values += (se.infrastructure, se.cohesion, se.happiness)
+    if d.stability is not None:
+        values.append(d.stability)
+    if d.population is not None:
+        values.append(int(d.population))
+    if d.weather is not None:
+        w = d.weather
+        values += (_WEATHER_INDEX[w.type], w.intensity, w.duration)
+
+    _put_str(out, rid)
+    out.append(flags)
+    out += _REGION_DELTA_LAYOUTS[flags & _RD_NUMERIC].pack(*values)
+    if d.owner is not None:
+        _put_str(out, d.owner)
+
+def _decode_region_delta(buf: bytes, pos: int) -> Tuple[str, RegionDelta, int]:
+    rid, pos = _get_str(buf, pos)
+    flags = buf[pos]
+    layout = _REGION_DELTA_LAYOUTS[flags & _RD_NUMERIC]
+    x = layout.unpack_from(buf, pos + 1)
+    pos += 1 + layout.size
+
+    socio = stability = population = owner = weather = None
+    i = 0
+    if flags & _RD_SOCIO:
+        socio = RegionSocioEconomic(x[0], x[1], x[2])
+        i = 3
+    if flags & _RD_STABILITY:
+        stability = x[i]
+        i += 1
+    if flags & _RD_POPULATION:
+        population = x[i]
+        i += 1
+    if flags & _RD_WEATHER:
+        weather = WeatherState(WEATHERS[x[i]], x[i + 1], x[i + 2])
+    if flags & _RD_OWNER:
+        owner, pos = _get_str(buf, pos)
+    # Field order of RegionDelta: socio_economic, stability, population, owner, weather,
+    # is_conquered, is_liberated.
+    return rid, _restore_region_delta(
+        socio, stability, population, owner, weather,
+        flags & _RD_CONQUERED != 0, flags & _RD_LIBERATED != 0
+    ), pos
+
+def _encode_faction_creation(out: bytearray, c: FactionCreationData):
+    _put_str(out, c.id)
+    _put_str(out, c.name)
+    _put_str(out, c.color)
+    out.append(_F_DETAILED if c.detailed_resources is not None else 0)
+    p, r = c.power, c.resources
+    out += FACTION_FIXED.pack(
+        p.army, p.navy, p.air,
+        c.legitimacy,
+        r.credits, r.materials, r.food, r.energy, r.influence,
+        c.knowledge
+    )
+    if c.detailed_resources is not None:
+        out += _pack_ressources(c.detailed_resources)
+    _put_strs(out, c.regions)
+    _put_strs(out, c.alliances)
+    _put_strs(out, c.traits)
+
+def _decode_faction_creation(buf: bytes, pos: int) -> Tuple[FactionCreationData, int]:
+    fid, pos = _get_str(buf, pos)
+    name, pos = _get_str(buf, pos)
+    color, pos = _get_str(buf, pos)
+    flags = buf[pos]
+    pos += 1
+    x = FACTION_FIXED.unpack_from(buf, pos)
+    pos += FACTION_FIXED.size
+    detailed = None
+    if flags & _F_DETAILED:
+        detailed, pos = _unpack_ressources(buf, pos)
+    regions, pos = _get_strs(buf, pos)
+    alliances, pos = _get_strs(buf, pos)
+    traits, pos = _get_strs(buf, pos)
+    return FactionCreationData(
+        id=fid,
+        name=name,
+        power=Power(x[0], x[1], x[2]),
+        legitimacy=x[3],
+        resources=Resources(x[4], x[5], x[6], x[7], x[8]),
+        regions=set(regions),
+        alliances=set(alliances),
+        detailed_resources=detailed,
+        knowledge=x[9],
+        traits=set(traits),
+        color=color
+    ), pos
+
+def _encode_region_creation(out: bytearray, c: RegionCreationData):
+    _put_str(out, c.id)
+    _put_str(out, c.name)
+    _put_opt_str(out, c.owner)
+    out.append(_ENVIRONMENT_INDEX[c.environment])
+    _put_svarint(out, int(c.population))
+    se = c.socio_economic
+    out += SOCIO.pack(se.infrastructure, se.cohesion, se.happiness)
+
+def _decode_region_creation(buf: bytes, pos: int) -> Tuple[RegionCreationData, int]:
+    rid, pos = _get_str(buf, pos)
+    name, pos = _get_str(buf, pos)
+    owner, pos = _get_opt_str(buf, pos)
+    environment = ENVIRONMENTS[buf[pos]]
+    population, pos = _get_svarint(buf, pos + 1)
+    socio = RegionSocioEconomic(*SOCIO.unpack_from(buf, pos))
+    return RegionCreationData(
+        id=rid,
+        name=name,
+        population=population,
+        environment=environment,
+        socio_economic=socio,
+        owner=owner
+    ), pos + SOCIO.size
+
+def encode_delta(delta: WorldDelta) -> bytes:
+    out = bytearray(HEADER.pack(MAGIC, VERSION, KIND_DELTA))
+    _put_varint(out, len(delta.faction_deltas))
+    for fid, d in delta.faction_deltas.items():
+        _encode_faction_delta(out, fid, d)
+    _put_varint(out, len(delta.region_deltas))
+    for rid, d in delta.region_deltas.items():
+        _encode_region_delta(out, rid, d)
+    _put_varint(out, len(delta.create_factions))
+    for c in delta.create_factions.values():
+        _encode_faction_creation(out, c)
+    _put_varint(out, len(delta.create_regions))
+    for c in delta.create_regions.values():
+        _encode_region_creation(out, c)
+    _put_strs(out, delta.delete_factions)
+    _put_strs(out, delta.delete_regions)
+    _put_market(out, delta.market)
+    _put_strs(out, delta.events)
+    # Optional trailing section, so deltas written before event tags still decode.
+    if delta.event_tags:
+        _put_varint(out, len(delta.event_tags))
+        for tag in delta.event_tags:
+            _put_str(out, tag.kind)
+            _put_opt_str(out, tag.primary)
+            _put_opt_str(out, tag.secondary)
+    return bytes(out)
+
+def decode_delta(buf: bytes) -> WorldDelta:
+    pos = _check_header(buf, KIND_DELTA)
+    delta = WorldDelta()
+    count, pos = _get_varint(buf, pos)
+    for _ in range(count):
+        fid, d, pos = _decode_faction_delta(buf, pos)
+        delta.faction_deltas[fid] = d
+    count, pos = _get_varint(buf, pos)
+    for _ in range(count):
+        rid, d, pos = _decode_region_delta(buf, pos)
+        delta.region_deltas[rid] = d
+    count, pos = _get_varint(buf, pos)
+    for _ in range(count):
+        c, pos = _decode_faction_creation(buf, pos)
+        delta.create_factions[c.id] = c
+    count, pos = _get_varint(buf, pos)
+    for _ in range(count):
+        c, pos = _decode_region_creation(buf, pos)
+        delta.create_regions[c.id] = c
+    values, pos = _get_strs(buf, pos)
+    delta.delete_factions = set(values)
+    values, pos = _get_strs(buf, pos)
+    delta.delete_regions = set(values)
+    delta.market, pos = _get_market(buf, pos)
+    delta.events, pos = _get_strs(buf, pos)
+    if pos < len(buf):
+        count, pos = _get_varint(buf, pos)
+        for _ in range(count):
+            kind, pos = _get_str(buf, pos)
+            primary, pos = _get_opt_str(buf, pos)
+            secondary, pos = _get_opt_str(buf, pos)
+            delta.event_tags.append(EventTag(kind, primary, secondary))
+    return delta
+
+
+# =========================
+# FORMAT DISPATCH
+# =========================
+def load_delta(payload: Union[bytes, str, None]) -> WorldDelta:
+    """Decodes a stored delta, whether it was written as binary or legacy JSON."""
+    if payload is None:
+        return WorldDelta()
+    if is_binary(payload):
+        return decode_delta(bytes(payload))
+    from .serializer import from_json
+    return from_json(payload, WorldDelta)
+
+def load_world(payload: Union[bytes, str]) -> World:
+    """Decodes a stored world snapshot, whether it was written as binary or legacy JSON."""
+    if is_binary(payload):
+        return decode_world(bytes(payload))
+    from .serializer import from_json
+    return from_json(payload, World)
+
+
+ENCODERS: Dict[str, Tuple[Callable[[WorldDelta], Union[bytes, str]], Callable[[World], Union[bytes, str]]]] = {
+    "binary": (encode_delta, encode_world),
+}
+
+def get_encoders(name: str):
+    if name == "json":
+        from .serializer import to_json
+        return to_json, to_json
+    try:
+        return ENCODERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec '{name}'") from None
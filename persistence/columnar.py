@@ -0,0 +1,316 @@
+"""Columnar snapshot files read through mmap.
+
+A columnar snapshot stores each numeric field of the world as one contiguous
+array: all region cohesions back to back, all faction armies back to back, and
+so on. Ids, names and other strings live in a shared string table that the
+entity columns index into, and set-valued fields (regions, alliances, traits)
+use an offsets array into a flat array of string indices.
+
+File layout: a fixed header, a directory of (name, typecode, offset, count)
+entries, then the arrays, each aligned to 8 bytes. Arrays are little-endian
+and are read with memoryview.cast over an mmap, so a scan of one field across
+many snapshots only touches those bytes in the page cache. numpy users can wrap
+a column with numpy.frombuffer(view, dtype) without copying.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from domains.economy import Resources
+from domains.power import Power
+from domains.region_meta import RegionSocioEconomic, WeatherState
+from domains.world import World
+from .codec import (
+    ENVIRONMENTS, WEATHERS, CodecError, _ENVIRONMENT_INDEX, _WEATHER_INDEX,
+    _ressources, _ressources_values, _restore_faction, _restore_region,
+)
+
+MAGIC = b"DCOL"
+VERSION = 1
+EXTENSION = ".col"
+
+# magic, version, entry count
+HEADER = struct.Struct("<4sHH")
+# name, typecode, offset, count
+ENTRY = struct.Struct("<32sc7xQQ")
+ALIGNMENT = 8
+
+FACTION_FIELDS = (
+    "army", "navy", "air", "legitimacy",
+    "credits", "materials", "food", "energy", "influence",
+    "knowledge",
+)
+REGION_FIELDS = ("infrastructure", "cohesion", "happiness", "weather_intensity")
+REGION_INT_FIELDS = ("population", "weather_duration")
+FACTION_SETS = ("regions", "alliances", "traits")
+DETAILED_SIZE = 21
+NO_OWNER = -1
+
+# Every column of a file with its array typecode. String columns hold indices into the string table.
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("faction.id", "I"), ("faction.name", "I"), ("faction.color", "I"),
+    *((f"faction.{name}", "d") for name in FACTION_FIELDS),
+    ("faction.is_active", "B"), ("faction.detailed", "B"), ("faction.detailed_values", "d"),
+    *(column for name in FACTION_SETS for column in ((f"faction.{name}.offsets", "I"), (f"faction.{name}", "I"))),
+    ("region.id", "I"), ("region.name", "I"), ("region.owner", "i"),
+    ("region.environment", "B"), ("region.weather", "B"),
+    *((f"region.{name}", "q") for name in REGION_INT_FIELDS),
+    *((f"region.{name}", "d") for name in REGION_FIELDS),
+    ("market.keys", "I"), ("market.prices", "d"),
+)
+
+
+class _StringTable:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.data = bytearray()
+        self.offsets = array("I", [0])
+
+    def add(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.offsets) - 1
+            self.data += value.encode("utf-8")
+            self.offsets.append(len(self.data))
+        return i
+
+
+def encode_columnar(world: World) -> bytes:
+    """Serializes world into the columnar file format."""
+    strings = _StringTable()
+    columns: Dict[str, array] = {name: array(typecode) for name, typecode in COLUMNS}
+    for name in FACTION_SETS:
+        columns[f"faction.{name}.offsets"].append(0)
+
+    for f in world.factions.values():
+        p, r = f.power, f.resources
+        columns["faction.id"].append(strings.add(f.id))
+        columns["faction.name"].append(strings.add(f.name))
+        columns["faction.color"].append(strings.add(f.color))
+        for name, value in zip(FACTION_FIELDS, (
+            p.army, p.navy, p.air, f.legitimacy,
+            r.credits, r.materials, r.food, r.energy, r.influence,
+            f.knowledge
+        )):
+            columns[f"faction.{name}"].append(value)
+        columns["faction.is_active"].append(1 if f.is_active else 0)
+        columns["faction.detailed"].append(0 if f.detailed_resources is None else 1)
+        columns["faction.detailed_values"].extend(
+            _ressources_values(f.detailed_resources) if f.detailed_resources is not None else (0.0,) * DETAILED_SIZE
+        )
+        for name in FACTION_SETS:
+            values = columns[f"faction.{name}"]
+            values.extend(strings.add(value) for value in sorted(getattr(f, name)))
+            columns[f"faction.{name}.offsets"].append(len(values))
+
+    for r in world.regions.values():
+        se, w = r.socio_economic, r.weather
+        columns["region.id"].append(strings.add(r.id))
+        columns["region.name"].append(strings.add(r.name))
+        columns["region.owner"].append(NO_OWNER if r.owner is None else strings.add(r.owner))
+        columns["region.environment"].append(_ENVIRONMENT_INDEX[r.environment])
+        columns["region.weather"].append(_WEATHER_INDEX[w.type])
+        columns["region.population"].append(int(r.population))
+        columns["region.weather_duration"].append(int(w.duration))
+        for name, value in zip(REGION_FIELDS, (se.infrastructure, se.cohesion, se.happiness, w.intensity)):
+            columns[f"region.{name}"].append(value)
+
+    columns["market.keys"].extend(strings.add(key) for key in world.market)
+    columns["market.prices"].extend(world.market.values())
+    columns["strings"] = array("B", strings.data)
+    columns["strings.offsets"] = strings.offsets
+
+    entries = []
+    offset = _align(HEADER.size + ENTRY.size * len(columns))
+    for name, values in columns.items():
+        entries.append((name, values, offset))
+        offset = _align(offset + len(values) * values.itemsize)
+
+    out = bytearray(offset)
+    HEADER.pack_into(out, 0, MAGIC, VERSION, len(entries))
+    for i, (name, values, start) in enumerate(entries):
+        ENTRY.pack_into(out, HEADER.size + i * ENTRY.size, name.encode("ascii"), values.typecode.encode("ascii"), start, len(values))
+        if sys.byteorder != "little":
+            values = array(values.typecode, values)
+            values.byteswap()
+        data = values.tobytes()
+        out[start:start + len(data)] = data
+    return bytes(out)
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class ColumnarSnapshot:
+    """A columnar snapshot file mapped into memory.
+
+    column() returns memoryviews into the mapping, which stay valid until
+    close(). Use it as a context manager to unmap the file when done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._map)
+        magic, version, count = HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise CodecError(f"{path} is not a columnar snapshot")
+        if version > VERSION:
+            self.close()
+            raise CodecError(f"Unsupported columnar snapshot version {version}")
+        self._entries: Dict[str, Tuple[str, int, int]] = {}
+        for i in range(count):
+            name, typecode, offset, length = ENTRY.unpack_from(self._buffer, HEADER.size + i * ENTRY.size)
+            self._entries[name.rstrip(b"\0").decode("ascii")] = (typecode.decode("ascii"), offset, length)
+        self._strings: Optional[List[str]] = None
+
+    def __enter__(self) -> "ColumnarSnapshot":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._map is None:
+            return
+        self._buffer.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # Columns handed out are still referenced; the mapping goes away with them.
+            pass
+        self._map = None
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._entries)
+
+    def column(self, name: str):
+        """Zero-copy view of one column, indexed like the entity id columns."""
+        try:
+            typecode, offset, length = self._entries[name]
+        except KeyError:
+            raise ValueError(f"Unknown column '{name}'. Expected one of: {', '.join(self._entries)}") from None
+        size = array(typecode).itemsize
+        view = self._buffer[offset:offset + length * size]
+        if sys.byteorder != "little":
+            values = array(typecode, bytes(view))
+            values.byteswap()
+            return memoryview(values)
+        return view.cast(typecode)
+
+    def faction_column(self, field: str):
+        return self.column(f"faction.{field}")
+
+    def region_column(self, field: str):
+        return self.column(f"region.{field}")
+
+    @property
+    def strings(self) -> List[str]:
+        if self._strings is None:
+            data, offsets = self.column("strings"), self.column("strings.offsets")
+            self._strings = [str(data[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(offsets) - 1)]
+        return self._strings
+
+    def faction_ids(self) -> List[str]:
+        strings = self.strings
+        return [strings[i] for i in self.column("faction.id")]
+
+    def region_ids(self) -> List[str]:
+        strings = self.strings
+        return [strings[i] for i in self.column("region.id")]
+
+    def _sets(self, name: str) -> Iterator[set]:
+        strings = self.strings
+        offsets, values = self.column(f"faction.{name}.offsets"), self.column(f"faction.{name}")
+        for i in range(len(offsets) - 1):
+            yield {strings[v] for v in values[offsets[i]:offsets[i + 1]]}
+
+    def to_world(self) -> World:
+        """Builds a regular World from the file."""
+        s = self.strings
+        world = World(factions={}, regions={}, market={
+            s[key]: price for key, price in zip(self.column("market.keys"), self.column("market.prices"))
+        })
+
+        f = {name: self.column(f"faction.{name}") for name in FACTION_FIELDS + ("id", "name", "color", "is_active", "detailed", "detailed_values")}
+        sets = [self._sets(name) for name in FACTION_SETS]
+        for i, (regions, alliances, traits) in enumerate(zip(*sets)):
+            detailed = None
+            if f["detailed"][i]:
+                values = list(f["detailed_values"][i * DETAILED_SIZE:(i + 1) * DETAILED_SIZE])
+                for j in (4, 5, 6):
+                    values[j] = int(values[j])
+                detailed = _ressources(values, 0)
+            faction = _restore_faction(
+                s[f["id"][i]], s[f["name"][i]],
+                Power(f["army"][i], f["navy"][i], f["air"][i]),
+                f["legitimacy"][i],
+                Resources(f["credits"][i], f["materials"][i], f["food"][i], f["energy"][i], f["influence"][i]),
+                detailed,
+                f["knowledge"][i],
+                regions, alliances, traits,
+                s[f["color"][i]],
+                f["is_active"][i] != 0
+            )
+            world.factions[faction.id] = faction
+
+        r = {name: self.column(f"region.{name}") for name in REGION_FIELDS + REGION_INT_FIELDS + ("id", "name", "owner", "environment", "weather")}
+        for i in range(len(r["id"])):
+            owner = r["owner"][i]
+            region = _restore_region(
+                s[r["id"][i]], s[r["name"][i]],
+                r["population"][i],
+                None if owner == NO_OWNER else s[owner],
+                ENVIRONMENTS[r["environment"][i]],
+                RegionSocioEconomic(r["infrastructure"][i], r["cohesion"][i], r["happiness"][i]),
+                WeatherState(WEATHERS[r["weather"][i]], r["weather_intensity"][i], r["weather_duration"][i])
+            )
+            world.regions[region.id] = region
+        return world
+
+
+class ColumnarStore:
+    """Directory of columnar snapshot files, one subdirectory per session."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, session_id: str, tick: int) -> str:
+        return os.path.join(self.root, session_id, f"{tick:010d}{EXTENSION}")
+
+    def save(self, session_id: str, tick: int, payload: bytes):
+        path = self.path(session_id, tick)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so readers never map a half-written file.
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(payload)
+        os.replace(temporary, path)
+
+    def open(self, session_id: str, tick: int) -> Optional[ColumnarSnapshot]:
+        path = self.path(session_id, tick)
+        return ColumnarSnapshot(path) if os.path.exists(path) else None
+
+    def ticks(self, session_id: str) -> List[int]:
+        directory = os.path.join(self.root, session_id)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(int(name[:-len(EXTENSION)]) for name in os.listdir(directory) if name.endswith(EXTENSION))
+
+    def delete(self, session_id: str, ticks):
+        for tick in ticks:
+            path = self.path(session_id, tick)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def delete_after(self, session_id: str, tick: int):
+        for stored in self.ticks(session_id):
+            if stored > tick:
+                os.remove(self.path(session_id, stored))
@@ -0,0 +1,110 @@
+"""zlib compression of stored payloads with per-session preset dictionaries.
+
+Compressed payloads start with a 4-byte header: the magic ``DZ``, a format
+version and a flag byte, followed by a raw deflate stream. The flags tell
+whether the session dictionary was used and whether the original payload was
+text (legacy JSON) rather than bytes.
+"""
+import heapq
+import struct
+import zlib
+from collections import Counter
+from typing import Optional, Sequence, Union
+
+MAGIC = b"DZ"
+VERSION = 1
+
+FLAG_DICTIONARY = 0x01
+FLAG_TEXT = 0x02
+
+HEADER = struct.Struct("<2sBB")
+
+# zlib only looks back 32 KiB, so a larger dictionary is never referenced.
+MAX_DICTIONARY_SIZE = 32_768
+
+
+def is_compressed(payload: Union[bytes, str, None]) -> bool:
+    return isinstance(payload, (bytes, bytearray, memoryview)) and bytes(payload[:2]) == MAGIC
+
+
+def uses_dictionary(payload: bytes) -> bool:
+    return bool(payload[3] & FLAG_DICTIONARY)
+
+
+def compress(payload: Union[bytes, str], zdict: Optional[bytes] = None, level: int = 6) -> bytes:
+    flags = 0
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+        flags |= FLAG_TEXT
+    if zdict:
+        flags |= FLAG_DICTIONARY
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return HEADER.pack(MAGIC, VERSION, flags) + compressor.compress(payload) + compressor.flush()
+
+
+def decompress(payload: bytes, zdict: Optional[bytes] = None) -> Union[bytes, str]:
+    magic, version, flags = HEADER.unpack_from(payload, 0)
+    if magic != MAGIC or version > VERSION:
+        raise ValueError("Not a supported compressed payload")
+    if flags & FLAG_DICTIONARY:
+        if zdict is None:
+            raise ValueError("Payload was compressed with a session dictionary that is not available")
+        decompressor = zlib.decompressobj(-15, zdict=zdict)
+    else:
+        decompressor = zlib.decompressobj(-15)
+    data = decompressor.decompress(memoryview(payload)[HEADER.size:]) + decompressor.flush()
+    return data.decode("utf-8") if flags & FLAG_TEXT else data
+
+
+def train_dictionary(samples: Sequence[Union[bytes, str]], size: int = 16_384, segment: int = 256, dmer: int = 6) -> bytes:
+    """Builds a zlib preset dictionary from sample payloads.
+
+    A simplified COVER selection: segments of the samples are scored by how
+    many samples share each of their dmer-byte substrings, and the best
+    segments are taken greedily until the dictionary is full, discounting
+    substrings that are already covered.
+    """
+    samples = [s.encode("utf-8") if isinstance(s, str) else bytes(s) for s in samples]
+    size = min(size, MAX_DICTIONARY_SIZE)
+
+    # Count each substring once per sample: recurring across ticks is what matters.
+    frequency = Counter()
+    for sample in samples:
+        frequency.update({sample[i:i + dmer] for i in range(len(sample) - dmer + 1)})
+    for key in [key for key, count in frequency.items() if count < 2]:
+        del frequency[key]
+
+    def score(sample: bytes, start: int) -> int:
+        window = sample[start:start + segment]
+        return sum(frequency.get(key, 0) for key in {window[i:i + dmer] for i in range(len(window) - dmer + 1)})
+
+    heap = []
+    step = max(1, segment // 2)
+    for index, sample in enumerate(samples):
+        for start in range(0, max(1, len(sample) - segment + 1), step):
+            value = score(sample, start)
+            if value:
+                heap.append((-value, index, start))
+    heapq.heapify(heap)
+
+    chosen = []
+    total = 0
+    while heap and total < size:
+        _, index, start = heapq.heappop(heap)
+        # Scores only go down as substrings get covered, so a stale entry is re-queued lazily.
+        value = score(samples[index], start)
+        if value <= 0:
+            continue
+        if heap and value < -heap[0][0]:
+            heapq.heappush(heap, (-value, index, start))
+            continue
+        window = samples[index][start:start + segment]
+        chosen.append(window)
+        total += len(window)
+        for i in range(len(window) - dmer + 1):
+            frequency.pop(window[i:i + dmer], None)
+
+    # Deflate encodes short distances more cheaply, so the best segments go last.
+    return b"".join(reversed(chosen))[-size:]
@@ -0,0 +1,235 @@
+"""Conformance checks shared by every storage backend.
+
+Records a short demo run through a backend, then reads it back through the
+StorageBackend API and the time-travel service and compares every answer with
+the worlds the engine held live. Backends that persist are also reopened and
+read again. The same run is then recorded with an adaptive snapshot schedule,
+with coalesced deltas, and as a replay log rebuilt by re-simulation.
+
+Usage: python -m persistence.conformance [ticks] [backend ...]
+"""
+import logging
+import os
+import sys
+import tempfile
+from dataclasses import replace
+from typing import Callable, List
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from core.scheduler import is_structural
+from deltas.types import FactionDelta, WorldDelta
+from scenarios import create_demo_scenario
+from .backend import BACKENDS, StorageBackend, create_backend
+from .codec import load_delta
+from .replay import session_config, verify_session
+from .timetravel import TimeTravelService
+from .writer import CoalescingWriter
+
+SNAPSHOT_INTERVAL = 10
+COALESCE_TICKS = 4
+
+
+class Conformance:
+    def __init__(self, name: str):
+        self.name = name
+        self.checks = 0
+        self.failures: List[str] = []
+
+    def check(self, condition: bool, message: str):
+        self.checks += 1
+        if not condition:
+            self.failures.append(message)
+
+
+def edit_tick(ticks: int) -> int:
+    return ticks // 3
+
+
+def edit(world) -> WorldDelta:
+    """The external edit submitted before edit_tick."""
+    faction_id = next(iter(world.factions))
+    return WorldDelta(faction_deltas={faction_id: FactionDelta(legitimacy=75.0)})
+
+
+def record(persistence: StorageBackend, ticks: int, storage_mode: str = "deltas", adaptive: bool = False):
+    """Runs the demo scenario on persistence and returns (session id, live world per tick)."""
+    engine = SimulationEngine(persistence=persistence)
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, snapshot_interval=SNAPSHOT_INTERVAL, persist_undo=True,
+        storage_mode=storage_mode, replay_snapshot_interval=SNAPSHOT_INTERVAL * 2, adaptive_snapshots=adaptive,
+        min_snapshot_interval=SNAPSHOT_INTERVAL // 2, max_snapshot_interval=SNAPSHOT_INTERVAL * 2,
+        snapshot_replay_budget=SNAPSHOT_INTERVAL * 10
+    ))
+    engine.create_session("conformance")
+    engine.initialize_world(create_demo_scenario())
+    worlds = [engine.world.clone()]
+    for tick in range(1, ticks + 1):
+        if tick == edit_tick(ticks):
+            engine.submit_input(edit(engine.world))
+        engine.step(1)
+        worlds.append(engine.world.clone())
+    engine.flush()
+    return engine.session_id, worlds
+
+
+def check_reads(result: Conformance, persistence: StorageBackend, session_id: str, worlds: list):
+    ticks = len(worlds) - 1
+    metadata = persistence.load_session_metadata(session_id)
+    result.check(metadata is not None and metadata[0] == session_id and metadata[2] == "conformance", "session metadata")
+    result.check(session_id in persistence.list_session_ids(), "list_session_ids")
+    result.check(persistence.load_session_metadata("missing") is None, "metadata of an unknown session")
+    result.check(persistence.get_latest_tick(session_id) == ticks, "get_latest_tick")
+    result.check(tuple(persistence.get_tick_range(session_id)) == (0, ticks), "get_tick_range")
+
+    for tick in range(0, ticks + 1):
+        stored = tick % SNAPSHOT_INTERVAL == 0
+        snapshot = persistence.get_snapshot(session_id, tick)
+        result.check((snapshot == worlds[tick]) if stored else snapshot is None, f"get_snapshot at {tick}")
+        nearest = tick - tick % SNAPSHOT_INTERVAL
+        result.check(persistence.get_nearest_snapshot_tick(session_id, tick) == nearest, f"get_nearest_snapshot_tick at {tick}")
+    for tick in range(0, ticks + 1, SNAPSHOT_INTERVAL):
+        lazy = persistence.get_snapshot(session_id, tick, lazy=True)
+        result.check(lazy is not None and lazy.clone() == worlds[tick], f"lazy get_snapshot at {tick}")
+        nearest = persistence.get_nearest_snapshot(session_id, tick + 1)
+        result.check(nearest is not None and nearest[0] == tick and nearest[1] == worlds[tick], f"get_nearest_snapshot at {tick + 1}")
+
+    deltas = list(persistence.iter_deltas(session_id, 1, ticks))
+    result.check([tick for tick, _ in deltas] == list(range(1, ticks + 1)), "iter_deltas covers every tick")
+    for start, end in ((1, 1), (3, 17), (ticks // 2, ticks), (ticks + 1, ticks + 5)):
+        expected = [payload for tick, payload in deltas if start <= tick <= end]
+        result.check(persistence.get_deltas(session_id, start, end) == expected, f"get_deltas {start}-{end}")
+    decoded = list(persistence.iter_deltas(session_id, 1, 5, batch_size=2, decode=True))
+    result.check([delta for _, delta in decoded] == [load_delta(payload) for _, payload in deltas[:5]], "iter_deltas decode")
+
+    inverses = persistence.get_inverse_deltas(session_id, 1, ticks)
+    result.check(not inverses or [tick for tick, _ in inverses] == list(range(1, ticks + 1)), "get_inverse_deltas")
+    result.check(persistence.get_inputs(session_id, 0, ticks) == [(edit_tick(ticks), [edit(worlds[0])])], "get_inputs")
+
+    time_travel = TimeTravelService(persistence)
+    for tick in (0, 1, SNAPSHOT_INTERVAL - 1, SNAPSHOT_INTERVAL, ticks // 2 + 3, ticks):
+        result.check(time_travel.checkout(session_id, tick) == worlds[tick], f"time travel to {tick}")
+
+
+def check_adaptive(result: Conformance, persistence: StorageBackend, ticks: int):
+    session_id, worlds = record(persistence, ticks, adaptive=True)
+    deltas = dict(persistence.iter_deltas(session_id, 1, ticks, decode=True))
+    inputs = dict(persistence.get_inputs(session_id, 0, ticks))
+    schedule = [0]
+    for tick in range(1, ticks + 1):
+        spacing = tick - schedule[-1]
+        snapshot = persistence.get_snapshot(session_id, tick)
+        if snapshot is not None:
+            result.check(snapshot == worlds[tick] and spacing >= SNAPSHOT_INTERVAL // 2, f"adaptive snapshot at {tick}")
+            schedule.append(tick)
+        else:
+            structural = is_structural(deltas.get(tick)) or any(is_structural(edit) for edit in inputs.get(tick, ()))
+            due = spacing >= SNAPSHOT_INTERVAL * 2 or (structural and spacing >= SNAPSHOT_INTERVAL // 2)
+            result.check(not due, f"adaptive schedule at {tick}")
+        result.check(persistence.get_nearest_snapshot_tick(session_id, tick) == schedule[-1], f"adaptive get_nearest_snapshot_tick at {tick}")
+    result.check(len(schedule) > 1 + ticks // (SNAPSHOT_INTERVAL * 2), "adaptive schedule snapshots early")
+    time_travel = TimeTravelService(persistence)
+    for tick in range(ticks, -1, -1):
+        result.check(time_travel.checkout(session_id, tick) == worlds[tick], f"time travel to {tick} on an adaptive schedule")
+
+
+def check_coalesced(result: Conformance, persistence: StorageBackend, session_id: str, worlds: list):
+    """Records the run of session_id again, with its seed and edit, coalescing its deltas."""
+    ticks = len(worlds) - 1
+    engine = SimulationEngine(persistence=persistence)
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=session_config(persistence, session_id).simulation.seed,
+        snapshot_interval=SNAPSHOT_INTERVAL, adaptive_snapshots=False
+    ))
+    engine.writer = CoalescingWriter(engine.writer, COALESCE_TICKS)
+    engine.create_session("coalesced")
+    engine.initialize_world(create_demo_scenario())
+    engine.step(edit_tick(ticks) - 1)
+    engine.submit_input(edit(engine.world))
+    engine.step(ticks - edit_tick(ticks) + 1)
+    coalesced = engine.session_id
+
+    stored = [tick for tick, _ in persistence.iter_deltas(coalesced, 1, ticks)]
+    result.check(stored[-1] == ticks and ticks / COALESCE_TICKS <= len(stored) < ticks, "coalesced deltas")
+    result.check(persistence.get_inputs(coalesced, 0, ticks) == [(edit_tick(ticks), [edit(worlds[0])])], "get_inputs of coalesced deltas")
+    time_travel = TimeTravelService(persistence)
+    previous = 0
+    for tick in stored:
+        result.check(tick - previous <= COALESCE_TICKS and persistence.get_coalesced_range(coalesced, tick) is None, f"coalesced range ending at {tick}")
+        for inner in range(previous + 1, tick):
+            result.check(persistence.get_coalesced_range(coalesced, inner) == (previous + 1, tick), f"get_coalesced_range at {inner}")
+        result.check(time_travel.checkout(coalesced, tick) == worlds[tick], f"time travel to coalesced tick {tick}")
+        previous = tick
+
+    try:
+        tick = engine.rewind(1)
+    except NotImplementedError:
+        return
+    result.check(persistence.get_latest_tick(coalesced) == tick and engine.world == worlds[tick], "rewind into a coalesced range")
+
+
+def check_replay(result: Conformance, persistence: StorageBackend, ticks: int):
+    session_id, worlds = record(persistence, ticks, storage_mode="replay")
+    result.check(not list(persistence.iter_deltas(session_id, 1, ticks)), "replay log stores no deltas")
+    result.check(persistence.get_latest_tick(session_id) == ticks, "get_latest_tick of a replay log")
+    result.check(persistence.get_inputs(session_id, 0, ticks) == [(edit_tick(ticks), [edit(worlds[0])])], "get_inputs of a replay log")
+    time_travel = TimeTravelService(persistence)
+    for tick in range(ticks, -1, -1):
+        result.check(time_travel.checkout(session_id, tick) == worlds[tick], f"re-simulation to {tick}")
+    report = verify_session(persistence, session_id)
+    result.check(report.diverged is None and report.ticks == ticks - ticks % (SNAPSHOT_INTERVAL * 2), "verify_session")
+
+
+def check_truncate(result: Conformance, persistence: StorageBackend, session_id: str, worlds: list):
+    ticks = len(worlds) - 1
+    target = ticks // 2 + 1
+    try:
+        persistence.truncate_session(session_id, target)
+    except NotImplementedError:
+        return
+    result.check(persistence.get_latest_tick(session_id) == target, "get_latest_tick after truncate_session")
+    result.check([tick for tick, _ in persistence.iter_deltas(session_id, 1, ticks)] == list(range(1, target + 1)), "iter_deltas after truncate_session")
+    result.check(persistence.get_nearest_snapshot_tick(session_id, ticks) == target - target % SNAPSHOT_INTERVAL, "snapshots after truncate_session")
+    # Recording continues from the truncation point.
+    step = persistence.prepare_step(session_id, target + 1, None, worlds[target])
+    persistence.save_steps([step])
+    result.check(persistence.get_snapshot(session_id, target + 1) == worlds[target], "save after truncate_session")
+
+
+def run(name: str, factory: Callable[[], StorageBackend], reopen: bool, ticks: int = 60) -> Conformance:
+    """factory opens the backend; with reopen, a second call opens what the first one stored."""
+    result = Conformance(name)
+    persistence = factory()
+    session_id, worlds = record(persistence, ticks)
+    check_reads(result, persistence, session_id, worlds)
+    if reopen:
+        persistence.close()
+        persistence = factory()
+        check_reads(result, persistence, session_id, worlds)
+    check_adaptive(result, persistence, ticks)
+    check_coalesced(result, persistence, session_id, worlds)
+    check_replay(result, persistence, ticks)
+    check_truncate(result, persistence, session_id, worlds)
+    persistence.close()
+    return result
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    args = sys.argv[1:]
+    ticks = int(args.pop(0)) if args and args[0].isdigit() else 60
+    failed = False
+    for name in args or BACKENDS:
+        with tempfile.TemporaryDirectory() as directory:
+            config = PersistenceConfig(backend=name)
+            path = os.path.join(directory, "conformance.db" if name == "sqlite" else "conformance")
+            result = run(name, lambda: create_backend(path, config), reopen=name != "memory", ticks=ticks)
+        failed = failed or bool(result.failures)
+        print(f"{name}: {result.checks - len(result.failures)}/{result.checks} checks passed")
+        for failure in result.failures:
+            print(f"  FAILED {failure}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+from core.defaults import PersistenceConfig
+
+
+class ConnectionPool:
+    """One long-lived writer connection plus a bounded pool of read-only connections."""
+
+    def __init__(self, db_path: str, config: Optional[PersistenceConfig] = None):
+        self.db_path = db_path
+        self.config = config or PersistenceConfig()
+        self.in_memory = db_path == ":memory:" or db_path.startswith("file::memory:")
+
+        self._write_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all_readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+
+    def _apply_pragmas(self, conn: sqlite3.Connection, read_only: bool):
+        cfg = self.config
+        conn.execute(f"PRAGMA busy_timeout = {int(cfg.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA cache_size = {-int(cfg.cache_size_kib)}")
+        conn.execute(f"PRAGMA mmap_size = {int(cfg.mmap_size)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if not read_only:
+            # Only takes effect on a new database; PersistenceManager.vacuum() converts older ones.
+            conn.execute(f"PRAGMA auto_vacuum = {cfg.auto_vacuum}")
+            if not self.in_memory:
+                conn.execute(f"PRAGMA journal_mode = {cfg.journal_mode}")
+            conn.execute(f"PRAGMA synchronous = {cfg.synchronous}")
+
+    def _open_writer(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, uri=self.db_path.startswith("file:"))
+        self._apply_pragmas(conn, read_only=False)
+        return conn
+
+    def _open_reader(self) -> sqlite3.Connection:
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._apply_pragmas(conn, read_only=True)
+        return conn
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed.")
+        if self._writer is None:
+            self._writer = self._open_writer()
+        return self._writer
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        with self._write_lock:
+            conn = self._get_writer()
+            with conn:
+                yield conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        # An in-memory database is private to its connection, so reads share the writer.
+        if self.in_memory or self.config.read_pool_size <= 0:
+            with self._write_lock:
+                yield self._get_writer()
+            return
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._readers.put(conn)
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed.")
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        if len(self._all_readers) < self.config.read_pool_size:
+            # Make sure the file and schema exist before opening it read-only. The
+            # write lock is taken first and on its own, so two threads cannot both
+            # open a writer, and no thread waits for it while holding _readers_lock.
+            with self._write_lock:
+                self._get_writer()
+        with self._readers_lock:
+            if len(self._all_readers) < self.config.read_pool_size:
+                conn = self._open_reader()
+                self._all_readers.append(conn)
+                return conn
+
+        return self._readers.get()
+
+    def close(self):
+        self._closed = True
+        with self._readers_lock:
+            while True:
+                try:
+                    self._readers.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._all_readers.clear()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
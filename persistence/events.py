@@ -0,0 +1,54 @@
+"""Structured rows of the event messages recorded in deltas.
+
+Systems tag each message with a kind and up to two entity ids when they add
+it to a delta. Deltas recorded before tags existed only have the message; its
+kind is then read from the upper-case prefix most messages start with, and
+the entity id named in parentheses, when the message of that kind has one.
+"""
+import re
+from typing import List, Optional, Tuple
+
+from deltas.types import WorldDelta
+
+# (kind, primary entity id, secondary entity id, message) of one event.
+EventRow = Tuple[str, Optional[str], Optional[str], str]
+
+_PREFIX = re.compile(r"^\W*([A-Z][A-Z ]*[A-Z]):")
+_WORD = re.compile(r"\w+\*?")
+_ENTITY = re.compile(r"\(([\w-]+)\)")
+
+# Kinds whose message names their primary entity as "Name (id)".
+_NAMED_KINDS = frozenset({"insurrection", "revolt", "collapse", "revolution", "civil_war", "new_faction", "coup"})
+
+
+def event_kind(message: str) -> str:
+    """Kind of an untagged message, from its upper-case prefix ("REVOLT: ..." is "revolt")."""
+    match = _PREFIX.match(message)
+    return match.group(1).lower().replace(" ", "_") if match else "event"
+
+
+def _untagged_row(message: str) -> EventRow:
+    kind = event_kind(message)
+    match = _ENTITY.search(message) if kind in _NAMED_KINDS else None
+    return kind, match.group(1) if match else None, None, message
+
+
+def event_rows(delta: Optional[WorldDelta]) -> List[EventRow]:
+    if delta is None or not delta.events:
+        return []
+    if len(delta.event_tags) == len(delta.events):
+        return [(tag.kind, tag.primary, tag.secondary, message) for tag, message in zip(delta.event_tags, delta.events)]
+    return [_untagged_row(message) for message in delta.events]
+
+
+def match_query(text: str) -> Optional[str]:
+    """FTS5 query matching messages that hold every word of text. A trailing * matches a prefix.
+
+    Words are quoted, so operators and punctuation typed by a user are never
+    parsed as query syntax. None when text has no word.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        prefix = word.endswith("*")
+        terms.append(f'"{word.rstrip("*")}"' + ("*" if prefix else ""))
+    return " ".join(terms) or None
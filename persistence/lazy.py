@@ -0,0 +1,143 @@
+"""Read-only worlds backed by stored binary snapshots.
+
+Loading a LazyWorld only indexes where each faction and region record starts.
+An entity is decoded the first time it is looked up, and column() reads one
+numeric field of every entity straight from the encoded records, so the cost of
+a read follows how much of the world it touches rather than the world's size.
+"""
+import struct
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from domains.faction import Faction
+from domains.region import Region
+from domains.world import World
+from .codec import (
+    FACTION_FIELD_OFFSETS, REGION_FIELD_OFFSETS,
+    decode_faction, decode_region, faction_fixed_offset, region_fixed_offset,
+    record_id, world_sections, world_diff_sections,
+)
+
+
+class LazyEntities(Mapping):
+    """Id to entity mapping over encoded records that decodes each entity on first access."""
+
+    def __init__(
+        self, decode: Callable[[bytes, int], Any], fixed_offset: Callable[[bytes, int], int],
+        fields: Dict[str, Tuple[int, str]]
+    ):
+        self._decode = decode
+        self._fixed_offset = fixed_offset
+        self._fields = fields
+        self._records: Dict[str, Tuple[bytes, int]] = {}
+        self._decoded: Dict[str, Any] = {}
+
+    def index(self, buf: bytes, records: List[Tuple[int, int]]):
+        """Adds or replaces the entities stored at the given (offset, length) records of buf."""
+        for offset, _ in records:
+            key = record_id(buf, offset)
+            self._records[key] = (buf, offset)
+            self._decoded.pop(key, None)
+
+    def remove(self, keys: List[str]):
+        for key in keys:
+            self._records.pop(key, None)
+            self._decoded.pop(key, None)
+
+    def __getitem__(self, key: str) -> Any:
+        entity = self._decoded.get(key)
+        if entity is None:
+            buf, offset = self._records[key]
+            entity = self._decoded[key] = self._decode(buf, offset)
+        return entity
+
+    def __contains__(self, key) -> bool:
+        return key in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def decoded_count(self) -> int:
+        return len(self._decoded)
+
+    def column(self, field: str) -> Dict[str, float]:
+        """Value of one numeric field for every entity, read without decoding any of them."""
+        try:
+            offset, fmt = self._fields[field]
+        except KeyError:
+            raise ValueError(f"Unknown column '{field}'. Expected one of: {', '.join(self._fields)}") from None
+        unpack = struct.Struct("<" + fmt).unpack_from
+        return {
+            key: unpack(buf, self._fixed_offset(buf, pos) + offset)[0]
+            for key, (buf, pos) in self._records.items()
+        }
+
+    def materialize(self) -> Dict[str, Any]:
+        """Freshly decoded copies of every entity, independent of the view."""
+        return {key: self._decode(buf, offset) for key, (buf, offset) in self._records.items()}
+
+    def copy(self) -> "LazyEntities":
+        clone = LazyEntities(self._decode, self._fixed_offset, self._fields)
+        clone._records = dict(self._records)
+        clone._decoded = dict(self._decoded)
+        return clone
+
+
+class LazyWorld:
+    """Stand-in for a World that must not be modified, built from binary snapshot payloads.
+
+    factions and regions behave like the dicts of a World. Entities are decoded
+    on first access and kept, so repeated lookups are free. clone() returns a
+    regular World.
+    """
+    __slots__ = ("factions", "regions", "market")
+
+    def __init__(self, factions: LazyEntities, regions: LazyEntities, market: Dict[str, float]):
+        self.factions = factions
+        self.regions = regions
+        self.market = market
+
+    @classmethod
+    def from_payload(cls, buf: bytes) -> "LazyWorld":
+        """Indexes a binary keyframe snapshot."""
+        buf = bytes(buf)
+        market, factions, regions = world_sections(buf)
+        world = cls(
+            LazyEntities(decode_faction, faction_fixed_offset, FACTION_FIELD_OFFSETS),
+            LazyEntities(decode_region, region_fixed_offset, REGION_FIELD_OFFSETS),
+            market
+        )
+        world.factions.index(buf, factions)
+        world.regions.index(buf, regions)
+        return world
+
+    def apply_diff(self, buf: bytes) -> "LazyWorld":
+        """Patches the index in place with a binary diff snapshot and returns the view."""
+        buf = bytes(buf)
+        self.market, factions, removed_factions, regions, removed_regions = world_diff_sections(buf)
+        self.factions.index(buf, factions)
+        self.factions.remove(removed_factions)
+        self.regions.index(buf, regions)
+        self.regions.remove(removed_regions)
+        return self
+
+    def get_faction(self, faction_id: str) -> Optional[Faction]:
+        return self.factions.get(faction_id)
+
+    def get_region(self, region_id: str) -> Optional[Region]:
+        return self.regions.get(region_id)
+
+    def copy(self) -> "LazyWorld":
+        """Another view over the same payloads, so patching one leaves the other intact."""
+        return LazyWorld(self.factions.copy(), self.regions.copy(), dict(self.market))
+
+    def clone(self) -> World:
+        return World(
+            factions=self.factions.materialize(),
+            regions=self.regions.materialize(),
+            market=dict(self.market)
+        )
@@ -0,0 +1,297 @@
+"""Append-only log storage backend.
+
+Each session is a directory of numbered segment files holding tick-ordered
+records: a (kind, tick, length) header followed by the encoded payload. Every
+save appends one batch of records plus a commit record to the newest segment,
+and a new segment starts once the current one passes log_segment_mib. Nothing
+is ever rewritten, so writes cost one sequential append.
+
+A sparse index file next to the segments holds the position of every snapshot
+and of a batch roughly every log_index_interval ticks. Reads seek to the
+closest indexed batch and scan forward from there. A log is opened the first
+time its session is used and scanned from the last indexed batch; records
+after the last commit are cut off, which drops a batch that was only partly
+written when the process died. At most open_session_files logs stay open, the
+least recently used being closed first.
+"""
+import json
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.defaults import PersistenceConfig
+from .backend import RecordBackend, RECORD_TICK, RECORD_SNAPSHOT
+
+RECORD_COMMIT = 255
+
+# kind, tick, payload length
+RECORD = struct.Struct("<BqI")
+# kind, tick, segment, offset
+INDEX = struct.Struct("<BqIQ")
+
+SEGMENT_EXTENSION = ".seg"
+INDEX_FILE = "index.idx"
+SESSIONS_FILE = "sessions.jsonl"
+
+
+class _SessionLog:
+    __slots__ = (
+        "directory", "position_ticks", "positions", "snapshot_ticks", "snapshots",
+        "first", "last", "last_indexed", "segment", "size", "handle", "index_handle"
+    )
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Sorted first ticks of indexed batches and where those batches start.
+        self.position_ticks: List[int] = []
+        self.positions: List[Tuple[int, int]] = []
+        self.snapshot_ticks: List[int] = []
+        self.snapshots: Dict[int, Tuple[int, int]] = {}
+        self.first: Optional[int] = None
+        self.last: Optional[int] = None
+        self.last_indexed: Optional[int] = None
+        # Segment being appended to and its committed size; readers stop there.
+        self.segment = 0
+        self.size = 0
+        self.handle = None
+        self.index_handle = None
+
+    def add_entry(self, kind: int, tick: int, segment: int, offset: int):
+        if kind == RECORD_SNAPSHOT:
+            if tick not in self.snapshots:
+                self.snapshots[tick] = (segment, offset)
+                self.snapshot_ticks.append(tick)
+        else:
+            self.position_ticks.append(tick)
+            self.positions.append((segment, offset))
+            self.last_indexed = tick
+            if self.first is None:
+                self.first = tick
+
+
+def _segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"{segment:08d}{SEGMENT_EXTENSION}")
+
+
+class LogBackend(RecordBackend):
+    """Sessions stored as append-only segmented logs under a root directory."""
+
+    def __init__(self, root: str, config: Optional[PersistenceConfig] = None):
+        super().__init__(config)
+        self.root = root
+        self.segment_bytes = max(1, self.config.log_segment_mib) * 1024 * 1024
+        self.index_interval = max(1, self.config.log_index_interval)
+        self.sync = self.config.synchronous.upper() in ("FULL", "EXTRA")
+        # Open logs, least recently used first. Appends hold the lock, so a log is never closed mid-write.
+        self._logs: "OrderedDict[str, _SessionLog]" = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+        self._sessions_path = os.path.join(root, SESSIONS_FILE)
+        if os.path.exists(self._sessions_path):
+            with open(self._sessions_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        row = tuple(json.loads(line))
+                    except ValueError:
+                        # A line cut short by a crash; the session was never handed out.
+                        continue
+                    self.sessions[row[0]] = row
+
+    def _write(self, handle, data: bytes):
+        handle.write(data)
+        handle.flush()
+        if self.sync:
+            os.fsync(handle.fileno())
+
+    def _store_session(self, row: tuple):
+        with open(self._sessions_path, "ab") as f:
+            self._write(f, (json.dumps(list(row)) + "\n").encode("utf-8"))
+        os.makedirs(os.path.join(self.root, row[0]), exist_ok=True)
+
+    def _log(self, session_id: str) -> Optional[_SessionLog]:
+        if session_id not in self.sessions:
+            return None
+        with self._lock:
+            log = self._logs.get(session_id)
+            if log is None:
+                log = self._logs[session_id] = self._open_log(session_id)
+                while len(self._logs) > max(1, self.config.open_session_files):
+                    self._close_log(self._logs.popitem(last=False)[1])
+            self._logs.move_to_end(session_id)
+            return log
+
+    @staticmethod
+    def _close_log(log: _SessionLog):
+        for handle in (log.handle, log.index_handle):
+            if handle is not None and not handle.closed:
+                handle.close()
+
+    def _open_log(self, session_id: str) -> _SessionLog:
+        log = _SessionLog(os.path.join(self.root, session_id))
+        os.makedirs(log.directory, exist_ok=True)
+        index_path = os.path.join(log.directory, INDEX_FILE)
+        data = b""
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                data = f.read()
+        stored = [INDEX.unpack_from(data, i) for i in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+
+        segments = sorted(
+            int(name[:-len(SEGMENT_EXTENSION)]) for name in os.listdir(log.directory) if name.endswith(SEGMENT_EXTENSION)
+        )
+        sizes = {segment: os.path.getsize(_segment_path(log.directory, segment)) for segment in segments}
+        # Entries pointing past the data on disk were indexed but their batch never reached the disk.
+        entries = [entry for entry in stored if entry[3] < sizes.get(entry[2], 0)]
+
+        # Scan from the last indexed batch, stepping back while that batch turns out to be incomplete.
+        while True:
+            positions = [entry for entry in entries if entry[0] != RECORD_SNAPSHOT]
+            start = (positions[-1][2], positions[-1][3]) if positions else (segments[0] if segments else 0, 0)
+            last_indexed = positions[-1][1] if positions else None
+            committed, last = start, None
+            scanned: List[Tuple[int, int, int, int]] = []
+            batch: List[Tuple[int, int, int, int]] = []
+            for kind, tick, segment, offset, _ in self._records(log.directory, *start):
+                if kind == RECORD_COMMIT:
+                    if batch and (last_indexed is None or tick - last_indexed >= self.index_interval):
+                        scanned.append(batch[0])
+                        last_indexed = batch[0][1]
+                    scanned.extend(entry for entry in batch[1:] if entry[0] == RECORD_SNAPSHOT)
+                    batch = []
+                    committed, last = (segment, offset + RECORD.size), tick
+                elif not batch:
+                    batch.append((RECORD_TICK, tick, segment, offset))
+                if kind == RECORD_SNAPSHOT:
+                    batch.append((kind, tick, segment, offset))
+            if last is not None or not positions:
+                break
+            entries = [entry for entry in entries if (entry[2], entry[3]) < start]
+
+        # Cut off what follows the last commit.
+        segment, size = committed
+        path = _segment_path(log.directory, segment)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        for later in segments:
+            if later > segment:
+                os.remove(_segment_path(log.directory, later))
+
+        known = {(entry[2], entry[3]) for entry in entries}
+        entries += [entry for entry in scanned if (entry[2], entry[3]) not in known]
+        entries = sorted((entry for entry in entries if (entry[2], entry[3]) < committed), key=lambda entry: (entry[2], entry[3]))
+        for entry in entries:
+            log.add_entry(*entry)
+        log.last = last
+
+        if entries != stored or len(data) != len(stored) * INDEX.size:
+            temporary = f"{index_path}.tmp"
+            with open(temporary, "wb") as f:
+                self._write(f, b"".join(INDEX.pack(*entry) for entry in entries))
+            os.replace(temporary, index_path)
+
+        log.segment, log.size = segment, size
+        log.handle = open(path, "ab")
+        log.index_handle = open(index_path, "ab")
+        return log
+
+    def _records(
+        self, directory: str, segment: int, offset: int,
+        limit: Optional[Tuple[int, int]] = None, payload_kind: Optional[int] = None
+    ) -> Iterator[Tuple[int, int, int, int, Optional[bytes]]]:
+        """Yields (kind, tick, segment, offset, payload) from a position on.
+
+        Payloads are only read for records of payload_kind. Scanning stops at
+        limit, a (segment, size) end, or at the first incomplete record.
+        """
+        while True:
+            path = _segment_path(directory, segment)
+            if not os.path.exists(path):
+                return
+            end = limit[1] if limit is not None and segment == limit[0] else None
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while end is None or offset < end:
+                    header = f.read(RECORD.size)
+                    if len(header) < RECORD.size:
+                        break
+                    kind, tick, length = RECORD.unpack(header)
+                    payload = None
+                    if kind == payload_kind:
+                        payload = f.read(length)
+                        if len(payload) < length:
+                            return
+                    else:
+                        f.seek(length, os.SEEK_CUR)
+                    yield kind, tick, segment, offset, payload
+                    offset += RECORD.size + length
+            if limit is not None and segment >= limit[0]:
+                return
+            segment, offset = segment + 1, 0
+
+    def _append(self, records: Dict[str, List[Tuple[int, int, bytes]]]):
+        with self._lock:
+            for session_id, entries in records.items():
+                self._append_session(self._log(session_id), entries)
+
+    def _append_session(self, log: _SessionLog, entries: List[Tuple[int, int, bytes]]):
+        if log.size >= self.segment_bytes:
+            log.handle.close()
+            log.segment, log.size = log.segment + 1, 0
+            log.handle = open(_segment_path(log.directory, log.segment), "ab")
+
+        data = bytearray()
+        index: List[Tuple[int, int, int, int]] = []
+        first_tick, last_tick = entries[0][1], entries[-1][1]
+        if log.last_indexed is None or last_tick - log.last_indexed >= self.index_interval:
+            index.append((RECORD_TICK, first_tick, log.segment, log.size))
+        for kind, tick, payload in entries:
+            if kind == RECORD_SNAPSHOT:
+                index.append((kind, tick, log.segment, log.size + len(data)))
+            data += RECORD.pack(kind, tick, len(payload))
+            data += payload
+        data += RECORD.pack(RECORD_COMMIT, last_tick, 0)
+
+        self._write(log.handle, data)
+        if index:
+            self._write(log.index_handle, b"".join(INDEX.pack(*entry) for entry in index))
+        for entry in index:
+            log.add_entry(*entry)
+        log.size += len(data)
+        log.last = last_tick
+
+    def _read(self, session_id: str, kind: int, start_tick: int, end_tick: int) -> Iterator[Tuple[int, bytes]]:
+        # Readers keep the log they started with; closing it only closes its append handles.
+        log = self._log(session_id)
+        if log is None or not log.positions:
+            return
+        limit = (log.segment, log.size)
+        if kind == RECORD_SNAPSHOT:
+            ticks = log.snapshot_ticks
+            for tick in ticks[bisect_left(ticks, start_tick):bisect_right(ticks, end_tick)]:
+                for _, _, _, _, payload in self._records(log.directory, *log.snapshots[tick], limit, kind):
+                    yield tick, payload
+                    break
+            return
+        i = max(0, bisect_right(log.position_ticks, start_tick) - 1)
+        for record_kind, tick, _, _, payload in self._records(log.directory, *log.positions[i], limit, kind):
+            if tick > end_tick:
+                return
+            if record_kind == kind and tick >= start_tick:
+                yield tick, payload
+
+    def _bounds(self, session_id: str) -> Tuple[Optional[int], Optional[int]]:
+        log = self._log(session_id)
+        return (log.first, log.last) if log else (None, None)
+
+    def _snapshot_ticks(self, session_id: str) -> List[int]:
+        log = self._log(session_id)
+        return log.snapshot_ticks if log else []
+
+    def close(self):
+        with self._lock:
+            while self._logs:
+                self._close_log(self._logs.popitem()[1])
@@ -1,22 +1,91 @@
+import gzip
+import os
+import shutil
 import sqlite3
+import tempfile
+import threading
 import time
 import uuid
-from typing import Optional, List
-from .serializer import to_json
-from deltas.types import WorldDelta
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, List, Dict, Iterable, Iterator, Set, Tuple, Union
+from .serializer import to_json, from_json, inputs_from_data
+from .compression import compress, decompress, is_compressed, uses_dictionary, train_dictionary
+from .codec import (
+    get_encoders, is_binary, is_manifest, load_delta, load_world, encode_faction, encode_region,
+    encode_world_records, encode_world_diff, encode_world_manifest, world_manifest_sections, record_hash, apply_world_diff,
+)
+from .backend import PendingStep, StorageBackend, SNAPSHOT_KEYFRAME, SNAPSHOT_DIFF
+from .columnar import ColumnarSnapshot, ColumnarStore, encode_columnar
+from .connection import ConnectionPool
+from .events import EventRow, event_rows, match_query
+from .lazy import LazyWorld
+from .timeseries import TickMetrics, TimeSeries, FACTION_COLUMNS, WORLD_COLUMNS, rollup_columns
+from deltas.types import WorldDelta, InverseDelta
 from domains.world import World
-from core.defaults import Defaults
+from core.defaults import Defaults, PersistenceConfig
 
-class PersistenceManager:
-    def __init__(self, db_path: str = "simulation.db"):
+# Raw table, rollup table, value columns and entity key column of each time series.
+FACTION_SERIES = ("faction_timeseries", "faction_rollups", FACTION_COLUMNS, "faction_id")
+WORLD_SERIES = ("world_timeseries", "world_rollups", WORLD_COLUMNS, None)
+
+# Every table holding rows of a session, with its session column, in insertion order.
+SESSION_TABLES = (
+    ("sessions", "id"), ("ticks", "session_id"), ("deltas", "session_id"), ("delta_ranges", "session_id"),
+    ("snapshots", "session_id"), ("inverse_deltas", "session_id"), ("inputs", "session_id"), ("session_dictionaries", "session_id"),
+    ("faction_timeseries", "session_id"), ("world_timeseries", "session_id"),
+    ("faction_rollups", "session_id"), ("world_rollups", "session_id"),
+    ("backfill_progress", "session_id"), ("compactions", "session_id"), ("events", "session_id"), ("seeds", "session_id"),
+)
+ARCHIVE_EXTENSION = ".db.gz"
+
+
+@dataclass
+class SnapshotChain:
+    # Encoded entity records of the last snapshot written for a session, used to diff the next one.
+    tick: int
+    since_keyframe: int
+    factions: Dict[str, bytes]
+    regions: Dict[str, bytes]
+
+
+class PersistenceManager(StorageBackend):
+    records_metrics = True
+
+    def __init__(self, db_path: str = "simulation.db", config: Optional[PersistenceConfig] = None):
         self.db_path = db_path
+        self.config = config or PersistenceConfig()
+        self.connections = ConnectionPool(db_path, self.config)
+        self.columns: Optional[ColumnarStore] = None
+        if self.config.columnar_snapshots:
+            if not self.config.columnar_path and self.connections.in_memory:
+                raise ValueError("columnar_snapshots needs a columnar_path when the database is in memory.")
+            self.columns = ColumnarStore(self.config.columnar_path or f"{db_path}.columns")
+        self.archive_path: Optional[str] = self.config.archive_path or (None if self.connections.in_memory else f"{db_path}.archive")
+        self.encode_delta, self.encode_world = get_encoders(self.config.codec)
+        self._chains: Dict[str, SnapshotChain] = {}
+        self._lineages: Dict[str, List[Tuple[str, Optional[int]]]] = {}
+        self._dictionaries: Dict[str, bytes] = {}
+        self._dictionary_samples: Dict[str, List[Union[bytes, str]]] = {}
+        # Dictionaries being trained in the background; the list gets the result.
+        self._dictionary_training: Dict[str, List[bytes]] = {}
+        self._bundled_dictionary: Optional[bytes] = None
+        # Entity records of snapshot manifests by content hash, most recently used last.
+        self._blob_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self._blob_lock = threading.Lock()
+        if self.config.dictionary_path:
+            with open(self.config.dictionary_path, "rb") as f:
+                self._bundled_dictionary = f.read()
         self.init_schema()
         
     def get_connection(self):
-        return sqlite3.connect(self.db_path)
+        return self.connections.writer()
+
+    def close(self):
+        self.connections.close()
         
     def init_schema(self):
-        with self.get_connection() as conn:
+        with self.connections.writer() as conn:
             conn.executescript("""
             CREATE TABLE IF NOT EXISTS sessions (
                 id TEXT PRIMARY KEY,
@@ -37,122 +106,1539 @@ class PersistenceManager:
                 session_id TEXT,
                 tick_number INTEGER,
                 delta_json TEXT,
+                PRIMARY KEY (session_id, tick_number),
                 FOREIGN KEY(session_id, tick_number) REFERENCES ticks(session_id, tick_number)
             );
 
+            -- Deltas that coalesce the ticks first_tick..tick_number, stored at tick_number.
+            CREATE TABLE IF NOT EXISTS delta_ranges (
+                session_id TEXT,
+                tick_number INTEGER,
+                first_tick INTEGER NOT NULL,
+                PRIMARY KEY (session_id, tick_number)
+            ) WITHOUT ROWID;
+
             CREATE TABLE IF NOT EXISTS snapshots (
                 session_id TEXT,
                 tick_number INTEGER,
                 world_json TEXT,
+                kind INTEGER NOT NULL DEFAULT 0,
+                base_tick INTEGER,
                 PRIMARY KEY (session_id, tick_number),
                 FOREIGN KEY(session_id, tick_number) REFERENCES ticks(session_id, tick_number)
             );
+
+            CREATE TABLE IF NOT EXISTS inverse_deltas (
+                session_id TEXT,
+                tick_number INTEGER,
+                inverse_json TEXT,
+                PRIMARY KEY (session_id, tick_number)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS inputs (
+                session_id TEXT,
+                tick_number INTEGER,
+                inputs_json TEXT,
+                PRIMARY KEY (session_id, tick_number)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS seeds (
+                session_id TEXT,
+                tick_number INTEGER,
+                seed INTEGER,
+                PRIMARY KEY (session_id, tick_number)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS session_dictionaries (
+                session_id TEXT PRIMARY KEY,
+                zdict BLOB NOT NULL,
+                created_at REAL,
+                FOREIGN KEY(session_id) REFERENCES sessions(id)
+            );
+
+            CREATE TABLE IF NOT EXISTS session_factions (
+                session_id TEXT,
+                faction_id TEXT,
+                name TEXT,
+                color TEXT,
+                PRIMARY KEY (session_id, faction_id)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS faction_timeseries (
+                session_id TEXT,
+                tick_number INTEGER,
+                faction_id TEXT,
+                army REAL,
+                navy REAL,
+                air REAL,
+                legitimacy REAL,
+                credits REAL,
+                materials REAL,
+                food REAL,
+                energy REAL,
+                influence REAL,
+                knowledge REAL,
+                region_count INTEGER,
+                population INTEGER,
+                is_active INTEGER,
+                PRIMARY KEY (session_id, tick_number, faction_id)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS world_timeseries (
+                session_id TEXT,
+                tick_number INTEGER,
+                active_factions INTEGER,
+                region_count INTEGER,
+                population INTEGER,
+                total_power REAL,
+                average_legitimacy REAL,
+                credits REAL,
+                materials REAL,
+                food REAL,
+                energy REAL,
+                influence REAL,
+                PRIMARY KEY (session_id, tick_number)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS backfill_progress (
+                session_id TEXT PRIMARY KEY,
+                last_tick INTEGER,
+                updated_at REAL
+            );
+
+            CREATE TABLE IF NOT EXISTS compactions (
+                session_id TEXT PRIMARY KEY,
+                tick_number INTEGER NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS entity_blobs (
+                hash BLOB PRIMARY KEY,
+                record BLOB NOT NULL
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS events (
+                session_id TEXT,
+                tick_number INTEGER,
+                seq INTEGER,
+                kind TEXT NOT NULL,
+                primary_id TEXT,
+                secondary_id TEXT,
+                message TEXT NOT NULL,
+                PRIMARY KEY (session_id, tick_number, seq)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_events_kind ON events(session_id, kind, tick_number);
+            CREATE INDEX IF NOT EXISTS idx_events_primary ON events(session_id, primary_id, tick_number);
+            CREATE INDEX IF NOT EXISTS idx_events_secondary ON events(session_id, secondary_id, tick_number);
+
+            -- Full-text index of the messages, kept in step with events by the triggers below.
+            CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(message, content='events', content_rowid='rowid');
+
+            CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+                INSERT INTO events_fts (rowid, message) VALUES (new.rowid, new.message);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+                INSERT INTO events_fts (events_fts, rowid, message) VALUES ('delete', old.rowid, old.message);
+            END;
+
+            CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions(created_at);
             """)
+            for series in (FACTION_SERIES, WORLD_SERIES):
+                conn.execute(self._rollup_table_sql(series))
+            self._migrate_schema(conn)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_snapshots_keyframes ON snapshots(session_id, tick_number) WHERE kind = 0"
+            )
+
+    def _rollup_table_sql(self, series: tuple) -> str:
+        # One row per bucket of `level` ticks: sample count plus min, max and sum of every column.
+        _, rollups, columns, key = series
+        keys = ["session_id TEXT", "level INTEGER"] + ([f"{key} TEXT"] if key else []) + ["bucket INTEGER", "samples INTEGER"]
+        primary = ", ".join(["session_id", "level"] + ([key] if key else []) + ["bucket"])
+        values = [f"{c} REAL" for c in rollup_columns(columns)]
+        return f"CREATE TABLE IF NOT EXISTS {rollups} ({', '.join(keys + values)}, PRIMARY KEY ({primary})) WITHOUT ROWID"
+
+    def _migrate_schema(self, conn: sqlite3.Connection):
+        # Databases created before deltas had a primary key still need a (session, tick) index.
+        has_pk = any(row[5] for row in conn.execute("PRAGMA table_info(deltas)"))
+        if not has_pk:
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_deltas_session_tick ON deltas(session_id, tick_number)")
+        self._ensure_column(conn, "snapshots", "kind", "INTEGER NOT NULL DEFAULT 0")
+        self._ensure_column(conn, "snapshots", "base_tick", "INTEGER")
+        self._ensure_column(conn, "sessions", "parent_id", "TEXT")
+        self._ensure_column(conn, "sessions", "fork_tick", "INTEGER")
+
+    def _ensure_column(self, conn: sqlite3.Connection, table: str, column: str, declaration: str):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
             
-    def create_session(self, name: str, config: Defaults = None) -> str:
-        session_id = str(uuid.uuid4())
+    def create_session(self, name: str, config: Defaults = None, session_id: Optional[str] = None) -> str:
+        """Creates a session and returns its id; a new one unless session_id is given."""
+        session_id = session_id or str(uuid.uuid4())
         created_at = time.time()
         config_json = to_json(config) if config else "{}"
         
-        with self.get_connection() as conn:
+        with self.connections.writer() as conn:
             conn.execute(
                 "INSERT INTO sessions (id, created_at, name, config_json) VALUES (?, ?, ?, ?)",
                 (session_id, created_at, name, config_json)
             )
         return session_id
         
-    def save_step(self, session_id: str, tick: int, delta: WorldDelta, world_snapshot: Optional[World] = None):
-        timestamp = time.time()
-        delta_json = to_json(delta)
-        
-        with self.get_connection() as conn:
-            conn.execute(
-                "INSERT INTO ticks (session_id, tick_number, timestamp) VALUES (?, ?, ?)",
-                (session_id, tick, timestamp)
+    def fork_session(self, parent_id: str, tick: int, name: str, world: World, config: Defaults = None) -> str:
+        """Creates a session that shares the history of parent_id up to tick and continues from world.
+
+        No history is copied: reads of the fork resolve ticks up to the fork
+        point to the parent. Only a keyframe of world at the fork tick (so
+        replays of the fork never reach back into the parent's deltas) and the
+        parent's compression dictionary are stored for the new session.
+        """
+        if not self.load_session_metadata(parent_id):
+            raise ValueError(f"Session {parent_id} not found.")
+        session_id = str(uuid.uuid4())
+        created_at = time.time()
+        config_json = to_json(config) if config else "{}"
+
+        zdict = self.get_dictionary(parent_id)
+        if zdict is not None:
+            self._dictionaries[session_id] = zdict
+        step = self.prepare_step(session_id, tick, None, world_snapshot=world)
+        try:
+            with self.connections.writer() as conn:
+                conn.execute(
+                    "INSERT INTO sessions (id, created_at, name, config_json, parent_id, fork_tick) VALUES (?, ?, ?, ?, ?, ?)",
+                    (session_id, created_at, name, config_json, parent_id, tick)
+                )
+                if step.blobs:
+                    conn.executemany("INSERT OR IGNORE INTO entity_blobs (hash, record) VALUES (?, ?)", step.blobs)
+                conn.execute(
+                    "INSERT INTO snapshots (session_id, tick_number, world_json, kind, base_tick) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, tick, step.world_json, step.snapshot_kind, step.snapshot_base)
+                )
+                if zdict is not None or step.dictionary is not None:
+                    conn.execute(
+                        "INSERT INTO session_dictionaries (session_id, zdict, created_at) VALUES (?, ?, ?)",
+                        (session_id, zdict if zdict is not None else step.dictionary, created_at)
+                    )
+        except Exception:
+            self._reset_session_state(session_id)
+            raise
+        if step.columnar is not None:
+            self.columns.save(session_id, tick, step.columnar)
+        return session_id
+
+    def get_fork_point(self, session_id: str) -> Optional[Tuple[str, int]]:
+        """(parent_id, fork_tick) of a forked session, None for a session started from scratch."""
+        with self.connections.reader() as conn:
+            row = conn.execute("SELECT parent_id, fork_tick FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return (row[0], row[1]) if row and row[0] is not None else None
+
+    def list_forks(self, session_id: str) -> List[Tuple[str, int]]:
+        """(fork_id, fork_tick) of every session forked directly from session_id."""
+        with self.connections.reader() as conn:
+            return conn.execute(
+                "SELECT id, fork_tick FROM sessions WHERE parent_id = ? ORDER BY fork_tick", (session_id,)
+            ).fetchall()
+
+    def _lineage(self, session_id: str) -> List[Tuple[str, Optional[int]]]:
+        """The sessions whose history session_id reads through, root first, each with its fork tick."""
+        lineage = self._lineages.get(session_id)
+        if lineage is None:
+            fork = self.get_fork_point(session_id)
+            lineage = [(session_id, None)] if fork is None else self._lineage(fork[0]) + [(session_id, fork[1])]
+            self._lineages[session_id] = lineage
+        return lineage
+
+    def _segments(self, session_id: str, start_tick: int, end_tick: int, snapshots: bool = False) -> List[Tuple[str, int, int]]:
+        """Splits start_tick..end_tick into (owner, first, last) ranges along the lineage of a session.
+
+        A fork owns the ticks, deltas and metrics after its fork tick, and the
+        snapshots from its fork tick on.
+        """
+        lineage = self._lineage(session_id)
+        shift = 0 if snapshots else 1
+        segments = []
+        for i, (owner, fork) in enumerate(lineage):
+            first = start_tick if fork is None else max(start_tick, fork + shift)
+            last = end_tick if i + 1 == len(lineage) else min(end_tick, lineage[i + 1][1] + shift - 1)
+            if first <= last:
+                segments.append((owner, first, last))
+        return segments
+
+    def _segment_clause(self, segments: List[Tuple[str, int, int]], alias: str = "") -> Tuple[str, list]:
+        clause = " OR ".join([f"({alias}session_id = ? AND {alias}tick_number >= ? AND {alias}tick_number <= ?)"] * len(segments))
+        return f"({clause or '0'})", [value for segment in segments for value in segment]
+
+    def _snapshot_owner(self, session_id: str, tick: int) -> str:
+        segments = self._segments(session_id, tick, tick, snapshots=True)
+        return segments[0][0] if segments else session_id
+
+    def prepare_step(
+        self, session_id: str, tick: int, delta: WorldDelta,
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ) -> PendingStep:
+        step = PendingStep(
+            session_id=session_id,
+            tick=tick,
+            timestamp=time.time(),
+            delta_json=self.encode_delta(delta) if delta else None,
+            metrics=metrics,
+            inverse_json=to_json(inverse) if inverse else None,
+            inputs_json=to_json(inputs) if inputs else None,
+            first_tick=first_tick,
+            events=events if events is not None or first_tick is not None else event_rows(delta)
+        )
+        if world_snapshot:
+            step.world_json, step.snapshot_kind, step.snapshot_base, step.blobs = self._encode_snapshot(session_id, tick, world_snapshot)
+            if self.columns is not None:
+                step.columnar = encode_columnar(world_snapshot)
+        if self.config.compression:
+            zdict = self._writer_dictionary(step)
+            level = self.config.compression_level
+            if step.delta_json is not None:
+                step.delta_json = compress(step.delta_json, zdict, level)
+            if step.world_json is not None:
+                step.world_json = compress(step.world_json, zdict, level)
+            if step.inverse_json is not None:
+                step.inverse_json = compress(step.inverse_json, zdict, level)
+            if step.inputs_json is not None:
+                step.inputs_json = compress(step.inputs_json, zdict, level)
+        return step
+
+    def _writer_dictionary(self, step: PendingStep) -> Optional[bytes]:
+        """Returns the session dictionary, training it once enough deltas have been sampled.
+
+        Training takes a second or more, so it runs on a background thread and
+        payloads stay compressed without a dictionary until it is ready. A newly
+        trained (or bundled) dictionary is attached to the step so it is stored
+        in the same transaction as the first payloads that need it.
+        """
+        session_id = step.session_id
+        zdict = self._dictionaries.get(session_id)
+        if zdict is not None:
+            return zdict
+
+        trained = self._dictionary_training.get(session_id)
+        if trained is not None:
+            if not trained:
+                return None
+            del self._dictionary_training[session_id]
+            zdict = step.dictionary = self._dictionaries[session_id] = trained[0]
+            return zdict
+
+        samples = self._dictionary_samples.get(session_id)
+        if samples is None:
+            zdict = self._load_dictionary(session_id)
+            if zdict is None and self._bundled_dictionary is not None:
+                zdict = step.dictionary = self._bundled_dictionary
+            if zdict is not None:
+                self._dictionaries[session_id] = zdict
+                return zdict
+            samples = self._dictionary_samples[session_id] = []
+
+        if step.delta_json is not None:
+            samples.append(step.delta_json)
+        if len(samples) < self.config.dictionary_samples:
+            return None
+
+        del self._dictionary_samples[session_id]
+        trained = self._dictionary_training[session_id] = []
+        threading.Thread(
+            target=lambda: trained.append(train_dictionary(samples, self.config.dictionary_size)),
+            name="diane-dictionary", daemon=True
+        ).start()
+        return None
+
+    def _load_dictionary(self, session_id: str) -> Optional[bytes]:
+        with self.connections.reader() as conn:
+            res = conn.execute("SELECT zdict FROM session_dictionaries WHERE session_id = ?", (session_id,)).fetchone()
+        return res[0] if res else None
+
+    def get_dictionary(self, session_id: str) -> Optional[bytes]:
+        zdict = self._dictionaries.get(session_id)
+        if zdict is None:
+            zdict = self._load_dictionary(session_id)
+            if zdict is not None:
+                self._dictionaries[session_id] = zdict
+        return zdict
+
+    def _unpack(self, session_id: str, payload: Union[bytes, str, None]) -> Union[bytes, str, None]:
+        if not is_compressed(payload):
+            return payload
+        return decompress(payload, self.get_dictionary(session_id) if uses_dictionary(payload) else None)
+
+    def _encode_snapshot(
+        self, session_id: str, tick: int, world: World
+    ) -> Tuple[Union[bytes, str], int, Optional[int], Optional[List[Tuple[bytes, bytes]]]]:
+        interval = self.config.keyframe_interval
+        if self.config.codec != "binary" or (interval <= 1 and not self.config.snapshot_blobs):
+            return self.encode_world(world), SNAPSHOT_KEYFRAME, None, None
+
+        factions = {fid: encode_faction(f) for fid, f in world.factions.items()}
+        regions = {rid: encode_region(r) for rid, r in world.regions.items()}
+        chain = self._chains.get(session_id)
+
+        if self.config.snapshot_blobs:
+            return self._encode_manifest(session_id, tick, world, factions, regions, chain)
+        if chain is None or chain.since_keyframe + 1 >= interval or tick <= chain.tick:
+            payload = encode_world_records(world.market, factions.values(), regions.values())
+            kind, base, since_keyframe = SNAPSHOT_KEYFRAME, None, 0
+        else:
+            payload = encode_world_diff(
+                world.market,
+                [record for fid, record in factions.items() if chain.factions.get(fid) != record],
+                [fid for fid in chain.factions if fid not in factions],
+                [record for rid, record in regions.items() if chain.regions.get(rid) != record],
+                [rid for rid in chain.regions if rid not in regions]
             )
+            kind, base, since_keyframe = SNAPSHOT_DIFF, chain.tick, chain.since_keyframe + 1
+
+        self._chains[session_id] = SnapshotChain(tick, since_keyframe, factions, regions)
+        return payload, kind, base, None
+
+    def _encode_manifest(
+        self, session_id: str, tick: int, world: World,
+        factions: Dict[str, bytes], regions: Dict[str, bytes], chain: Optional[SnapshotChain]
+    ) -> Tuple[bytes, int, None, List[Tuple[bytes, bytes]]]:
+        # A manifest lists every record, so it is a keyframe. Records the previous
+        # snapshot of the session already stored are not handed to save_steps again.
+        stored = set() if chain is None or tick <= chain.tick else {*chain.factions.values(), *chain.regions.values()}
+        blobs = {}
+
+        def hashes(records: Iterable[bytes]) -> List[bytes]:
+            digests = []
+            for record in records:
+                digest = record_hash(record)
+                if record not in stored:
+                    blobs[digest] = record
+                digests.append(digest)
+            return digests
+
+        payload = encode_world_manifest(world.market, hashes(factions.values()), hashes(regions.values()))
+        self._chains[session_id] = SnapshotChain(tick, 0, factions, regions)
+        return payload, SNAPSHOT_KEYFRAME, None, list(blobs.items())
+
+    def reset_snapshot_chain(self, session_id: str):
+        """Makes the next snapshot of the session a keyframe."""
+        self._chains.pop(session_id, None)
+
+    def _reset_session_state(self, session_id: str):
+        self.reset_snapshot_chain(session_id)
+        self._dictionaries.pop(session_id, None)
+        self._dictionary_samples.pop(session_id, None)
+        self._dictionary_training.pop(session_id, None)
+
+    def save_steps(self, steps: List[PendingStep]):
+        if not steps:
+            return
             
-            if delta:
-                conn.execute(
+        try:
+            with self.connections.writer() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO entity_blobs (hash, record) VALUES (?, ?)",
+                    [blob for s in steps if s.blobs for blob in s.blobs]
+                )
+                conn.executemany(
+                    "INSERT INTO ticks (session_id, tick_number, timestamp) VALUES (?, ?, ?)",
+                    [(s.session_id, s.tick, s.timestamp) for s in steps]
+                )
+                conn.executemany(
                     "INSERT INTO deltas (session_id, tick_number, delta_json) VALUES (?, ?, ?)",
-                    (session_id, tick, delta_json)
+                    [(s.session_id, s.tick, s.delta_json) for s in steps if s.delta_json is not None]
                 )
-            
-            if world_snapshot:
-                world_json = to_json(world_snapshot)
-                conn.execute(
-                    "INSERT INTO snapshots (session_id, tick_number, world_json) VALUES (?, ?, ?)",
-                    (session_id, tick, world_json)
+                conn.executemany(
+                    "INSERT INTO delta_ranges (session_id, tick_number, first_tick) VALUES (?, ?, ?)",
+                    [(s.session_id, s.tick, s.first_tick) for s in steps if s.first_tick is not None]
+                )
+                conn.executemany(
+                    "INSERT INTO snapshots (session_id, tick_number, world_json, kind, base_tick) VALUES (?, ?, ?, ?, ?)",
+                    [(s.session_id, s.tick, s.world_json, s.snapshot_kind, s.snapshot_base) for s in steps if s.world_json is not None]
                 )
+                conn.executemany(
+                    "INSERT INTO inverse_deltas (session_id, tick_number, inverse_json) VALUES (?, ?, ?)",
+                    [(s.session_id, s.tick, s.inverse_json) for s in steps if s.inverse_json is not None]
+                )
+                conn.executemany(
+                    "INSERT INTO inputs (session_id, tick_number, inputs_json) VALUES (?, ?, ?)",
+                    [(s.session_id, s.tick, s.inputs_json) for s in steps if s.inputs_json is not None]
+                )
+                conn.executemany(
+                    "INSERT INTO session_dictionaries (session_id, zdict, created_at) VALUES (?, ?, ?)",
+                    [(s.session_id, s.dictionary, s.timestamp) for s in steps if s.dictionary is not None]
+                )
+                conn.executemany(
+                    "INSERT INTO events (session_id, tick_number, seq, kind, primary_id, secondary_id, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(s.session_id, s.tick, seq, *row) for s in steps if s.events for seq, row in enumerate(s.events)]
+                )
+                metrics = [(s.session_id, s.tick, s.metrics) for s in steps if s.metrics is not None]
+                self._save_metrics(conn, metrics)
+                spans = {}
+                for session_id, tick, _ in metrics:
+                    low, high = spans.get(session_id, (tick, tick))
+                    spans[session_id] = (min(low, tick), max(high, tick))
+                for session_id, (low, high) in spans.items():
+                    self._refresh_rollups(conn, session_id, low, high)
+        except Exception:
+            # Payloads prepared after a lost batch could point at snapshots or a
+            # dictionary that were never written.
+            for step in steps:
+                self._reset_session_state(step.session_id)
+            raise
+        # Files follow the commit, so a file never exists for a snapshot row that was rolled back.
+        for step in steps:
+            if step.columnar is not None:
+                self.columns.save(step.session_id, step.tick, step.columnar)
+
+    def _save_metrics(self, conn: sqlite3.Connection, items: List[Tuple[str, int, TickMetrics]], backfill: bool = False):
+        if not items:
+            return
+        # Backfilled rows never override what the engine recorded live.
+        verb = "INSERT OR IGNORE" if backfill else "INSERT"
+        conn.executemany(
+            f"{verb} INTO faction_timeseries (session_id, tick_number, faction_id, {', '.join(FACTION_COLUMNS)}) "
+            f"VALUES ({', '.join(['?'] * (len(FACTION_COLUMNS) + 3))})",
+            [(session_id, tick) + row for session_id, tick, metrics in items for row in metrics.factions]
+        )
+        conn.executemany(
+            f"{verb} INTO world_timeseries (session_id, tick_number, {', '.join(WORLD_COLUMNS)}) "
+            f"VALUES ({', '.join(['?'] * (len(WORLD_COLUMNS) + 2))})",
+            [(session_id, tick) + metrics.world for session_id, tick, metrics in items]
+        )
+        # Only the latest name and color of each faction is kept.
+        names = {
+            (session_id, fid): (name, color)
+            for session_id, _, metrics in items for fid, name, color in metrics.names
+        }
+        conflict = "DO NOTHING" if backfill else "DO UPDATE SET name = excluded.name, color = excluded.color"
+        conn.executemany(
+            "INSERT INTO session_factions (session_id, faction_id, name, color) VALUES (?, ?, ?, ?) "
+            f"ON CONFLICT(session_id, faction_id) {conflict}",
+            [key + value for key, value in names.items()]
+        )
+
+    def _refresh_rollups(self, conn: sqlite3.Connection, session_id: str, start_tick: int, end_tick: int):
+        """Recomputes the rollup buckets of every level that overlap start_tick..end_tick.
+
+        Each level is built from the next finer one when it is a multiple of it,
+        so a refresh reads a bounded number of rows per level whatever the bucket size.
+        """
+        finer = None
+        for level in sorted(self.config.rollup_levels):
+            first, last = start_tick // level, end_tick // level
+            for series in (FACTION_SERIES, WORLD_SERIES):
+                table, rollups, columns, key = series
+                names = ", ".join(["session_id", "level"] + ([key] if key else []) + ["bucket", "samples"] + rollup_columns(columns))
+                entity = f"{key}, " if key else ""
+                if finer and level % finer == 0:
+                    ratio = level // finer
+                    aggregates = [f"MIN({c}_min), MAX({c}_max), SUM({c}_sum)" for c in columns]
+                    source = (
+                        f"SELECT session_id, {level}, {entity}bucket / {ratio}, SUM(samples), {', '.join(aggregates)} "
+                        f"FROM {rollups} WHERE session_id = ? AND level = {finer} AND bucket >= ? AND bucket <= ? "
+                        f"GROUP BY {entity}bucket / {ratio}"
+                    )
+                    bounds = (first * ratio, (last + 1) * ratio - 1)
+                else:
+                    aggregates = [f"MIN({c}), MAX({c}), SUM({c})" for c in columns]
+                    source = (
+                        f"SELECT session_id, {level}, {entity}tick_number / {level}, COUNT(*), {', '.join(aggregates)} "
+                        f"FROM {table} WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? "
+                        f"GROUP BY {entity}tick_number / {level}"
+                    )
+                    bounds = (first * level, (last + 1) * level - 1)
+                conn.execute(f"INSERT OR REPLACE INTO {rollups} ({names}) {source}", (session_id,) + bounds)
+            finer = level
+
+    def rebuild_rollups(self, session_id: str):
+        """Recomputes every rollup level of a session from its raw time-series rows.
+
+        Buckets before the raw rows dropped by compact_deltas are kept as they are.
+        """
+        start, end = self.get_tick_range(session_id)
+        floor = self._raw_floor(session_id)
+        with self.connections.writer() as conn:
+            for level in self.config.rollup_levels:
+                for series in (FACTION_SERIES, WORLD_SERIES):
+                    conn.execute(
+                        f"DELETE FROM {series[1]} WHERE session_id = ? AND level = ? AND bucket >= ?",
+                        (session_id, level, floor // level)
+                    )
+            self._refresh_rollups(conn, session_id, max(start, floor), end)
+
+    def truncate_session(self, session_id: str, tick: int):
+        """Deletes everything a session recorded after tick so it can continue from there.
+
+        Refuses while a fork branches off after tick, since the fork reads that history.
+        """
+        forks = [fork_id for fork_id, fork_tick in self.list_forks(session_id) if fork_tick > tick]
+        if forks:
+            raise ValueError(f"Session {session_id} has forks after tick {tick}: {', '.join(forks)}")
+        compacted = self.get_compacted_tick(session_id)
+        if compacted is not None and tick < compacted:
+            raise ValueError(f"Session {session_id} only keeps its deltas after tick {compacted}.")
+
+        with self.connections.writer() as conn:
+            for table in ("deltas", "delta_ranges", "snapshots", "inverse_deltas", "inputs", "faction_timeseries", "world_timeseries", "events", "seeds", "ticks"):
+                conn.execute(f"DELETE FROM {table} WHERE session_id = ? AND tick_number > ?", (session_id, tick))
+            # The bucket holding tick loses its later samples, so it is rebuilt from what remains.
+            for level in self.config.rollup_levels:
+                for series in (FACTION_SERIES, WORLD_SERIES):
+                    conn.execute(
+                        f"DELETE FROM {series[1]} WHERE session_id = ? AND level = ? AND bucket >= ?",
+                        (session_id, level, tick // level)
+                    )
+            self._refresh_rollups(conn, session_id, tick, tick)
+            conn.execute(
+                "UPDATE backfill_progress SET last_tick = MIN(last_tick, ?) WHERE session_id = ?",
+                (tick, session_id)
+            )
+        self.reset_snapshot_chain(session_id)
+        if self.columns is not None:
+            self.columns.delete_after(session_id, tick)
+
+    def get_snapshot_ticks(self, session_id: str) -> List[int]:
+        """Ticks of the snapshots a session stores itself, without those read through its parent."""
+        with self.connections.reader() as conn:
+            cursor = conn.execute("SELECT tick_number FROM snapshots WHERE session_id = ? ORDER BY tick_number", (session_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_compacted_tick(self, session_id: str) -> Optional[int]:
+        """The snapshot tick up to which compact_deltas dropped the session's deltas, if it ever ran."""
+        with self.connections.reader() as conn:
+            res = conn.execute("SELECT tick_number FROM compactions WHERE session_id = ?", (session_id,)).fetchone()
+        return res[0] if res else None
+
+    def _raw_floor(self, session_id: str) -> int:
+        # Raw time-series rows before this tick were dropped with the deltas; whole buckets of the finest rollup level remain.
+        compacted = self.get_compacted_tick(session_id)
+        if compacted is None or not self.config.rollup_levels:
+            return 0
+        finest = min(self.config.rollup_levels)
+        return compacted // finest * finest
+
+    def is_replayable(self, session_id: str, tick: int) -> bool:
+        owner = self._snapshot_owner(session_id, tick)
+        compacted = self.get_compacted_tick(owner)
+        if compacted is None or tick >= compacted:
+            return True
+        with self.connections.reader() as conn:
+            return conn.execute(
+                "SELECT 1 FROM snapshots WHERE session_id = ? AND tick_number = ?", (owner, tick)
+            ).fetchone() is not None
+
+    def get_coalesced_range(self, session_id: str, tick: int) -> Optional[Tuple[int, int]]:
+        # A range never spans a fork point, since no fork can be made inside one.
+        segments = self._segments(session_id, tick, tick)
+        owner = segments[0][0] if segments else session_id
+        with self.connections.reader() as conn:
+            row = conn.execute(
+                "SELECT first_tick, tick_number FROM delta_ranges WHERE session_id = ? AND tick_number > ? "
+                "ORDER BY tick_number LIMIT 1",
+                (owner, tick)
+            ).fetchone()
+        return (row[0], row[1]) if row and row[0] <= tick else None
+
+    def get_last_activity(self, session_id: str) -> float:
+        """Time of the last tick a session recorded, or of its creation."""
+        with self.connections.reader() as conn:
+            return conn.execute(
+                "SELECT COALESCE((SELECT MAX(timestamp) FROM ticks WHERE session_id = ?), "
+                "(SELECT created_at FROM sessions WHERE id = ?))",
+                (session_id, session_id)
+            ).fetchone()[0]
+
+    def _rewrite_keyframes(self, conn: sqlite3.Connection, session_id: str, ticks: List[int]):
+        # Rebuilt before anything is deleted, since they may be diffs of the snapshots going away.
+        zdict = self.get_dictionary(session_id) if self.config.compression else None
+        for tick, world in self._reconstruct_snapshots(conn, session_id, ticks):
+            payload = self.encode_world(world)
+            if self.config.compression:
+                payload = compress(payload, zdict, self.config.compression_level)
+            conn.execute(
+                "UPDATE snapshots SET world_json = ?, kind = ?, base_tick = NULL WHERE session_id = ? AND tick_number = ?",
+                (payload, SNAPSHOT_KEYFRAME, session_id, tick)
+            )
+
+    def _drop_tick_rows(self, conn: sqlite3.Connection, session_id: str, through_tick: int):
+        # Rows of ticks with nothing left to read; the first one stays as the start of the tick range.
+        conn.execute(
+            "DELETE FROM ticks WHERE session_id = ? AND tick_number <= ? "
+            "AND tick_number > (SELECT MIN(tick_number) FROM ticks WHERE session_id = ?) "
+            "AND NOT EXISTS (SELECT 1 FROM deltas d WHERE d.session_id = ticks.session_id AND d.tick_number = ticks.tick_number) "
+            "AND NOT EXISTS (SELECT 1 FROM inputs i WHERE i.session_id = ticks.session_id AND i.tick_number = ticks.tick_number) "
+            "AND NOT EXISTS (SELECT 1 FROM snapshots s WHERE s.session_id = ticks.session_id AND s.tick_number = ticks.tick_number)",
+            (session_id, through_tick, session_id)
+        )
+
+    def compact_deltas(self, session_id: str, tick: int) -> int:
+        """Drops the deltas, inverse deltas and inputs a session recorded up to its snapshot at tick.
+
+        That snapshot becomes a keyframe and covers every later replay. Ticks up
+        to it stay readable only where a snapshot is kept. Raw time-series rows
+        of the whole finest rollup buckets before tick go too; queries of that
+        range read the rollups. Returns the number of deltas deleted.
+        """
+        floor = self._raw_floor(session_id)
+        with self.connections.writer() as conn:
+            row = conn.execute(
+                "SELECT kind FROM snapshots WHERE session_id = ? AND tick_number = ?", (session_id, tick)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Session {session_id} has no snapshot at tick {tick} to cover its earlier deltas.")
+            if row[0] != SNAPSHOT_KEYFRAME:
+                self._rewrite_keyframes(conn, session_id, [tick])
+            deleted = conn.execute(
+                "DELETE FROM deltas WHERE session_id = ? AND tick_number <= ?", (session_id, tick)
+            ).rowcount
+            conn.execute("DELETE FROM delta_ranges WHERE session_id = ? AND tick_number <= ?", (session_id, tick))
+            conn.execute("DELETE FROM inverse_deltas WHERE session_id = ? AND tick_number <= ?", (session_id, tick))
+            conn.execute("DELETE FROM inputs WHERE session_id = ? AND tick_number <= ?", (session_id, tick))
+            self._drop_tick_rows(conn, session_id, tick)
+            if self.config.rollup_levels:
+                finest = min(self.config.rollup_levels)
+                new_floor = tick // finest * finest
+                if new_floor > floor:
+                    # Rollups of sessions recorded before they existed are built before their source goes.
+                    self._refresh_rollups(conn, session_id, floor, new_floor - 1)
+                    for table in ("faction_timeseries", "world_timeseries"):
+                        conn.execute(f"DELETE FROM {table} WHERE session_id = ? AND tick_number < ?", (session_id, new_floor))
+            conn.execute(
+                "INSERT INTO compactions (session_id, tick_number) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET tick_number = MAX(tick_number, excluded.tick_number)",
+                (session_id, tick)
+            )
+        return deleted
+
+    def drop_snapshots(self, session_id: str, ticks: Iterable[int]) -> int:
+        """Deletes snapshots of a session. Later diffs that relied on them are rewritten as keyframes.
+
+        The first snapshot of the session and the one covering compacted
+        deltas cannot be dropped. Returns the number of snapshots deleted.
+        """
+        drop = set(ticks)
+        compacted = self.get_compacted_tick(session_id)
+        with self.connections.writer() as conn:
+            rows = conn.execute(
+                "SELECT tick_number, kind, base_tick FROM snapshots WHERE session_id = ? ORDER BY tick_number", (session_id,)
+            ).fetchall()
+            drop &= {row[0] for row in rows}
+            if not drop:
+                return 0
+            protected = {rows[0][0], compacted} & drop
+            if protected:
+                raise ValueError(f"Snapshots at ticks {sorted(protected)} of session {session_id} are needed for replay.")
+
+            valid, rewrite = set(), []
+            for tick, kind, base in rows:
+                if tick in drop:
+                    continue
+                if kind != SNAPSHOT_KEYFRAME and base not in valid:
+                    rewrite.append(tick)
+                valid.add(tick)
+            self._rewrite_keyframes(conn, session_id, rewrite)
+            conn.executemany(
+                "DELETE FROM snapshots WHERE session_id = ? AND tick_number = ?", [(session_id, tick) for tick in drop]
+            )
+            if compacted is not None:
+                self._drop_tick_rows(conn, session_id, compacted)
+        # The next snapshot must not be a diff of one that is gone.
+        self.reset_snapshot_chain(session_id)
+        if self.columns is not None:
+            self.columns.delete(session_id, drop)
+        return len(drop)
+
+    def _archive_file(self, session_id: str) -> Optional[str]:
+        return os.path.join(self.archive_path, f"{session_id}{ARCHIVE_EXTENSION}") if self.archive_path else None
+
+    def archive_session(self, session_id: str) -> str:
+        """Moves every row of a session into a gzip-compressed SQLite file under archive_path.
+
+        Refuses while forks of the session exist, since they read its history.
+        Returns the path of the archive; restore_session brings the session back.
+        """
+        if not self.archive_path:
+            raise ValueError("Archiving needs an archive_path when the database is in memory.")
+        if not self.load_session_metadata(session_id):
+            raise ValueError(f"Session {session_id} not found.")
+        forks = [fork_id for fork_id, _ in self.list_forks(session_id)]
+        if forks:
+            raise ValueError(f"Session {session_id} has forks: {', '.join(forks)}")
+
+        path = self._archive_file(session_id)
+        os.makedirs(self.archive_path, exist_ok=True)
+        temporary = f"{path}.tmp"
+        with tempfile.TemporaryDirectory(dir=self.archive_path) as directory:
+            database = os.path.join(directory, "session.db")
+            archive = sqlite3.connect(database)
+            try:
+                with self.connections.reader() as conn, archive:
+                    for table, key in SESSION_TABLES:
+                        archive.execute(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0])
+                        cursor = conn.execute(f"SELECT * FROM {table} WHERE {key} = ?", (session_id,))
+                        while True:
+                            rows = cursor.fetchmany(1000)
+                            if not rows:
+                                break
+                            archive.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})", rows)
+                    # Shared entity records go along, so the archive loads into any database.
+                    hashes = self._manifest_hashes(conn, session_id)
+                    if hashes:
+                        archive.execute(conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'entity_blobs'").fetchone()[0])
+                        archive.executemany("INSERT INTO entity_blobs (hash, record) VALUES (?, ?)", self._load_blobs(conn, hashes).items())
+            finally:
+                archive.close()
+            with open(database, "rb") as source, gzip.open(temporary, "wb", compresslevel=self.config.compression_level) as target:
+                shutil.copyfileobj(source, target)
+                target.flush()
+            os.replace(temporary, path)
+
+        self.delete_session(session_id)
+        return path
+
+    def restore_session(self, session_id: str) -> bool:
+        """Imports an archived session back into the database. False when there is no archive of it."""
+        path = self._archive_file(session_id)
+        if path is None or not os.path.exists(path):
+            return False
+        self.import_session(path)
+        os.remove(path)
+        return True
+
+    def import_session(self, path: str) -> str:
+        """Copies the session stored in an archive file into the database and returns its id.
+
+        A forked session needs its parent, which is restored from the archive
+        directory first if it was archived too.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            database = os.path.join(directory, "session.db")
+            with gzip.open(path, "rb") as source, open(database, "wb") as target:
+                shutil.copyfileobj(source, target)
+            archive = sqlite3.connect(database)
+            try:
+                row = archive.execute("SELECT id, parent_id FROM sessions").fetchone()
+                if row is None:
+                    raise ValueError(f"{path} holds no session.")
+                session_id, parent_id = row
+                if self.load_session_metadata(session_id):
+                    raise ValueError(f"Session {session_id} is already in the database.")
+                if parent_id and not self.load_session_metadata(parent_id) and not self.restore_session(parent_id):
+                    raise ValueError(f"Session {session_id} was forked from {parent_id}, which is missing.")
+
+                tables = {name for (name,) in archive.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                with self.connections.writer() as conn:
+                    if "entity_blobs" in tables:
+                        cursor = archive.execute("SELECT hash, record FROM entity_blobs")
+                        while True:
+                            rows = cursor.fetchmany(1000)
+                            if not rows:
+                                break
+                            conn.executemany("INSERT OR IGNORE INTO entity_blobs (hash, record) VALUES (?, ?)", rows)
+                    for table, _ in SESSION_TABLES:
+                        if table not in tables:
+                            continue
+                        # Named columns, so archives written before a schema migration still load.
+                        columns = [column[1] for column in archive.execute(f"PRAGMA table_info({table})")]
+                        cursor = archive.execute(f"SELECT {', '.join(columns)} FROM {table}")
+                        while True:
+                            rows = cursor.fetchmany(1000)
+                            if not rows:
+                                break
+                            conn.executemany(
+                                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+                            )
+            finally:
+                archive.close()
+        self._lineages.pop(session_id, None)
+        return session_id
+
+    def delete_session(self, session_id: str):
+        """Deletes every row of a session. Refuses while forks of it exist."""
+        forks = [fork_id for fork_id, _ in self.list_forks(session_id)]
+        if forks:
+            raise ValueError(f"Session {session_id} has forks: {', '.join(forks)}")
+        with self.connections.writer() as conn:
+            for table, key in reversed(SESSION_TABLES):
+                conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (session_id,))
+        self._reset_session_state(session_id)
+        self._lineages.pop(session_id, None)
+        if self.columns is not None:
+            self.columns.delete_after(session_id, -1)
+
+    def vacuum(self, pages: int = 0) -> int:
+        """Returns free pages to the file system and the number of bytes it gave back.
+
+        Entity records no snapshot refers to any more are deleted first. With
+        auto_vacuum INCREMENTAL this frees up to pages pages (0 for all)
+        without rewriting the database. A database created before auto_vacuum
+        was set is rebuilt by a full VACUUM once to switch modes.
+        """
+        self.collect_blobs()
+        modes = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}
+        wanted = modes.get(self.config.auto_vacuum.upper(), 0)
+        with self.connections.writer() as conn:
+            def size() -> int:
+                return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+            before = size()
+            current = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+            if current != wanted:
+                conn.execute(f"PRAGMA auto_vacuum = {wanted}")
+                conn.execute("VACUUM")
+            elif current == 2:
+                # executescript steps the pragma to completion; execute() would free a single page.
+                conn.executescript(f"PRAGMA incremental_vacuum({max(0, int(pages))});")
+            elif current == 0:
+                conn.execute("VACUUM")
+            # In WAL mode the file only shrinks once the log is checkpointed.
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+            return before - size()
+
+    def get_inverse_deltas(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, InverseDelta]]:
+        """Persisted inverse deltas of the session's own ticks in start_tick..end_tick, oldest first."""
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                "SELECT tick_number, inverse_json FROM inverse_deltas "
+                "WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? ORDER BY tick_number",
+                (session_id, start_tick, end_tick)
+            ).fetchall()
+        return [(tick, from_json(self._unpack(session_id, payload), InverseDelta)) for tick, payload in rows]
+
+    def get_inputs(self, session_id: str, start_tick: int, end_tick: int) -> List[Tuple[int, List[WorldDelta]]]:
+        """(tick, edits) for the ticks in start_tick..end_tick that had external edits, read through forks like deltas."""
+        results = []
+        with self.connections.reader() as conn:
+            for owner, first, last in self._segments(session_id, start_tick, end_tick):
+                rows = conn.execute(
+                    "SELECT tick_number, inputs_json FROM inputs "
+                    "WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? ORDER BY tick_number",
+                    (owner, first, last)
+                ).fetchall()
+                results.extend((tick, inputs_from_data(from_json(self._unpack(owner, payload)))) for tick, payload in rows)
+        return results
+
+    def record_seed(self, session_id: str, tick: int, seed: int):
+        """Starts a seed epoch: ticks from tick on ran with seed. Replaces the epochs recorded from tick on."""
+        with self.connections.writer() as conn:
+            conn.execute("DELETE FROM seeds WHERE session_id = ? AND tick_number >= ?", (session_id, tick))
+            conn.execute("INSERT INTO seeds (session_id, tick_number, seed) VALUES (?, ?, ?)", (session_id, tick, seed))
+
+    def get_seeds(self, session_id: str) -> List[Tuple[int, int]]:
+        """(first tick, seed) of the seed epochs a session recorded itself, in tick order."""
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                "SELECT tick_number, seed FROM seeds WHERE session_id = ? ORDER BY tick_number", (session_id,)
+            ).fetchall()
+        return [(tick, seed) for tick, seed in rows]
 
     def load_session_metadata(self, session_id: str):
-        with self.get_connection() as conn:
+        with self.connections.reader() as conn:
             return conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
 
+    def list_session_ids(self) -> List[str]:
+        with self.connections.reader() as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM sessions ORDER BY created_at").fetchall()]
+
     def get_latest_tick(self, session_id: str) -> int:
-        with self.get_connection() as conn:
+        with self.connections.reader() as conn:
             res = conn.execute("SELECT MAX(tick_number) FROM ticks WHERE session_id = ?", (session_id,)).fetchone()
-            return res[0] if res and res[0] is not None else 0
+        if res and res[0] is not None:
+            return res[0]
+        # A fork that has not stepped yet ends at its fork tick.
+        return self._lineage(session_id)[-1][1] or 0
 
-    def get_snapshot(self, session_id: str, tick: int) -> Optional[str]:
-        with self.get_connection() as conn:
-            res = conn.execute("SELECT world_json FROM snapshots WHERE session_id = ? AND tick_number = ?", 
-                             (session_id, tick)).fetchone()
-            return res[0] if res else None
+    def get_snapshot(self, session_id: str, tick: int, lazy: bool = False) -> Optional[Union[World, LazyWorld]]:
+        """The snapshot stored at tick. With lazy, binary snapshots come back as a LazyWorld."""
+        with self.connections.reader() as conn:
+            res = self._reconstruct_snapshots(conn, self._snapshot_owner(session_id, tick), [tick], lazy)
+        return res[0][1] if res else None
 
-    def get_deltas(self, session_id: str, start_tick: int, end_tick: int) -> List[str]:
-        with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT delta_json FROM deltas WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? ORDER BY tick_number",
-                (session_id, start_tick, end_tick)
+    def get_nearest_snapshot_tick(self, session_id: str, tick: int) -> Optional[int]:
+        with self.connections.reader() as conn:
+            return conn.execute(
+                "SELECT MAX(tick_number) FROM snapshots WHERE session_id = ? AND tick_number <= ?",
+                (self._snapshot_owner(session_id, tick), tick)
+            ).fetchone()[0]
+
+    def get_nearest_snapshot(self, session_id: str, tick: int) -> Optional[Tuple[int, World]]:
+        snapshot_tick = self.get_nearest_snapshot_tick(session_id, tick)
+        if snapshot_tick is None:
+            return None
+        with self.connections.reader() as conn:
+            res = self._reconstruct_snapshots(conn, self._snapshot_owner(session_id, snapshot_tick), [snapshot_tick])
+        return res[0] if res else None
+
+    def get_columnar_snapshot(self, session_id: str, tick: int) -> Optional[ColumnarSnapshot]:
+        """The columnar file of the snapshot at tick, mapped into memory, or None.
+
+        Only snapshots written while columnar_snapshots was on have one. Close
+        it, or use it as a context manager, once its columns are no longer used.
+        """
+        if self.columns is None:
+            return None
+        return self.columns.open(self._snapshot_owner(session_id, tick), tick)
+
+    def iter_columnar_snapshots(
+        self, session_id: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None
+    ) -> Iterator[Tuple[int, ColumnarSnapshot]]:
+        """Yields (tick, ColumnarSnapshot) for the columnar files of a session, oldest first.
+
+        Each file is unmapped when the iteration moves on, so copy out the
+        values that have to outlive it.
+        """
+        if self.columns is None:
+            return
+        for owner, first, last in self._segments(session_id, *self._tick_bounds(start_tick, end_tick), snapshots=True):
+            for tick in self.columns.ticks(owner):
+                if first <= tick <= last:
+                    with self.columns.open(owner, tick) as snapshot:
+                        yield tick, snapshot
+
+    def _reconstruct_snapshots(
+        self, conn: sqlite3.Connection, session_id: str, ticks: Iterable[int], lazy: bool = False
+    ) -> List[Tuple[int, Union[World, LazyWorld]]]:
+        """Rebuilds the snapshots at the given ticks from their keyframe and the diffs that follow it."""
+        results = []
+        world, world_tick, shared = None, None, False
+        for target in sorted(set(ticks)):
+            keyframe = conn.execute(
+                "SELECT MAX(tick_number) FROM snapshots WHERE session_id = ? AND tick_number <= ? AND kind = 0",
+                (session_id, target)
+            ).fetchone()[0]
+            if keyframe is None:
+                continue
+            # Keep walking forward from the previous target when it shares the same keyframe.
+            start = world_tick + 1 if world is not None and world_tick >= keyframe else keyframe
+            rows = conn.execute(
+                "SELECT tick_number, kind, base_tick, world_json FROM snapshots "
+                "WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? ORDER BY tick_number",
+                (session_id, start, target)
             )
-            return [row[0] for row in cursor.fetchall()]
+            for row in rows:
+                world = self._apply_snapshot_row(conn, session_id, world, world_tick, shared, row, lazy)
+                world_tick, shared = row[0], False
+            if world_tick == target:
+                results.append((target, world))
+                shared = True
+        return results
+
+    def _apply_snapshot_row(
+        self, conn: sqlite3.Connection, session_id: str, world: Optional[Union[World, LazyWorld]],
+        world_tick: Optional[int], shared: bool, row: tuple, lazy: bool = False
+    ) -> Union[World, LazyWorld]:
+        tick, kind, base_tick, payload = row
+        payload = self._unpack(session_id, payload)
+        if kind == SNAPSHOT_KEYFRAME:
+            if is_manifest(payload):
+                payload = self._resolve_manifest(conn, payload)
+            # JSON snapshots have no record index, so they are always decoded in full.
+            return LazyWorld.from_payload(payload) if lazy and is_binary(payload) else load_world(payload)
+        if world is None or base_tick != world_tick:
+            raise ValueError(f"Snapshot diff at tick {tick} does not follow the snapshot at tick {world_tick}.")
+        if isinstance(world, LazyWorld):
+            return (world.copy() if shared else world).apply_diff(payload)
+        if shared:
+            world = world.clone()
+        return apply_world_diff(world, payload)
+
+    def _resolve_manifest(self, conn: sqlite3.Connection, payload: bytes) -> bytes:
+        """The world blob a snapshot manifest stands for, built from the records it refers to."""
+        market, factions, regions = world_manifest_sections(bytes(payload))
+        records = self._load_blobs(conn, factions + regions)
+        return encode_world_records(market, [records[h] for h in factions], [records[h] for h in regions])
+
+    def _load_blobs(self, conn: sqlite3.Connection, hashes: Iterable[bytes]) -> Dict[bytes, bytes]:
+        records, missing = {}, []
+        with self._blob_lock:
+            for digest in hashes:
+                record = self._blob_cache.get(digest)
+                if record is None:
+                    missing.append(digest)
+                else:
+                    self._blob_cache.move_to_end(digest)
+                    records[digest] = record
+        missing = list(dict.fromkeys(missing))
+        # Chunked to stay under SQLite's limit on bound parameters.
+        for i in range(0, len(missing), 500):
+            chunk = missing[i:i + 500]
+            records.update(conn.execute(
+                f"SELECT hash, record FROM entity_blobs WHERE hash IN ({', '.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        lost = [digest for digest in missing if digest not in records]
+        if lost:
+            raise ValueError(f"{len(lost)} entity records referenced by a snapshot are missing from entity_blobs.")
+        if missing and self.config.blob_cache_size > 0:
+            with self._blob_lock:
+                for digest in missing:
+                    self._blob_cache[digest] = records[digest]
+                while len(self._blob_cache) > self.config.blob_cache_size:
+                    self._blob_cache.popitem(last=False)
+        return records
+
+    def _manifest_hashes(self, conn: sqlite3.Connection, session_id: Optional[str] = None) -> Set[bytes]:
+        """Hashes of the entity records the snapshot manifests of one session, or of all sessions, refer to."""
+        query = "SELECT session_id, world_json FROM snapshots WHERE kind = 0"
+        cursor = conn.execute(query + " AND session_id = ?", (session_id,)) if session_id else conn.execute(query)
+        hashes = set()
+        for owner, payload in cursor:
+            payload = self._unpack(owner, payload)
+            if is_manifest(payload):
+                _, factions, regions = world_manifest_sections(bytes(payload))
+                hashes.update(factions)
+                hashes.update(regions)
+        return hashes
+
+    def collect_blobs(self) -> int:
+        """Deletes the entity records no snapshot manifest refers to and returns how many went.
+
+        Records stay behind when the snapshots using them are dropped, truncated,
+        archived or deleted, since other sessions may share them; vacuum() runs
+        this before freeing pages.
+        """
+        with self.connections.writer() as conn:
+            used = self._manifest_hashes(conn)
+            unused = [(digest,) for (digest,) in conn.execute("SELECT hash FROM entity_blobs") if digest not in used]
+            conn.executemany("DELETE FROM entity_blobs WHERE hash = ?", unused)
+        with self._blob_lock:
+            for (digest,) in unused:
+                self._blob_cache.pop(digest, None)
+        return len(unused)
+
+    def iter_deltas(
+        self, session_id: str, start_tick: int, end_tick: int, batch_size: int = 1000, decode: bool = False
+    ) -> Iterator[Tuple[int, Union[bytes, str, WorldDelta]]]:
+        """Yields (tick, payload) for the deltas in start_tick..end_tick, or (tick, WorldDelta) with decode.
 
-    def get_all_snapshots(self, session_id: str) -> List[tuple]:
-        with self.get_connection() as conn:
+        Rows are read batch_size at a time, each batch resuming after the last
+        tick seen, so no connection or read transaction stays open while the
+        caller works and memory use does not grow with the range.
+        """
+        for owner, first, last_tick in self._segments(session_id, start_tick, end_tick):
+            last = first - 1
+            while last < last_tick:
+                with self.connections.reader() as conn:
+                    cursor = conn.execute(
+                        "SELECT tick_number, delta_json FROM deltas WHERE session_id = ? AND tick_number > ? AND tick_number <= ? "
+                        "ORDER BY tick_number LIMIT ?",
+                        (owner, last, last_tick, max(1, batch_size))
+                    )
+                    rows = cursor.fetchmany(max(1, batch_size))
+                if not rows:
+                    break
+                for tick, payload in rows:
+                    payload = self._unpack(owner, payload)
+                    yield tick, load_delta(payload) if decode else payload
+                last = rows[-1][0]
+
+    def get_all_snapshots(self, session_id: str) -> List[Tuple[int, World]]:
+        results = []
+        with self.connections.reader() as conn:
+            for owner, first, last in self._segments(session_id, *self._tick_bounds(None, None), snapshots=True):
+                world, world_tick = None, None
+                cursor = conn.execute(
+                    "SELECT tick_number, kind, base_tick, world_json FROM snapshots "
+                    "WHERE session_id = ? AND tick_number >= ? AND tick_number <= ? ORDER BY tick_number",
+                    (owner, first, last)
+                )
+                for row in cursor:
+                    world = self._apply_snapshot_row(conn, owner, world, world_tick, world is not None, row)
+                    world_tick = row[0]
+                    results.append((world_tick, world))
+        return results
+    
+    def get_faction_timeseries(
+        self, session_id: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None, stride: int = 1
+    ) -> List[tuple]:
+        """Rows of (tick, faction_id, name, color, *FACTION_COLUMNS) ordered by tick.
+
+        With stride > 1 only ticks at a multiple of stride from start_tick are returned.
+        """
+        start, end = self._tick_bounds(start_tick, end_tick)
+        where, params = self._segment_clause(self._segments(session_id, start, end), "t.")
+        with self.connections.reader() as conn:
+            return conn.execute(
+                f"SELECT t.tick_number, t.faction_id, f.name, f.color, {', '.join('t.' + c for c in FACTION_COLUMNS)} "
+                "FROM faction_timeseries t "
+                "LEFT JOIN session_factions f ON f.session_id = t.session_id AND f.faction_id = t.faction_id "
+                f"WHERE {where} AND (t.tick_number - ?) % ? = 0 "
+                "ORDER BY t.tick_number",
+                params + [start, max(1, stride)]
+            ).fetchall()
+
+    def get_world_timeseries(
+        self, session_id: str, start_tick: Optional[int] = None, end_tick: Optional[int] = None, stride: int = 1
+    ) -> List[tuple]:
+        """Rows of (tick, *WORLD_COLUMNS) ordered by tick."""
+        start, end = self._tick_bounds(start_tick, end_tick)
+        where, params = self._segment_clause(self._segments(session_id, start, end))
+        with self.connections.reader() as conn:
+            return conn.execute(
+                f"SELECT tick_number, {', '.join(WORLD_COLUMNS)} FROM world_timeseries "
+                f"WHERE {where} AND (tick_number - ?) % ? = 0 "
+                "ORDER BY tick_number",
+                params + [start, max(1, stride)]
+            ).fetchall()
+
+    def get_session_factions(self, session_id: str) -> Dict[str, Tuple[str, str]]:
+        """Latest name and color of every faction that has time-series rows, by faction id."""
+        names = {}
+        with self.connections.reader() as conn:
+            # A fork's own names override the ones inherited from its ancestors.
+            for owner, _ in self._lineage(session_id):
+                rows = conn.execute(
+                    "SELECT faction_id, name, color FROM session_factions WHERE session_id = ?", (owner,)
+                ).fetchall()
+                names.update((fid, (name, color)) for fid, name, color in rows)
+        return names
+
+    def query_timeseries(
+        self,
+        session_id: str,
+        entity_ids: Optional[Iterable[str]],
+        fields: Iterable[str],
+        tick_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        max_points: int = 300
+    ) -> Dict[Optional[str], TimeSeries]:
+        """Downsampled column arrays of faction metrics, or of world metrics when entity_ids is None.
+
+        The finest stored resolution (raw rows, then each rollup level) that fits
+        tick_range into max_points is read; when even the coarsest level is too
+        fine, its buckets are merged further. Points cover whole buckets, so the
+        first and last ones may reach slightly outside tick_range. Returns one
+        TimeSeries per faction id, or a single one under the None key.
+        """
+        series = WORLD_SERIES if entity_ids is None else FACTION_SERIES
+        table, rollups, columns, key = series
+        fields = list(fields)
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise ValueError(f"Unknown time-series fields: {', '.join(unknown)}")
+        max_points = max(1, max_points)
+
+        start, end = self._tick_bounds(*(tick_range or (None, None)))
+        if tick_range is None or tick_range[0] is None or tick_range[1] is None:
+            first, last = self.get_tick_range(session_id)
+            start, end = max(start, first), min(end, last)
+
+        def buckets(size: int) -> int:
+            return max(0, end // size - start // size + 1)
+
+        segments = self._segments(session_id, start, end)
+        levels = sorted(self.config.rollup_levels)
+        if not levels or all(low >= self._raw_floor(owner) for owner, low, _ in segments):
+            levels = [1] + levels
+        level = next((size for size in levels if buckets(size) <= max_points), levels[-1])
+        merge = -(-buckets(level) // max_points)
+        width = level * merge
+
+        entity_filter, entity_params = "", []
+        if key:
+            entity_ids = list(entity_ids)
+            if not entity_ids:
+                return {}
+            entity_filter = f" AND {key} IN ({', '.join('?' * len(entity_ids))})"
+            entity_params = entity_ids
+        entity = key if key else "NULL"
+        by_entity = f"{key}, " if key else ""
+
+        def aggregates(size: int, grouped: bool) -> str:
+            # Sample count, then sum, min and max of every field.
+            if size == 1:
+                values = [f"SUM({f}), MIN({f}), MAX({f})" if grouped else f"{f}, {f}, {f}" for f in fields]
+                return ", ".join(["COUNT(*)" if grouped else "1"] + values)
+            values = [f"SUM({f}_sum), MIN({f}_min), MAX({f}_max)" if grouped else f"{f}_sum, {f}_min, {f}_max" for f in fields]
+            return ", ".join(["SUM(samples)" if grouped else "samples"] + values)
+
+        def source(size: int) -> Tuple[str, str, str]:
+            if size == 1:
+                return table, "tick_number", "tick_number >= ? AND tick_number <= ?"
+            return rollups, "bucket", f"level = {size} AND bucket >= ? AND bucket <= ?"
+
+        def pieces(low: int, high: int, sizes: List[int]) -> List[Tuple[int, int, int]]:
+            # Covers low..high exactly with whole buckets, coarsest first, down to raw ticks.
+            for i, size in enumerate(sizes):
+                first_bucket, last_bucket = -(-low // size), (high + 1) // size - 1
+                if first_bucket <= last_bucket:
+                    return (
+                        pieces(low, first_bucket * size - 1, sizes[i + 1:])
+                        + [(size, first_bucket, last_bucket)]
+                        + pieces((last_bucket + 1) * size, high, sizes[i + 1:])
+                    )
+            return [(1, low, high)] if low <= high else []
+
+        # Merged points are counted from the first bucket of the range so at most max_points come back.
+        first = start // level
+        finer = sorted((size for size in self.config.rollup_levels if size < level), reverse=True)
+        points: Dict[Tuple[Optional[str], int], list] = {}
+
+        def add(entity_id: Optional[str], point: int, row: tuple):
+            acc = points.get((entity_id, point))
+            if acc is None:
+                points[(entity_id, point)] = list(row)
+                return
+            acc[0] += row[0]
+            for i in range(1, len(row), 3):
+                acc[i] += row[i]
+                acc[i + 1] = min(acc[i + 1], row[i + 1])
+                acc[i + 2] = max(acc[i + 2], row[i + 2])
+
+        with self.connections.reader() as conn:
+            for owner, low, high in segments:
+                table_name, bucket, where = source(level)
+                bounds = (low, high) if level == 1 else (low // level, high // level)
+                tail = None
+                if owner != session_id and level > 1 and (high + 1) % level:
+                    # An ancestor's last bucket also holds ticks after the fork; rebuild its part from finer data.
+                    bounds, tail = (bounds[0], bounds[1] - 1), bounds[1]
+                point = f"({bucket} - {first}) / {merge}"
+                grouping = f" GROUP BY {by_entity}{point}" if merge > 1 else ""
+                cursor = conn.execute(
+                    f"SELECT {entity}, {point}, {aggregates(level, merge > 1)} FROM {table_name} "
+                    f"WHERE session_id = ? AND {where}{entity_filter}{grouping}",
+                    (owner,) + bounds + tuple(entity_params)
+                )
+                for row in cursor:
+                    add(row[0], row[1], row[2:])
+                if tail is None:
+                    continue
+                for size, piece_low, piece_high in pieces(tail * level, high, finer):
+                    table_name, _, where = source(size)
+                    cursor = conn.execute(
+                        f"SELECT {entity}, {aggregates(size, True)} FROM {table_name} "
+                        f"WHERE session_id = ? AND {where}{entity_filter}{' GROUP BY ' + key if key else ''}",
+                        (owner, piece_low, piece_high) + tuple(entity_params)
+                    )
+                    for row in cursor:
+                        if row[1]:
+                            add(row[0], (tail - first) // merge, row[1:])
+
+        results: Dict[Optional[str], TimeSeries] = {}
+        for (entity_id, point), acc in sorted(points.items(), key=lambda item: (item[0][0] or "", item[0][1])):
+            result = results.get(entity_id)
+            if result is None:
+                result = results[entity_id] = TimeSeries(width, [], {})
+                for f in fields:
+                    result.columns[f], result.columns[f + "_min"], result.columns[f + "_max"] = [], [], []
+            result.ticks.append(point * width + first * level)
+            for i, f in enumerate(fields):
+                result.columns[f].append(acc[1 + 3 * i] / acc[0])
+                result.columns[f + "_min"].append(acc[2 + 3 * i])
+                result.columns[f + "_max"].append(acc[3 + 3 * i])
+        return results
+
+    def _tick_bounds(self, start_tick: Optional[int], end_tick: Optional[int]) -> Tuple[int, int]:
+        return (
+            start_tick if start_tick is not None else 0,
+            end_tick if end_tick is not None else 2 ** 63 - 1
+        )
+
+    def get_keyframe_ticks(self, session_id: str) -> List[int]:
+        with self.connections.reader() as conn:
             cursor = conn.execute(
-                "SELECT tick_number, world_json FROM snapshots WHERE session_id = ? ORDER BY tick_number",
+                "SELECT tick_number FROM snapshots WHERE session_id = ? AND kind = 0 ORDER BY tick_number",
                 (session_id,)
             )
-            return cursor.fetchall()
-    
-    def get_tick_range(self, session_id: str) -> tuple:
-        with self.get_connection() as conn:
-            res = conn.execute(
-                "SELECT MIN(tick_number), MAX(tick_number) FROM ticks WHERE session_id = ?",
-                (session_id,)
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_raw_segment(self, session_id: str, base_tick: int, end_tick: int) -> Tuple[Union[bytes, str], List[Tuple[int, Union[bytes, str]]]]:
+        """Stored payloads, still compressed, of the keyframe at base_tick and the deltas up to end_tick.
+
+        A keyframe stored as a manifest comes back as the uncompressed world
+        blob it stands for, so it can be decoded without the entity_blobs table.
+        """
+        with self.connections.reader() as conn:
+            snapshot = conn.execute(
+                "SELECT world_json FROM snapshots WHERE session_id = ? AND tick_number = ? AND kind = 0",
+                (session_id, base_tick)
             ).fetchone()
-            return (res[0] or 0, res[1] or 0)
-            
-    def get_sampled_snapshots(self, session_id: str, max_points: int = 100) -> List[tuple]:
-        with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT tick_number FROM snapshots WHERE session_id = ? ORDER BY tick_number",
-                (session_id,)
+            if snapshot is None:
+                raise ValueError(f"No keyframe at tick {base_tick} for session {session_id}.")
+            payload = snapshot[0]
+            if is_manifest(self._unpack(session_id, payload)):
+                payload = self._resolve_manifest(conn, self._unpack(session_id, payload))
+            deltas = conn.execute(
+                "SELECT tick_number, delta_json FROM deltas WHERE session_id = ? AND tick_number > ? AND tick_number <= ? ORDER BY tick_number",
+                (session_id, base_tick, end_tick)
+            ).fetchall()
+        return payload, deltas
+
+    def count_world_metrics(self, session_id: str, start_tick: int, end_tick: int) -> int:
+        with self.connections.reader() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM world_timeseries WHERE session_id = ? AND tick_number >= ? AND tick_number <= ?",
+                (session_id, start_tick, end_tick)
+            ).fetchone()[0]
+
+    def get_backfill_progress(self, session_id: str) -> Optional[int]:
+        with self.connections.reader() as conn:
+            res = conn.execute("SELECT last_tick FROM backfill_progress WHERE session_id = ?", (session_id,)).fetchone()
+        return res[0] if res else None
+
+    def save_backfill(self, session_id: str, items: List[Tuple[int, TickMetrics]], last_tick: int):
+        """Writes backfilled metrics and the resume point in one transaction. Existing rows win."""
+        with self.connections.writer() as conn:
+            self._save_metrics(conn, [(session_id, tick, metrics) for tick, metrics in items], backfill=True)
+            conn.execute(
+                "INSERT INTO backfill_progress (session_id, last_tick, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_tick = excluded.last_tick, updated_at = excluded.updated_at",
+                (session_id, last_tick, time.time())
             )
-            all_ticks = [row[0] for row in cursor.fetchall()]
-            
-            if not all_ticks:
+
+    def query_events(
+        self,
+        session_id: str,
+        kinds: Optional[Iterable[str]] = None,
+        entity_id: Optional[str] = None,
+        text: Optional[str] = None,
+        tick_range: Optional[Tuple[Optional[int], Optional[int]]] = None,
+        limit: int = 50
+    ) -> List[Tuple[int, str, Optional[str], Optional[str], str]]:
+        """Latest events of a session, newest first, as (tick, kind, primary, secondary, message).
+
+        Events the session inherited from its ancestors are included. kinds,
+        entity_id (on either side of the event), text (every word of it in the
+        message, through the full-text index) and tick_range narrow the result.
+        Every lineage segment, kind and entity side is read by its own subquery
+        walking an index backwards from the newest tick, so a query reads about
+        limit rows per subquery however long the history is.
+        """
+        match = None
+        if text:
+            match = match_query(text)
+            if match is None:
                 return []
-            
-            total_ticks = len(all_ticks)
-            if total_ticks <= max_points:
-                selected_ticks = all_ticks
+        kinds = list(kinds) if kinds else []
+        limit = max(1, limit)
+        start, end = self._tick_bounds(*(tick_range or (None, None)))
+
+        branches, params = [], []
+        for owner, first, last in self._segments(session_id, start, end):
+            # The index to walk is named: without statistics SQLite would rather walk
+            # the primary key and filter. An entity leads when there is one, then the
+            # kinds, one at a time.
+            if entity_id is not None:
+                sides = [
+                    ("idx_events_primary", "e.primary_id = ?", [entity_id]),
+                    ("idx_events_secondary", "e.secondary_id = ? AND e.primary_id IS NOT ?", [entity_id, entity_id]),
+                ]
+                groups = [kinds]
             else:
-                step = total_ticks / max_points
-                selected_indices = [int(i * step) for i in range(max_points)]
-                
-                if selected_indices and (total_ticks - 1) not in selected_indices:
-                     selected_indices[-1] = total_ticks - 1
-                
-                selected_ticks = [all_ticks[i] for i in selected_indices if i < total_ticks]
-                selected_ticks = sorted(list(set(selected_ticks)))
-            
-            if not selected_ticks:
-                return []
+                sides = [("idx_events_kind" if kinds else None, None, [])]
+                groups = [[kind] for kind in kinds] or [[]]
+            for index, side, side_params in sides:
+                for group in groups:
+                    conditions = ["e.session_id = ?", "e.tick_number >= ?", "e.tick_number <= ?"]
+                    values = [owner, first, last]
+                    if side:
+                        conditions.append(side)
+                        values += side_params
+                    if group:
+                        conditions.append(f"e.kind IN ({', '.join('?' * len(group))})")
+                        values += group
+                    order = "e.tick_number DESC, e.seq DESC"
+                    if match and index is None and tick_range is None:
+                        # Only text: walk the matches newest first. Rows of a session are
+                        # inserted in tick order, so their rowids follow their ticks.
+                        # Otherwise the matches are collected once and checked per row,
+                        # which costs the same wherever the rows sit.
+                        source = "events_fts JOIN events AS e ON e.rowid = events_fts.rowid"
+                        conditions.insert(0, "events_fts MATCH ?")
+                        values.insert(0, match)
+                        order = "events_fts.rowid DESC"
+                    else:
+                        source = f"events AS e INDEXED BY {index}" if index else "events AS e"
+                        if match:
+                            conditions.append("e.rowid IN (SELECT rowid FROM events_fts WHERE events_fts MATCH ?)")
+                            values.append(match)
+                    branches.append(
+                        f"SELECT * FROM (SELECT e.tick_number, e.seq, e.kind, e.primary_id, e.secondary_id, e.message FROM {source} "
+                        f"WHERE {' AND '.join(conditions)} ORDER BY {order} LIMIT ?)"
+                    )
+                    params += values + [limit]
+        if not branches:
+            return []
+        with self.connections.reader() as conn:
+            rows = conn.execute(
+                f"SELECT tick_number, kind, primary_id, secondary_id, message FROM ({' UNION ALL '.join(branches)}) "
+                "ORDER BY tick_number DESC, seq DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return rows
+
+    def rebuild_events(self, session_id: str, batch_ticks: int = 1000) -> int:
+        """Fills the events of a session recorded before they had their own table from its deltas.
+
+        Does nothing when the session already has event rows. The events of a
+        coalesced delta all land on the last tick of its range. Returns the
+        number of rows written.
+        """
+        with self.connections.reader() as conn:
+            if conn.execute("SELECT 1 FROM events WHERE session_id = ? LIMIT 1", (session_id,)).fetchone():
+                return 0
+        fork = self.get_fork_point(session_id)
+        first = fork[1] + 1 if fork else 0
+        last = self.get_latest_tick(session_id)
+        written = 0
+        batch = []
+
+        def flush():
+            nonlocal written
+            with self.connections.writer() as conn:
+                conn.executemany(
+                    "INSERT INTO events (session_id, tick_number, seq, kind, primary_id, secondary_id, message) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(session_id, tick, seq, *row) for tick, rows in batch for seq, row in enumerate(rows)]
+                )
+            written += sum(len(rows) for _, rows in batch)
+            batch.clear()
+
+        for tick, delta in self.iter_deltas(session_id, first, last, decode=True):
+            rows = event_rows(delta)
+            if rows:
+                batch.append((tick, rows))
+            if len(batch) >= batch_ticks:
+                flush()
+        if batch:
+            flush()
+        return written
 
-            placeholders = ','.join(['?'] * len(selected_ticks))
-            query = f"SELECT tick_number, world_json FROM snapshots WHERE session_id = ? AND tick_number IN ({placeholders}) ORDER BY tick_number"
-            args = [session_id] + selected_ticks
+    def get_tick_range(self, session_id: str) -> tuple:
+        lineage = self._lineage(session_id)
+        with self.connections.reader() as conn:
+            res = conn.execute(
+                # Separate subqueries let SQLite answer each bound with a single index seek.
+                "SELECT (SELECT MIN(tick_number) FROM ticks WHERE session_id = ?), "
+                "(SELECT MAX(tick_number) FROM ticks WHERE session_id = ?)",
+                (lineage[0][0], session_id)
+            ).fetchone()
+            return (res[0] or 0, res[1] if res[1] is not None else lineage[-1][1] or 0)
             
-            cursor = conn.execute(query, args)
-            return cursor.fetchall()
+    def get_sampled_snapshots(self, session_id: str, max_points: int = 100, lazy: bool = False) -> List[Tuple[int, Union[World, LazyWorld]]]:
+        """At most max_points evenly spaced snapshots, always including the first and the last one.
+
+        With lazy, binary snapshots come back as LazyWorld views, so scanning a
+        few fields across the samples skips decoding the rest.
+        """
+        where, params = self._segment_clause(self._segments(session_id, *self._tick_bounds(None, None), snapshots=True))
+        with self.connections.reader() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM snapshots WHERE {where}", params).fetchone()[0]
+            if not total:
+                return []
+            # The first and every stride-th snapshot, plus the last: max_points - 1 strides span all of them.
+            points = max(1, max_points)
+            stride = -(-(total - 1) // (points - 1)) if points > 1 and total > 1 else 0
+            # Ticks are picked from the index; payloads are only read for the chosen ones.
+            cursor = conn.execute(
+                "SELECT session_id, tick_number FROM ("
+                "  SELECT session_id, tick_number, ROW_NUMBER() OVER (ORDER BY tick_number) - 1 AS position"
+                f"  FROM snapshots WHERE {where}"
+                ") WHERE (? > 0 AND position % ? = 0) OR position = ? ORDER BY tick_number",
+                params + [stride, stride, total - 1]
+            )
+            selected = cursor.fetchall()
+            results = []
+            for owner in dict.fromkeys(owner for owner, _ in selected):
+                results += self._reconstruct_snapshots(conn, owner, [tick for o, tick in selected if o == owner], lazy)
+            return results
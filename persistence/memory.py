@@ -0,0 +1,86 @@
+"""Storage backend that keeps every session in process memory.
+
+Nothing touches the disk and everything is gone when the process exits, which
+suits benchmarks, tests and ensemble runs that only keep the final worlds.
+"""
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.defaults import PersistenceConfig
+from .backend import RecordBackend, RECORD_TICK, RECORD_SNAPSHOT
+
+
+class _SessionRecords:
+    __slots__ = ("ticks", "payloads", "snapshot_ticks", "seeds")
+
+    def __init__(self):
+        self.ticks: List[int] = []
+        # kind -> tick -> payload
+        self.payloads: Dict[int, Dict[int, bytes]] = {}
+        self.snapshot_ticks: List[int] = []
+        self.seeds: List[Tuple[int, int]] = []
+
+
+class InMemoryBackend(RecordBackend):
+    """Sessions held in dicts, one payload per tick and record kind."""
+
+    def __init__(self, config: Optional[PersistenceConfig] = None):
+        super().__init__(config)
+        self._records: Dict[str, _SessionRecords] = {}
+
+    def _store_session(self, row: tuple):
+        self._records[row[0]] = _SessionRecords()
+
+    def _append(self, records: Dict[str, List[Tuple[int, int, bytes]]]):
+        for session_id, entries in records.items():
+            session = self._records[session_id]
+            for kind, tick, payload in entries:
+                if kind == RECORD_TICK:
+                    session.ticks.append(tick)
+                    continue
+                session.payloads.setdefault(kind, {})[tick] = bytes(payload)
+                if kind == RECORD_SNAPSHOT:
+                    session.snapshot_ticks.append(tick)
+
+    def _read(self, session_id: str, kind: int, start_tick: int, end_tick: int) -> Iterator[Tuple[int, bytes]]:
+        session = self._records.get(session_id)
+        if session is None:
+            return
+        payloads = session.payloads.get(kind, {})
+        ticks = session.ticks
+        for tick in ticks[bisect_left(ticks, start_tick):bisect_right(ticks, end_tick)]:
+            payload = payloads.get(tick)
+            if payload is not None:
+                yield tick, payload
+
+    def _bounds(self, session_id: str) -> Tuple[Optional[int], Optional[int]]:
+        session = self._records.get(session_id)
+        if session is None or not session.ticks:
+            return None, None
+        return session.ticks[0], session.ticks[-1]
+
+    def _snapshot_ticks(self, session_id: str) -> List[int]:
+        session = self._records.get(session_id)
+        return session.snapshot_ticks if session else []
+
+    def truncate_session(self, session_id: str, tick: int):
+        session = self._records.get(session_id)
+        if session is None:
+            return
+        del session.ticks[bisect_right(session.ticks, tick):]
+        del session.snapshot_ticks[bisect_right(session.snapshot_ticks, tick):]
+        session.seeds = [epoch for epoch in session.seeds if epoch[0] <= tick]
+        for payloads in session.payloads.values():
+            for stored in [stored for stored in payloads if stored > tick]:
+                del payloads[stored]
+
+    def record_seed(self, session_id: str, tick: int, seed: int):
+        session = self._records[session_id]
+        session.seeds = [epoch for epoch in session.seeds if epoch[0] < tick] + [(tick, seed)]
+
+    def get_seeds(self, session_id: str) -> List[Tuple[int, int]]:
+        session = self._records.get(session_id)
+        return list(session.seeds) if session else []
+
+    def close(self):
+        pass
@@ -0,0 +1,140 @@
+"""Sessions recorded as replay logs.
+
+With storage_mode "replay" the engine records, per session, the config and
+seed it ran with, the initial snapshot, the external edits applied at each tick
+and a verification snapshot every replay_snapshot_interval ticks. Deltas,
+inverse deltas and the time series between snapshots are not written; a tick
+is rebuilt by running the systems again from the closest snapshot before it.
+
+That only reproduces the run while the systems behave as they did when it was
+recorded. verify_session() runs a session again from its first snapshot and
+compares the result with each later one, which finds where a change to the
+systems made an old session diverge.
+
+Usage: python -m persistence.replay <db_path> [session_id ...]
+"""
+import argparse
+import logging
+import sys
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from core.defaults import Defaults
+from core.simulator import Simulator
+from domains.world import World
+from .backend import StorageBackend, create_backend
+from .serializer import from_json
+
+logger = logging.getLogger("Replay")
+
+
+def session_config(persistence: StorageBackend, session_id: str) -> Defaults:
+    """The config a session was recorded with, seed included."""
+    metadata = persistence.load_session_metadata(session_id)
+    if not metadata:
+        raise ValueError(f"Session {session_id} not found.")
+    return from_json(metadata[3] or "{}", Defaults)
+
+
+def is_replay_log(config: Defaults) -> bool:
+    return config.simulation.storage_mode == "replay"
+
+
+def seed_schedule(persistence: StorageBackend, session_id: str) -> List[Tuple[int, int]]:
+    """(first tick, seed) of every seed epoch the ticks of a session ran with, read through forks.
+
+    A session starts with the seed of its config; a fork's seed starts after
+    its fork tick. Each rewind recorded a new epoch from the tick it
+    continued from.
+    """
+    fork = persistence.get_fork_point(session_id)
+    schedule = [epoch for epoch in seed_schedule(persistence, fork[0]) if epoch[0] <= fork[1]] if fork else []
+    seed = session_config(persistence, session_id).simulation.seed
+    if seed is not None:
+        schedule.append((fork[1] + 1 if fork else 0, seed))
+    return schedule + persistence.get_seeds(session_id)
+
+
+def resimulate(
+    persistence: StorageBackend, session_id: str, config: Defaults, world: World, start_tick: int, end_tick: int
+) -> World:
+    """Rebuilds ticks start_tick..end_tick of a replay log on world, in place."""
+    if config.simulation.seed is None:
+        raise ValueError(f"Session {session_id} has no recorded seed to replay.")
+    inputs = dict(persistence.get_inputs(session_id, start_tick, end_tick))
+    simulator = Simulator(config, config.simulation.seed, seed_schedule(persistence, session_id))
+    return simulator.resimulate(world, start_tick, end_tick, inputs)
+
+
+@dataclass
+class VerificationReport:
+    session_id: str
+    ticks: int = 0
+    snapshots: int = 0
+    # The first snapshot that re-simulation did not reproduce, and the snapshot before it.
+    diverged: Optional[Tuple[int, int]] = None
+    seconds: float = 0.0
+
+
+def _snapshot_ticks(persistence: StorageBackend, session_id: str, start_tick: int, end_tick: int) -> List[int]:
+    ticks = []
+    tick = persistence.get_nearest_snapshot_tick(session_id, end_tick)
+    while tick is not None and tick >= start_tick:
+        ticks.append(tick)
+        tick = persistence.get_nearest_snapshot_tick(session_id, tick - 1) if tick > 0 else None
+    return ticks[::-1]
+
+
+def verify_session(persistence: StorageBackend, session_id: str) -> VerificationReport:
+    """Re-simulates a replay log from its first replayable snapshot and compares every later snapshot."""
+    config = session_config(persistence, session_id)
+    if not is_replay_log(config):
+        raise ValueError(f"Session {session_id} is not recorded as a replay log.")
+    report = VerificationReport(session_id)
+    started = time.perf_counter()
+
+    ticks = _snapshot_ticks(persistence, session_id, persistence.get_compacted_tick(session_id) or 0, persistence.get_latest_tick(session_id))
+    if ticks:
+        world = persistence.get_snapshot(session_id, ticks[0])
+        for previous, tick in zip(ticks, ticks[1:]):
+            resimulate(persistence, session_id, config, world, previous + 1, tick)
+            report.ticks += tick - previous
+            report.snapshots += 1
+            if world != persistence.get_snapshot(session_id, tick):
+                report.diverged = (tick, previous)
+                break
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that replay logs still re-simulate to their verification snapshots.")
+    parser.add_argument("db_path")
+    parser.add_argument("session_ids", nargs="*", help="defaults to every replay log in the database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = Defaults()
+    persistence = create_backend(args.db_path, config.persistence)
+    diverged = False
+    try:
+        session_ids = args.session_ids or [
+            session_id for session_id in persistence.list_session_ids()
+            if is_replay_log(session_config(persistence, session_id))
+        ]
+        for session_id in session_ids:
+            report = verify_session(persistence, session_id)
+            if report.diverged:
+                diverged = True
+                tick, previous = report.diverged
+                logger.error(f"{session_id}: diverges between ticks {previous} and {tick}")
+            else:
+                logger.info(f"{session_id}: {report.snapshots} snapshots reproduced over {report.ticks} ticks in {report.seconds:.1f}s")
+    finally:
+        persistence.close()
+    sys.exit(1 if diverged else 0)
+
+
+if __name__ == "__main__":
+    main()
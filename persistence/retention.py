@@ -0,0 +1,159 @@
+"""Retention policy for recorded sessions.
+
+Old history is reduced in three ways, each off by default:
+
+- Deltas older than retention_delta_ticks are dropped up to the latest snapshot
+  before that horizon. That snapshot covers every later replay, and earlier
+  ticks stay readable at their snapshots.
+- Snapshots older than retention_snapshot_window are thinned so that their
+  spacing doubles each time their age doubles, which keeps a logarithmic number
+  of them per session.
+- Sessions idle for archive_after_days are moved out of the database into
+  compressed archive files, which the engine restores when they are loaded or
+  forked again.
+
+A run ends with an incremental VACUUM so the freed pages leave the file.
+
+Usage: python -m persistence.retention <db_path> [session_id ...]
+"""
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+from core.defaults import Defaults
+from .backend import create_backend
+from .catalog import SessionFilesBackend
+from .manager import PersistenceManager
+
+logger = logging.getLogger("Retention")
+
+
+@dataclass
+class RetentionReport:
+    sessions: int = 0
+    deltas_dropped: int = 0
+    snapshots_dropped: int = 0
+    archived: List[str] = field(default_factory=list)
+    bytes_reclaimed: int = 0
+    seconds: float = 0.0
+
+
+def thinned_snapshots(ticks: List[int], latest_tick: int, interval: int, window: int, keep: Iterable[int] = ()) -> List[int]:
+    """Snapshot ticks to drop so that past window, the spacing of kept snapshots doubles with every doubling of age.
+
+    Snapshots aged window to 2*window keep one per two intervals, those aged
+    2*window to 4*window one per four, and so on. A snapshot goes when the
+    previous one kept falls in the same spacing-wide span of ticks, so
+    irregular adaptive schedules thin like fixed ones. Spacing only grows with
+    age, so running the schedule again later only drops more.
+    """
+    keep = set(keep)
+    interval = max(1, interval)
+    drop = []
+    kept = None
+    for tick in sorted(ticks):
+        age = latest_tick - tick
+        spacing = interval * 2 ** (age // window).bit_length()
+        if age >= window and tick not in keep and kept is not None and kept // spacing == tick // spacing:
+            drop.append(tick)
+        else:
+            kept = tick
+    return drop
+
+
+def apply_retention(
+    persistence: PersistenceManager,
+    config: Optional[Defaults] = None,
+    session_ids: Optional[List[str]] = None,
+    exclude: Iterable[str] = ()
+) -> RetentionReport:
+    """Applies the retention settings of config.persistence to sessions, then vacuums.
+
+    Sessions in exclude, such as the one the engine is running, are left
+    alone. Forks are processed before their parents, so a parent whose forks
+    were all archived can be archived in the same run.
+    """
+    if not isinstance(persistence, (PersistenceManager, SessionFilesBackend)):
+        raise NotImplementedError(f"{type(persistence).__name__} has no retention policy.")
+    config = config or Defaults()
+    settings = config.persistence
+    exclude = set(exclude)
+    report = RetentionReport()
+    started = time.perf_counter()
+
+    session_ids = session_ids or persistence.list_session_ids()
+    for session_id in reversed(session_ids):
+        if session_id in exclude:
+            continue
+        report.sessions += 1
+
+        idle_days = (time.time() - persistence.get_last_activity(session_id)) / 86_400
+        if settings.archive_after_days > 0 and idle_days >= settings.archive_after_days:
+            if persistence.list_forks(session_id):
+                logger.info(f"Not archiving session {session_id}: it still has forks.")
+            else:
+                persistence.archive_session(session_id)
+                report.archived.append(session_id)
+                continue
+
+        latest_tick = persistence.get_latest_tick(session_id)
+        snapshot_ticks = persistence.get_snapshot_ticks(session_id)
+        if settings.retention_delta_ticks > 0:
+            horizon = latest_tick - settings.retention_delta_ticks
+            covering = [tick for tick in snapshot_ticks if tick <= horizon]
+            compacted = persistence.get_compacted_tick(session_id)
+            if covering and (compacted is None or covering[-1] > compacted):
+                report.deltas_dropped += persistence.compact_deltas(session_id, covering[-1])
+
+        if settings.retention_snapshot_window > 0 and snapshot_ticks:
+            keep = [snapshot_ticks[0], persistence.get_compacted_tick(session_id)]
+            drop = thinned_snapshots(
+                snapshot_ticks, latest_tick, config.simulation.snapshot_interval, settings.retention_snapshot_window, keep
+            )
+            if drop:
+                report.snapshots_dropped += persistence.drop_snapshots(session_id, drop)
+
+    report.bytes_reclaimed = persistence.vacuum(settings.vacuum_pages)
+    report.seconds = time.perf_counter() - started
+    logger.info(
+        f"Retention over {report.sessions} sessions: {report.deltas_dropped} deltas and "
+        f"{report.snapshots_dropped} snapshots dropped, {len(report.archived)} archived, "
+        f"{report.bytes_reclaimed / 1024 / 1024:.1f} MiB reclaimed in {report.seconds:.1f}s"
+    )
+    return report
+
+
+def _disk_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the retention policy to recorded sessions.")
+    parser.add_argument("db_path")
+    parser.add_argument("session_ids", nargs="*", help="defaults to every session in the database")
+    parser.add_argument("--restore", action="append", default=[], metavar="SESSION_ID", help="restore an archived session instead")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = Defaults()
+    persistence = create_backend(args.db_path, config.persistence)
+    try:
+        if args.restore:
+            for session_id in args.restore:
+                if not persistence.restore_session(session_id):
+                    raise SystemExit(f"No archive of session {session_id} under {persistence.archive_path}.")
+                logger.info(f"Restored session {session_id}")
+            return
+        apply_retention(persistence, config, args.session_ids or None)
+        logger.info(f"Database size: {_disk_size(args.db_path) / 1024 / 1024:.1f} MiB")
+    finally:
+        persistence.close()
+
+
+if __name__ == "__main__":
+    main()
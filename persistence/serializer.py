@@ -1,7 +1,20 @@
 import json
 import dataclasses
 from enum import Enum
-from typing import Any, Set
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from deltas.types import (
+    WorldDelta, FactionDelta, RegionDelta, FactionCreationData, RegionCreationData,
+    InverseDelta, FactionInverse, RegionInverse, EventTag
+)
+from core.defaults import Defaults
+from domains.economy import Resources
+from domains.faction import Faction
+from domains.power import Power
+from domains.region import Region
+from domains.region_meta import EnvironmentType, RegionSocioEconomic, WeatherState, WeatherType
+from domains.ressources import Ressources, Energetic, Human, Material, Production, Intangible, Vital
+from domains.world import World
 
 class SimulationEncoder(json.JSONEncoder):
     def default(self, o: Any) -> Any:
@@ -17,4 +30,217 @@ def to_json(obj: Any) -> str:
     return json.dumps(obj, cls=SimulationEncoder)
 
 def from_json(json_str: str, cls: Any = None) -> Any:
-    return json.loads(json_str)
\ No newline at end of file
+    data = json.loads(json_str)
+    if cls is None:
+        return data
+    decoder = _DECODERS.get(cls)
+    if decoder is None:
+        raise TypeError(f"No decoder registered for {cls.__name__}")
+    return decoder(data)
+
+
+def _restore(cls, **values):
+    # Persisted state is restored as-is: __post_init__ validation is for new
+    # entities, and a stored world may legitimately sit outside those bounds.
+    obj = cls.__new__(cls)
+    for name, value in values.items():
+        object.__setattr__(obj, name, value)
+    return obj
+
+def _optional(decoder: Callable[[Any], Any], value: Any) -> Any:
+    return decoder(value) if value is not None else None
+
+def _set(value: Any) -> Set[str]:
+    return set(value) if value else set()
+
+
+def ressources_from_data(data: Dict[str, Any]) -> Ressources:
+    return Ressources(
+        energetic=Energetic(**data.get("energetic", {})),
+        human=Human(**data.get("human", {})),
+        material=Material(**data.get("material", {})),
+        production=Production(**data.get("production", {})),
+        intangible=Intangible(**data.get("intangible", {})),
+        vital=Vital(**data.get("vital", {}))
+    )
+
+def weather_from_data(data: Dict[str, Any]) -> WeatherState:
+    return WeatherState(
+        type=WeatherType(data.get("type", WeatherType.SUNNY.value)),
+        intensity=data.get("intensity", 1.0),
+        duration=data.get("duration", 0)
+    )
+
+def faction_from_data(data: Dict[str, Any]) -> Faction:
+    return _restore(
+        Faction,
+        id=data["id"],
+        name=data["name"],
+        power=Power.from_dict(data.get("power")),
+        legitimacy=data.get("legitimacy", 50.0),
+        resources=Resources.from_dict(data.get("resources")),
+        detailed_resources=_optional(ressources_from_data, data.get("detailed_resources")),
+        knowledge=data.get("knowledge", 0.0),
+        regions=_set(data.get("regions")),
+        alliances=_set(data.get("alliances")),
+        traits=_set(data.get("traits")),
+        color=data.get("color", "#808080"),
+        is_active=data.get("is_active", True)
+    )
+
+def region_from_data(data: Dict[str, Any]) -> Region:
+    weather = data.get("weather")
+    return _restore(
+        Region,
+        id=data["id"],
+        name=data["name"],
+        population=data.get("population", 0),
+        owner=data.get("owner"),
+        environment=EnvironmentType.from_str(data.get("environment", "RURAL")),
+        socio_economic=RegionSocioEconomic.from_dict(data.get("socio_economic")),
+        weather=weather_from_data(weather) if weather else WeatherState()
+    )
+
+def world_from_data(data: Dict[str, Any]) -> World:
+    world = World(
+        factions={fid: faction_from_data(f) for fid, f in data.get("factions", {}).items()},
+        regions={rid: region_from_data(r) for rid, r in data.get("regions", {}).items()}
+    )
+    if data.get("market"):
+        world.market = dict(data["market"])
+    return world
+
+
+def faction_delta_from_data(data: Dict[str, Any]) -> FactionDelta:
+    return FactionDelta(
+        power=_optional(Power.from_dict, data.get("power")),
+        legitimacy=data.get("legitimacy"),
+        resources=_optional(Resources.from_dict, data.get("resources")),
+        detailed_resources=_optional(ressources_from_data, data.get("detailed_resources")),
+        knowledge=data.get("knowledge"),
+        add_regions=_set(data.get("add_regions")),
+        remove_regions=_set(data.get("remove_regions")),
+        add_alliances=_set(data.get("add_alliances")),
+        remove_alliances=_set(data.get("remove_alliances")),
+        deactivate=data.get("deactivate", False)
+    )
+
+def region_delta_from_data(data: Dict[str, Any]) -> RegionDelta:
+    return RegionDelta(
+        socio_economic=_optional(RegionSocioEconomic.from_dict, data.get("socio_economic")),
+        stability=data.get("stability"),
+        population=data.get("population"),
+        owner=data.get("owner"),
+        weather=_optional(weather_from_data, data.get("weather")),
+        is_conquered=data.get("is_conquered", False),
+        is_liberated=data.get("is_liberated", False)
+    )
+
+def faction_creation_from_data(data: Dict[str, Any]) -> FactionCreationData:
+    return FactionCreationData(
+        id=data["id"],
+        name=data["name"],
+        power=Power.from_dict(data.get("power")),
+        legitimacy=data.get("legitimacy", 50.0),
+        resources=Resources.from_dict(data.get("resources")),
+        regions=_set(data.get("regions")),
+        alliances=_set(data.get("alliances")),
+        detailed_resources=_optional(ressources_from_data, data.get("detailed_resources")),
+        knowledge=data.get("knowledge", 0.0),
+        traits=_set(data.get("traits")),
+        color=data.get("color", "#808080")
+    )
+
+def region_creation_from_data(data: Dict[str, Any]) -> RegionCreationData:
+    return RegionCreationData(
+        id=data["id"],
+        name=data["name"],
+        population=data.get("population", 0),
+        environment=EnvironmentType.from_str(data.get("environment", "RURAL")),
+        socio_economic=RegionSocioEconomic.from_dict(data.get("socio_economic")),
+        owner=data.get("owner")
+    )
+
+def delta_from_data(data: Optional[Dict[str, Any]]) -> WorldDelta:
+    if not data:
+        return WorldDelta()
+    return WorldDelta(
+        faction_deltas={fid: faction_delta_from_data(d) for fid, d in data.get("faction_deltas", {}).items()},
+        region_deltas={rid: region_delta_from_data(d) for rid, d in data.get("region_deltas", {}).items()},
+        create_factions={fid: faction_creation_from_data(d) for fid, d in data.get("create_factions", {}).items()},
+        create_regions={rid: region_creation_from_data(d) for rid, d in data.get("create_regions", {}).items()},
+        delete_factions=_set(data.get("delete_factions")),
+        delete_regions=_set(data.get("delete_regions")),
+        market=dict(data.get("market") or {}),
+        events=list(data.get("events") or []),
+        event_tags=[EventTag(t["kind"], t.get("primary"), t.get("secondary")) for t in data.get("event_tags") or []]
+    )
+
+
+def faction_inverse_from_data(data: Dict[str, Any]) -> FactionInverse:
+    return FactionInverse(
+        fields=_set(data.get("fields")),
+        power=_optional(Power.from_dict, data.get("power")),
+        legitimacy=data.get("legitimacy"),
+        resources=_optional(Resources.from_dict, data.get("resources")),
+        detailed_resources=_optional(ressources_from_data, data.get("detailed_resources")),
+        knowledge=data.get("knowledge"),
+        is_active=data.get("is_active"),
+        added_regions=_set(data.get("added_regions")),
+        removed_regions=_set(data.get("removed_regions")),
+        added_alliances=_set(data.get("added_alliances")),
+        removed_alliances=_set(data.get("removed_alliances"))
+    )
+
+def region_inverse_from_data(data: Dict[str, Any]) -> RegionInverse:
+    return RegionInverse(
+        fields=_set(data.get("fields")),
+        infrastructure=data.get("infrastructure"),
+        cohesion=data.get("cohesion"),
+        population=data.get("population"),
+        owner=data.get("owner"),
+        weather=_optional(weather_from_data, data.get("weather"))
+    )
+
+def inverse_from_data(data: Optional[Dict[str, Any]]) -> InverseDelta:
+    if not data:
+        return InverseDelta()
+    return InverseDelta(
+        factions={fid: faction_inverse_from_data(d) for fid, d in data.get("factions", {}).items()},
+        regions={rid: region_inverse_from_data(d) for rid, d in data.get("regions", {}).items()},
+        created_factions=_set(data.get("created_factions")),
+        created_regions=_set(data.get("created_regions")),
+        deleted_factions={fid: faction_from_data(d) for fid, d in data.get("deleted_factions", {}).items()},
+        deleted_regions={rid: region_from_data(d) for rid, d in data.get("deleted_regions", {}).items()},
+        market=dict(data.get("market") or {})
+    )
+
+
+def inputs_from_data(data: Optional[List[Dict[str, Any]]]) -> List[WorldDelta]:
+    return [delta_from_data(d) for d in data or []]
+
+
+def config_from_data(data: Optional[Dict[str, Any]]) -> Defaults:
+    # Sections and settings missing from older sessions keep their defaults;
+    # ones that no longer exist are ignored.
+    defaults = Defaults()
+    sections = {}
+    for section in dataclasses.fields(Defaults):
+        current = getattr(defaults, section.name)
+        stored = (data or {}).get(section.name) or {}
+        names = {f.name for f in dataclasses.fields(current)}
+        sections[section.name] = dataclasses.replace(current, **{
+            name: tuple(value) if isinstance(value, list) else value
+            for name, value in stored.items() if name in names
+        })
+    return Defaults(**sections)
+
+
+_DECODERS: Dict[type, Callable[[Any], Any]] = {
+    WorldDelta: delta_from_data,
+    InverseDelta: inverse_from_data,
+    World: world_from_data,
+    Faction: faction_from_data,
+    Region: region_from_data,
+    Defaults: config_from_data,
+}
@@ -0,0 +1,80 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from domains.world import World
+
+# Column order of the value part of faction_timeseries and world_timeseries rows.
+FACTION_COLUMNS = (
+    "army", "navy", "air", "legitimacy",
+    "credits", "materials", "food", "energy", "influence",
+    "knowledge", "region_count", "population", "is_active",
+)
+WORLD_COLUMNS = (
+    "active_factions", "region_count", "population", "total_power", "average_legitimacy",
+    "credits", "materials", "food", "energy", "influence",
+)
+
+
+def rollup_columns(columns: Tuple[str, ...]) -> List[str]:
+    """Value columns of a rollup table: min, max and sum of every metric column."""
+    return [f"{c}_{agg}" for c in columns for agg in ("min", "max", "sum")]
+
+
+@dataclass
+class TickMetrics:
+    """Per-faction and world-level indicators captured from the live world at one tick."""
+    factions: List[tuple] = field(default_factory=list)
+    world: tuple = ()
+    names: List[Tuple[str, str, str]] = field(default_factory=list)
+
+
+def capture_metrics(world: World) -> TickMetrics:
+    metrics = TickMetrics()
+    populations = {}
+    for region in world.regions.values():
+        if region.owner:
+            populations[region.owner] = populations.get(region.owner, 0) + region.population
+
+    active = 0
+    total_power = 0.0
+    total_legitimacy = 0.0
+    totals = [0.0] * 5
+    for fid, f in world.factions.items():
+        p, r = f.power, f.resources
+        metrics.factions.append((
+            fid,
+            p.army, p.navy, p.air, f.legitimacy,
+            r.credits, r.materials, r.food, r.energy, r.influence,
+            f.knowledge, len(f.regions), populations.get(fid, 0), int(f.is_active)
+        ))
+        metrics.names.append((fid, f.name, f.color))
+        if f.is_active:
+            active += 1
+            total_power += p.total
+            total_legitimacy += f.legitimacy
+            for i, value in enumerate((r.credits, r.materials, r.food, r.energy, r.influence)):
+                totals[i] += value
+
+    metrics.world = (
+        active,
+        len(world.regions),
+        sum(region.population for region in world.regions.values()),
+        total_power,
+        total_legitimacy / active if active else 0.0,
+        *totals
+    )
+    return metrics
+
+
+@dataclass
+class TimeSeries:
+    """Column arrays returned by PersistenceManager.query_timeseries.
+
+    ticks holds the first tick of each point. For every requested field,
+    columns[field] is the mean over the ticks the point covers and
+    columns[field + "_min"] / columns[field + "_max"] its extremes, so short
+    spikes stay visible after downsampling. resolution is the number of ticks
+    per point.
+    """
+    resolution: int
+    ticks: List[int] = field(default_factory=list)
+    columns: Dict[str, List[float]] = field(default_factory=dict)
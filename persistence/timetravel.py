@@ -0,0 +1,169 @@
+"""Read-only access to past states of recorded sessions.
+
+Reconstructed worlds are kept in a least-recently-used cache bounded by an
+estimate of their memory footprint. A request replays forward from the
+closest earlier state, cached or stored, so walking through a session's
+history only decodes the deltas in between, or runs the systems again over
+them for sessions recorded as replay logs. Ticks that have a stored snapshot
+can also be read through view() without decoding the whole world.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.defaults import Defaults
+from deltas.applier import DeltaApplier
+from deltas.types import WorldDelta
+from deltas.validator import DeltaValidator
+from domains.world import World
+from .lazy import LazyWorld
+from .backend import StorageBackend
+from .replay import is_replay_log, resimulate, session_config
+
+# Rough in-memory size of one reconstructed entity, measured on the demo scenario.
+FACTION_BYTES = 1024
+REGION_BYTES = 512
+
+
+def estimate_size(world: World) -> int:
+    return len(world.factions) * FACTION_BYTES + len(world.regions) * REGION_BYTES
+
+
+def _with_inputs(deltas: Iterable[Tuple[int, WorldDelta]], inputs: Dict[int, List[WorldDelta]]) -> Iterator[WorldDelta]:
+    # The external edits of a tick were applied before its systems ran. A
+    # coalesced delta is stored at the last tick of its range, and edits only
+    # start a range, so every edit up to a delta's tick goes before it.
+    pending = sorted(inputs.items())
+    for tick, delta in deltas:
+        while pending and pending[0][0] <= tick:
+            yield from pending.pop(0)[1]
+        yield delta
+
+
+class TimeTravelService:
+    def __init__(self, persistence: StorageBackend, config: Optional[Defaults] = None):
+        self.persistence = persistence
+        self.config = config or Defaults()
+        self.budget = self.config.persistence.world_cache_mib * 1024 * 1024
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[World, int]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._session_configs: Dict[str, Defaults] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_world(self, session_id: str, tick: int) -> World:
+        """State of a session at a tick, shared with other callers.
+
+        The returned world lives in the cache and must not be modified; use
+        checkout() for a copy that can be.
+        """
+        with self._lock:
+            entry = self._cache.get((session_id, tick))
+            if entry is not None:
+                self._cache.move_to_end((session_id, tick))
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            base_tick, base = self._nearest_cached(session_id, tick)
+
+        latest_tick = self.persistence.get_latest_tick(session_id)
+        if tick < 0 or tick > latest_tick:
+            raise ValueError(f"Tick {tick} is outside the recorded range (0-{latest_tick}).")
+        if not self.persistence.is_replayable(session_id, tick):
+            raise ValueError(f"Tick {tick} was compacted by the retention policy; only its snapshot ticks are kept.")
+        coalesced = self.persistence.get_coalesced_range(session_id, tick)
+        if coalesced:
+            first_tick, last_tick = coalesced
+            raise ValueError(f"Tick {tick} was coalesced with ticks {first_tick}-{last_tick}; read tick {first_tick - 1} or {last_tick} instead.")
+
+        snapshot_tick = self.persistence.get_nearest_snapshot_tick(session_id, tick)
+        if base is None or (snapshot_tick is not None and snapshot_tick > base_tick):
+            nearest = self.persistence.get_nearest_snapshot(session_id, tick)
+            if not nearest:
+                raise ValueError("No snapshot found to start replay.")
+            base_tick, world = nearest
+        else:
+            world = base.clone()
+
+        if tick > base_tick:
+            config = self._session_config(session_id)
+            if is_replay_log(config):
+                resimulate(self.persistence, session_id, config, world, base_tick + 1, tick)
+            else:
+                deltas = self.persistence.iter_deltas(session_id, base_tick + 1, tick, decode=True)
+                inputs = dict(self.persistence.get_inputs(session_id, base_tick + 1, tick))
+                DeltaApplier(DeltaValidator(self.config)).replay(_with_inputs(deltas, inputs), world)
+
+        self._store(session_id, tick, world)
+        return world
+
+    def view(self, session_id: str, tick: int) -> Union[World, LazyWorld]:
+        """Read-only state of a session at a tick, decoding as little as possible.
+
+        A cached world is returned as is. At a tick with a stored binary
+        snapshot, a LazyWorld that decodes entities as they are read is
+        returned and not cached. Other ticks go through get_world().
+        """
+        with self._lock:
+            entry = self._cache.get((session_id, tick))
+            if entry is not None:
+                self._cache.move_to_end((session_id, tick))
+                self.hits += 1
+                return entry[0]
+
+        if tick >= 0 and self.persistence.get_nearest_snapshot_tick(session_id, tick) == tick:
+            snapshot = self.persistence.get_snapshot(session_id, tick, lazy=True)
+            if snapshot is not None:
+                return snapshot
+        return self.get_world(session_id, tick)
+
+    def checkout(self, session_id: str, tick: int) -> World:
+        """Private, modifiable copy of a session's state at a tick."""
+        return self.get_world(session_id, tick).clone()
+
+    def invalidate(self, session_id: str, from_tick: int = 0):
+        """Drops cached states of a session from from_tick on, e.g. after its history was rewritten."""
+        with self._lock:
+            for key in [k for k in self._cache if k[0] == session_id and k[1] >= from_tick]:
+                self._size -= self._cache.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._cache), "bytes": self._size, "hits": self.hits, "misses": self.misses}
+
+    def _session_config(self, session_id: str) -> Defaults:
+        # A session keeps the config it was created with, so it is read once.
+        config = self._session_configs.get(session_id)
+        if config is None:
+            config = self._session_configs[session_id] = session_config(self.persistence, session_id)
+        return config
+
+    def _nearest_cached(self, session_id: str, tick: int) -> Tuple[Optional[int], Optional[World]]:
+        best = None
+        for sid, cached_tick in self._cache:
+            if sid == session_id and cached_tick <= tick and (best is None or cached_tick > best):
+                best = cached_tick
+        if best is None:
+            return None, None
+        self._cache.move_to_end((session_id, best))
+        return best, self._cache[(session_id, best)][0]
+
+    def _store(self, session_id: str, tick: int, world: World):
+        size = estimate_size(world)
+        if size > self.budget:
+            return
+        with self._lock:
+            previous = self._cache.pop((session_id, tick), None)
+            if previous is not None:
+                self._size -= previous[1]
+            self._cache[(session_id, tick)] = (world, size)
+            self._size += size
+            while self._size > self.budget:
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._size -= evicted
@@ -0,0 +1,258 @@
+import logging
+import queue
+import threading
+from typing import List, Optional, Tuple
+from deltas.merger import DeltaMerger
+from deltas.types import WorldDelta, InverseDelta
+from domains.world import World
+from .backend import PendingStep, StorageBackend
+from .events import EventRow, event_rows
+from .timeseries import TickMetrics
+
+logger = logging.getLogger("WriteBehindWriter")
+
+
+class BatchWriter:
+    """Buffers encoded ticks and writes them to the database in one transaction per batch.
+
+    A batch that fails to save is lost. Writing the ticks after it would leave
+    a gap in the history, so every later submit() and flush() raises until
+    discard() is called.
+    """
+
+    def __init__(self, persistence: StorageBackend, batch_size: int = 1):
+        self.persistence = persistence
+        self.batch_size = max(1, batch_size)
+        self._pending: List[PendingStep] = []
+        self._error: Optional[BaseException] = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def submit(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ):
+        self._raise_if_failed()
+        # Encode immediately: the world keeps mutating after this call returns.
+        self._pending.append(self.persistence.prepare_step(session_id, tick, delta, world_snapshot, metrics, inverse, inputs, first_tick, events))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        self._raise_if_failed()
+        if not self._pending:
+            return
+        steps = self._pending
+        self._pending = []
+        try:
+            self.persistence.save_steps(steps)
+        except BaseException as e:
+            self._error = e
+            raise
+
+    def discard(self):
+        """Drops the ticks not written yet and accepts new ones again."""
+        self._pending = []
+        self._error = None
+
+    def close(self):
+        self.flush()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError("An earlier batch of ticks was not written; discard() the rest before writing more.") from self._error
+
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Encodes and writes ticks on a dedicated thread fed by a bounded queue.
+
+    submit() blocks while the queue is full, which throttles the tick loop to the
+    speed of the disk. A failure on the writer thread is raised on the next
+    submit(), flush() or close() call. The ticks queued after it are dropped
+    rather than written past the lost ones, and every call keeps raising until
+    discard() is called.
+    """
+
+    def __init__(self, persistence: StorageBackend, batch_size: int = 1, queue_size: int = 1024):
+        self.persistence = persistence
+        self.batch_size = max(1, batch_size)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._error: Optional[BaseException] = None
+        self._dropped = 0
+        self._discarding = False
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="diane-write-behind", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def submit(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        first_tick: Optional[int] = None, events: Optional[List[EventRow]] = None
+    ):
+        self._raise_if_failed()
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter is closed.")
+        # Deltas, metrics, inverses and inputs are never touched again once captured, but the world keeps changing.
+        frozen = world_snapshot.clone() if world_snapshot else None
+        self._queue.put((session_id, tick, delta, frozen, metrics, inverse, inputs, first_tick, events))
+
+    def flush(self):
+        if not self._closed:
+            self._queue.join()
+        self._raise_if_failed()
+
+    def discard(self):
+        """Drops the ticks not written yet and clears a failure."""
+        with self._lock:
+            self._discarding = True
+        if not self._closed:
+            self._queue.join()
+        with self._lock:
+            self._discarding = False
+            self._error, self._dropped = None, 0
+
+    def close(self):
+        if self._closed:
+            self._raise_if_failed()
+            return
+        self._queue.join()
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._raise_if_failed()
+
+    def _raise_if_failed(self):
+        with self._lock:
+            error, dropped = self._error, self._dropped
+        if error is not None:
+            raise RuntimeError(
+                f"Background persistence failed; {dropped} tick(s) were not written."
+            ) from error
+
+    def _next_batch(self, first) -> Tuple[list, bool]:
+        batch = [first]
+        stop = False
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+
+            batch, stop = self._next_batch(first)
+            try:
+                with self._lock:
+                    failed = self._error is not None or self._discarding
+                if failed:
+                    with self._lock:
+                        self._dropped += len(batch)
+                else:
+                    steps = [self.persistence.prepare_step(*item) for item in batch]
+                    self.persistence.save_steps(steps)
+            except BaseException as e:
+                logger.error(f"Failed to persist ticks {batch[0][1]}-{batch[-1][1]}: {e}")
+                with self._lock:
+                    self._error = e
+                    self._dropped += len(batch)
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+
+            if stop:
+                return
+
+
+class CoalescingWriter:
+    """Folds the deltas of up to coalesce_ticks consecutive ticks into one before handing them to another writer.
+
+    The merged delta is stored at the last tick of its range with the range's
+    first tick; the other ticks of the range keep their metrics, inverse
+    deltas, inputs and event rows but no delta. A range ends early at a
+    snapshot, before a tick with external edits, before a delta that
+    DeltaMerger.can_merge() rejects, and on flush(), so it never spans two
+    step() calls.
+    """
+
+    def __init__(self, writer, coalesce_ticks: int):
+        self.writer = writer
+        self.coalesce_ticks = max(1, coalesce_ticks)
+        self.merger = DeltaMerger()
+        self._session_id: Optional[str] = None
+        # (tick, delta, metrics, inverse, inputs, events) of the open range, and their merged delta.
+        self._range: List[tuple] = []
+        self._merged: Optional[WorldDelta] = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._range) + self.writer.pending_count
+
+    def submit(
+        self, session_id: str, tick: int, delta: Optional[WorldDelta],
+        world_snapshot: Optional[World] = None, metrics: Optional[TickMetrics] = None,
+        inverse: Optional[InverseDelta] = None, inputs: Optional[List[WorldDelta]] = None,
+        events: Optional[List[EventRow]] = None
+    ):
+        if self._range and (session_id != self._session_id or inputs or delta is None or not self.merger.can_merge(self._merged, delta)):
+            self._close()
+        if delta is None:
+            self.writer.submit(session_id, tick, None, world_snapshot, metrics, inverse, inputs, events=events)
+            return
+
+        self._session_id = session_id
+        # Each tick keeps its own event rows; the merged delta no longer says which tick an event belongs to.
+        self._range.append((tick, delta, metrics, inverse, inputs, event_rows(delta) if events is None else events))
+        if len(self._range) > 1:
+            if len(self._range) == 2:
+                self._merged = self.merger.merge([self._range[0][1]])
+            self.merger.merge_into(self._merged, delta)
+        else:
+            self._merged = delta
+        if world_snapshot is not None or len(self._range) >= self.coalesce_ticks:
+            self._close(world_snapshot)
+
+    def _close(self, world_snapshot: Optional[World] = None):
+        ticks, self._range = self._range, []
+        merged, self._merged = self._merged, None
+        *inner, (last_tick, _, metrics, inverse, inputs, events) = ticks
+        for tick, _, tick_metrics, tick_inverse, tick_inputs, tick_events in inner:
+            self.writer.submit(self._session_id, tick, None, None, tick_metrics, tick_inverse, tick_inputs, events=tick_events)
+        first_tick = ticks[0][0] if inner else None
+        self.writer.submit(self._session_id, last_tick, merged, world_snapshot, metrics, inverse, inputs, first_tick, events)
+
+    def flush(self):
+        if self._range:
+            self._close()
+        self.writer.flush()
+
+    def discard(self):
+        self._range, self._merged = [], None
+        self.writer.discard()
+
+    def close(self):
+        if self._range:
+            self._close()
+        self.writer.close()
@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -14,29 +13,29 @@ class AllianceSystem(BaseSystem):
             
         formation_chance = cfg.alliance_formation_chance
         t_cfg = self.config.traits
-        f1_candidate = random.choice(active_factions) if active_factions else None
+        f1_candidate = self.rng.choice(active_factions) if active_factions else None
         if f1_candidate and "Diplomat" in f1_candidate.traits:
             formation_chance *= t_cfg.diplomat_alliance_formation_mod
             
-        if random.random() < formation_chance:
+        if self.rng.random() < formation_chance:
             f1 = f1_candidate
-            f2 = random.choice(active_factions)
+            f2 = self.rng.choice(active_factions)
             
             if f1.id != f2.id and f2.id not in f1.alliances:
                 if len(f1.alliances) < f_cfg.max_alliances and len(f2.alliances) < f_cfg.max_alliances:
                     builder.for_faction(f1.id).add_alliance(f2.id)
                     builder.for_faction(f2.id).add_alliance(f1.id)
-                    builder.add_event(f"🟡 ALLIANCE: {f1.name} and {f2.name} formed an alliance.")
+                    builder.add_event(f"🟡 ALLIANCE: {f1.name} and {f2.name} formed an alliance.", "alliance", f1.id, f2.id)
 
         for faction in active_factions:
             if not faction.alliances:
                 continue
                 
-            for other_id in list(faction.alliances):
-                if random.random() < cfg.alliance_break_chance:
+            for other_id in sorted(faction.alliances):
+                if self.rng.random() < cfg.alliance_break_chance:
                     builder.for_faction(faction.id).remove_alliance(other_id)
                     builder.for_faction(other_id).remove_alliance(faction.id)
                     
                     other = world.get_faction(other_id)
                     other_name = other.name if other else other_id
-                    builder.add_event(f"🟡 ALLIANCE BROKEN: {faction.name} and {other_name} are no longer allies.")
+                    builder.add_event(f"🟡 ALLIANCE BROKEN: {faction.name} and {other_name} are no longer allies.", "alliance_broken", faction.id, other_id)
@@ -1,3 +1,4 @@
+import random
 from abc import ABC, abstractmethod
 from typing import Optional
 from domains.world import World
@@ -6,9 +7,11 @@ from deltas.builder import DeltaBuilder
 from core.defaults import Defaults
 
 class BaseSystem(ABC):
-    def __init__(self, config: Optional[Defaults] = None):
+    def __init__(self, config: Optional[Defaults] = None, rng: Optional[random.Random] = None):
         self.config = config or Defaults()
+        # Every random draw goes through rng, which the engine reseeds each tick so runs can be replayed.
+        self.rng = rng or random.Random()
         
     @abstractmethod
     def compute_delta(self, world: World, builder: DeltaBuilder) -> None:
-        pass
\ No newline at end of file
+        pass
@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -13,12 +12,11 @@ class ConflictSystem(BaseSystem):
                 if builder.has_pending_owner_change(region_id):
                     continue
                     
-                if random.random() < cfg.insurrection_chance:
-                    import uuid
+                if self.rng.random() < cfg.insurrection_chance:
                     from deltas.types import FactionCreationData
                     from core.defaults import Rules
                     
-                    new_id = f"nascent_{str(uuid.uuid4())[:8]}"
+                    new_id = f"nascent_{self.rng.getrandbits(32):08x}"
                     new_name = f"Commonalty of {region.name}"
                     
                     builder.for_region(region_id).set_owner(new_id).set_stability(cfg.revolt_stability_threshold + Rules.Conflict.INSURRECTION_STABILITY_BONUS)
@@ -27,7 +25,7 @@ class ConflictSystem(BaseSystem):
                     from domains.economy import Resources
                     
                     trait_pool = Rules.Traits.TRAIT_POOL
-                    selected_traits = set(random.sample(trait_pool, random.randint(1, 2)))
+                    selected_traits = set(self.rng.sample(trait_pool, self.rng.randint(1, 2)))
                     
                     creation_data = FactionCreationData(
                         id=new_id,
@@ -41,13 +39,13 @@ class ConflictSystem(BaseSystem):
                         color="#00FF00" 
                     )
                     builder.create_faction(creation_data)
-                    builder.add_event(f"🔴 INSURRECTION: {new_name} ({new_id}) with traits {selected_traits} established independence in {region.name}!")
+                    builder.add_event(f"🔴 INSURRECTION: {new_name} ({new_id}) with traits {selected_traits} established independence in {region.name}!", "insurrection", new_id, region_id)
                 continue
                 
             if region.socio_economic.cohesion < cfg.revolt_stability_threshold:
-                if random.random() < cfg.revolt_chance:
+                if self.rng.random() < cfg.revolt_chance:
                     builder.for_region(region_id).set_owner("")
-                    builder.add_event(f"🔴 REVOLT: Region {region.name} ({region_id}) declared independence from {region.owner}")
+                    builder.add_event(f"🔴 REVOLT: Region {region.name} ({region_id}) declared independence from {region.owner}", "revolt", region_id, region.owner)
                     
                     new_cohesion = max(0.0, region.socio_economic.cohesion - cfg.revolt_stability_loss)
                     builder.for_region(region_id).set_stability(new_cohesion)
@@ -75,9 +73,9 @@ class ConflictSystem(BaseSystem):
             if (faction.power.total < col_cfg.faction_power_floor) or \
                (faction.legitimacy < col_cfg.faction_legitimacy_floor):
                 builder.for_faction(faction_id).delta.deactivate = True
-                builder.add_event(f"🔴 COLLAPSE: Faction {faction.name} ({faction_id}) has collapsed!")
+                builder.add_event(f"🔴 COLLAPSE: Faction {faction.name} ({faction_id}) has collapsed!", "collapse", faction_id)
                 
-                for rid in faction.regions:
+                for rid in sorted(faction.regions):
                     builder.for_region(rid).set_owner("")
                     
                 continue
@@ -88,14 +86,14 @@ class ConflictSystem(BaseSystem):
                 threshold *= t_cfg.populist_revolution_threshold_mod
             
             if faction.legitimacy < threshold:
-                if random.random() < leg_cfg.revolution_chance:
-                    builder.add_event(f"🔴 REVOLUTION: Revolution erupted in {faction.name} ({faction_id})!")
+                if self.rng.random() < leg_cfg.revolution_chance:
+                    builder.add_event(f"🔴 REVOLUTION: Revolution erupted in {faction.name} ({faction_id})!", "revolution", faction_id)
                     
                     from core.defaults import Rules
                     new_power = faction.power * Rules.Conflict.REVOLUTION_POWER_REMAINING
                     builder.for_faction(faction_id).set_power(new_power)
                     
-                    for rid in faction.regions:
+                    for rid in sorted(faction.regions):
                         rb = builder.for_region(rid)
                         region = world.get_region(rid)
                         if region:
@@ -105,19 +103,19 @@ class ConflictSystem(BaseSystem):
             from core.defaults import Rules
             cw_risk = cfg.civil_war_chance + (1.0 - (faction.legitimacy / 100.0)) * Rules.Conflict.CIVIL_WAR_RISK_LEGITIMACY_FACTOR
             
-            if random.random() < cw_risk:
+            if self.rng.random() < cw_risk:
                 if len(faction.regions) >= 2:
-                    builder.add_event(f"🔴 CIVIL WAR: Civil war broke out in {faction.name} ({faction_id})!")
+                    builder.add_event(f"🔴 CIVIL WAR: Civil war broke out in {faction.name} ({faction_id})!", "civil_war", faction_id)
                     
-                    regions_list = list(faction.regions)
-                    random.shuffle(regions_list)
+                    # Sorted, since set order changes between processes and the shuffle must not.
+                    regions_list = sorted(faction.regions)
+                    self.rng.shuffle(regions_list)
                     split_idx = len(regions_list) // 2
                     rebel_regions = regions_list[:split_idx]
                     
-                    import uuid
                     from deltas.types import FactionCreationData
                     
-                    rebel_id = f"rebels_{str(uuid.uuid4())[:8]}"
+                    rebel_id = f"rebels_{self.rng.getrandbits(32):08x}"
                     rebel_name = f"Rebels of {faction.name}"
                     
                     rebel_power = faction.power * Rules.Conflict.CIVIL_WAR_REBEL_POWER_RATIO
@@ -131,7 +129,7 @@ class ConflictSystem(BaseSystem):
                     rebel_res = faction.resources * Rules.Conflict.CIVIL_WAR_REBEL_RESOURCE_RATIO
                     
                     trait_pool = Rules.Traits.TRAIT_POOL
-                    selected_traits = set(random.sample(trait_pool, random.randint(1, 2)))
+                    selected_traits = set(self.rng.sample(trait_pool, self.rng.randint(1, 2)))
 
                     creation_data = FactionCreationData(
                         id=rebel_id,
@@ -145,14 +143,14 @@ class ConflictSystem(BaseSystem):
                         color="#FF0000"
                     )
                     builder.create_faction(creation_data)
-                    builder.add_event(f"NEW FACTION: {rebel_name} ({rebel_id}) with traits {selected_traits} formed from civil war.")
+                    builder.add_event(f"NEW FACTION: {rebel_name} ({rebel_id}) with traits {selected_traits} formed from civil war.", "new_faction", rebel_id, faction_id)
  
             coup_chance = cfg.coup_d_etat_chance
             if "Autocrat" in faction.traits:
                 coup_chance *= t_cfg.autocrat_coup_chance_mod
             
-            if random.random() < coup_chance:
-                builder.add_event(f"🔴 COUP: Military coup in {faction.name} ({faction_id})!")
+            if self.rng.random() < coup_chance:
+                builder.add_event(f"🔴 COUP: Military coup in {faction.name} ({faction_id})!", "coup", faction_id)
                 
                 from domains.power import Power
                 new_power = faction.power + Power(army=10.0, navy=5.0, air=5.0)
@@ -161,7 +159,7 @@ class ConflictSystem(BaseSystem):
                 new_legitimacy = max(0.0, faction.legitimacy - 30.0)
                 builder.for_faction(faction_id).set_legitimacy(new_legitimacy)
                 
-                for rid in faction.regions:
+                for rid in sorted(faction.regions):
                     region = world.get_region(rid)
                     if region:
                         new_stab = max(0.0, region.socio_economic.cohesion - 15.0)
@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -29,7 +28,7 @@ class DemographicsSystem(BaseSystem):
             if not faction:
                 continue
             
-            for other_id in faction.regions:
+            for other_id in sorted(faction.regions):
                 if other_id == region_id:
                     continue
                     
@@ -45,7 +44,7 @@ class DemographicsSystem(BaseSystem):
                         migration_deltas[region_id] = migration_deltas.get(region_id, 0) - migrants
                         migration_deltas[other_id] = migration_deltas.get(other_id, 0) + migrants
                         
-                        builder.add_event(f"👥 {migrants} people migrated from {region.name} to {other_region.name} (happiness: {happiness_map[region_id]:.1f} → {happiness_map[other_id]:.1f})")
+                        builder.add_event(f"👥 {migrants} people migrated from {region.name} to {other_region.name} (happiness: {happiness_map[region_id]:.1f} → {happiness_map[other_id]:.1f})", "migration", region_id, other_id)
         
         for region_id, region in world.regions.items():
             current_pop = region.population
@@ -25,7 +25,8 @@ class EconomySystem(BaseSystem):
             
             total_pop = 0
             
-            for rid in faction.regions:
+            # Production is summed in float, so regions go in a fixed order.
+            for rid in sorted(faction.regions):
                 region = world.get_region(rid)
                 if not region: continue
                 
@@ -140,11 +141,11 @@ class EconomySystem(BaseSystem):
                  leg_loss = starvation_ratio * l_cfg.starvation_legitimacy_loss * Rules.Economy.STARVATION_LEGITIMACY_PENALTY_MULT
                  builder.for_faction(faction_id).set_legitimacy(max(0.0, faction.legitimacy - leg_loss))
                  if prev_res.vital.food > 0:
-                     builder.add_event(f"🟣 Faction {faction.name} suffers from FOOD SHORTAGE! Legitimacy dropping.")
+                     builder.add_event(f"🟣 Faction {faction.name} suffers from FOOD SHORTAGE! Legitimacy dropping.", "food_shortage", faction_id)
 
             if simple_resources.energy <= 0:
                  if prev_res.energetic.fossils > 0 or prev_res.energetic.renewables > 0:
-                    builder.add_event(f"🟣 Faction {faction.name} suffers from ENERGY CRISIS!")
+                    builder.add_event(f"🟣 Faction {faction.name} suffers from ENERGY CRISIS!", "energy_crisis", faction_id)
             
             f_cfg = self.config.faction
             simple_resources = simple_resources.clamp(
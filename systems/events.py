@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -8,8 +7,8 @@ class EventSystem(BaseSystem):
         from core.defaults import Rules
         from domains.power import Power
         
-        if random.random() < Rules.Events.EVENT_BASE_CHANCE:
-            event_type = random.choice([
+        if self.rng.random() < Rules.Events.EVENT_BASE_CHANCE:
+            event_type = self.rng.choice([
                 "tech_breakthrough",
                 "pandemic",
                 "economic_boom",
@@ -22,7 +21,7 @@ class EventSystem(BaseSystem):
             if event_type == "tech_breakthrough":
                 active_factions = [f for f in world.factions.values() if f.is_active]
                 if active_factions:
-                    faction = random.choice(active_factions)
+                    faction = self.rng.choice(active_factions)
                     if faction.detailed_resources:
                         new_res = faction.detailed_resources
                         from domains.ressources import Intangible
@@ -41,16 +40,16 @@ class EventSystem(BaseSystem):
                             vital=new_res.vital
                         )
                         builder.for_faction(faction.id).set_detailed_resources(updated_res)
-                        builder.add_event(f"🔬 BREAKTHROUGH: {faction.name} achieved a major technological breakthrough!")
+                        builder.add_event(f"🔬 BREAKTHROUGH: {faction.name} achieved a major technological breakthrough!", "breakthrough", faction.id)
             
             elif event_type == "pandemic":
                 for faction in world.factions.values():
                     if not faction.is_active:
                         continue
-                    for region_id in faction.regions:
+                    for region_id in sorted(faction.regions):
                         region = world.get_region(region_id)
                         if region:
-                            loss_rate = random.uniform(0.05, 0.15)
+                            loss_rate = self.rng.uniform(0.05, 0.15)
                             new_pop = int(region.population * (1.0 - loss_rate))
                             builder.for_region(region_id).set_population(new_pop)
                             
@@ -62,12 +61,12 @@ class EventSystem(BaseSystem):
                             )
                             builder.for_region(region_id).delta.socio_economic = new_socio
                 
-                builder.add_event(f"☣️ PANDEMIC: A deadly disease swept across the world, devastating populations!")
+                builder.add_event(f"☣️ PANDEMIC: A deadly disease swept across the world, devastating populations!", "pandemic")
             
             elif event_type == "economic_boom":
                 active_factions = [f for f in world.factions.values() if f.is_active]
                 if active_factions:
-                    faction = random.choice(active_factions)
+                    faction = self.rng.choice(active_factions)
                     if faction.detailed_resources:
                         new_res = faction.detailed_resources
                         from domains.ressources import Production
@@ -86,33 +85,33 @@ class EventSystem(BaseSystem):
                             vital=new_res.vital
                         )
                         builder.for_faction(faction.id).set_detailed_resources(updated_res)
-                        builder.add_event(f"📈 BOOM: {faction.name} experienced an economic boom!")
+                        builder.add_event(f"📈 BOOM: {faction.name} experienced an economic boom!", "boom", faction.id)
             
             elif event_type == "scandal":
                 active_factions = [f for f in world.factions.values() if f.is_active]
                 if active_factions:
-                    faction = random.choice(active_factions)
-                    new_legitimacy = max(0.0, faction.legitimacy - random.uniform(10.0, 30.0))
+                    faction = self.rng.choice(active_factions)
+                    new_legitimacy = max(0.0, faction.legitimacy - self.rng.uniform(10.0, 30.0))
                     builder.for_faction(faction.id).set_legitimacy(new_legitimacy)
-                    builder.add_event(f"📰 SCANDAL: A major political scandal rocked {faction.name}!")
+                    builder.add_event(f"📰 SCANDAL: A major political scandal rocked {faction.name}!", "scandal", faction.id)
             
             elif event_type == "natural_disaster":
                 regions_list = [r for r in world.regions.values() if r.owner]
                 if regions_list:
-                    region = random.choice(regions_list)
-                    new_infrastructure = max(0.0, region.socio_economic.infrastructure - random.uniform(10.0, 30.0))
+                    region = self.rng.choice(regions_list)
+                    new_infrastructure = max(0.0, region.socio_economic.infrastructure - self.rng.uniform(10.0, 30.0))
                     new_socio = type(region.socio_economic)(
                         infrastructure=new_infrastructure,
                         cohesion=region.socio_economic.cohesion - 10.0,
                         happiness=region.socio_economic.happiness - 15.0
                     )
                     builder.for_region(region.id).delta.socio_economic = new_socio
-                    builder.add_event(f"🌋 DISASTER: Natural disaster struck {region.name}, devastating infrastructure!")
+                    builder.add_event(f"🌋 DISASTER: Natural disaster struck {region.name}, devastating infrastructure!", "disaster", region.id)
             
             elif event_type == "cultural_renaissance":
                 active_factions = [f for f in world.factions.values() if f.is_active]
                 if active_factions:
-                    faction = random.choice(active_factions)
+                    faction = self.rng.choice(active_factions)
                     if faction.detailed_resources:
                         new_res = faction.detailed_resources
                         from domains.ressources import Intangible
@@ -131,9 +130,10 @@ class EventSystem(BaseSystem):
                             vital=new_res.vital
                         )
                         builder.for_faction(faction.id).set_detailed_resources(updated_res)
-                        builder.add_event(f"🎨 RENAISSANCE: {faction.name} experienced a cultural renaissance!")
+                        builder.add_event(f"🎨 RENAISSANCE: {faction.name} experienced a cultural renaissance!", "renaissance", faction.id)
             
             elif event_type == "trade_disruption":
                 for resource in world.market.keys():
-                    world.market[resource] *= random.uniform(1.2, 1.8)
-                builder.add_event(f"🚢 DISRUPTION: Global trade routes disrupted, prices spiked!")
+                    world.market[resource] *= self.rng.uniform(1.2, 1.8)
+                builder.set_market_prices(dict(world.market))
+                builder.add_event(f"🚢 DISRUPTION: Global trade routes disrupted, prices spiked!", "trade_disruption")
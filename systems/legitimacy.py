@@ -32,7 +32,7 @@ class LegitimacySystem(BaseSystem):
             if faction.regions:
                 total_cohesion = 0.0
                 count = 0
-                for rid in faction.regions:
+                for rid in sorted(faction.regions):
                     region = world.get_region(rid)
                     if region:
                         total_cohesion += region.socio_economic.cohesion
@@ -69,6 +69,7 @@ class MarketSystem(BaseSystem):
             new_prices[resource] = new_price
             
             if abs(new_price - current_price) > 0.1:
-                builder.add_event(f"💰 Market: {resource} price changed from {current_price:.2f} to {new_price:.2f} (supply: {supply_val:.1f}, demand: {demand_val:.1f})")
+                builder.add_event(f"💰 Market: {resource} price changed from {current_price:.2f} to {new_price:.2f} (supply: {supply_val:.1f}, demand: {demand_val:.1f})", "market")
         
         world.market.update(new_prices)
+        builder.set_market_prices(new_prices)
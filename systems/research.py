@@ -1,3 +1,4 @@
+from dataclasses import replace
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -18,8 +19,10 @@ class ResearchSystem(BaseSystem):
                 cost = 2.0
                 knowledge_gain = 1.0 * research_rate
                 
-                new_resources = faction.resources
+                # Detach from the object the previous tick's delta still references.
+                new_resources = replace(faction.resources)
                 new_resources.influence -= cost
+                faction.resources = new_resources
                 
                 new_knowledge = faction.knowledge + knowledge_gain
                 
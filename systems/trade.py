@@ -1,3 +1,4 @@
+from dataclasses import replace
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -25,6 +26,12 @@ class TradeSystem(BaseSystem):
         
         trade_occurred = False
         
+        if (res1.energy > cfg.trade_threshold and res2.energy < cfg.trade_shortage_threshold) or \
+           (res2.food > cfg.trade_threshold and res1.food < cfg.trade_shortage_threshold):
+            # Detach from the objects earlier deltas still reference before mutating.
+            res1 = f1.resources = replace(res1)
+            res2 = f2.resources = replace(res2)
+        
         if res1.energy > cfg.trade_threshold and res2.energy < cfg.trade_shortage_threshold:
             amount = cfg.trade_amount
             res1.energy -= amount
@@ -44,4 +51,4 @@ class TradeSystem(BaseSystem):
             builder.for_faction(f1.id).set_resources(res1).set_legitimacy(min(100.0, f1.legitimacy + cfg.trade_legitimacy_bonus))
             builder.for_faction(f2.id).set_resources(res2).set_legitimacy(min(100.0, f2.legitimacy + cfg.trade_legitimacy_bonus))
             
-            builder.add_event(f"🟡 Trade agreement between {f1.name} and {f2.name} is active.")
+            builder.add_event(f"🟡 Trade agreement between {f1.name} and {f2.name} is active.", "trade", f1.id, f2.id)
@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from deltas.builder import DeltaBuilder
 from .base import BaseSystem
@@ -14,7 +13,7 @@ class WarSystem(BaseSystem):
             if "Pacifist" in attacker.traits:
                 declaration_chance *= t_cfg.pacifist_war_declaration_mod
             
-            if random.random() < declaration_chance:
+            if self.rng.random() < declaration_chance:
                 potential_owned = []
                 potential_neutral = []
                 
@@ -25,8 +24,8 @@ class WarSystem(BaseSystem):
                     else:
                         potential_neutral.append(region)
                 
-                if potential_owned and random.random() > cfg.colonization_chance:
-                    target_region = random.choice(potential_owned)
+                if potential_owned and self.rng.random() > cfg.colonization_chance:
+                    target_region = self.rng.choice(potential_owned)
                     target_owner = world.get_faction(target_region.owner)
                     
                     if not target_owner:
@@ -40,7 +39,7 @@ class WarSystem(BaseSystem):
                     if "Militarist" in attacker.traits:
                         victory_chance *= t_cfg.militarist_victory_mod
                     
-                    if random.random() < victory_chance:
+                    if self.rng.random() < victory_chance:
                         builder.for_region(target_region.id).set_owner(attacker.id).set_stability(cfg.conquest_stability_penalty).done()
                         builder.for_faction(target_owner.id).remove_region(target_region.id).done()
                         builder.for_faction(attacker.id).add_region(target_region.id).done()
@@ -63,7 +62,7 @@ class WarSystem(BaseSystem):
                         new_attacker_power = attacker.power * Rules.War.CONQUEST_ATTACKER_POWER_REMAINING
                         builder.for_faction(attacker.id).set_power(new_attacker_power).done()
                         
-                        builder.add_event(f"🔴 WAR: {attacker.name} conquered {target_region.name} from {target_owner.name}!")
+                        builder.add_event(f"🔴 WAR: {attacker.name} conquered {target_region.name} from {target_owner.name}!", "war", attacker.id, target_owner.id)
                     else:
                         new_attacker_power = attacker.power * Rules.War.FAILED_ATTACK_ATTACKER_POWER_REMAINING
                         new_defender_power = target_owner.power * Rules.War.FAILED_ATTACK_DEFENDER_POWER_REMAINING
@@ -71,12 +70,12 @@ class WarSystem(BaseSystem):
                         builder.for_faction(attacker.id).set_power(new_attacker_power).done()
                         builder.for_faction(target_owner.id).set_power(new_defender_power).done()
                         
-                        builder.add_event(f"🔴 WAR: {attacker.name} failed to conquer {target_region.name} from {target_owner.name}.")
+                        builder.add_event(f"🔴 WAR: {attacker.name} failed to conquer {target_region.name} from {target_owner.name}.", "war", attacker.id, target_owner.id)
                 
                 elif potential_neutral:
                     from core.defaults import Rules
                     from domains.power import Power
-                    target_region = random.choice(potential_neutral)
+                    target_region = self.rng.choice(potential_neutral)
                     builder.for_region(target_region.id).set_owner(attacker.id).set_stability(Rules.War.COLONIZATION_STABILITY).done()
                     builder.for_faction(attacker.id).add_region(target_region.id).done()
                     
@@ -87,4 +86,4 @@ class WarSystem(BaseSystem):
                     new_attacker_power = attacker.power - Power(army=cost)
                     builder.for_faction(attacker.id).set_power(new_attacker_power).done()
                     
-                    builder.add_event(f"🔴 EXPANSION: {attacker.name} colonized the neutral region of {target_region.name}.")
+                    builder.add_event(f"🔴 EXPANSION: {attacker.name} colonized the neutral region of {target_region.name}.", "expansion", attacker.id, target_region.id)
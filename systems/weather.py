@@ -1,4 +1,3 @@
-import random
 from domains.world import World
 from domains.region_meta import WeatherType, WeatherState
 from deltas.builder import DeltaBuilder
@@ -16,10 +15,10 @@ class WeatherSystem(BaseSystem):
                 if new_duration > 0:
                     continue
             
-            if random.random() < Rules.Weather.WEATHER_CHANGE_CHANCE:
+            if self.rng.random() < Rules.Weather.WEATHER_CHANGE_CHANCE:
                 new_weather_type = self._get_next_weather(region.weather.type, region.environment)
-                new_intensity = random.uniform(0.7, 1.5)
-                new_duration = random.randint(1, 5)
+                new_intensity = self.rng.uniform(0.7, 1.5)
+                new_duration = self.rng.randint(1, 5)
                 
                 new_weather = WeatherState(
                     type=new_weather_type,
@@ -28,8 +27,9 @@ class WeatherSystem(BaseSystem):
                 )
                 
                 region.weather = new_weather
+                builder.for_region(region_id).set_weather(new_weather)
                 
-                builder.add_event(f"🌦️ Weather changed to {new_weather_type.value} in {region.name} (intensity: {new_intensity:.1f}, duration: {new_duration} turns)")
+                builder.add_event(f"🌦️ Weather changed to {new_weather_type.value} in {region.name} (intensity: {new_intensity:.1f}, duration: {new_duration} turns)", "weather", region_id)
     
     def _get_next_weather(self, current: WeatherType, environment) -> WeatherType:
         from domains.region_meta import EnvironmentType
@@ -71,4 +71,4 @@ class WeatherSystem(BaseSystem):
         total = sum(weights.values())
         normalized = {k: v/total for k, v in weights.items()}
         
-        return random.choices(list(normalized.keys()), weights=list(normalized.values()))[0]
+        return self.rng.choices(list(normalized.keys()), weights=list(normalized.values()))[0]
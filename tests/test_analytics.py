@@ -0,0 +1,112 @@
+import logging
+import os
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence import analytics
+from persistence.backend import create_backend
+from scenarios import create_demo_scenario
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _build(tmp_path, backend: str):
+    """Four 200-tick sessions, a fork of the last one and a session too short to see a collapse."""
+    path = os.path.join(tmp_path, "simulation.db" if backend == "sqlite" else "simulation")
+    config = PersistenceConfig(backend=backend)
+    engine = SimulationEngine(persistence=create_backend(path, config))
+    for seed, ticks in ((100, 200), (101, 200), (102, 200), (103, 200), (104, 5)):
+        engine.config = replace(engine.config, simulation=replace(engine.config.simulation, seed=seed))
+        engine.create_session(f"seed {seed}")
+        engine.initialize_world(create_demo_scenario())
+        engine.step(ticks)
+        if seed == 103:
+            engine.fork_session(engine.session_id, 100)
+            engine.step(100)
+    session_ids = engine.persistence.list_session_ids()
+    engine.close()
+    return path, config, session_ids
+
+
+def _sorted(table: analytics.Table):
+    return sorted(table.rows(), key=lambda row: tuple(str(value) for value in row))
+
+
+def _scanned(path, config, session_ids=None):
+    return (
+        analytics.scan_sessions(path, config, analytics.scan_rebel_lifespans, analytics.Rows(analytics.LIFESPAN_COLUMNS), session_ids, workers=2),
+        analytics.scan_sessions(path, config, analytics.scan_first_collapse, analytics.Rows(analytics.COLLAPSE_COLUMNS), session_ids, workers=2)
+    )
+
+
+# =========================
+# QUERIES
+# =========================
+@pytest.mark.parametrize("backend", ["sqlite", "files"])
+def test_sql_matches_the_session_scan(tmp_path, backend):
+    path, config, session_ids = _build(tmp_path, backend)
+    lifespans = analytics.rebel_lifespans(path, config)
+    collapses = analytics.first_collapse_ticks(path, config)
+    scanned_lifespans, scanned_collapses = _scanned(path, config)
+    assert _sorted(lifespans) == _sorted(scanned_lifespans)
+    assert _sorted(collapses) == _sorted(scanned_collapses)
+
+    assert list(lifespans.columns) == list(analytics.LIFESPAN_COLUMNS)
+    assert any(died is not None for died in lifespans.columns["died"])
+    assert any(died is None for died in lifespans.columns["died"])
+    assert len(collapses) == len(session_ids) == 6
+    # The fork counts from its fork tick and the short session has no collapse.
+    assert 100 in collapses.columns["start_tick"]
+    assert None in collapses.columns["collapse_tick"]
+
+    subset = session_ids[1:3]
+    assert _sorted(analytics.first_collapse_ticks(path, config, subset)) == [row for row in _sorted(collapses) if row[0] in subset]
+
+
+def test_sessions_without_event_rows_are_scanned(tmp_path):
+    path, config, session_ids = _build(tmp_path, "sqlite")
+    expected = [_sorted(table) for table in _scanned(path, config)]
+    persistence = create_backend(path, config)
+    with persistence.connections.writer() as conn:
+        for session_id in session_ids[:2]:
+            conn.execute("DELETE FROM events WHERE session_id = ?", (session_id,))
+    persistence.close()
+
+    lifespans = analytics.rebel_lifespans(path, config, workers=2)
+    collapses = analytics.first_collapse_ticks(path, config, workers=2)
+    assert [_sorted(lifespans), _sorted(collapses)] == expected
+
+
+def test_memory_sessions_cannot_be_scanned(tmp_path):
+    with pytest.raises(ValueError):
+        analytics.scan_sessions(str(tmp_path), PersistenceConfig(backend="memory"), analytics.scan_first_collapse, analytics.Rows(analytics.COLLAPSE_COLUMNS))
+
+
+# =========================
+# AGGREGATORS
+# =========================
+def test_summary_and_histogram():
+    values = [4.0, None, 1.0, 7.0, 12.0]
+    stats = {name: column[0] for name, column in analytics.summary(values).columns.items()}
+    assert stats["count"] == 4 and stats["mean"] == 6.0
+    assert (stats["min"], stats["max"]) == (1.0, 12.0)
+    assert stats["std"] == pytest.approx((sum((v - 6.0) ** 2 for v in (4.0, 1.0, 7.0, 12.0)) / 4) ** 0.5)
+    assert next(analytics.summary([None]).rows()) == (0, None, None, None, None)
+
+    table = analytics.histogram(values, 5)
+    assert list(table.rows()) == [(0, 2), (5, 1), (10, 1)]
+
+    # Partials fold into the same result as the values taken at once.
+    aggregator = analytics.Histogram(5)
+    aggregator.add(values[:2])
+    aggregator.add(values[2:])
+    assert list(aggregator.result().rows()) == list(table.rows())
+    assert aggregator.missing == 1
@@ -0,0 +1,461 @@
+import logging
+import os
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence import conformance
+from persistence.backend import BACKENDS, create_backend
+from persistence.retention import apply_retention, thinned_snapshots
+from persistence.timetravel import TimeTravelService
+from persistence.writer import CoalescingWriter
+from scenarios import create_demo_scenario
+
+TICKS = 60
+SQLITE_BACKENDS = ["sqlite", "files"]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _open(name: str, directory, **settings):
+    path = os.path.join(directory, "simulation.db" if name == "sqlite" else "simulation")
+    return create_backend(path, PersistenceConfig(backend=name, **settings))
+
+
+def _run(persistence, ticks: int, coalesce_ticks: int = 1, **simulation):
+    """Runs the demo scenario and returns the engine, the live world of every tick and the events as (tick, event).
+
+    A coalesced run steps all ticks at once and returns no worlds.
+    """
+    engine = SimulationEngine(persistence=persistence)
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=11, snapshot_interval=conformance.SNAPSHOT_INTERVAL, adaptive_snapshots=False, **simulation
+    ))
+    if coalesce_ticks > 1:
+        engine.writer = CoalescingWriter(engine.writer, coalesce_ticks)
+    engine.create_session("test")
+    engine.initialize_world(create_demo_scenario())
+    worlds = [engine.world.clone()]
+    if coalesce_ticks > 1:
+        # Coalesced ranges never span two step() calls.
+        return engine, None, _events(engine.step(ticks))
+    events = []
+    for _ in range(ticks):
+        events += _events(engine.step(1))
+        worlds.append(engine.world.clone())
+    return engine, worlds, events
+
+
+def _events(messages):
+    """(tick, event) of the "[Tick N] event" messages step() returns."""
+    events = []
+    for message in messages:
+        prefix, _, event = message.partition("] ")
+        events.append((int(prefix[len("[Tick "):]), event))
+    return events
+
+
+# =========================
+# CONFORMANCE
+# =========================
+@pytest.fixture(params=BACKENDS)
+def backend(request, tmp_path):
+    """(name, factory) of a backend; the factory reopens what an earlier call stored."""
+    return request.param, lambda: _open(request.param, tmp_path)
+
+
+def _passed(result: conformance.Conformance):
+    assert result.checks > 0
+    assert result.failures == []
+
+
+def test_conformance_reads(backend):
+    name, factory = backend
+    result = conformance.Conformance(name)
+    persistence = factory()
+    session_id, worlds = conformance.record(persistence, TICKS)
+    conformance.check_reads(result, persistence, session_id, worlds)
+    if name != "memory":
+        persistence.close()
+        persistence = factory()
+        conformance.check_reads(result, persistence, session_id, worlds)
+    persistence.close()
+    _passed(result)
+
+
+def test_conformance_adaptive(backend):
+    name, factory = backend
+    result = conformance.Conformance(name)
+    persistence = factory()
+    conformance.check_adaptive(result, persistence, TICKS)
+    persistence.close()
+    _passed(result)
+
+
+def test_conformance_coalesced(backend):
+    name, factory = backend
+    result = conformance.Conformance(name)
+    persistence = factory()
+    session_id, worlds = conformance.record(persistence, TICKS)
+    conformance.check_coalesced(result, persistence, session_id, worlds)
+    persistence.close()
+    _passed(result)
+
+
+def test_conformance_replay(backend):
+    name, factory = backend
+    result = conformance.Conformance(name)
+    persistence = factory()
+    conformance.check_replay(result, persistence, TICKS)
+    persistence.close()
+    _passed(result)
+
+
+def test_conformance_truncate(backend):
+    name, factory = backend
+    result = conformance.Conformance(name)
+    persistence = factory()
+    session_id, worlds = conformance.record(persistence, TICKS)
+    conformance.check_truncate(result, persistence, session_id, worlds)
+    persistence.close()
+    if name == "log":
+        # Append-only: the check skips itself.
+        assert result.checks == 0
+    else:
+        _passed(result)
+
+
+# =========================
+# REWIND
+# =========================
+@pytest.mark.parametrize("name", SQLITE_BACKENDS + ["memory"])
+@pytest.mark.parametrize("persist_undo", [False, True])
+def test_rewind_restores_the_recorded_state(tmp_path, name, persist_undo):
+    engine, worlds, events = _run(_open(name, tmp_path), TICKS, persist_undo=persist_undo, undo_depth=10)
+    session_id = engine.session_id
+
+    # Within the undo log, then past it.
+    assert engine.rewind(5) == TICKS - 5
+    assert engine.world == worlds[TICKS - 5]
+    assert engine.rewind(25) == TICKS - 30
+    assert engine.world == worlds[TICKS - 30]
+
+    persistence = engine.persistence
+    assert persistence.get_latest_tick(session_id) == TICKS - 30
+    assert [tick for tick, _ in persistence.iter_deltas(session_id, 1, TICKS)] == list(range(1, TICKS - 29))
+    assert persistence.get_nearest_snapshot_tick(session_id, TICKS) <= TICKS - 30
+    if name in SQLITE_BACKENDS:
+        recorded = persistence.query_events(session_id, limit=1000)
+        assert [(tick, message) for tick, _, _, _, message in reversed(recorded)] == [e for e in events if e[0] <= TICKS - 30]
+
+    engine.step(5)
+    assert persistence.get_latest_tick(session_id) == TICKS - 25
+    assert TimeTravelService(persistence).checkout(session_id, TICKS - 25) == engine.world
+    engine.close()
+
+
+def test_rewind_refuses_what_it_cannot_undo(tmp_path):
+    engine, _, _ = _run(_open("sqlite", tmp_path), 30)
+    parent = engine.session_id
+    with pytest.raises(ValueError):
+        engine.rewind(0)
+    with pytest.raises(ValueError):
+        engine.rewind(31)
+
+    engine.fork_session(parent, 20)
+    engine.load_session(parent)
+    with pytest.raises(ValueError):
+        engine.rewind(15)
+    assert engine.current_tick == 30
+    assert engine.rewind(5) == 25
+    engine.close()
+
+
+def test_log_backend_cannot_rewind(tmp_path):
+    engine, worlds, _ = _run(_open("log", tmp_path), 20)
+    with pytest.raises(NotImplementedError):
+        engine.rewind(5)
+    assert engine.current_tick == 20
+    assert engine.world == worlds[20]
+    assert engine.persistence.get_latest_tick(engine.session_id) == 20
+    engine.close()
+
+
+# =========================
+# FORKS
+# =========================
+@pytest.mark.parametrize("name", SQLITE_BACKENDS)
+def test_fork_reads_its_parent_history(tmp_path, name):
+    engine, worlds, events = _run(_open(name, tmp_path), 40)
+    parent = engine.session_id
+    persistence = engine.persistence
+
+    fork = engine.fork_session(parent, 20, "branch")
+    fork_events = [(tick + 20, message) for tick, message in _step_events(engine, 10)]
+    fork_world = engine.world.clone()
+
+    assert persistence.get_fork_point(fork) == (parent, 20)
+    assert persistence.list_forks(parent) == [(fork, 20)]
+    assert persistence.get_tick_range(fork) == (0, 30)
+    assert [tick for tick, _ in persistence.iter_deltas(fork, 1, 30)] == list(range(1, 31))
+    # The parent's history is shared, not copied.
+    assert [tick for tick, _ in persistence.iter_deltas(parent, 1, 40)] == list(range(1, 41))
+
+    time_travel = TimeTravelService(persistence)
+    for tick in (0, 5, 20):
+        assert time_travel.checkout(fork, tick) == worlds[tick]
+    assert time_travel.checkout(fork, 30) == fork_world
+
+    recorded = persistence.query_events(fork, limit=1000)
+    assert [(tick, message) for tick, _, _, _, message in reversed(recorded)] == [e for e in events if e[0] <= 20] + fork_events
+
+    with pytest.raises(ValueError):
+        persistence.truncate_session(parent, 10)
+    with pytest.raises(ValueError):
+        persistence.delete_session(parent)
+    persistence.delete_session(fork)
+    assert persistence.list_forks(parent) == []
+    persistence.truncate_session(parent, 10)
+    engine.close()
+
+
+def _step_events(engine, ticks: int):
+    """Steps ticks and returns their events as (ticks since the start, event)."""
+    start = engine.current_tick
+    return [(tick - start, event) for tick, event in _events(engine.step(ticks))]
+
+
+@pytest.mark.parametrize("name", ["log", "memory"])
+def test_forks_need_a_sqlite_backend(tmp_path, name):
+    engine, _, _ = _run(_open(name, tmp_path), 10)
+    with pytest.raises(NotImplementedError):
+        engine.fork_session(engine.session_id, 5)
+    engine.close()
+
+
+# =========================
+# COALESCING
+# =========================
+@pytest.mark.parametrize("name", BACKENDS)
+def test_coalesced_ranges(tmp_path, name):
+    _, worlds, _ = _run(_open("memory", tmp_path), 41)
+    engine, _, events = _run(_open(name, tmp_path), 41, coalesce_ticks=4)
+    session_id = engine.session_id
+    persistence = engine.persistence
+
+    stored = [tick for tick, _ in persistence.iter_deltas(session_id, 1, 41)]
+    assert stored[-1] == 41
+    assert len(stored) < 41
+    time_travel = TimeTravelService(persistence)
+    previous = 0
+    for tick in stored:
+        assert tick - previous <= 4
+        assert persistence.get_coalesced_range(session_id, tick) is None
+        assert time_travel.checkout(session_id, tick) == worlds[tick]
+        for inner in range(previous + 1, tick):
+            assert persistence.get_coalesced_range(session_id, inner) == (previous + 1, tick)
+            with pytest.raises(ValueError):
+                time_travel.checkout(session_id, inner)
+        previous = tick
+
+    if name in SQLITE_BACKENDS:
+        # Events keep the tick they happened at, not the end of their range.
+        recorded = persistence.query_events(session_id, limit=1000)
+        assert [(tick, message) for tick, _, _, _, message in reversed(recorded)] == events
+    engine.close()
+
+
+# =========================
+# RETENTION
+# =========================
+@pytest.mark.parametrize("name", SQLITE_BACKENDS)
+def test_retention_compacts_old_deltas(tmp_path, name):
+    engine, worlds, events = _run(_open(name, tmp_path), TICKS)
+    session_id = engine.session_id
+    persistence = engine.persistence
+    config = replace(engine.config, persistence=replace(engine.config.persistence, retention_delta_ticks=25))
+
+    report = apply_retention(persistence, config)
+    assert report.deltas_dropped == 30
+    assert persistence.get_compacted_tick(session_id) == 30
+    assert [tick for tick, _ in persistence.iter_deltas(session_id, 1, TICKS)] == list(range(31, TICKS + 1))
+
+    time_travel = TimeTravelService(persistence)
+    assert time_travel.checkout(session_id, 20) == worlds[20]
+    assert time_travel.checkout(session_id, 45) == worlds[45]
+    assert not persistence.is_replayable(session_id, 25)
+    with pytest.raises(ValueError):
+        time_travel.checkout(session_id, 25)
+    # Events outlive the deltas they came from.
+    assert len(persistence.query_events(session_id, limit=1000)) == len(events)
+
+    # A second pass has nothing left to drop.
+    assert apply_retention(persistence, config).deltas_dropped == 0
+    engine.close()
+
+
+@pytest.mark.parametrize("name", SQLITE_BACKENDS)
+def test_retention_archives_idle_sessions(tmp_path, name):
+    engine, worlds, _ = _run(_open(name, tmp_path), 20)
+    session_id = engine.session_id
+    persistence = engine.persistence
+    config = replace(engine.config, persistence=replace(engine.config.persistence, archive_after_days=1e-9))
+
+    report = apply_retention(persistence, config)
+    assert report.archived == [session_id]
+    assert session_id not in persistence.list_session_ids()
+
+    engine.load_session(session_id)
+    assert engine.current_tick == 20
+    assert engine.world == worlds[20]
+    engine.close()
+
+
+def test_thinned_snapshots_double_their_spacing_with_age():
+    ticks = list(range(0, 1001, 10))
+    drop = thinned_snapshots(ticks, 1000, 10, 100)
+    kept = [tick for tick in ticks if tick not in drop]
+    # Everything younger than the window stays.
+    assert all(tick in kept for tick in ticks if tick >= 900)
+    # Past it, at most one snapshot per spacing-wide span, the spacing doubling with every doubling of age.
+    for earlier, later in zip(kept, kept[1:]):
+        age = 1000 - later
+        if age >= 100:
+            spacing = 10 * 2 ** (age // 100).bit_length()
+            assert earlier // spacing != later // spacing
+    assert len(kept) < len(ticks) // 2
+    # Running the schedule again on what is left drops nothing more.
+    assert thinned_snapshots(kept, 1000, 10, 100) == []
+    assert thinned_snapshots(ticks, 1000, 10, 100, keep=[0, 150]) == [tick for tick in drop if tick != 150]
+
+
+# =========================
+# EVENTS
+# =========================
+@pytest.fixture(params=SQLITE_BACKENDS)
+def recorded(request, tmp_path):
+    engine, _, events = _run(_open(request.param, tmp_path), TICKS)
+    yield engine, events
+    engine.close()
+
+
+def test_query_events_newest_first(recorded):
+    engine, events = recorded
+    rows = engine.persistence.query_events(engine.session_id, limit=5)
+    assert [(tick, message) for tick, _, _, _, message in rows] == events[::-1][:5]
+
+
+def test_query_events_filters(recorded):
+    engine, events = recorded
+    persistence, session_id = engine.persistence, engine.session_id
+    rows = persistence.query_events(session_id, limit=1000)
+    assert len(rows) == len(events)
+
+    kind = rows[0][1]
+    by_kind = persistence.query_events(session_id, kinds=[kind], limit=1000)
+    assert by_kind == [row for row in rows if row[1] == kind]
+
+    entity = next(row[2] for row in rows if row[2] is not None)
+    by_entity = persistence.query_events(session_id, entity_id=entity, limit=1000)
+    assert by_entity == [row for row in rows if entity in (row[2], row[3])]
+
+    in_range = persistence.query_events(session_id, tick_range=(10, 30), limit=1000)
+    assert in_range == [row for row in rows if 10 <= row[0] <= 30]
+    assert persistence.query_events(session_id, tick_range=(None, 30), limit=1000) == [row for row in rows if row[0] <= 30]
+
+    both = persistence.query_events(session_id, kinds=[kind], tick_range=(10, 30), limit=1000)
+    assert both == [row for row in by_kind if 10 <= row[0] <= 30]
+
+
+def test_query_events_text(recorded):
+    engine, _ = recorded
+    persistence, session_id = engine.persistence, engine.session_id
+    rows = persistence.query_events(session_id, limit=1000)
+    word = next(word for word in rows[0][4].split() if word.isalpha() and len(word) > 3)
+
+    matches = persistence.query_events(session_id, text=word, limit=1000)
+    assert matches
+    assert all(word.lower() in row[4].lower() for row in matches)
+    assert persistence.query_events(session_id, text=word[:3] + "*", limit=1000)[:len(matches)] != []
+    # Query syntax typed by a user is searched for, not parsed.
+    assert persistence.query_events(session_id, text='"unbalanced OR NEAR(', limit=10) == []
+    assert persistence.query_events(session_id, text="zzzznotaword", limit=10) == []
+
+
+@pytest.mark.parametrize("name", ["log", "memory"])
+def test_query_events_needs_a_sqlite_backend(tmp_path, name):
+    engine, _, _ = _run(_open(name, tmp_path), 5)
+    with pytest.raises(NotImplementedError):
+        engine.persistence.query_events(engine.session_id)
+    engine.close()
+
+
+# =========================
+# ATTACH
+# =========================
+def _sessions(engine, count: int, ticks: int):
+    """Starts count more sessions of the demo scenario on the engine's backend and steps each."""
+    session_ids = []
+    for i in range(count):
+        engine.create_session(f"attached {i}")
+        engine.initialize_world(create_demo_scenario())
+        engine.step(ticks)
+        session_ids.append(engine.session_id)
+    engine.flush()
+    return session_ids
+
+
+def test_attach_queries_across_session_files(tmp_path):
+    engine, _, events = _run(_open("files", tmp_path), 20)
+    persistence, first = engine.persistence, engine.session_id
+    second, third = _sessions(engine, 2, 10)
+    fork = engine.fork_session(third, 5)
+    engine.step(3)
+    engine.flush()
+
+    with persistence.attach([first, second, third, fork]) as conn:
+        # The fork shares its parent's file, so it is attached once.
+        attached = [name for _, name, _ in conn.execute("PRAGMA database_list") if name not in ("main", "temp")]
+        assert attached == ["s0", "s1", "s2"]
+        ticks = dict(conn.execute("SELECT session_id, MAX(tick_number) FROM ticks GROUP BY session_id").fetchall())
+        assert ticks == {first: 20, second: 10, third: 10, fork: 8}
+        names = dict(conn.execute("SELECT id, name FROM sessions").fetchall())
+        assert names[first] == "test" and set(names) == {first, second, third, fork}
+        count = conn.execute("SELECT COUNT(*) FROM events WHERE session_id = ?", (first,)).fetchone()[0]
+        assert count == len(events)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO s0.ticks (session_id, tick_number, timestamp) VALUES ('x', 1, 0)")
+
+    with persistence.attach([second]) as conn:
+        assert [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM deltas")] == [second]
+    engine.close()
+
+
+def test_attach_refuses_what_it_cannot_open(tmp_path):
+    engine, _, _ = _run(_open("files", tmp_path), 1)
+    persistence = engine.persistence
+    with pytest.raises(ValueError):
+        with persistence.attach([]):
+            pass
+    with pytest.raises(ValueError):
+        with persistence.attach(["missing"]):
+            pass
+
+    probe = sqlite3.connect(":memory:")
+    limit = probe.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if hasattr(probe, "getlimit") else 10
+    probe.close()
+    session_ids = [engine.session_id] + _sessions(engine, limit, 1)
+    with pytest.raises(ValueError):
+        with persistence.attach(session_ids):
+            pass
+    with persistence.attach(session_ids[:limit]) as conn:
+        assert conn.execute("SELECT COUNT(DISTINCT session_id) FROM ticks").fetchone()[0] == limit
+    engine.close()
@@ -0,0 +1,120 @@
+import logging
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence.backfill import backfill_session
+from persistence.manager import PersistenceManager
+from scenarios import create_demo_scenario
+
+TICKS = 60
+SERIES_TABLES = ("faction_timeseries", "world_timeseries", "faction_rollups", "world_rollups", "session_factions")
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _recorded(tmp_path, storage_mode: str = "deltas"):
+    """A session whose time series were recorded live, then dropped as if it predated them.
+
+    Returns the open backend, the session id and what the live rows were.
+    """
+    path = str(tmp_path / "simulation.db")
+    # A keyframe every 10 ticks, so the session backfills in several stretches.
+    engine = SimulationEngine(persistence=PersistenceManager(path, PersistenceConfig(keyframe_interval=1)))
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=8, storage_mode=storage_mode, snapshot_interval=10,
+        replay_snapshot_interval=10, adaptive_snapshots=False
+    ))
+    engine.create_session("backfill")
+    engine.initialize_world(create_demo_scenario())
+    engine.step(TICKS)
+    persistence, session_id = engine.persistence, engine.session_id
+    live = _series(persistence, session_id)
+    engine.writer.close()
+
+    with sqlite3.connect(path) as conn:
+        for table in SERIES_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+    assert _series(persistence, session_id)[:2] == ([], [])
+    return persistence, session_id, live
+
+
+def _series(persistence: PersistenceManager, session_id: str):
+    rollups = persistence.query_timeseries(session_id, None, ["total_power", "population"], None, 10)
+    return (
+        persistence.get_faction_timeseries(session_id),
+        persistence.get_world_timeseries(session_id),
+        {key: (series.ticks, series.columns) for key, series in rollups.items()}
+    )
+
+
+def _assert_rebuilt(persistence: PersistenceManager, session_id: str, live):
+    factions, world, rollups = _series(persistence, session_id)
+    assert factions == live[0]
+    assert world == live[1]
+    assert [row[0] for row in world] == list(range(TICKS + 1))
+    assert rollups.keys() == live[2].keys()
+    for key, (ticks, columns) in rollups.items():
+        assert ticks == live[2][key][0]
+        for name, values in columns.items():
+            assert values == pytest.approx(live[2][key][1][name])
+
+
+def test_backfill_rebuilds_the_live_rows(tmp_path):
+    persistence, session_id, live = _recorded(tmp_path)
+    report = backfill_session(persistence, session_id, workers=2)
+    assert (report.start_tick, report.end_tick, report.ticks) == (0, TICKS, TICKS + 1)
+    _assert_rebuilt(persistence, session_id, live)
+    assert persistence.get_backfill_progress(session_id) == TICKS
+
+    # A finished session has nothing left to do.
+    again = backfill_session(persistence, session_id, workers=2)
+    assert again.ticks == 0
+    _assert_rebuilt(persistence, session_id, live)
+    persistence.close()
+
+
+def test_backfill_fills_every_tick_of_a_replay_log(tmp_path):
+    # A replay log records metrics only with its snapshots; backfill simulates the ticks in between.
+    persistence, session_id, live = _recorded(tmp_path, "replay")
+    assert [row[0] for row in live[1]] == list(range(0, TICKS + 1, 10))
+    report = backfill_session(persistence, session_id, workers=2)
+    assert report.ticks == TICKS + 1
+    factions, world, _ = _series(persistence, session_id)
+    assert [row[0] for row in world] == list(range(TICKS + 1))
+    assert [row for row in world if row[0] % 10 == 0] == live[1]
+    assert [row for row in factions if row[0] % 10 == 0] == live[0]
+    persistence.close()
+
+
+def test_backfill_resumes_after_an_interruption(tmp_path, monkeypatch):
+    persistence, session_id, live = _recorded(tmp_path)
+    save_backfill, saved = persistence.save_backfill, []
+
+    def interrupted(session, items, last_tick):
+        if len(saved) == 2:
+            raise KeyboardInterrupt
+        saved.append(last_tick)
+        save_backfill(session, items, last_tick)
+    monkeypatch.setattr(persistence, "save_backfill", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        backfill_session(persistence, session_id, workers=2)
+    monkeypatch.undo()
+
+    # Two stretches of ten ticks were committed with their resume point.
+    assert saved == [9, 19]
+    assert persistence.get_backfill_progress(session_id) == 19
+    assert [row[0] for row in persistence.get_world_timeseries(session_id)] == list(range(20))
+
+    report = backfill_session(persistence, session_id, workers=2)
+    assert (report.start_tick, report.ticks) == (20, TICKS - 19)
+    _assert_rebuilt(persistence, session_id, live)
+    persistence.close()
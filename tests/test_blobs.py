@@ -0,0 +1,129 @@
+import logging
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence.codec import encode_faction, encode_region, is_manifest, record_hash
+from persistence.lazy import LazyWorld
+from persistence.manager import PersistenceManager
+from scenarios import create_demo_scenario
+
+TICKS = 30
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _engine(tmp_path, **settings) -> SimulationEngine:
+    config = PersistenceConfig(snapshot_blobs=True, **settings)
+    return SimulationEngine(persistence=PersistenceManager(str(tmp_path / "simulation.db"), config))
+
+
+def _record(engine: SimulationEngine, seed: int):
+    """A new session of the demo scenario, and its world at each snapshot."""
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=seed, snapshot_interval=10, adaptive_snapshots=False
+    ))
+    engine.create_session(f"seed {seed}")
+    engine.initialize_world(create_demo_scenario())
+    worlds = {0: engine.world.clone()}
+    for _ in range(TICKS // 10):
+        engine.step(10)
+        worlds[engine.current_tick] = engine.world.clone()
+    engine.flush()
+    return engine.session_id, worlds
+
+
+def _hashes(worlds) -> set:
+    return {
+        record_hash(record) for world in worlds.values() for record in
+        [*map(encode_faction, world.factions.values()), *map(encode_region, world.regions.values())]
+    }
+
+
+def _stored(tmp_path) -> set:
+    with sqlite3.connect(str(tmp_path / "simulation.db")) as conn:
+        return {digest for (digest,) in conn.execute("SELECT hash FROM entity_blobs")}
+
+
+def _assert_reads_back(persistence: PersistenceManager, session_id: str, worlds: dict):
+    for tick, world in worlds.items():
+        assert persistence.get_snapshot(session_id, tick) == world
+        lazy = persistence.get_snapshot(session_id, tick, lazy=True)
+        assert isinstance(lazy, LazyWorld) and lazy.clone() == world
+
+
+# =========================
+# DEDUPLICATION
+# =========================
+def test_records_are_stored_once(tmp_path):
+    engine = _engine(tmp_path)
+    first, worlds = _record(engine, 1)
+    # Each distinct entity record is one row, however many snapshots refer to it.
+    assert _stored(tmp_path) == _hashes(worlds)
+    with sqlite3.connect(str(tmp_path / "simulation.db")) as conn:
+        payloads = [payload for (payload,) in conn.execute("SELECT world_json FROM snapshots WHERE session_id = ?", (first,))]
+    assert len(payloads) == len(worlds) and all(is_manifest(payload) for payload in payloads)
+
+    # A run from the same seed stores nothing new.
+    second, replayed = _record(engine, 1)
+    assert replayed == worlds
+    assert _stored(tmp_path) == _hashes(worlds)
+    _assert_reads_back(engine.persistence, first, worlds)
+    _assert_reads_back(engine.persistence, second, replayed)
+    engine.close()
+
+
+def test_reads_survive_an_empty_cache(tmp_path):
+    engine = _engine(tmp_path, blob_cache_size=0)
+    session_id, worlds = _record(engine, 2)
+    engine.close()
+    reopened = PersistenceManager(str(tmp_path / "simulation.db"), PersistenceConfig(snapshot_blobs=True))
+    _assert_reads_back(reopened, session_id, worlds)
+    reopened.close()
+
+
+# =========================
+# COLLECTION
+# =========================
+def test_collect_blobs_keeps_shared_records(tmp_path):
+    engine = _engine(tmp_path)
+    persistence = engine.persistence
+    first, worlds = _record(engine, 1)
+    second, other = _record(engine, 2)
+    assert _stored(tmp_path) == _hashes(worlds) | _hashes(other)
+    # Both runs start from the same scenario.
+    assert _hashes(worlds) & _hashes(other)
+    assert persistence.collect_blobs() == 0
+
+    # Records outlive the session that wrote them until they are collected.
+    persistence.delete_session(second)
+    assert _stored(tmp_path) == _hashes(worlds) | _hashes(other)
+    assert persistence.collect_blobs() == len(_hashes(other) - _hashes(worlds))
+    assert _stored(tmp_path) == _hashes(worlds)
+    _assert_reads_back(persistence, first, worlds)
+
+    # Dropped snapshots give their records up through vacuum().
+    persistence.drop_snapshots(first, [10, 20, 30])
+    persistence.vacuum()
+    assert _stored(tmp_path) == _hashes({0: worlds[0]})
+    _assert_reads_back(persistence, first, {0: worlds[0]})
+    engine.close()
+
+
+def test_missing_records_are_reported(tmp_path):
+    engine = _engine(tmp_path, blob_cache_size=0)
+    session_id, worlds = _record(engine, 3)
+    with sqlite3.connect(str(tmp_path / "simulation.db")) as conn:
+        conn.execute("DELETE FROM entity_blobs WHERE hash = ?", (next(iter(_hashes({10: worlds[10]}) - _hashes({0: worlds[0]}))),))
+    with pytest.raises(ValueError):
+        engine.persistence.get_snapshot(session_id, 10)
+    assert engine.persistence.get_snapshot(session_id, 0) == worlds[0]
+    engine.close()
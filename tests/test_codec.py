@@ -0,0 +1,197 @@
+import logging
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import Defaults
+from core.simulator import Simulator
+from deltas.applier import DeltaApplier
+from deltas.types import WorldDelta, FactionDelta, RegionDelta, FactionCreationData, RegionCreationData, EventTag
+from deltas.validator import DeltaValidator
+from domains.economy import Resources
+from domains.power import Power
+from domains.region_meta import EnvironmentType, RegionSocioEconomic, WeatherState, WeatherType
+from domains.ressources import Ressources, Energetic, Human, Material, Production, Intangible, Vital
+from persistence.codec import (
+    CodecError, HEADER, MAGIC, VERSION, KIND_DELTA,
+    encode_delta, decode_delta, encode_world, decode_world, load_delta, load_world,
+    encode_faction, decode_faction, encode_region, decode_region, record_id, record_hash,
+    encode_world_diff, apply_world_diff, encode_world_manifest, world_manifest_sections
+)
+from persistence.serializer import to_json
+from scenarios import create_demo_scenario
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _ressources() -> Ressources:
+    return Ressources(
+        energetic=Energetic(1.5, 2.0, 0.25, 3.0),
+        human=Human(1200, 800, 90),
+        material=Material(4.0, 0.5, 6.0, 1.0),
+        production=Production(2.0, 3.5, 1.0, 7.0),
+        intangible=Intangible(0.1, 0.2, 0.3, 0.4),
+        vital=Vital(9.0, 8.0)
+    )
+
+
+def _full_delta() -> WorldDelta:
+    """A delta that sets every optional field at least once."""
+    return WorldDelta(
+        faction_deltas={
+            "f1": FactionDelta(
+                power=Power(10.0, 2.5, 1.0), legitimacy=61.25, resources=Resources(100.0, 5.0, 3.0, 2.0, 1.0),
+                detailed_resources=_ressources(), knowledge=12.5,
+                add_regions={"r1", "r2"}, remove_regions={"r3"}, add_alliances={"f2"}, remove_alliances={"f3"}
+            ),
+            "f2": FactionDelta(legitimacy=0.0),
+            "f3": FactionDelta(deactivate=True),
+            "f4": FactionDelta()
+        },
+        region_deltas={
+            "r1": RegionDelta(
+                socio_economic=RegionSocioEconomic(30.0, 75.5, 40.0), stability=75.5, population=123456,
+                owner="f1", weather=WeatherState(WeatherType.STORM, 1.75, 3), is_conquered=True
+            ),
+            "r2": RegionDelta(is_liberated=True),
+            "r3": RegionDelta(owner="f2")
+        },
+        create_factions={
+            "f5": FactionCreationData(
+                "f5", "Rebels of Ünïcode", Power(1.0, 0.0, 0.0), 20.0, Resources(credits=-50.0), {"r3"}, set(),
+                detailed_resources=_ressources(), knowledge=1.0, traits={"zealous", "mercantile"}, color="#ff00aa"
+            ),
+            "f6": FactionCreationData("f6", "Plain", Power(), 50.0, Resources(), set(), {"f5"})
+        },
+        create_regions={
+            "r4": RegionCreationData("r4", "Frontier", 10, EnvironmentType.WILDERNESS, RegionSocioEconomic(), None),
+            "r5": RegionCreationData("r5", "Port", 99999, EnvironmentType.COASTAL, RegionSocioEconomic(1.0, 2.0, 3.0), "f6")
+        },
+        delete_factions={"f7"},
+        delete_regions={"r8", "r9"},
+        market={"food": 1.25, "metals_rare": 4.5},
+        events=["REVOLT: Rebels of Ünïcode (f5) rise", "Weather changed"],
+        event_tags=[EventTag("revolt", "f5", "f1"), EventTag("weather")]
+    )
+
+
+# =========================
+# DELTAS
+# =========================
+@pytest.mark.parametrize("delta", [
+    WorldDelta(),
+    _full_delta(),
+    # Deltas recorded before event tags existed.
+    replace(_full_delta(), event_tags=[]),
+    WorldDelta(market={"food": float("inf")}, events=["only events"])
+], ids=["empty", "full", "untagged", "sparse"])
+def test_delta_round_trip(delta):
+    payload = encode_delta(delta)
+    assert decode_delta(payload) == delta
+    assert load_delta(payload) == delta
+    assert load_delta(bytearray(payload)) == delta
+
+
+def test_demo_deltas_round_trip():
+    # Every delta a run produces decodes to itself, and to what its JSON decodes to.
+    config = Defaults()
+    world = create_demo_scenario()
+    simulator = Simulator(config, 5)
+    applier = DeltaApplier(DeltaValidator(config))
+    kinds = set()
+    for tick in range(1, 81):
+        delta = simulator.compute_delta(world, tick)
+        assert decode_delta(encode_delta(delta)) == delta
+        assert load_delta(to_json(delta)) == delta
+        kinds.update(tag.kind for tag in delta.event_tags)
+        applier.apply(delta, world, validate=True)
+    assert len(kinds) > 3
+
+
+def test_legacy_json_delta():
+    delta = _full_delta()
+    assert load_delta(to_json(delta)) == delta
+    assert load_delta(None) == WorldDelta()
+
+
+def test_rejects_foreign_and_newer_payloads():
+    with pytest.raises(CodecError):
+        decode_delta(b"XX" + encode_delta(WorldDelta())[2:])
+    with pytest.raises(CodecError):
+        decode_delta(HEADER.pack(MAGIC, VERSION + 1, KIND_DELTA))
+    with pytest.raises(CodecError):
+        decode_world(encode_delta(WorldDelta()))
+
+
+# =========================
+# WORLDS
+# =========================
+def _demo_world(ticks: int):
+    config = Defaults()
+    world = create_demo_scenario()
+    simulator = Simulator(config, 9)
+    applier = DeltaApplier(DeltaValidator(config))
+    for tick in range(1, ticks + 1):
+        applier.apply(simulator.compute_delta(world, tick), world, validate=True)
+    return world
+
+
+@pytest.mark.parametrize("ticks", [0, 60])
+def test_world_round_trip(ticks):
+    world = _demo_world(ticks)
+    payload = encode_world(world)
+    assert decode_world(payload) == world
+    assert load_world(payload) == world
+    assert load_world(to_json(world)) == world
+
+
+def test_world_with_unusual_entities_round_trips():
+    world = create_demo_scenario()
+    faction = next(iter(world.factions.values()))
+    faction.is_active = False
+    faction.detailed_resources = _ressources()
+    faction.traits = {"isolationist"}
+    other = list(world.factions.values())[1]
+    other.detailed_resources = None
+    region = next(iter(world.regions.values()))
+    region.owner = None
+    region.weather = WeatherState(WeatherType.HEATWAVE, 2.5, 7)
+    world.market = {}
+    assert decode_world(encode_world(world)) == world
+
+
+def test_entity_records():
+    world = _demo_world(30)
+    for faction in world.factions.values():
+        record = encode_faction(faction)
+        assert decode_faction(record) == faction
+        assert record_id(record) == faction.id
+        # Records decode in place inside a larger buffer.
+        assert decode_faction(b"pad" + record, 3) == faction
+    for region in world.regions.values():
+        record = encode_region(region)
+        assert decode_region(record) == region
+        assert record_id(record) == region.id
+    assert record_hash(encode_faction(faction)) == record_hash(encode_faction(faction.clone()))
+
+
+def test_world_diff_and_manifest():
+    before, after = _demo_world(10), _demo_world(40)
+    changed = [f for fid, f in after.factions.items() if before.factions.get(fid) != f]
+    removed = [fid for fid in before.factions if fid not in after.factions]
+    regions = [r for rid, r in after.regions.items() if before.regions.get(rid) != r]
+    diff = encode_world_diff(
+        after.market, [encode_faction(f) for f in changed], removed,
+        [encode_region(r) for r in regions], [rid for rid in before.regions if rid not in after.regions]
+    )
+    assert apply_world_diff(before, diff) == after
+
+    faction_hashes = [record_hash(encode_faction(f)) for f in after.factions.values()]
+    region_hashes = [record_hash(encode_region(r)) for r in after.regions.values()]
+    market, factions, regions = world_manifest_sections(encode_world_manifest(after.market, faction_hashes, region_hashes))
+    assert (market, list(factions), list(regions)) == (after.market, faction_hashes, region_hashes)
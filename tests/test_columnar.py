@@ -0,0 +1,158 @@
+import logging
+import os
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import Defaults, PersistenceConfig
+from core.engine import SimulationEngine
+from core.simulator import Simulator
+from deltas.applier import DeltaApplier
+from deltas.validator import DeltaValidator
+from domains.region_meta import WeatherState, WeatherType
+from domains.ressources import Ressources, Energetic, Human, Material, Production, Intangible, Vital
+from persistence.codec import CodecError
+from persistence.columnar import ColumnarSnapshot, encode_columnar
+from persistence.manager import PersistenceManager
+from scenarios import create_demo_scenario
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _demo_world(ticks: int):
+    config = Defaults()
+    world = create_demo_scenario()
+    simulator = Simulator(config, 2)
+    applier = DeltaApplier(DeltaValidator(config))
+    for tick in range(1, ticks + 1):
+        applier.apply(simulator.compute_delta(world, tick), world, validate=True)
+    return world
+
+
+def _write(tmp_path, world) -> str:
+    path = os.path.join(tmp_path, "world.col")
+    with open(path, "wb") as f:
+        f.write(encode_columnar(world))
+    return path
+
+
+# =========================
+# FILES
+# =========================
+@pytest.mark.parametrize("ticks", [0, 60])
+def test_file_reads_back_the_world(tmp_path, ticks):
+    world = _demo_world(ticks)
+    with ColumnarSnapshot(_write(tmp_path, world)) as snapshot:
+        assert snapshot.to_world() == world
+        assert snapshot.faction_ids() == list(world.factions)
+        assert snapshot.region_ids() == list(world.regions)
+        assert list(snapshot.faction_column("army")) == [f.power.army for f in world.factions.values()]
+        assert list(snapshot.faction_column("legitimacy")) == [f.legitimacy for f in world.factions.values()]
+        assert list(snapshot.region_column("cohesion")) == [r.socio_economic.cohesion for r in world.regions.values()]
+        assert list(snapshot.region_column("population")) == [r.population for r in world.regions.values()]
+        with pytest.raises(ValueError):
+            snapshot.column("faction.missing")
+
+
+def test_unusual_entities_read_back(tmp_path):
+    world = create_demo_scenario()
+    faction = next(iter(world.factions.values()))
+    faction.is_active = False
+    faction.traits = {"isolationist", "zealous"}
+    faction.detailed_resources = Ressources(
+        Energetic(1.5, 2.0, 0.25, 3.0), Human(1200, 800, 90), Material(4.0, 0.5, 6.0, 1.0),
+        Production(2.0, 3.5, 1.0, 7.0), Intangible(0.1, 0.2, 0.3, 0.4), Vital(9.0, 8.0)
+    )
+    region = next(iter(world.regions.values()))
+    region.owner = None
+    region.weather = WeatherState(WeatherType.STORM, 2.5, 7)
+    world.market = {}
+    with ColumnarSnapshot(_write(tmp_path, world)) as snapshot:
+        assert snapshot.to_world() == world
+
+
+def test_rejects_other_files(tmp_path):
+    path = _write(tmp_path, create_demo_scenario())
+    with open(path, "r+b") as f:
+        f.write(b"XXXX")
+    with pytest.raises(CodecError):
+        ColumnarSnapshot(path)
+
+
+# =========================
+# SESSIONS
+# =========================
+def _engine(tmp_path) -> SimulationEngine:
+    path = str(tmp_path / "simulation.db")
+    engine = SimulationEngine(persistence=PersistenceManager(path, PersistenceConfig(columnar_snapshots=True)))
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=2, snapshot_interval=10, adaptive_snapshots=False
+    ))
+    engine.create_session("columnar")
+    engine.initialize_world(create_demo_scenario())
+    return engine
+
+
+def _step(engine, ticks: int, worlds: dict):
+    for _ in range(ticks // 10):
+        engine.step(10)
+        worlds[engine.current_tick] = engine.world.clone()
+
+
+def test_session_files_match_the_snapshots(tmp_path):
+    engine = _engine(tmp_path)
+    persistence, session_id = engine.persistence, engine.session_id
+    worlds = {0: engine.world.clone()}
+    _step(engine, 40, worlds)
+    assert os.path.isdir(str(tmp_path / "simulation.db.columns"))
+
+    for tick, world in worlds.items():
+        with persistence.get_columnar_snapshot(session_id, tick) as snapshot:
+            assert snapshot.to_world() == world == persistence.get_snapshot(session_id, tick)
+    assert persistence.get_columnar_snapshot(session_id, 5) is None
+
+    armies = {tick: list(snapshot.faction_column("army")) for tick, snapshot in persistence.iter_columnar_snapshots(session_id)}
+    assert armies == {tick: [f.power.army for f in world.factions.values()] for tick, world in worlds.items()}
+    assert [tick for tick, _ in persistence.iter_columnar_snapshots(session_id, 10, 30)] == [10, 20, 30]
+
+    # Forks read their parent's files up to the fork tick.
+    fork = engine.fork_session(session_id, 20)
+    forked = {tick: world for tick, world in worlds.items() if tick <= 20}
+    _step(engine, 20, forked)
+    for tick, snapshot in persistence.iter_columnar_snapshots(fork):
+        assert snapshot.to_world() == forked[tick]
+    assert [tick for tick, _ in persistence.iter_columnar_snapshots(fork)] == sorted(forked)
+    engine.close()
+
+
+def test_files_follow_the_snapshots_they_mirror(tmp_path):
+    engine = _engine(tmp_path)
+    persistence, session_id = engine.persistence, engine.session_id
+    _step(engine, 50, {})
+    columns = persistence.columns
+
+    engine.rewind(25)
+    assert columns.ticks(session_id) == [0, 10, 20]
+    _step(engine, 20, {})
+    assert columns.ticks(session_id) == [0, 10, 20, 30, 40]
+
+    assert persistence.drop_snapshots(session_id, [10]) == 1
+    assert columns.ticks(session_id) == [0, 20, 30, 40]
+
+    engine.writer.close()
+    persistence.delete_session(session_id)
+    assert columns.ticks(session_id) == []
+    persistence.close()
+
+
+def test_in_memory_database_needs_a_path(tmp_path):
+    with pytest.raises(ValueError):
+        PersistenceManager(":memory:", PersistenceConfig(columnar_snapshots=True))
+    persistence = PersistenceManager(":memory:", PersistenceConfig(columnar_snapshots=True, columnar_path=str(tmp_path / "columns")))
+    assert persistence.columns.root == str(tmp_path / "columns")
+    persistence.close()
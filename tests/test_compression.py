@@ -0,0 +1,141 @@
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from persistence.codec import encode_delta
+from persistence.compression import (
+    MAX_DICTIONARY_SIZE, compress, decompress, is_compressed, train_dictionary, uses_dictionary
+)
+from persistence.manager import PersistenceManager
+from persistence.timetravel import TimeTravelService
+from scenarios import create_demo_scenario
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _samples(count: int = 60):
+    engine = SimulationEngine(persistence=PersistenceManager(":memory:"))
+    engine.create_session("samples")
+    engine.initialize_world(create_demo_scenario())
+    payloads = []
+    for _ in range(count):
+        engine.step(1)
+        payloads.append(encode_delta(next(engine.persistence.iter_deltas(engine.session_id, engine.current_tick, engine.current_tick, decode=True))[1]))
+    engine.close()
+    return payloads
+
+
+# =========================
+# PAYLOADS
+# =========================
+@pytest.mark.parametrize("payload", [b"", b"\x00\x01binary" * 40, "legacy json {\"a\": 1}", "ünïcode"])
+def test_round_trip(payload):
+    zdict = b"binary legacy json" * 10
+    for dictionary in (None, zdict):
+        packed = compress(payload, dictionary)
+        assert is_compressed(packed)
+        assert uses_dictionary(packed) == (dictionary is not None)
+        assert decompress(packed, dictionary) == payload
+    assert not is_compressed(payload)
+
+
+def test_dictionary_is_required_to_decompress():
+    packed = compress(b"payload" * 20, b"payload")
+    with pytest.raises(ValueError):
+        decompress(packed)
+    with pytest.raises(ValueError):
+        decompress(b"XX" + packed[2:])
+
+
+def test_trained_dictionary_shrinks_payloads():
+    samples = _samples()
+    train, held_out = samples[:40], samples[40:]
+    zdict = train_dictionary(train, 4096)
+    assert 0 < len(zdict) <= 4096
+    assert train_dictionary(train, 4096) == zdict
+    assert len(train_dictionary(train, 10 * MAX_DICTIONARY_SIZE)) <= MAX_DICTIONARY_SIZE
+
+    plain = sum(len(compress(p)) for p in held_out)
+    with_dictionary = sum(len(compress(p, zdict)) for p in held_out)
+    assert with_dictionary < plain
+    assert all(decompress(compress(p, zdict), zdict) == p for p in held_out)
+
+
+# =========================
+# SESSIONS
+# =========================
+def _engine(path: str, **settings) -> SimulationEngine:
+    config = PersistenceConfig(compression=True, **settings)
+    engine = SimulationEngine(persistence=PersistenceManager(path, config))
+    engine.config = replace(engine.config, simulation=replace(engine.config.simulation, seed=4))
+    engine.create_session("compressed")
+    engine.initialize_world(create_demo_scenario())
+    return engine
+
+
+def _deltas(path: str):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT tick_number, delta_json FROM deltas ORDER BY tick_number").fetchall()
+
+
+def test_dictionary_swaps_in_once_trained(tmp_path):
+    path = str(tmp_path / "simulation.db")
+    engine = _engine(path, dictionary_samples=20, dictionary_size=4096)
+    worlds = {0: engine.world.clone()}
+    for _ in range(30):
+        engine.step(1)
+        worlds[engine.current_tick] = engine.world.clone()
+    # Training runs beside the tick loop; payloads go without a dictionary until it is done.
+    for thread in threading.enumerate():
+        if thread.name == "diane-dictionary":
+            thread.join()
+    for _ in range(10):
+        engine.step(1)
+        worlds[engine.current_tick] = engine.world.clone()
+    session_id = engine.session_id
+    assert engine.persistence.get_dictionary(session_id) is not None
+    engine.close()
+
+    flags = [(tick, uses_dictionary(payload)) for tick, payload in _deltas(path)]
+    assert all(is_compressed(payload) for _, payload in _deltas(path))
+    swapped = next(tick for tick, used in flags if used)
+    # Once the dictionary is in, every later payload uses it.
+    assert 20 <= swapped <= 31
+    assert all(used == (tick >= swapped) for tick, used in flags)
+
+    reopened = PersistenceManager(path, PersistenceConfig(compression=True))
+    time_travel = TimeTravelService(reopened)
+    for tick in (swapped - 1, swapped, 40):
+        assert time_travel.checkout(session_id, tick) == worlds[tick]
+    reopened.close()
+
+
+def test_bundled_dictionary_is_used_from_the_first_tick(tmp_path):
+    zdict = train_dictionary(_samples(30), 4096)
+    dictionary_path = os.path.join(tmp_path, "deltas.zdict")
+    with open(dictionary_path, "wb") as f:
+        f.write(zdict)
+    path = str(tmp_path / "simulation.db")
+    engine = _engine(path, dictionary_path=dictionary_path)
+    engine.step(10)
+    world, session_id = engine.world.clone(), engine.session_id
+    assert engine.persistence.get_dictionary(session_id) == zdict
+    engine.close()
+
+    assert all(uses_dictionary(payload) for _, payload in _deltas(path))
+    # The session keeps its own copy, so the file is not needed to read it back.
+    os.remove(dictionary_path)
+    reopened = PersistenceManager(path, PersistenceConfig(compression=True))
+    assert TimeTravelService(reopened).checkout(session_id, 10) == world
+    reopened.close()
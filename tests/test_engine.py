@@ -0,0 +1,219 @@
+import logging
+from dataclasses import replace
+
+import pytest
+
+from core.engine import SimulationEngine
+from persistence.replay import verify_session
+from persistence.writer import BatchWriter, WriteBehindWriter
+from persistence.timetravel import TimeTravelService
+from scenarios import create_demo_scenario
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _engine(tmp_path, storage_mode: str = "deltas", seed: int = 7) -> SimulationEngine:
+    tmp_path.mkdir(exist_ok=True)
+    engine = SimulationEngine(str(tmp_path / "simulation.db"))
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=seed, storage_mode=storage_mode, replay_snapshot_interval=10
+    ))
+    engine.create_session("base")
+    engine.initialize_world(create_demo_scenario())
+    return engine
+
+
+@pytest.mark.parametrize("storage_mode", ["deltas", "replay"])
+def test_forks_diverge_from_their_parent(tmp_path, storage_mode):
+    engine = _engine(tmp_path, storage_mode)
+    engine.step(50)
+    parent, at_50 = engine.session_id, engine.world.clone()
+
+    first = engine.fork_session(parent, 20)
+    engine.step(30)
+    first_world = engine.world.clone()
+    engine.fork_session(parent, 20)
+    engine.step(30)
+
+    assert first_world != at_50
+    assert engine.world != at_50
+    assert engine.world != first_world
+    # Each fork replays to the world it ran into, and reads its parent's ticks before the fork.
+    time_travel = TimeTravelService(engine.persistence, engine.config)
+    assert time_travel.checkout(first, 50) == first_world
+    assert time_travel.checkout(first, 15) == time_travel.checkout(parent, 15)
+    engine.close()
+
+
+@pytest.mark.parametrize("storage_mode", ["deltas", "replay"])
+def test_rewind_then_step_diverges(tmp_path, storage_mode):
+    engine = _engine(tmp_path, storage_mode)
+    engine.step(40)
+    engine.step(10)
+    undone = engine.world.clone()
+
+    engine.rewind(10)
+    engine.step(10)
+    assert engine.world != undone
+
+    # The new seed is recorded, so the session still replays to the state it reached.
+    final, tick = engine.world.clone(), engine.current_tick
+    assert TimeTravelService(engine.persistence, engine.config).checkout(engine.session_id, tick) == final
+    if storage_mode == "replay":
+        assert verify_session(engine.persistence, engine.session_id).diverged is None
+    engine.close()
+
+
+def test_fixed_seed_reproduces_a_run(tmp_path):
+    first = _engine(tmp_path / "a")
+    first.step(30)
+    second = _engine(tmp_path / "b")
+    second.step(30)
+    assert first.world == second.world
+    first.close()
+    second.close()
+
+
+@pytest.mark.parametrize("writer", [BatchWriter, WriteBehindWriter])
+def test_batched_ticks_store_the_same_history(tmp_path, monkeypatch, writer):
+    unbatched = _engine(tmp_path / "a")
+    unbatched.step(20)
+    batched = _engine(tmp_path / "b")
+    batched.writer = writer(batched.persistence, 8)
+    save_steps, batches = batched.persistence.save_steps, []
+
+    def counted(steps):
+        batches.append([step.tick for step in steps])
+        save_steps(steps)
+    monkeypatch.setattr(batched.persistence, "save_steps", counted)
+    batched.step(20)
+    assert [tick for batch in batches for tick in batch] == list(range(1, 21))
+    assert max(map(len, batches)) <= 8
+    if writer is BatchWriter:
+        # step() flushes the partial batch at its end.
+        assert batches == [list(range(1, 9)), list(range(9, 17)), list(range(17, 21))]
+
+    for engine in (unbatched, batched):
+        assert engine.persistence.get_latest_tick(engine.session_id) == 20
+    deltas = [list(e.persistence.iter_deltas(e.session_id, 1, 20, decode=True)) for e in (unbatched, batched)]
+    assert deltas[0] == deltas[1]
+    snapshots = [e.persistence.get_all_snapshots(e.session_id) for e in (unbatched, batched)]
+    assert snapshots[0] == snapshots[1]
+    unbatched.close()
+    batched.close()
+
+
+def _failing_once(persistence, monkeypatch, call: int):
+    """Makes the call-th save_steps of persistence raise, once."""
+    save_steps, calls = persistence.save_steps, []
+
+    def flaky(steps):
+        calls.append(len(steps))
+        if len(calls) == call:
+            raise OSError("disk full")
+        save_steps(steps)
+    monkeypatch.setattr(persistence, "save_steps", flaky)
+
+
+@pytest.mark.parametrize("writer", [BatchWriter, WriteBehindWriter])
+def test_failed_batch_leaves_no_gap(tmp_path, monkeypatch, writer):
+    engine = _engine(tmp_path)
+    engine.writer = writer(engine.persistence, 5)
+    _failing_once(engine.persistence, monkeypatch, 2)
+
+    with pytest.raises((OSError, RuntimeError)):
+        engine.step(12)
+    # Ticks 6-10 were lost, so the engine is back at the last tick stored before them.
+    assert engine.current_tick == engine.persistence.get_latest_tick(engine.session_id) == 5
+    time_travel = TimeTravelService(engine.persistence, engine.config)
+    assert engine.world == time_travel.checkout(engine.session_id, 5)
+
+    engine.step(7)
+    ticks = [tick for tick, _ in engine.persistence.iter_deltas(engine.session_id, 1, 12)]
+    assert ticks == list(range(1, 13))
+    assert time_travel.checkout(engine.session_id, 12) == engine.world
+    engine.close()
+
+
+def test_writer_refuses_ticks_after_a_lost_batch(tmp_path, monkeypatch):
+    engine = _engine(tmp_path)
+    writer = BatchWriter(engine.persistence, 1)
+    _failing_once(engine.persistence, monkeypatch, 1)
+    with pytest.raises(OSError):
+        writer.submit(engine.session_id, 1, None)
+    with pytest.raises(RuntimeError):
+        writer.submit(engine.session_id, 2, None)
+    writer.discard()
+    writer.submit(engine.session_id, 1, None)
+    assert engine.persistence.get_latest_tick(engine.session_id) == 1
+    engine.close()
+
+
+def test_write_behind_drops_the_ticks_after_a_lost_batch(tmp_path, monkeypatch):
+    engine = _engine(tmp_path)
+    writer = WriteBehindWriter(engine.persistence, 1)
+    _failing_once(engine.persistence, monkeypatch, 1)
+    writer.submit(engine.session_id, 1, None)
+    writer.submit(engine.session_id, 2, None)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            writer.flush()
+    with pytest.raises(RuntimeError):
+        writer.submit(engine.session_id, 3, None)
+    assert engine.persistence.get_latest_tick(engine.session_id) == 0
+
+    writer.discard()
+    writer.submit(engine.session_id, 1, None)
+    writer.close()
+    assert engine.persistence.get_latest_tick(engine.session_id) == 1
+    engine.close()
+
+
+def test_step_refuses_to_overwrite_stored_ticks(tmp_path):
+    engine = _engine(tmp_path)
+    engine.step(40)
+    session_id = engine.session_id
+    at_20 = TimeTravelService(engine.persistence, engine.config).checkout(session_id, 20)
+
+    engine.load_session(session_id, 20)
+    for _ in range(2):
+        with pytest.raises(ValueError, match="recorded up to tick 40"):
+            engine.step(1)
+        # Nothing moved, in memory or on disk.
+        assert engine.current_tick == 20
+        assert engine.world == at_20
+        assert engine.persistence.get_latest_tick(session_id) == 40
+    engine.close()
+
+
+def test_load_an_earlier_tick_then_continue(tmp_path):
+    engine = _engine(tmp_path)
+    engine.step(40)
+    session_id = engine.session_id
+    at_40 = engine.world.clone()
+    time_travel = TimeTravelService(engine.persistence, engine.config)
+
+    # A fork continues from the tick being viewed and leaves the session whole.
+    engine.load_session(session_id, 20)
+    fork_id = engine.fork_session(session_id)
+    assert engine.persistence.get_fork_point(fork_id) == (session_id, 20)
+    engine.step(5)
+    assert engine.persistence.get_latest_tick(session_id) == 40
+
+    # Discarding would cut the history the fork reads.
+    with pytest.raises(ValueError, match="forked there"):
+        engine.load_session(session_id, 10, truncate=True)
+    engine.persistence.delete_session(fork_id)
+
+    engine.load_session(session_id, 20, truncate=True)
+    assert engine.current_tick == engine.persistence.get_latest_tick(session_id) == 20
+    engine.step(20)
+    assert [tick for tick, _ in engine.persistence.iter_deltas(session_id, 1, 40)] == list(range(1, 41))
+    assert engine.world != at_40
+    assert time_travel.checkout(session_id, 40) == engine.world
+    engine.close()
@@ -0,0 +1,132 @@
+import logging
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from domains.world import World
+from persistence.codec import FACTION_FIELD_OFFSETS, REGION_FIELD_OFFSETS
+from persistence.lazy import LazyWorld
+from persistence.manager import PersistenceManager
+from persistence.timetravel import TimeTravelService
+from scenarios import create_demo_scenario
+
+TICKS = 60
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _record(tmp_path, **settings):
+    """A session with a snapshot every 5 ticks, and the live world at each of them."""
+    engine = SimulationEngine(persistence=PersistenceManager(str(tmp_path / "simulation.db"), PersistenceConfig(**settings)))
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=6, snapshot_interval=5, adaptive_snapshots=False
+    ))
+    engine.create_session("lazy")
+    engine.initialize_world(create_demo_scenario())
+    worlds = {0: engine.world.clone()}
+    for _ in range(TICKS // 5):
+        engine.step(5)
+        worlds[engine.current_tick] = engine.world.clone()
+    return engine, worlds
+
+
+def _faction_value(faction, field: str) -> float:
+    if field in ("army", "navy", "air"):
+        return getattr(faction.power, field)
+    if field in ("legitimacy", "knowledge"):
+        return getattr(faction, field)
+    return getattr(faction.resources, field)
+
+
+def _region_value(region, field: str) -> float:
+    if field == "population":
+        return region.population
+    if field.startswith("weather_"):
+        return getattr(region.weather, field[len("weather_"):])
+    return getattr(region.socio_economic, field)
+
+
+def _assert_same_world(lazy: LazyWorld, world: World):
+    assert isinstance(lazy, LazyWorld)
+    assert lazy.factions.decoded_count == 0 and lazy.regions.decoded_count == 0
+    # Columns are read without decoding any entity.
+    for field in FACTION_FIELD_OFFSETS:
+        assert lazy.factions.column(field) == {fid: _faction_value(f, field) for fid, f in world.factions.items()}
+    for field in REGION_FIELD_OFFSETS:
+        assert lazy.regions.column(field) == {rid: _region_value(r, field) for rid, r in world.regions.items()}
+    assert lazy.factions.decoded_count == 0
+
+    assert lazy.market == world.market
+    assert sorted(lazy.factions) == sorted(world.factions)
+    assert sorted(lazy.regions) == sorted(world.regions)
+    for fid, faction in world.factions.items():
+        assert lazy.get_faction(fid) == faction
+        assert lazy.factions[fid] is lazy.factions[fid]
+    for rid, region in world.regions.items():
+        assert lazy.get_region(rid) == region
+    assert lazy.get_faction("missing") is None
+    assert lazy.clone() == world
+
+
+# =========================
+# SNAPSHOTS
+# =========================
+@pytest.mark.parametrize("keyframe_interval", [1, 3])
+def test_lazy_snapshots_match_the_eager_load(tmp_path, keyframe_interval):
+    # Past the first keyframe, most snapshots are diffs patched onto the keyframe's view.
+    engine, worlds = _record(tmp_path, keyframe_interval=keyframe_interval)
+    persistence, session_id = engine.persistence, engine.session_id
+    for tick, world in worlds.items():
+        assert persistence.get_snapshot(session_id, tick) == world
+        _assert_same_world(persistence.get_snapshot(session_id, tick, lazy=True), world)
+
+    eager = persistence.get_sampled_snapshots(session_id, 5)
+    lazy = persistence.get_sampled_snapshots(session_id, 5, lazy=True)
+    assert [tick for tick, _ in lazy] == [tick for tick, _ in eager]
+    for (tick, view), (_, world) in zip(lazy, eager):
+        assert world == worlds[tick]
+        _assert_same_world(view, world)
+    engine.close()
+
+
+def test_views_are_independent(tmp_path):
+    engine, worlds = _record(tmp_path)
+    view = engine.persistence.get_snapshot(engine.session_id, 10, lazy=True)
+    copy = view.copy()
+    faction_id = next(iter(worlds[10].factions))
+    copy.factions.remove([faction_id])
+    copy.market["food"] = -1.0
+    assert faction_id in view.factions and len(copy.factions) == len(view.factions) - 1
+    assert view.clone() == worlds[10]
+
+    # Clones are regular worlds that share nothing with the view.
+    world = view.clone()
+    world.factions[faction_id].legitimacy = -1.0
+    assert view.factions[faction_id] == worlds[10].factions[faction_id]
+    with pytest.raises(ValueError):
+        view.factions.column("name")
+    engine.close()
+
+
+def test_json_snapshots_load_eagerly(tmp_path):
+    engine, worlds = _record(tmp_path, codec="json")
+    lazy = engine.persistence.get_snapshot(engine.session_id, 10, lazy=True)
+    assert isinstance(lazy, World) and lazy == worlds[10]
+    engine.close()
+
+
+def test_time_travel_view(tmp_path):
+    engine, worlds = _record(tmp_path)
+    time_travel = TimeTravelService(engine.persistence)
+    # Snapshot ticks come back as views; the ticks between them are replayed.
+    _assert_same_world(time_travel.view(engine.session_id, 20), worlds[20])
+    between = time_travel.view(engine.session_id, 22)
+    assert isinstance(between, World) and between == time_travel.checkout(engine.session_id, 22)
+    engine.close()
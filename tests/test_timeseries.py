@@ -0,0 +1,253 @@
+import logging
+import os
+import sqlite3
+from dataclasses import replace
+
+import pytest
+
+from core.defaults import PersistenceConfig
+from core.engine import SimulationEngine
+from deltas.types import WorldDelta, FactionDelta
+from domains.power import Power
+from persistence.backend import create_backend
+from persistence.manager import FACTION_SERIES, WORLD_SERIES
+from persistence.timeseries import capture_metrics, rollup_columns
+from scenarios import create_demo_scenario
+
+SNAPSHOT_INTERVAL = 10
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    logging.disable(logging.CRITICAL)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def _record(tmp_path, ticks: int, backend: str = "sqlite", **settings) -> SimulationEngine:
+    path = os.path.join(tmp_path, "simulation.db" if backend == "sqlite" else "simulation")
+    engine = SimulationEngine(persistence=create_backend(path, PersistenceConfig(backend=backend, **settings)))
+    engine.config = replace(engine.config, simulation=replace(
+        engine.config.simulation, seed=3, snapshot_interval=SNAPSHOT_INTERVAL, adaptive_snapshots=False
+    ))
+    engine.create_session("series")
+    engine.initialize_world(create_demo_scenario())
+    engine.step(ticks)
+    return engine
+
+
+# =========================
+# RECORDED METRICS
+# =========================
+@pytest.mark.parametrize("backend", ["sqlite", "files"])
+@pytest.mark.parametrize("metrics_interval", [1, 5])
+def test_metrics_are_recorded_from_the_live_world(tmp_path, backend, metrics_interval):
+    engine = _record(tmp_path, 0, backend)
+    engine.config = replace(engine.config, simulation=replace(engine.config.simulation, metrics_interval=metrics_interval))
+    live = {0: capture_metrics(engine.world)}
+    names = {fid: (name, color) for fid, name, color in live[0].names}
+    for _ in range(30):
+        engine.step(1)
+        metrics = capture_metrics(engine.world)
+        names.update((fid, (name, color)) for fid, name, color in metrics.names)
+        if engine.current_tick % metrics_interval == 0:
+            live[engine.current_tick] = metrics
+    persistence, session_id = engine.persistence, engine.session_id
+
+    world_rows = persistence.get_world_timeseries(session_id)
+    assert world_rows == [(tick, *metrics.world) for tick, metrics in sorted(live.items())]
+    faction_rows = {}
+    for tick, fid, name, color, *values in persistence.get_faction_timeseries(session_id):
+        faction_rows.setdefault(tick, []).append((fid, *values))
+        assert (name, color) == names[fid]
+    assert {tick: sorted(rows) for tick, rows in faction_rows.items()} == {tick: sorted(m.factions) for tick, m in live.items()}
+    assert persistence.get_session_factions(session_id) == names
+
+    # Rows go with the ticks they were recorded at.
+    engine.rewind(10)
+    assert [row[0] for row in persistence.get_world_timeseries(session_id)] == [tick for tick in sorted(live) if tick <= 20]
+    assert max(row[0] for row in persistence.get_faction_timeseries(session_id)) <= 20
+    engine.close()
+
+
+# =========================
+# SAMPLED SNAPSHOTS
+# =========================
+@pytest.mark.parametrize("backend", ["sqlite", "files"])
+def test_sampled_snapshots_stay_within_max_points(tmp_path, backend):
+    # Six snapshots, at ticks 0-50: the last one is off the stride for most caps.
+    engine = _record(tmp_path, 50, backend)
+    stored = [tick for tick, _ in engine.persistence.get_all_snapshots(engine.session_id)]
+    assert stored == [0, 10, 20, 30, 40, 50]
+
+    for max_points in range(1, 9):
+        ticks = [tick for tick, _ in engine.persistence.get_sampled_snapshots(engine.session_id, max_points)]
+        assert len(ticks) <= max_points
+        assert ticks[-1] == 50
+        if max_points > 1:
+            assert ticks[0] == 0
+        assert ticks == sorted(set(ticks))
+        if max_points >= len(stored):
+            assert ticks == stored
+    engine.close()
+
+
+# =========================
+# QUERIES AND ROLLUPS
+# =========================
+SPIKE_TICK = 137
+
+
+def _record_spike(tmp_path, **settings) -> SimulationEngine:
+    """300 ticks in which one faction's army jumps to a million for the single tick SPIKE_TICK."""
+    engine = _record(tmp_path, SPIKE_TICK - 1, **settings)
+    faction_id = sorted(engine.world.factions)[0]
+    army = engine.world.factions[faction_id].power
+    engine.submit_input(WorldDelta(faction_deltas={faction_id: FactionDelta(power=Power(1e6, army.navy, army.air))}))
+    engine.step(1)
+    engine.submit_input(WorldDelta(faction_deltas={faction_id: FactionDelta(power=army)}))
+    engine.step(300 - SPIKE_TICK)
+    return engine
+
+
+def _raw(path: str, series: tuple, lineage) -> dict:
+    """{entity: {tick: row}} of the raw rows of a session, given as [(session_id, last tick it owns)] root first."""
+    table, _, columns, key = series
+    rows = {}
+    with sqlite3.connect(path) as conn:
+        low = -1
+        for session_id, high in lineage:
+            cursor = conn.execute(
+                f"SELECT {key or 'NULL'}, tick_number, {', '.join(columns)} FROM {table} "
+                "WHERE session_id = ? AND tick_number > ? AND tick_number <= ?",
+                (session_id, low, high)
+            )
+            for entity, tick, *values in cursor:
+                rows.setdefault(entity, {})[tick] = dict(zip(columns, values))
+            low = high
+    return rows
+
+
+def _expected(raw: dict, fields, start: int, end: int, level: int, width: int) -> dict:
+    """Mean, min and max of every point over whole buckets of level ticks, computed from raw rows."""
+    first, last = start // level * level, (end // level + 1) * level - 1
+    expected = {}
+    for entity, by_tick in raw.items():
+        points = {}
+        for tick in sorted(by_tick):
+            if first <= tick <= last:
+                points.setdefault(first + (tick - first) // width * width, []).append(by_tick[tick])
+        columns = {}
+        for f in fields:
+            values = [[row[f] for row in rows] for rows in points.values()]
+            columns[f] = [sum(v) / len(v) for v in values]
+            columns[f + "_min"] = [min(v) for v in values]
+            columns[f + "_max"] = [max(v) for v in values]
+        expected[entity] = (list(points), columns)
+    return expected
+
+
+def _assert_matches(results: dict, expected: dict, width: int):
+    assert set(results) == set(expected)
+    for entity, (ticks, columns) in expected.items():
+        series = results[entity]
+        assert series.resolution == width
+        assert series.ticks == ticks
+        for name, values in columns.items():
+            assert series.columns[name] == pytest.approx(values), name
+
+
+@pytest.mark.parametrize("tick_range, max_points, level, width", [
+    (None, 1000, 1, 1),
+    (None, 40, 10, 10),
+    (None, 4, 100, 100),
+    ((35, 172), 20, 10, 10),
+    ((35, 172), 200, 1, 1),
+    ((120, None), 2, 1_000, 1_000),
+])
+def test_query_timeseries_matches_raw_rows(tmp_path, tick_range, max_points, level, width):
+    engine = _record_spike(tmp_path)
+    path = str(tmp_path / "simulation.db")
+    session_id = engine.session_id
+    start, end = (tick_range[0] if tick_range else 0), (tick_range[1] if tick_range and tick_range[1] is not None else 300)
+
+    fields = ["army", "legitimacy", "population"]
+    raw = _raw(path, FACTION_SERIES, [(session_id, 300)])
+    results = engine.persistence.query_timeseries(session_id, sorted(raw), fields, tick_range, max_points)
+    expected = _expected(raw, fields, start, end, level, width)
+    expected = {entity: points for entity, points in expected.items() if points[0]}
+    _assert_matches(results, expected, width)
+    assert all(len(series.ticks) <= max_points for series in results.values())
+
+    fields = ["total_power", "active_factions"]
+    results = engine.persistence.query_timeseries(session_id, None, fields, tick_range, max_points)
+    expected = _expected(_raw(path, WORLD_SERIES, [(session_id, 300)]), fields, start, end, level, width)
+    _assert_matches(results, expected, width)
+    engine.close()
+
+
+def test_spikes_survive_downsampling(tmp_path):
+    engine = _record_spike(tmp_path)
+    faction_id = sorted(engine.world.factions)[0]
+    for max_points in (1000, 40, 4, 1):
+        series = engine.persistence.query_timeseries(engine.session_id, [faction_id], ["army"], None, max_points)[faction_id]
+        point = max(i for i, tick in enumerate(series.ticks) if tick <= SPIKE_TICK)
+        assert series.columns["army_max"][point] == 1e6
+        if series.resolution > 1:
+            assert series.columns["army"][point] < 1e6 / 2
+        assert sum(1 for value in series.columns["army_max"] if value >= 1e6) == 1
+    engine.close()
+
+
+def test_merged_buckets_of_the_coarsest_level(tmp_path):
+    engine = _record_spike(tmp_path, rollup_levels=(10,))
+    path = str(tmp_path / "simulation.db")
+    fields = ["army", "credits"]
+    raw = _raw(path, FACTION_SERIES, [(engine.session_id, 300)])
+    # 31 buckets of 10 ticks, merged five at a time into 7 points.
+    results = engine.persistence.query_timeseries(engine.session_id, sorted(raw), fields, None, 7)
+    expected = _expected(raw, fields, 0, 300, 10, 50)
+    _assert_matches(results, expected, 50)
+    engine.close()
+
+
+@pytest.mark.parametrize("series", [FACTION_SERIES, WORLD_SERIES], ids=["factions", "world"])
+def test_rollup_rows_aggregate_raw_rows(tmp_path, series):
+    engine = _record_spike(tmp_path)
+    path = str(tmp_path / "simulation.db")
+    _, rollups, columns, key = series
+    raw = _raw(path, series, [(engine.session_id, 300)])
+    with sqlite3.connect(path) as conn:
+        for level in engine.persistence.config.rollup_levels:
+            cursor = conn.execute(
+                f"SELECT {key or 'NULL'}, bucket, samples, {', '.join(rollup_columns(columns))} FROM {rollups} "
+                "WHERE session_id = ? AND level = ?",
+                (engine.session_id, level)
+            )
+            stored = {(entity, bucket): (samples, values) for entity, bucket, samples, *values in cursor}
+            expected = {}
+            for entity, by_tick in raw.items():
+                for tick, row in by_tick.items():
+                    expected.setdefault((entity, tick // level), []).append(row)
+            assert set(stored) == set(expected)
+            for bucket, rows in expected.items():
+                samples, values = stored[bucket]
+                assert samples == len(rows)
+                aggregates = [agg([row[c] for row in rows]) for c in columns for agg in (min, max, sum)]
+                assert values == pytest.approx(aggregates)
+    engine.close()
+
+
+def test_fork_series_read_through_the_parent(tmp_path):
+    engine = _record_spike(tmp_path)
+    path = str(tmp_path / "simulation.db")
+    parent = engine.session_id
+    # Off a bucket boundary, so the parent's bucket 14 also holds ticks the fork does not have.
+    fork = engine.fork_session(parent, 143)
+    engine.step(157)
+    fields = ["army", "legitimacy"]
+    raw = _raw(path, FACTION_SERIES, [(parent, 143), (fork, 300)])
+    for max_points, level in ((1000, 1), (40, 10), (4, 100)):
+        results = engine.persistence.query_timeseries(fork, sorted(raw), fields, None, max_points)
+        _assert_matches(results, _expected(raw, fields, 0, 300, level, level), level)
+    engine.close()